@@ -0,0 +1,25 @@
+"""Streaming HTTP channels
+
+Revision ID: 0031_3b5c7e9a
+Revises: 0030_9271ae91
+Create Date: 2016-10-18 10:12:45
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '0031_3b5c7e9a'
+down_revision = '0030_9271ae91'
+
+from alembic import op
+import sqlalchemy as sa
+
+# Zato
+from zato.common.odb import model
+
+# ################################################################################################################################
+
+def upgrade():
+    op.add_column(model.HTTPSOAP.__tablename__, sa.Column('is_streaming', sa.Boolean(), nullable=True, default=False))
+
+def downgrade():
+    op.drop_column(model.HTTPSOAP.__tablename__, 'is_streaming')
@@ -45,17 +45,43 @@ NEEDS_TMP_KEY = [v for k,v in TOPICS.items() if k in(
 CODE_RENAMED = 10
 CODE_NO_SUCH_FROM_KEY = 11
 
-def BrokerClient(kvdb, client_type, topic_callbacks, _initial_lua_programs):
+# Messages of these types are pushed onto a queue if async delivery is configured to use queues
+QUEUE_MSG_TYPES = (MESSAGE_TYPE.TO_PARALLEL_ANY,)
+
+# Each message in a queue is prefixed with a Unix timestamp after which it should be ignored
+QUEUE_MSG_SEPARATOR = b'|'
+
+# Pushes a message onto a queue, making sure the queue itself will expire if nothing pops messages off it.
+LUA_ENQUEUE = """
+-- KEYS[1] = queue
+-- ARGV[1] = message
+-- ARGV[2] = expiration, in seconds
+
+local queue = KEYS[1]
+local expiration = tonumber(ARGV[2])
+
+redis.call('rpush', queue, ARGV[1])
+
+if redis.call('ttl', queue) < expiration then
+    redis.call('expire', queue, expiration)
+end
+"""
+
+def get_queue_key(msg_type):
+    return b'zato:broker:queue{}'.format(KEYS[msg_type])
+
+def BrokerClient(kvdb, client_type, topic_callbacks, _initial_lua_programs, async_delivery=BROKER.ASYNC_DELIVERY.PUB_SUB):
 
     # Imported here so it's guaranteed to be monkey-patched using gevent.monkey.patch_all by whoever called us
     from thread import start_new_thread
 
     class _ClientThread(object):
-        def __init__(self, kvdb, pubsub, name, topic_callbacks=None, on_message=None):
+        def __init__(self, kvdb, pubsub, name, topic_callbacks=None, on_message=None, queue_keys=None):
             self.kvdb = kvdb
             self.pubsub = pubsub
             self.topic_callbacks = topic_callbacks
             self.on_message = on_message
+            self.queue_keys = queue_keys
             self.client = None
             self.keep_running = ZATO_NONE
 
@@ -81,6 +107,26 @@ def BrokerClient(kvdb, client_type, topic_callbacks, _initial_lua_programs):
                 except KeyboardInterrupt:
                     self.keep_running = False
 
+            elif self.pubsub == 'queue':
+                self.client = self.kvdb
+                self.keep_running = True
+
+                try:
+                    while self.keep_running:
+                        try:
+                            msg = self.client.conn.blpop(self.queue_keys, BROKER.QUEUE_POP_TIMEOUT)
+                        except redis.ConnectionError, e:
+                            if not self.keep_running:
+                                break
+                            logger.warn('Could not pop a broker message, will retry in %ss, e:`%s`',
+                                BROKER.QUEUE_POP_TIMEOUT, e.message)
+                            time.sleep(BROKER.QUEUE_POP_TIMEOUT)
+                        else:
+                            if msg:
+                                self.on_message(*msg)
+                except KeyboardInterrupt:
+                    self.keep_running = False
+
             else:
                 self.client = self.kvdb
                 self.keep_running = True
@@ -116,13 +162,22 @@ def BrokerClient(kvdb, client_type, topic_callbacks, _initial_lua_programs):
            that bad as it may seem, there will be at most as many clients as there
            are servers in the cluster and truth to be told, Zero MQ < 3.x also would
            do client-side PUB/SUB filtering and it did scale nicely.
+
+           Alternatively, with async_delivery set to BROKER.ASYNC_DELIVERY.QUEUE, the message
+           is pushed onto a queue in a single Lua call and each client pops messages off it,
+           so no message is ever sent to more than one client. Messages published
+           the former way are still accepted so servers of both kinds can share a cluster.
         """
-        def __init__(self, kvdb, client_type, topic_callbacks, initial_lua_programs):
+        def __init__(self, kvdb, client_type, topic_callbacks, initial_lua_programs,
+                async_delivery=BROKER.ASYNC_DELIVERY.PUB_SUB):
             self.kvdb = kvdb
             self.decrypt_func = kvdb.decrypt_func
             self.name = '{}-{}'.format(client_type, new_cid())
             self.topic_callbacks = topic_callbacks
             self.lua_container = LuaContainer(self.kvdb.conn, initial_lua_programs)
+            self.lua_container.add_lua_program('zato.broker.enqueue', LUA_ENQUEUE)
+            self.async_delivery = async_delivery
+            self.queue_client = None
             self.ready = False
 
         def run(self):
@@ -132,10 +187,22 @@ def BrokerClient(kvdb, client_type, topic_callbacks, _initial_lua_programs):
             self.pub_client = _ClientThread(self.kvdb.copy(), 'pub', self.name)
             self.sub_client = _ClientThread(self.kvdb.copy(), 'sub', self.name, self.topic_callbacks, self.on_message)
 
-            start_new_thread(self.pub_client.run, ())
-            start_new_thread(self.sub_client.run, ())
+            clients = [self.pub_client, self.sub_client]
+
+            if self.async_delivery == BROKER.ASYNC_DELIVERY.QUEUE:
+
+                # Only queues of messages that we have callbacks for are popped off
+                queue_keys = [get_queue_key(msg_type) for msg_type in QUEUE_MSG_TYPES if TOPICS[msg_type] in self.topic_callbacks]
+
+                if queue_keys:
+                    self.queue_client = _ClientThread(
+                        self.kvdb.copy(), 'queue', self.name, on_message=self.on_queue_message, queue_keys=queue_keys)
+                    clients.append(self.queue_client)
+
+            for client in clients:
+                start_new_thread(client.run, ())
 
-            for client in(self.pub_client, self.sub_client):
+            for client in clients:
                 while client.keep_running == ZATO_NONE:
                     time.sleep(0.01)
                 self.ready = True
@@ -155,6 +222,14 @@ def BrokerClient(kvdb, client_type, topic_callbacks, _initial_lua_programs):
                 logger.error(error_msg, msg, format_exc(e))
                 raise
             else:
+
+                # A single call to KVDB, the message will be delivered to exactly one client
+                if self.async_delivery == BROKER.ASYNC_DELIVERY.QUEUE and msg_type in QUEUE_MSG_TYPES:
+                    expires_at = b'{:.3f}'.format(time.time() + expiration)
+                    self.lua_container.run_lua('zato.broker.enqueue',
+                        [get_queue_key(msg_type)], [QUEUE_MSG_SEPARATOR.join((expires_at, str(msg))), expiration])
+                    return
+
                 topic = TOPICS[msg_type]
                 key = broker_msg = b'zato:broker{}:{}'.format(KEYS[msg_type], new_cid())
 
@@ -197,12 +272,29 @@ def BrokerClient(kvdb, client_type, topic_callbacks, _initial_lua_programs):
                     if logger.isEnabledFor(logging.DEBUG):
                         logger.debug('No payload in msg:[{}]'.format(msg))
 
+        def on_queue_message(self, queue_key, msg):
+            """ Invoked for each message popped off a queue, unless it has already expired.
+            """
+            expires_at, msg = msg.split(QUEUE_MSG_SEPARATOR, 1)
+
+            if time.time() > float(expires_at):
+                logger.warning('Ignoring expired broker message from queue [{}]'.format(queue_key))
+                return
+
+            payload = Bunch(loads(msg))
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug('Got broker message payload [{}]'.format(payload))
+
+            callback = self.topic_callbacks[TOPICS[payload.msg_type]]
+            spawn(callback, payload)
+
         def close(self):
-            for client in(self.pub_client, self.sub_client):
-                client.keep_running = False
-                client.kvdb.close()
+            for client in(self.pub_client, self.sub_client, self.queue_client):
+                if client:
+                    client.keep_running = False
+                    client.kvdb.close()
 
-    client = _BrokerClient(kvdb, client_type, topic_callbacks, _initial_lua_programs)
+    client = _BrokerClient(kvdb, client_type, topic_callbacks, _initial_lua_programs, async_delivery)
     start_new_thread(client.run, ())
 
     return client
@@ -93,6 +93,9 @@ zato_services = {
     'zato.email.smtp.get-list': 'zato.server.service.internal.email.smtp.GetList',
     'zato.email.smtp.ping': 'zato.server.service.internal.email.smtp.Ping',
 
+    # Enmasse
+    'zato.enmasse.import': 'zato.server.service.internal.enmasse.Import',
+
     # Helpers
     'zato.helpers.echo': 'zato.server.service.internal.helpers.Echo',
     'zato.helpers.input-logger': 'zato.server.service.internal.helpers.InputLogger',
@@ -105,7 +108,9 @@ zato_services = {
     'zato.http-soap.create':'zato.server.service.internal.http_soap.Create',
     'zato.http-soap.delete':'zato.server.service.internal.http_soap.Delete',
     'zato.http-soap.edit':'zato.server.service.internal.http_soap.Edit',
+    'zato.http-soap.get-audit-queue-stats':'zato.server.service.internal.http_soap.GetAuditQueueStats',
     'zato.http-soap.get-list':'zato.server.service.internal.http_soap.GetList',
+    'zato.http-soap.get-url-path-cache-stats':'zato.server.service.internal.http_soap.GetURLPathCacheStats',
     'zato.http-soap.ping':'zato.server.service.internal.http_soap.Ping',
 
     # Clusters - Connections map
@@ -239,6 +244,7 @@ zato_services = {
     'zato.pubsub.topics.get-info':'zato.server.service.internal.pubsub.topics.GetInfo',
     'zato.pubsub.topics.get-list':'zato.server.service.internal.pubsub.topics.GetList',
     'zato.pubsub.topics.publish':'zato.server.service.internal.pubsub.topics.Publish',
+    'zato.pubsub.topics.publish-many':'zato.server.service.internal.pubsub.topics.PublishMany',
 
     # Search - ElasticSearch
     'zato.search.es.create':'zato.server.service.internal.search.es.Create',
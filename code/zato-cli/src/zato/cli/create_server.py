@@ -111,9 +111,45 @@ http_server_header=Zato
 zeromq_connect_sleep=0.1
 aws_host=
 use_soap_envelope=True
+http_url_path_cache_size=10000 # How many URL paths each worker keeps in its HTTP channel lookup cache
+broker_async_delivery=pubsub # Use "queue" so that each async invocation is delivered to one server only, without a race between them
 
 [stats]
 expire_after=168 # In hours, 168 = 7 days = 1 week
+flush_interval=5 # In seconds, how often each worker writes its in-memory statistics to KVDB
+
+[http_audit]
+queue_size=10000 # How many audit records of HTTP channels each worker may keep in memory before they are written to ODB
+batch_size=500 # How many records at most are written to ODB in a single INSERT
+flush_interval=200 # In milliseconds, how long to wait for a batch to fill up before it is written anyway
+overflow=block # What to do if the queue is full - block, drop-oldest or spill-to-file
+spill_path=../../logs/http-audit-spill.log # Used by spill-to-file, either absolute or relative to the directory server.conf is in
+
+[http_streaming]
+chunk_size=65536 # In bytes, how much of a request or response of a streaming channel is read or sent at a time
+spool=False # Whether request bodies of streaming channels are copied to temporary files first so they can be read more than once
+spool_threshold=1048576 # In bytes, spooled request bodies bigger than that are kept on disk rather than in RAM
+spool_dir= # Where spooled request bodies are kept, the system's default temporary directory if empty
+
+[config_snapshot]
+enabled=True # Whether workers other than the first one load configuration from a snapshot the first one saved
+path=../../work/config-snapshot.json # Either absolute or relative to the directory server.conf is in
+wait_timeout=120 # In seconds, how long other workers wait for the first one to save the snapshot
+
+[email_smtp]
+pool_size=5 # How many authenticated sessions to each SMTP server a worker may keep open
+idle_timeout=60 # In seconds, sessions idle for longer than that are closed rather than reused
+ping_after=10 # In seconds, sessions idle for longer than that are checked with NOOP before they are reused
+
+[channel_amqp]
+ack_after_processing=False # If True, messages are acknowledged only after services they are dispatched to finish
+prefetch_count=20 # How many unacknowledged messages each channel may be sent at a time, 0 = no limit
+ack_timeout=300 # In seconds, how long to wait for a service to finish before its message is given back to the broker
+requeue_on_error=False # Whether messages services could not process are given back to the broker or rejected
+
+[out_amqp]
+confirm_publish=False # Whether to wait for the broker to confirm each message published through outgoing AMQP connections
+heartbeat_check_rate=2 # How many times within each heartbeat interval outgoing AMQP connections check heartbeats
 
 [kvdb]
 host={{kvdb_host}}
@@ -142,9 +178,11 @@ zato.kvdb.log-connection-info=
 zato.helpers.input-logger=Sample payload for a startup service (any worker)
 
 [pubsub]
-move_to_target_queues_interval=3 # In seconds
+move_to_target_queues_interval=3 # In seconds, messages are moved as soon as they are published and at least this often
 delete_expired_interval=180 # In seconds
 invoke_callbacks_interval=2 # In seconds
+get_max_waiters=100 # How many consumers may wait for messages in each worker at a time
+get_max_wait=60 # In seconds, longer waits consumers ask for are capped to that
 
 [profiler]
 enabled=False
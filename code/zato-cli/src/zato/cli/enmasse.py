@@ -80,6 +80,26 @@ from zato.server.service.internal.security.tls import key_cert as sec_tls_key_ce
 DEFAULT_COLS_WIDTH = '15,100'
 NO_SEC_DEF_NEEDED = 'zato-no-security'
 
+# How many objects of the same type at most to import with a single request to zato.enmasse.import
+IMPORT_BATCH_SIZE = 1000
+
+# Object types that other ones depend on and that are not definitions, in the order they are to be imported in,
+# either before or after any other objects.
+IMPORT_ORDER_FIRST = ('rbac_permission', 'rbac_role')
+IMPORT_ORDER_LAST = ('rbac_client_role', 'rbac_role_permission')
+
+def get_import_order(item_type):
+    """ Returns a sort key of a given object type such that definitions are imported before anything else.
+    """
+    if 'def' in item_type:
+        return 0
+    elif item_type in IMPORT_ORDER_FIRST:
+        return 1 + IMPORT_ORDER_FIRST.index(item_type)
+    elif item_type in IMPORT_ORDER_LAST:
+        return 10 + IMPORT_ORDER_LAST.index(item_type)
+    else:
+        return 5
+
 class Code(object):
     def __init__(self, symbol, desc):
         self.symbol = symbol
@@ -487,17 +507,22 @@ class EnMasse(ManageCommand):
 
     def get_odb_objects(self):
 
+        # Names of services and security definitions by their IDs, each read in one query rather than once per object
+        service_names = dict(self.client.odb_session.query(Service.id, Service.name).\
+            filter(Service.cluster_id == self.client.cluster_id).all())
+
+        sec_def_names = dict(self.client.odb_session.query(SecurityBase.id, SecurityBase.name).\
+            filter(SecurityBase.cluster_id == self.client.cluster_id).all())
+
         def _update_service_name(item):
-            item.service = self.client.odb_session.query(Service.name).\
-                filter(Service.id == item.service_id).one()[0]
+            item.service = service_names[item.service_id]
 
         def fix_up_odb_object(key, item):
             if key == 'http_soap':
                 if item.connection == 'channel':
                     _update_service_name(item)
                 if item.security_id:
-                    item.sec_def = self.client.odb_session.query(SecurityBase.name).\
-                        filter(SecurityBase.id == item.security_id).one()[0]
+                    item.sec_def = sec_def_names[item.security_id]
                 else:
                     item.sec_def = NO_SEC_DEF_NEEDED
             elif key == 'scheduler':
@@ -1030,12 +1055,6 @@ class EnMasse(ManageCommand):
         warnings = []
         errors = []
 
-        existing_defs = []
-        existing_other = []
-
-        new_defs = []
-        new_other = []
-
         # FTP definition may use a password but are not required to.
         MAYBE_NEEDS_PASSWORD = 'MAYBE_NEEDS_PASSWORD'
 
@@ -1101,18 +1120,16 @@ class EnMasse(ManageCommand):
                 if item.name == name:
                     return item
 
-        def get_security_by_name(name):
-            for item in self.odb_objects.def_sec:
-                if item.name == name:
-                    return item.id
-
         def _swap_service_name(service_class, attrs, first, second):
             if first in getattr(service_class.SimpleIO, 'input_required', []) and second in attrs:
                 attrs[first] = attrs[second]
 
-        def import_object(def_type, attrs, is_edit):
+        def get_import_item(item_type, attrs, is_edit):
+            """ Returns an item for zato.enmasse.import to create or edit an object with, or an error message.
+            References to connection and security definitions are resolved by the server.
+            """
             attrs_dict = attrs.toDict()
-            info_dict, info_key = (def_sec_info, attrs.type) if 'sec' in def_type else (service_info, def_type)
+            info_dict, info_key = (def_sec_info, attrs.type) if 'sec' in item_type else (service_info, item_type)
             import_info = info_dict[info_key]
             service_class = getattr(import_info.mod, 'Edit' if is_edit else 'Create')
             service_name = service_class.get_name()
@@ -1124,49 +1141,27 @@ class EnMasse(ManageCommand):
             # Fetch an item from a cache of ODB object and assign its ID
             # to attrs so that the Edit service knows what to update.
             if is_edit:
-                odb_item = get_odb_item(def_type, attrs.name)
+                odb_item = get_odb_item(item_type, attrs.name)
                 attrs.id = odb_item.id
 
-            if def_type == 'http_soap':
-                if attrs.sec_def == NO_SEC_DEF_NEEDED:
-                    attrs.security_id = None
-                else:
-                    attrs.security_id = get_security_by_name(attrs.sec_def)
+            if item_type == 'http_soap' and attrs.sec_def == NO_SEC_DEF_NEEDED:
+                attrs.security_id = None
+                del attrs.sec_def
 
-            if def_type in('channel_amqp', 'channel_jms_wmq', 'outconn_amqp', 'outconn_jms_wmq'):
-                def_type_name = def_type.replace('channel', 'def').replace('outconn', 'def')
-                odb_item = get_odb_item(def_type_name, attrs.get('def_name'))
-                attrs.def_id = odb_item.id
+            item = {'item_type':item_type, 'service_name':service_name, 'request':attrs.toDict()}
 
-            response = self.client.invoke(service_name, attrs)
-            if not response.ok:
-                return service_name, response.details
-            else:
-                verb = 'Updated' if is_edit else 'Created'
-                self.logger.info("{} object '{}' ({} {})".format(verb, attrs.name, item_type, service_name))
-                if import_info.needs_password:
-
-                    password = attrs.get('password')
-                    if not password:
-                        if import_info.needs_password == MAYBE_NEEDS_PASSWORD:
-                            self.logger.info("Password missing but not required '{}' ({} {})".format(
-                                attrs.name, item_type, service_name))
-                        else:
-                            return service_name, "Password missing but is required '{}' ({} {}) attrs '{}'".format(
-                                attrs.name, item_type, service_name, attrs_dict)
-                    else:
-                        if not is_edit:
-                            attrs.id = response.data['id']
-
-                        service_class = getattr(import_info.mod, 'ChangePassword')
-                        request = {'id':attrs.id, 'password1':attrs.password, 'password2':attrs.password}
-                        response = self.client.invoke(service_class.get_name(), request)
-                        if not response.ok:
-                            return service_name, response.details
-                        else:
-                            self.logger.info("Updated password '{}' ({} {})".format(attrs.name, item_type, service_name))
+            if import_info.needs_password:
+                if attrs.get('password'):
+                    item['password_service_name'] = getattr(import_info.mod, 'ChangePassword').get_name()
+
+                elif import_info.needs_password == MAYBE_NEEDS_PASSWORD:
+                    self.logger.info("Password missing but not required '{}' ({} {})".format(
+                        attrs.name, item_type, service_name))
+                else:
+                    return service_name, None, "Password missing but is required '{}' ({} {}) attrs '{}'".format(
+                        attrs.name, item_type, service_name, attrs_dict)
 
-            return None, None
+            return service_name, item, None
 
         def remove_from_import_list(item_type, name):
             for json_item_type, items in self.json_to_import.items():
@@ -1184,70 +1179,87 @@ class EnMasse(ManageCommand):
             if item_type == 'rbac_role' and attrs.name == 'Root':
                 return True
 
-        def _import(item_type, attrs, is_edit):
-            attrs_dict = attrs.toDict()
-            attrs.cluster_id = self.client.cluster_id
-            service_name, error_response = import_object(item_type, attrs, is_edit)
-
-            # We quit on first error encountered
-            if error_response:
-                raw = (item_type, attrs_dict, error_response)
-                value = "Could not import (is_edit {}) '{}' with '{}', response from '{}' was '{}'".format(
-                    is_edit, attrs.name, attrs_dict, service_name, error_response)
-                errors.append(Error(raw, value, ERROR_COULD_NOT_IMPORT_OBJECT))
-                return Results(warnings, errors)
-
-            # It's been just imported so we don't want to create in next steps
-            # (this in fact would result in an error as the object already exists).
-            if is_edit:
-                remove_from_import_list(item_type, attrs.name)
-
-            # We'll see how expensive this call is. Seems to be but
-            # let's see in practice if it's a burden.
-            self.get_odb_objects()
+        def get_error(item_type, attrs_dict, is_edit, service_name, error_response):
+            raw = (item_type, attrs_dict, error_response)
+            value = "Could not import (is_edit {}) '{}' with '{}', response from '{}' was '{}'".format(
+                is_edit, attrs_dict.get('name'), attrs_dict, service_name, error_response)
+            return Error(raw, value, ERROR_COULD_NOT_IMPORT_OBJECT)
 
         #
-        # Update already existing objects first, definitions before any object
-        # that may depend on them ..
+        # Objects to update are the ones already existing ..
         #
-        for w in already_existing.warnings:
-            item_type, _ = w.value_raw
-            existing = existing_defs if 'def' in item_type else existing_other
-            existing.append(w)
+        to_import = []
 
-        #
-        # .. actually invoke the updates now ..
-        #
-        for w in chain(existing_defs, existing_other):
+        for w in already_existing.warnings:
             item_type, attrs = w.value_raw
 
             if should_skip_item(item_type, attrs, True):
                 continue
 
-            results = _import(item_type, attrs, True)
-            if results:
-                return results
+            to_import.append((item_type, attrs, True))
+
+            # It will be updated so we don't want to create it in next steps
+            # (this in fact would result in an error as the object already exists).
+            remove_from_import_list(item_type, attrs.name)
 
         #
-        # Create new objects, again, definitions come first ..
+        # .. and everything else is to be created ..
         #
         for item_type, items in self.json_to_import.items():
-            new = new_defs if 'def' in item_type else new_other
-            new.append({item_type:items})
+            for attrs in items:
+                if not should_skip_item(item_type, attrs, False):
+                    to_import.append((item_type, attrs, False))
 
         #
-        # .. actually create the objects now.
+        # .. in an order such that objects that others depend on come first, e.g. definitions before any object
+        # that may use them, and, for each type, updates before creates.
         #
-        for elem in chain(new_defs, new_other):
-            for item_type, attr_list in elem.items():
-                for attrs in attr_list:
+        to_import.sort(key=lambda elem: (get_import_order(elem[0]), elem[0], not elem[2]))
 
-                    if should_skip_item(item_type, attrs, False):
-                        continue
+        #
+        # Prepare requests to zato.enmasse.import ..
+        #
+        batches = []
 
-                    results = _import(item_type, attrs, False)
-                    if results:
-                        return results
+        for item_type, attrs, is_edit in to_import:
+            attrs_dict = attrs.toDict()
+            attrs.cluster_id = self.client.cluster_id
+            service_name, item, error_response = get_import_item(item_type, attrs, is_edit)
+
+            # We quit on first error encountered
+            if error_response:
+                errors.append(get_error(item_type, attrs_dict, is_edit, service_name, error_response))
+                return Results(warnings, errors)
+
+            # Each request holds objects of one type only
+            if not batches or batches[-1][0] != item_type or len(batches[-1][1]) == IMPORT_BATCH_SIZE:
+                batches.append((item_type, []))
+
+            batches[-1][1].append((item, attrs_dict, is_edit))
+
+        #
+        # .. and invoke it, one batch at a time.
+        #
+        total = len(to_import)
+        imported = 0
+
+        for item_type, batch in batches:
+            data = dumps([item for item, _, _ in batch]).encode('bz2').encode('base64')
+            response = self.client.invoke('zato.enmasse.import', {'cluster_id':self.client.cluster_id, 'data':data})
+
+            if not response.ok:
+                item, attrs_dict, is_edit = batch[0]
+                errors.append(get_error(item_type, attrs_dict, is_edit, 'zato.enmasse.import', response.details))
+                return Results(warnings, errors)
+
+            imported += response.data['imported']
+            self.logger.info('Imported {}/{} objects ({})'.format(imported, total, item_type))
+
+            if response.data.get('error_name'):
+                item, attrs_dict, is_edit = batch[response.data['imported']]
+                errors.append(get_error(
+                    item_type, attrs_dict, is_edit, response.data['error_service_name'], response.data['error_details']))
+                return Results(warnings, errors)
 
         return Results(warnings, errors)
 
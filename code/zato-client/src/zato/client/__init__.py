@@ -78,6 +78,7 @@ class _Response(object):
         self.has_data = False
         self.output_repeated = output_repeated
         self.data = [] if self.output_repeated else None
+        self.meta = None # Information about other pages of results if a list service returned only a single one
         self.cid = self.inner.headers.get('x-zato-cid', '(None)')
         self.details = None
         self.init()
@@ -193,11 +194,13 @@ class JSONSIOResponse(_Response):
 
         if self.ok:
             if has_zato_env:
-                # There will be two keys, zato_env and the actual payload
+                # There will be two keys, zato_env and the actual payload, and possibly _meta too
                 for key, _value in json.items():
-                    if key != 'zato_env':
+                    if key not in ('zato_env', '_meta'):
                         value = _value
                         break
+
+                self.meta = json.get('_meta')
             else:
                 value = json
 
@@ -255,6 +258,7 @@ class ServiceInvokeResponse(JSONSIOResponse):
                     self.data = self.inner_service_response
                 else:
                     if isinstance(data, dict):
+                        self.meta = data.pop('_meta', None)
                         data_keys = data.keys()
                         if len(data_keys) == 1:
                             data_key = data_keys[0]
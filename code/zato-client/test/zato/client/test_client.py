@@ -202,6 +202,29 @@ class JSONSIOClientTestCase(_Base):
         eq_(response.cid, cid)
         eq_(response.cid, sio_response['zato_env']['cid'])
         eq_(response.details, sio_response['zato_env']['details'])
+        eq_(response.meta, None)
+
+    def test_client_meta(self):
+
+        cid = new_cid()
+        headers = {'x-zato-cid':cid}
+
+        sio_payload = [{'name': rand_string()}]
+        meta = {'total_results': 31, 'num_batches': 2, 'current_batch': 1, 'batch_size': 25, 'has_previous': False,
+            'has_next': True, 'previous_batch_number': None, 'next_batch_number': 2}
+
+        text = dumps({
+            'zato_env': {'details': '', 'result': ZATO_OK, 'cid': cid},
+            '_meta': meta,
+            'zato_http_soap_get_list_response': sio_payload,
+        })
+
+        client = self.get_client(FakeInnerResponse(headers, True, text, rand_int()))
+        response = client.invoke()
+
+        eq_(response.ok, True)
+        eq_(response.data, sio_payload)
+        eq_(response.meta, meta)
 
 class SOAPSIOClientTestCase(_Base):
     client_class = SOAPSIOClient
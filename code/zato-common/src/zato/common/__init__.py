@@ -261,6 +261,10 @@ class BATCH_DEFAULTS:
     SIZE = 25
     MAX_SIZE = 1000
 
+class SORT_ORDER:
+    ASC = 'asc'
+    DESC = 'desc'
+
 class NameId(object):
     """ Wraps both an attribute's name and its ID.
     """
@@ -364,6 +368,20 @@ class KVDB(Attrs):
     SERVICE_TIME_AGGREGATED_BY_MONTH = 'zato:stats:service:time:aggr-by-month:'
     SERVICE_TIME_SLOW = 'zato:stats:service:time:slow:'
 
+    SERVICE_TIME_HISTOGRAM_RAW = 'zato:stats:service:time:histogram:raw:'
+    SERVICE_TIME_HISTOGRAM_RAW_BY_MINUTE = 'zato:stats:service:time:histogram:raw-by-minute:'
+    SERVICE_TIME_HISTOGRAM_AGGREGATED_BY_MINUTE = 'zato:stats:service:time:histogram:aggr-by-minute:'
+    SERVICE_TIME_HISTOGRAM_AGGREGATED_BY_HOUR = 'zato:stats:service:time:histogram:aggr-by-hour:'
+    SERVICE_TIME_HISTOGRAM_AGGREGATED_BY_DAY = 'zato:stats:service:time:histogram:aggr-by-day:'
+    SERVICE_TIME_HISTOGRAM_AGGREGATED_BY_MONTH = 'zato:stats:service:time:histogram:aggr-by-month:'
+
+    # Sets of names of services that have statistics under a given prefix for a given time suffix
+    SERVICE_TIME_INDEX = 'zato:stats:service:time:index:'
+    SERVICE_TIME_INDEX_RAW = 'zato:stats:service:time:index:raw'
+
+    # Set once statistics written before indexes were introduced have been indexed
+    SERVICE_TIME_INDEX_BACKFILLED = 'zato:stats:service:time:index-backfilled'
+
     SERVICE_SUMMARY_PREFIX_PATTERN = 'zato:stats:service:summary:{}:'
     SERVICE_SUMMARY_BY_DAY = 'zato:stats:service:summary:by-day:'
     SERVICE_SUMMARY_BY_WEEK = 'zato:stats:service:summary:by-week:'
@@ -385,6 +403,9 @@ class KVDB(Attrs):
     ASYNC_INVOKE_PROCESSED_FLAG_PATTERN = 'zato:async-invoke-with-pattern:processed:{}:{}'
     ASYNC_INVOKE_PROCESSED_FLAG = '1'
 
+    # Incremented each time a message is published to all servers, e.g. because configuration changed
+    CONFIG_VERSION = 'zato:config:version'
+
 class SCHEDULER:
 
     class JOB_TYPE(Attrs):
@@ -470,10 +491,21 @@ class DELIVERY_CALLBACK_INVOKER(Attrs):
 class BROKER:
     DEFAULT_EXPIRATION = 15 # In seconds
 
+    # How async invocations reach the servers - either published to everyone, with the first one to rename
+    # the message's key winning the race, or pushed onto a queue that each of the servers pops messages off.
+    class ASYNC_DELIVERY:
+        PUB_SUB = 'pubsub'
+        QUEUE = 'queue'
+
+    # How long to block on the queue of async invocations before checking whether the client should stop
+    QUEUE_POP_TIMEOUT = 1 # In seconds
+
 class MISC:
     DEFAULT_HTTP_TIMEOUT=10
     DEFAULT_AUDIT_BACK_LOG = 24 * 60 # 24 hours * 60 days ≅ 2 months
     DEFAULT_AUDIT_MAX_PAYLOAD = 0 # Using 0 means there's no limit
+    DEFAULT_HTTP_URL_PATH_CACHE_SIZE = 10000 # Per worker, in its HTTP channel lookup cache
+    DEFAULT_STATS_FLUSH_INTERVAL = 5 # In seconds, well below 60 so per-minute data is complete before it is aggregated
     OAUTH_SIG_METHODS = ['HMAC-SHA1', 'PLAINTEXT']
     PIDFILE = 'pidfile'
     SEPARATOR = ':::'
@@ -485,6 +517,28 @@ class ADAPTER_PARAMS:
 class AUDIT_LOG:
     REPLACE_WITH = SECRET_SHADOW
 
+    DEFAULT_QUEUE_SIZE = 10000 # Per worker
+    DEFAULT_BATCH_SIZE = 500
+    DEFAULT_FLUSH_INTERVAL = 200 # In milliseconds
+    DEFAULT_SPILL_PATH = '../../logs/http-audit-spill.log' # Relative to the directory server.conf is in
+
+    class OVERFLOW:
+        BLOCK = 'block'
+        DROP_OLDEST = 'drop-oldest'
+        SPILL_TO_FILE = 'spill-to-file'
+
+        class __metaclass__(type):
+            def __iter__(self):
+                return iter((self.BLOCK, self.DROP_OLDEST, self.SPILL_TO_FILE))
+
+class CONFIG_SNAPSHOT:
+    DEFAULT_PATH = '../../work/config-snapshot.json' # Relative to the directory server.conf is in
+    DEFAULT_WAIT_TIMEOUT = 120 # In seconds
+
+class HTTP_STREAMING:
+    DEFAULT_CHUNK_SIZE = 65536 # In bytes
+    DEFAULT_SPOOL_THRESHOLD = 1048576 # In bytes, spooled request bodies bigger than that are kept on disk
+
 class INFO_FORMAT:
     DICT = 'dict'
     TEXT = 'text'
@@ -573,9 +627,12 @@ class PUB_SUB:
     DEFAULT_MIME_TYPE = 'text/plain'
     DEFAULT_EXPIRATION = 60.0 # In seconds
     DEFAULT_GET_MAX_BATCH_SIZE = 100
+    DEFAULT_GET_MAX_WAITERS = 100 # Per process
+    DEFAULT_GET_MAX_WAIT = 60 # In seconds
     DEFAULT_IS_FIFO = True
     DEFAULT_MAX_DEPTH = 500
     DEFAULT_MAX_BACKLOG = 1000
+    PENDING_LISTENER_RETRY = 1 # In seconds
 
     class QUEUE_TYPE:
         MESSAGE = 'message'
@@ -633,6 +690,9 @@ class EMAIL:
         PING_ADDRESS = 'invalid@invalid'
         GET_CRITERIA = 'UNSEEN'
         IMAP_DEBUG_LEVEL = 0
+        SMTP_POOL_SIZE = 5 # How many sessions to each SMTP server a worker may keep open
+        SMTP_IDLE_TIMEOUT = 60 # In seconds, sessions idle for longer than that are closed
+        SMTP_PING_AFTER = 10 # In seconds, sessions idle for longer than that are checked with NOOP before they are reused
 
     class IMAP:
         class MODE(Constants):
@@ -730,6 +790,18 @@ NO_DEFAULT_VALUE = 'NO_DEFAULT_VALUE'
 
 ZATO_INFO_FILE = b'.zato-info'
 
+# Compiled ObjectPath expressions keyed by their source, e.g. {namespace}request_elem.param
+_object_path_cache = {}
+
+def get_object_path(path):
+    """ Returns a compiled lxml.objectify.ObjectPath for the given expression, compiling it only the first time
+    a given expression is needed.
+    """
+    object_path = _object_path_cache.get(path)
+    if object_path is None:
+        object_path = _object_path_cache[path] = _ObjectPath(path)
+    return object_path
+
 class path(object):
     def __init__(self, path, raise_on_not_found=False, ns='', text_only=False):
         self.path = path
@@ -747,7 +819,7 @@ class path(object):
         try:
             if self.children_only:
                 elem = elem.getchildren()[self.children_only_idx]
-            value = _ObjectPath(_path)(elem)
+            value = get_object_path(_path)(elem)
             if self.text_only:
                 return value.text
             return value
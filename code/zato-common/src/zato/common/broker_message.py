@@ -78,6 +78,7 @@ class SCHEDULER(Constants):
     DELETE = ValueConstant('')
     EXECUTE = ValueConstant('')
     JOB_EXECUTED = ValueConstant('')
+    JOB_EXECUTED_BATCH = ValueConstant('')
 
 class ZMQ_SOCKET(Constants):
     code_start = 100200
@@ -171,6 +172,7 @@ class OUTGOING(Constants):
     AMQP_EDIT = ValueConstant('')
     AMQP_DELETE = ValueConstant('')
     AMQP_PUBLISH = ValueConstant('')
+    AMQP_PUBLISH_MANY = ValueConstant('')
 
     JMS_WMQ_CREATE = ValueConstant('')
     JMS_WMQ_EDIT = ValueConstant('')
@@ -210,6 +212,7 @@ class CHANNEL(Constants):
     AMQP_EDIT = ValueConstant('')
     AMQP_DELETE = ValueConstant('')
     AMQP_MESSAGE_RECEIVED = ValueConstant('')
+    AMQP_MESSAGE_PROCESSED = ValueConstant('')
 
     JMS_WMQ_CREATE = ValueConstant('')
     JMS_WMQ_EDIT = ValueConstant('')
@@ -251,6 +254,7 @@ class SERVICE(Constants):
     EDIT = ValueConstant('')
     DELETE = ValueConstant('')
     PUBLISH = ValueConstant('')
+    CONFIGURE_REQUEST_RESPONSE = ValueConstant('')
 
 class STATS(Constants):
     code_start = 102000
@@ -387,6 +391,11 @@ class RBAC(Constants):
     ROLE_PERMISSION_EDIT = ValueConstant('')
     ROLE_PERMISSION_DELETE = ValueConstant('')
 
+class BATCH(Constants):
+    code_start = 105400
+
+    MESSAGES = ValueConstant('')
+
 code_to_name = {}
 
 # To prevent 'RuntimeError: dictionary changed size during iteration'
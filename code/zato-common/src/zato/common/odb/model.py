@@ -474,6 +474,9 @@ class HTTPSOAP(Base):
     sec_tls_ca_cert = relationship('TLSCACert', backref=backref('http_soap', order_by=name, cascade='all, delete, delete-orphan'))
     has_rbac = Column(Boolean, nullable=False, default=False)
 
+    # Whether requests and responses are streamed rather than read into RAM in full
+    is_streaming = Column(Boolean, nullable=True, default=False)
+
     service_id = Column(Integer, ForeignKey('service.id', ondelete='CASCADE'), nullable=True)
     service = relationship('Service', backref=backref('http_soap', order_by=name, cascade='all, delete, delete-orphan'))
 
@@ -487,7 +490,8 @@ class HTTPSOAP(Base):
                  url_path=None, method=None, soap_action=None, soap_version=None, data_format=None, ping_method=None,
                  pool_size=None, merge_url_params_req=None, url_params_pri=None, params_pri=None, serialization_type=None,
                  timeout=None, sec_tls_ca_cert_id=None, service_id=None, service=None, security=None, cluster_id=None,
-                 cluster=None, service_name=None, security_id=None, has_rbac=None, security_name=None, content_type=None):
+                 cluster=None, service_name=None, security_id=None, has_rbac=None, security_name=None, content_type=None,
+                 is_streaming=None):
         self.id = id
         self.name = name
         self.is_active = is_active
@@ -518,6 +522,7 @@ class HTTPSOAP(Base):
         self.has_rbac = has_rbac
         self.security_name = security_name
         self.content_type = content_type
+        self.is_streaming = is_streaming
 
 # ################################################################################################################################
 
@@ -18,8 +18,8 @@ from sqlalchemy.orm import aliased
 from sqlalchemy.sql.expression import case
 
 # Zato
-from zato.common import DEFAULT_HTTP_PING_METHOD, DEFAULT_HTTP_POOL_SIZE, HTTP_SOAP_SERIALIZATION_TYPE, PARAMS_PRIORITY, \
-     URL_PARAMS_PRIORITY
+from zato.common import BATCH_DEFAULTS, DEFAULT_HTTP_PING_METHOD, DEFAULT_HTTP_POOL_SIZE, HTTP_SOAP_SERIALIZATION_TYPE, \
+     PARAMS_PRIORITY, SORT_ORDER, URL_PARAMS_PRIORITY
 from zato.common.odb.model import AWSS3, APIKeySecurity, AWSSecurity, CassandraConn, CassandraQuery, ChannelAMQP, ChannelSTOMP, \
      ChannelWMQ, ChannelZMQ, Cluster, ConnDefAMQP, ConnDefWMQ, CronStyleJob, DeliveryDefinitionBase, Delivery, DeliveryHistory, \
      DeliveryPayload, ElasticSearch, JSONPointer, HTTPBasicAuth, HTTPSOAP, HTTSOAPAudit, IMAP, IntervalBasedJob, Job, \
@@ -31,23 +31,107 @@ from zato.common.odb.model import AWSS3, APIKeySecurity, AWSSecurity, CassandraC
 
 logger = logging.getLogger(__name__)
 
+class SearchResults(object):
+    """ A single page of results of a list query along with information about all of the other pages.
+    """
+    def __init__(self, result, total, current_batch, batch_size):
+        self.result = result
+        self.total = total
+        self.current_batch = current_batch
+        self.batch_size = batch_size
+        self.num_batches = max(1, (total + batch_size - 1) // batch_size)
+        self.has_previous = current_batch > 1
+        self.has_next = current_batch < self.num_batches
+        self.previous_batch_number = current_batch - 1 if self.has_previous else None
+        self.next_batch_number = current_batch + 1 if self.has_next else None
+
+    def __iter__(self):
+        return iter(self.result)
+
+    def __len__(self):
+        return len(self.result)
+
+    def to_dict(self):
+        return {
+            'total_results': self.total,
+            'num_batches': self.num_batches,
+            'current_batch': self.current_batch,
+            'batch_size': self.batch_size,
+            'has_previous': self.has_previous,
+            'has_next': self.has_next,
+            'previous_batch_number': self.previous_batch_number,
+            'next_batch_number': self.next_batch_number,
+        }
+
+def _get_column(q, name):
+    """ Returns a column, or a labeled expression, of a given name that a query selects.
+    """
+    for desc in q.column_descriptions:
+
+        # A whole entity is selected, e.g. session.query(SQLConnectionPool)
+        if desc['expr'] is desc['entity']:
+            if name in desc['entity'].__mapper__.column_attrs.keys():
+                return getattr(desc['entity'], name)
+
+        elif desc['name'] == name:
+            return desc['expr']
+
+def _escape_like(value):
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+def search(q, current_batch=BATCH_DEFAULTS.PAGE_NO, batch_size=BATCH_DEFAULTS.SIZE, query=None, sort_by=None,
+        sort_order=SORT_ORDER.ASC, query_column='name'):
+    """ Returns a single page of results of a list query. If query is given, only rows whose query_column contains,
+    case-insensitively, each of the query's space-separated words are returned. Rows can be sorted by any of the columns
+    the query selects. The total number of results comes from a COUNT query over the same criteria.
+    """
+    current_batch = max(current_batch or BATCH_DEFAULTS.PAGE_NO, 1)
+    batch_size = min(batch_size or BATCH_DEFAULTS.SIZE, BATCH_DEFAULTS.MAX_SIZE)
+
+    if query:
+        column = _get_column(q, query_column)
+        if column is None:
+            raise ValueError('Query column `{}` not found among `{}`'.format(
+                query_column, [desc['name'] for desc in q.column_descriptions]))
+
+        for word in query.strip().split():
+            q = q.filter(column.ilike('%{}%'.format(_escape_like(word)), escape='\\'))
+
+    if sort_by:
+        column = _get_column(q, sort_by)
+        if column is None:
+            raise ValueError('Sort column `{}` not found among `{}`'.format(
+                sort_by, [desc['name'] for desc in q.column_descriptions]))
+
+        q = q.order_by(None).order_by(column.desc() if sort_order == SORT_ORDER.DESC else column.asc())
+
+    total = q.order_by(None).count()
+    result = q.limit(batch_size).offset((current_batch - 1) * batch_size).all()
+
+    return SearchResults(result, total, current_batch, batch_size)
+
 def needs_columns(func):
     """ A decorator for queries which works out whether a given query function
     should return the result only or a column list retrieved in addition
     to the result. This is useful because some callers prefer the former and
     some need the latter.
+
+    If a search keyword argument is given, it is a dictionary of parameters to the search function above
+    and only a single page of the result is returned.
     """
     @wraps(func)
-    def inner(*args):
+    def inner(*args, **kwargs):
         # needs_columns is always the last argument so we don't have to look
         # it up using the 'inspect' module or anything like that.
         needs_columns = args[-1]
+        search_info = kwargs.get('search')
 
         q = func(*args)
+        result = search(q, **search_info) if search_info else q.all()
 
         if needs_columns:
-            return q.all(), q.statement.columns
-        return q.all()
+            return result, q.statement.columns
+        return result
 
     return inner
 
@@ -534,6 +618,7 @@ def _http_soap(session, cluster_id):
         case([(HTTPSOAP.merge_url_params_req != None, HTTPSOAP.merge_url_params_req)], else_=True).label('merge_url_params_req'),
         case([(HTTPSOAP.url_params_pri != None, HTTPSOAP.url_params_pri)], else_=URL_PARAMS_PRIORITY.DEFAULT).label('url_params_pri'),
         case([(HTTPSOAP.params_pri != None, HTTPSOAP.params_pri)], else_=PARAMS_PRIORITY.DEFAULT).label('params_pri'),
+        case([(HTTPSOAP.is_streaming != None, HTTPSOAP.is_streaming)], else_=False).label('is_streaming'),
         case([(
             HTTPSOAP.serialization_type != None, HTTPSOAP.serialization_type)],
              else_=HTTP_SOAP_SERIALIZATION_TYPE.DEFAULT.id).label('serialization_type'),
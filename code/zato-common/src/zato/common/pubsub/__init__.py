@@ -19,7 +19,9 @@ from traceback import format_exc
 import logging
 
 # gevent
-from gevent.lock import RLock
+from gevent import sleep, spawn
+from gevent.event import Event
+from gevent.lock import BoundedSemaphore, RLock
 
 # Zato
 from zato.common import PUB_SUB, ZATO_NONE, ZATO_NOT_GIVEN
@@ -47,6 +49,10 @@ class PermissionDenied(PubSubException):
     """ Raised when an attempt is made to make use of a topic a client is not allowed to access.
     """
 
+class TooManyWaiters(PubSubException):
+    """ Raised when a consumer wants to wait for messages but there are already too many consumers waiting in this process.
+    """
+
 class ItemFull(Exception):
     """ Raised when either a topic or a consumer's queue is full.
     """
@@ -129,6 +135,16 @@ class PubCtx(HasAutoRepr):
 
 # ################################################################################################################################
 
+class PubManyCtx(HasAutoRepr):
+    """ A set of data describing a batch of messages to publish to one topic.
+    """
+    def __init__(self, client_id=None, topic=None, msgs=None):
+        self.client_id = client_id
+        self.topic = topic
+        self.msgs = msgs or []
+
+# ################################################################################################################################
+
 class SubCtx(HasAutoRepr):
     """ Subscription context - what to subscribe to.
     """
@@ -142,11 +158,12 @@ class GetCtx(HasAutoRepr):
     """ A set of data describing where to fetch messages from.
     """
     def __init__(self, sub_key=None, max_batch_size=PUB_SUB.DEFAULT_GET_MAX_BATCH_SIZE, is_fifo=PUB_SUB.DEFAULT_IS_FIFO,
-                   get_format=PUB_SUB.GET_FORMAT.OBJECT.id):
+                   get_format=PUB_SUB.GET_FORMAT.OBJECT.id, wait_seconds=0):
         self.sub_key = sub_key
         self.max_batch_size = max_batch_size
         self.is_fifo = is_fifo # Fetch in FIFO or LIFO order
         self.get_format = get_format
+        self.wait_seconds = wait_seconds # How long to wait for messages if there are none yet
 
 # ################################################################################################################################
 
@@ -293,6 +310,9 @@ class PubSub(object):
         clients = self.topic_to_cons.setdefault(topic, set())
         clients.add(client_id)
 
+        # Implemented by subclasses
+        self.add_consumer_metadata(topic)
+
         self.logger.info('Added subscription: `%s`, `%s`, `%s`', sub_key, client_id, topic)
 
 # ################################################################################################################################
@@ -368,6 +388,8 @@ class PubSub(object):
             self.sub_to_cons[client.sub_key] = client.id
             self.cons_to_sub[client.id] = client.sub_key
 
+            self.add_consumer_metadata(topic.name)
+
             self.logger.info('Added consumer `%s` for topic:`%s`', client, topic)
 
     def update_consumer(self, client, topic):
@@ -405,6 +427,11 @@ class PubSub(object):
 
             self.logger.info('Deleted consumer `%s` for topic:`%s`', client, topic)
 
+    def add_consumer_metadata(self, topic_name):
+        """ Stores metadata needed once a topic has a new consumer. Needs to be subclasses by concrete implementations.
+        """
+        raise NotImplementedError('Must be implemented by subclasses')
+
     def delete_consumer_metadata(self, client):
         """ Deletes consumer's metadata. Needs to be subclasses by concrete implementations.
         """
@@ -424,6 +451,7 @@ class RedisPubSub(PubSub, LuaContainer):
     """
     # Main public API
     LUA_PUBLISH = 'lua-publish'
+    LUA_PUBLISH_MANY = 'lua-publish-many'
     LUA_GET_FROM_CONSUMER_QUEUE = 'lua-get-from-consumer-queue'
     LUA_REJECT = 'lua-reject'
     LUA_ACK_DELETE = 'lua-ack-delete'
@@ -441,7 +469,8 @@ class RedisPubSub(PubSub, LuaContainer):
 
 # ################################################################################################################################
 
-    def __init__(self, kvdb, key_prefix='zato:pubsub:'):
+    def __init__(self, kvdb, key_prefix='zato:pubsub:', max_waiters=PUB_SUB.DEFAULT_GET_MAX_WAITERS,
+            max_wait=PUB_SUB.DEFAULT_GET_MAX_WAIT):
         super(RedisPubSub, self).__init__()
         self.kvdb = kvdb
         self.lua_programs = {}
@@ -458,8 +487,30 @@ class RedisPubSub(PubSub, LuaContainer):
         self.LAST_PUB_TIME_KEY = '{}{}'.format(key_prefix, 'hash:last-pub-time') # In UTC
         self.LAST_SEEN_CONSUMER_KEY = '{}{}'.format(key_prefix, 'hash:last-seen-consumer') # In UTC
         self.LAST_SEEN_PRODUCER_KEY = '{}{}'.format(key_prefix, 'hash:last-seen-producer') # In UTC
+        self.PENDING_TOPICS_KEY = '{}{}'.format(key_prefix, 'set:pending-topics')
+        self.PENDING_CHANNEL = '{}{}'.format(key_prefix, 'channel:pending') # A Redis pub/sub channel, not a key
+        self.CONSUMER_CHANNEL = '{}{}'.format(key_prefix, 'channel:consumer') # Ditto
+
+        # Set each time a message is published to any topic, no matter which server it was published through
+        self.has_pending = Event()
+
+        # Listens for notifications on both channels above
+        self.listener = None
+
+        # Key = sub_key, value = an event set when messages land in that consumer's queue
+        self.consumer_events = {}
+
+        # Key = sub_key, value = how many consumers are waiting for that consumer_events' event
+        self.consumer_event_waiters = {}
+
+        # Caps how many consumers may be waiting for messages in this process at a time
+        self.waiters = BoundedSemaphore(max_waiters)
+
+        # Caps how long, in seconds, each of them may wait
+        self.max_wait = max_wait
 
         self.add_lua_program(self.LUA_PUBLISH, lua.lua_publish)
+        self.add_lua_program(self.LUA_PUBLISH_MANY, lua.lua_publish_many)
         self.add_lua_program(self.LUA_MOVE_TO_TARGET_QUEUES, lua.lua_move_to_target_queues)
         self.add_lua_program(self.LUA_GET_FROM_CONSUMER_QUEUE, lua.lua_get_from_cons_queue)
         self.add_lua_program(self.LUA_REJECT, lua.lua_reject)
@@ -498,6 +549,10 @@ class RedisPubSub(PubSub, LuaContainer):
     def delete_topic_metadata(self, topic):
         self.kvdb.hdel(self.LAST_PUB_TIME_KEY, topic.name)
 
+    def add_consumer_metadata(self, topic_name):
+        # Messages published before there were any consumers can be now moved to the new one's queue
+        self.set_pending(topic_name)
+
     def delete_consumer_metadata(self, client):
         self.kvdb.hdel(self.LAST_SEEN_CONSUMER_KEY, client.id)
 
@@ -509,8 +564,8 @@ class RedisPubSub(PubSub, LuaContainer):
     def _raise_cant_publish_error(self, ctx):
         raise PermissionDenied("Permision denied. Can't publish to `{}`".format(ctx.topic))
 
-    def publish(self, ctx):
-        """ Publishes a message on a selected topic.
+    def _check_can_publish(self, ctx):
+        """ Raises PermissionDenied unless the producer is allowed to publish to the topic.
         """
         # Note that the client always receives the same response but logs contain details
         with self.update_lock:
@@ -530,9 +585,23 @@ class RedisPubSub(PubSub, LuaContainer):
                 self.logger.warn('Producer `%s` is not active. Producer `%s`.', ctx.client_id, ctx.topic)
                 self._raise_cant_publish_error(ctx)
 
-        if self.get_topic_depth(ctx.topic) >= self.topics[ctx.topic].max_depth:
-            self.logger.warn('Topic full, `%s`, max depth `%s`', ctx.topic, self.topics[ctx.topic].max_depth)
-            raise ItemFull('Topic full', ctx.topic, self.topics[ctx.topic].max_depth)
+    def _check_topic_depth(self, ctx):
+        """ Raises ItemFull if the topic cannot accept any more messages, otherwise returns how many it can still accept.
+        """
+        max_depth = self.topics[ctx.topic].max_depth
+        depth = self.get_topic_depth(ctx.topic)
+
+        if depth >= max_depth:
+            self.logger.warn('Topic full, `%s`, max depth `%s`', ctx.topic, max_depth)
+            raise ItemFull('Topic full', ctx.topic, max_depth)
+
+        return max_depth - depth
+
+    def publish(self, ctx):
+        """ Publishes a message on a selected topic.
+        """
+        self._check_can_publish(ctx)
+        self._check_topic_depth(ctx)
 
         id_key = self.MSG_IDS_PREFIX.format(ctx.topic)
 
@@ -552,7 +621,7 @@ class RedisPubSub(PubSub, LuaContainer):
             self.run_lua(
                 self.LUA_PUBLISH, [
                     id_key, self.MSG_VALUES_KEY, self.MSG_METADATA_KEY, self.MSG_EXPIRE_AT_KEY, self.LAST_PUB_TIME_KEY,
-                       self.LAST_SEEN_PRODUCER_KEY],
+                       self.LAST_SEEN_PRODUCER_KEY, self.PENDING_TOPICS_KEY, self.PENDING_CHANNEL],
                     [score, ctx.msg.msg_id, ctx.msg.expire_at_utc.isoformat(), ctx.msg.payload, ctx.msg.to_json(),
                        ctx.topic, datetime.utcnow().isoformat(), ctx.client_id])
         except Exception, e:
@@ -562,6 +631,53 @@ class RedisPubSub(PubSub, LuaContainer):
             self.logger.info('Published `%s` to `%s`, exp `%s`', ctx.msg.msg_id, ctx.topic, ctx.msg.expire_at_utc.isoformat())
             return ctx
 
+    def publish_many(self, ctx):
+        """ Publishes a batch of messages on a selected topic. Permissions and topic depth are checked once for the whole
+        batch and all the messages are stored in a single Lua call. Returns a list of (msg_id, error) pairs, in the same
+        order the messages were given in, with error set to None for each message published. Messages that did not fit
+        in the topic are not published and their error is an ItemFull exception.
+        """
+        self._check_can_publish(ctx)
+        capacity = self._check_topic_depth(ctx)
+
+        to_publish = ctx.msgs[:capacity]
+        overflown = ctx.msgs[capacity:]
+
+        # Scores are built in the same way self.publish builds them
+        now = datetime.utcnow()
+        now_seconds = datetime_to_seconds(now)
+
+        args = [ctx.topic, now.isoformat(), ctx.client_id]
+
+        for msg in to_publish:
+            msg.topic = ctx.topic
+            args.extend(['{}{}'.format(msg.priority, now_seconds), msg.msg_id, msg.expire_at_utc.isoformat(), msg.payload,
+                msg.to_json()])
+
+        if to_publish:
+            try:
+                self.run_lua(
+                    self.LUA_PUBLISH_MANY, [
+                        self.MSG_IDS_PREFIX.format(ctx.topic), self.MSG_VALUES_KEY, self.MSG_METADATA_KEY,
+                            self.MSG_EXPIRE_AT_KEY, self.LAST_PUB_TIME_KEY, self.LAST_SEEN_PRODUCER_KEY,
+                            self.PENDING_TOPICS_KEY, self.PENDING_CHANNEL], args)
+            except Exception, e:
+                self.logger.error('Pub many error `%s`', format_exc(e))
+                raise
+
+        out = [(msg.msg_id, None) for msg in to_publish]
+
+        if overflown:
+            max_depth = self.topics[ctx.topic].max_depth
+            self.logger.warn('Topic full, `%s`, max depth `%s`, rejected `%s` msg(s)', ctx.topic, max_depth, len(overflown))
+
+            error = ItemFull('Topic full', ctx.topic, max_depth)
+            out.extend((msg.msg_id, error) for msg in overflown)
+
+        self.logger.info('Published `%s` msg(s) to `%s`', len(to_publish), ctx.topic)
+
+        return out
+
 # ################################################################################################################################
 
     def subscribe(self, ctx, sub_key=None):
@@ -579,9 +695,9 @@ class RedisPubSub(PubSub, LuaContainer):
 
 # ################################################################################################################################
 
-    def get(self, ctx):
-        self.logger.debug('Get by sub_key `%s`', ctx.sub_key)
-
+    def _get_messages(self, ctx):
+        """ Returns up to ctx.max_batch_size messages from a consumer's queue, marking them as in-flight.
+        """
         with self.in_flight_lock:
             with self.update_lock:
 
@@ -608,20 +724,32 @@ class RedisPubSub(PubSub, LuaContainer):
 
                 self.logger.debug('Get messages `%s`:`%r`', ctx.sub_key, messages)
 
-                for msg in messages:
+                return messages
 
-                    if self.logger.isEnabledFor(logging.DEBUG):
-                        self.logger.debug('Get result: sub_key `%s`, msg `%s`', ctx.sub_key, msg)
-                    else:
-                        self.logger.info('Get result: sub_key `%s`, metadata `%s`', ctx.sub_key, msg[1])
+    def get(self, ctx):
+        self.logger.debug('Get by sub_key `%s`', ctx.sub_key)
 
-                    payload = msg[0][0] if msg[0] else None
-                    metadata = loads(msg[1][0])
+        messages = self._get_messages(ctx)
 
-                    if ctx.get_format == PUB_SUB.GET_FORMAT.JSON.id:
-                        yield {'payload': payload, 'metadata':metadata}
-                    else:
-                        yield Message(payload=payload, **metadata)
+        # There is nothing to return yet so wait for messages, if asked to, without holding onto any locks in the meantime.
+        if not messages and ctx.wait_seconds:
+            if self.wait_for_messages(ctx.sub_key, ctx.wait_seconds):
+                messages = self._get_messages(ctx)
+
+        for msg in messages:
+
+            if self.logger.isEnabledFor(logging.DEBUG):
+                self.logger.debug('Get result: sub_key `%s`, msg `%s`', ctx.sub_key, msg)
+            else:
+                self.logger.info('Get result: sub_key `%s`, metadata `%s`', ctx.sub_key, msg[1])
+
+            payload = msg[0][0] if msg[0] else None
+            metadata = loads(msg[1][0])
+
+            if ctx.get_format == PUB_SUB.GET_FORMAT.JSON.id:
+                yield {'payload': payload, 'metadata':metadata}
+            else:
+                yield Message(payload=payload, **metadata)
 
 # ################################################################################################################################
 
@@ -662,7 +790,8 @@ class RedisPubSub(PubSub, LuaContainer):
         cons_in_flight_ids = self.CONSUMER_IN_FLIGHT_IDS_PREFIX.format(ctx.sub_key)
         cons_in_flight_data = self.CONSUMER_IN_FLIGHT_DATA_PREFIX.format(ctx.sub_key)
 
-        result = self.run_lua(self.LUA_REJECT, keys=[cons_queue, cons_in_flight_ids, cons_in_flight_data], args=ctx.msg_ids)
+        result = self.run_lua(
+            self.LUA_REJECT, keys=[cons_queue, cons_in_flight_ids, cons_in_flight_data, self.CONSUMER_CHANNEL], args=ctx.msg_ids)
 
         if self.logger.isEnabledFor(logging.DEBUG):
             self.logger.info(
@@ -702,7 +831,8 @@ class RedisPubSub(PubSub, LuaContainer):
 # ############################################################################################################################
 
     def move_to_target_queues(self):
-        """ Invoked periodically in order to fetch data sent to a topic and move it to each consumer's queue.
+        """ Moves messages published to topics to each consumer's queue. Only topics that messages were published to
+        since the last time are looked into. Invoked whenever wait_for_pending returns.
         """
         # TODO: We currently deliver messages to each consumer. However, we also need to support
         # the delivery to only one consumer chosen randomly from each of the subscribed ones.
@@ -711,44 +841,136 @@ class RedisPubSub(PubSub, LuaContainer):
 
             out = []
 
-            for topic in self.topic_to_prod:
+            for topic in self.kvdb.smembers(self.PENDING_TOPICS_KEY):
 
-                source_queue = self.MSG_IDS_PREFIX.format(topic)
-                topic_info = self.topics[topic]
+                topic_info = self.topics.get(topic)
+                consumers = self.topic_to_cons.get(topic, [])
+
+                # Messages stay in the topic until it has a consumer, which in turn will mark the topic as pending again.
+                if not (topic_info and consumers):
+                    self.kvdb.srem(self.PENDING_TOPICS_KEY, topic)
+                    self.logger.info('Move: no consumers for topic `%s`', topic)
+                    continue
 
-                # There are as many keys as there are arguments - items on idx 3 and above are related and come in pairs.
+                # Target queues are in keys on idx 5 and above, each one's max depth in args on idx 4 and above.
 
                 # Keys the Lua program will operate on
                 keys = []
-                keys.append(source_queue)
+                keys.append(self.MSG_IDS_PREFIX.format(topic))
                 keys.append(self.BACKLOG_FULL_KEY)
                 keys.append(self.UNACK_COUNTER_KEY)
+                keys.append(self.PENDING_TOPICS_KEY)
+                keys.append(self.CONSUMER_CHANNEL)
 
                 # Lua program's args
                 args = []
                 args.append(int(topic_info.is_fifo)) # So it's easy to cast it to bool in Lua
                 args.append(topic_info.max_depth)
                 args.append(maxint)
+                args.append(topic)
 
-                consumers = self.topic_to_cons.get(topic, [])
-                if consumers:
-                    for consumer in consumers:
-                        sub_key = self.cons_to_sub[consumer]
-                        self.logger.debug('Move: Found sub `%s` for topic `%s` by consumer `%s`', sub_key, topic, consumer)
-
-                        keys.append(self.CONSUMER_MSG_IDS_PREFIX.format(sub_key))
-                        args.append(self.consumers[consumer].max_depth)
+                for consumer in consumers:
+                    sub_key = self.cons_to_sub[consumer]
+                    self.logger.debug('Move: Found sub `%s` for topic `%s` by consumer `%s`', sub_key, topic, consumer)
 
-                    move_result = self.run_lua(self.LUA_MOVE_TO_TARGET_QUEUES, keys, args)
-                    if move_result:
-                        self.logger.info('Move: result `%s`, keys `%s`', move_result, ', '.join(keys))
-                        out.append(move_result)
+                    keys.append(self.CONSUMER_MSG_IDS_PREFIX.format(sub_key))
+                    args.append(self.consumers[consumer].max_depth)
 
-                else:
-                    self.logger.info('Move: no consumers for topic `%s`', topic)
+                move_result = self.run_lua(self.LUA_MOVE_TO_TARGET_QUEUES, keys, args)
+                if move_result:
+                    self.logger.info('Move: result `%s`, keys `%s`', move_result, ', '.join(keys))
+                    out.append(move_result)
 
             return out
 
+    def set_pending(self, topic):
+        """ Marks a topic as one that may have messages to move to consumer queues.
+        """
+        with self.kvdb.pipeline() as pipe:
+            pipe.sadd(self.PENDING_TOPICS_KEY, topic)
+            pipe.publish(self.PENDING_CHANNEL, topic)
+            pipe.execute()
+
+    def _listen(self):
+        """ Sets self.has_pending each time a message is published to a topic and wakes up consumers waiting for messages
+        once there are any in their queues, no matter which server the messages were published through.
+        """
+        cons_queue_prefix = self.CONSUMER_MSG_IDS_PREFIX.format('')
+
+        while True:
+            try:
+                client = self.kvdb.pubsub()
+                client.subscribe([self.PENDING_CHANNEL, self.CONSUMER_CHANNEL])
+
+                for msg in client.listen():
+                    if msg['type'] != 'message':
+                        continue
+
+                    if msg['channel'] == self.PENDING_CHANNEL:
+                        self.has_pending.set()
+                    else:
+                        event = self.consumer_events.pop(msg['data'][len(cons_queue_prefix):], None)
+                        if event:
+                            event.set()
+
+            except Exception, e:
+                self.logger.warn('Could not listen for pub/sub notifications, will retry in %ss, e:`%s`',
+                    PUB_SUB.PENDING_LISTENER_RETRY, format_exc(e))
+
+                # Messages could have been published in the meantime
+                self.has_pending.set()
+                for sub_key in self.consumer_events.keys():
+                    self.consumer_events.pop(sub_key).set()
+
+                sleep(PUB_SUB.PENDING_LISTENER_RETRY)
+
+    def _ensure_listener(self):
+        if not self.listener:
+            self.listener = spawn(self._listen)
+
+    def wait_for_pending(self, timeout):
+        """ Blocks until a message is published to any topic or until timeout seconds elapse, whichever comes first.
+        Notifications received in the meantime are coalesced so a caller moving messages afterwards does it in batches.
+        """
+        self._ensure_listener()
+
+        self.has_pending.wait(timeout)
+        self.has_pending.clear()
+
+    def wait_for_messages(self, sub_key, timeout):
+        """ Blocks until there are messages in a consumer's queue or until timeout seconds elapse, whichever comes first,
+        though no longer than self.max_wait seconds. Returns True if there are messages to get. Raises TooManyWaiters
+        if too many consumers are waiting already.
+        """
+        if not self.waiters.acquire(blocking=False):
+            self.logger.warn('Too many waiting consumers, sub_key `%s`', sub_key)
+            raise TooManyWaiters('Too many waiting consumers')
+
+        try:
+            self._ensure_listener()
+
+            # All consumers waiting for the same sub_key share an event
+            event = self.consumer_events.setdefault(sub_key, Event())
+            self.consumer_event_waiters[sub_key] = self.consumer_event_waiters.get(sub_key, 0) + 1
+
+            try:
+                # Messages may have arrived before the event was there to be set
+                if self.get_consumer_queue_current_depth(sub_key):
+                    return True
+
+                return event.wait(min(timeout, self.max_wait))
+
+            finally:
+
+                # The last consumer to stop waiting removes the event unless it has been already popped and set
+                self.consumer_event_waiters[sub_key] -= 1
+                if not self.consumer_event_waiters[sub_key]:
+                    del self.consumer_event_waiters[sub_key]
+                    self.consumer_events.pop(sub_key, None)
+
+        finally:
+            self.waiters.release()
+
 # ################################################################################################################################
 
     def get_topic_depth(self, topic):
@@ -889,6 +1111,39 @@ class PubSubAPI(object):
 
         return self.impl.publish(ctx)
 
+    def publish_many(self, messages, topic, client_id=None):
+        """ Publishes a batch of messages to a given topic. Each message is either a payload alone or a dictionary
+        of the same parameters self.publish accepts. Returns a list of (msg_id, error) pairs in the order of messages
+        on input, msg_id being None if a message could not be created out of parameters given.
+        """
+        client_id = client_id or self.get_default_producer().id
+        producer_name = self.impl.producers[client_id].name
+
+        ctx = PubManyCtx()
+        ctx.client_id = client_id
+        ctx.topic = topic
+
+        out = []
+
+        for item in messages:
+            if not isinstance(item, dict):
+                item = {'payload': item}
+
+            try:
+                msg = Message(
+                    item.get('payload', ''), topic, item.get('mime_type') or PUB_SUB.DEFAULT_MIME_TYPE,
+                    item.get('priority') or PUB_SUB.DEFAULT_PRIORITY, item.get('expiration') or PUB_SUB.DEFAULT_EXPIRATION,
+                    item.get('msg_id'), producer_name)
+            except Exception, e:
+                out.append((item.get('msg_id'), e))
+            else:
+                ctx.msgs.append(msg)
+                out.append(None) # Filled in below with what the implementation returns
+
+        published = iter(self.impl.publish_many(ctx))
+
+        return [next(published) if item is None else item for item in out]
+
     def subscribe(self, client_id, topics, sub_key=None):
         """ Subscribes a client to one or more topic. Returns a subscription key assigned.
         """
@@ -906,10 +1161,11 @@ class PubSubAPI(object):
         return self.impl.subscribe(ctx, sub_key)
 
     def get(self, sub_key, max_batch_size=PUB_SUB.DEFAULT_GET_MAX_BATCH_SIZE, is_fifo=PUB_SUB.DEFAULT_IS_FIFO,
-            get_format=PUB_SUB.GET_FORMAT.DEFAULT.id):
-        """ Gets one or more message, if any are available, for the given subscription key.
+            get_format=PUB_SUB.GET_FORMAT.DEFAULT.id, wait_seconds=0):
+        """ Gets one or more message, if any are available, for the given subscription key. If there are none,
+        waits for up to wait_seconds for any to arrive.
         """
-        return self.impl.get(GetCtx(sub_key, max_batch_size, is_fifo, get_format))
+        return self.impl.get(GetCtx(sub_key, max_batch_size, is_fifo, get_format, wait_seconds))
 
     def acknowledge(self, sub_key, msg_ids):
         """ Acknowledges one or more message IDs for a given subscription key.
@@ -16,6 +16,8 @@ lua_publish = """
    local msg_expire_at = KEYS[4]
    local last_pub_time_key = KEYS[5]
    local last_seen_producer_key = KEYS[6]
+   local pending_topics = KEYS[7]
+   local pending_channel = KEYS[8]
 
    local score = ARGV[1]
    local msg_id = ARGV[2]
@@ -32,38 +34,66 @@ lua_publish = """
    redis.pcall('hset', msg_expire_at, msg_id, expire_at)
    redis.pcall('hset', last_pub_time_key, topic_name, utc_now)
    redis.pcall('hset', last_seen_producer_key, client_id, utc_now)
+
+   -- Let whoever moves messages to consumer queues know there is something to move
+   redis.pcall('sadd', pending_topics, topic_name)
+   redis.pcall('publish', pending_channel, topic_name)
 """
 
-lua_move_to_target_queues = """
+lua_publish_many = """
 
-    -- A function to copy Redis keys we operate over to a table which skips the first one, the source queue.
-    local function get_target_queues(keys, argv)
-        local target_queues = {}
-        local max_depths = {}
-        if #keys == 4 then
-          target_queues = {keys[4]}
-          max_depths = {argv[4]}
-        else
-            for idx = 1, #keys do
-                -- Note - the whole point is that we're skipping the first few items which are not target queues
-                target_queues[idx] = keys[idx+3]
-                max_depths[idx] = argv[idx+3]
-            end
-        end
-        return {target_queues, max_depths}
-    end
+   local id_key = KEYS[1]
+   local msg_values = KEYS[2]
+   local msg_metadata_key = KEYS[3]
+   local msg_expire_at = KEYS[4]
+   local last_pub_time_key = KEYS[5]
+   local last_seen_producer_key = KEYS[6]
+   local pending_topics = KEYS[7]
+   local pending_channel = KEYS[8]
+
+   local topic_name = ARGV[1]
+   local utc_now = ARGV[2]
+   local client_id = ARGV[3]
+   local published = 0
+
+   -- Items from idx 4 onwards describe messages, each one takes 5 consecutive arguments.
+   for idx = 4, #ARGV, 5 do
+
+       local score = ARGV[idx]
+       local msg_id = ARGV[idx+1]
+
+       redis.pcall('zadd', id_key, score, msg_id)
+       redis.pcall('hset', msg_values, msg_id, ARGV[idx+3])
+       redis.pcall('hset', msg_metadata_key, msg_id, ARGV[idx+4])
+       redis.pcall('hset', msg_expire_at, msg_id, ARGV[idx+2])
+
+       published = published + 1
+   end
+
+   redis.pcall('hset', last_pub_time_key, topic_name, utc_now)
+   redis.pcall('hset', last_seen_producer_key, client_id, utc_now)
+
+   -- Let whoever moves messages to consumer queues know there is something to move
+   redis.pcall('sadd', pending_topics, topic_name)
+   redis.pcall('publish', pending_channel, topic_name)
+
+   return published
+"""
+
+lua_move_to_target_queues = """
 
     local source_queue = KEYS[1]
     local backlog_full = KEYS[2]
     local unack_counter = KEYS[3]
+    local pending_topics = KEYS[4]
+    local consumer_channel = KEYS[5]
 
     local is_fifo = tonumber(ARGV[1])
     local max_depth = tonumber(ARGV[2])
     local max_int = tonumber(ARGV[3])
+    local topic_name = ARGV[4]
     local zset_command
     local out = {}
-    local target_queue_depth = 0
-    local can_push_to_target = true;
 
     if is_fifo then
         zset_command = 'zrevrange'
@@ -73,36 +103,44 @@ lua_move_to_target_queues = """
 
     local ids = redis.pcall(zset_command, source_queue, 0, max_depth)
 
-    local target_queues_max_depths = get_target_queues(KEYS, ARGV)
-    local target_queues = target_queues_max_depths[1]
-    local max_depths = target_queues_max_depths[2]
+    -- Items from idx 6 onwards in KEYS are target queues and their max depths are in ARGV from idx 5 onwards.
+    for queue_idx = 6, #KEYS do
 
-    for queue_idx, target_queue in ipairs(target_queues) do
+        local target_queue = KEYS[queue_idx]
 
-        for id_idx, id in ipairs(ids) do
+        -- Each target queue's depth is read once per batch and then kept track of locally
+        local free_slots = tonumber(ARGV[queue_idx-1]) - redis.call('llen', target_queue)
+        local has_moved = false
 
-            target_queue_depth = redis.call('llen', target_queue);
-
-            max_depth = tonumber(max_depths[queue_idx])
-            if target_queue_depth >= max_depth then
-                can_push_to_target = false
-            else
-                can_push_to_target = true
-            end
+        for id_idx, id in ipairs(ids) do
 
-            if can_push_to_target then
+            if free_slots > 0 then
                 redis.call('lpush', target_queue, id)
                 redis.pcall('hincrby', unack_counter, id, 1)
                 table.insert(out, {'moved', target_queue, id})
+                free_slots = free_slots - 1
+                has_moved = true
             else
                 table.insert(out, {'overflow', target_queue, id})
             end
 
-            redis.pcall('zrem', source_queue, id)
+        end
 
+        -- Wakes up consumers waiting for messages
+        if has_moved then
+            redis.pcall('publish', consumer_channel, target_queue)
         end
     end
 
+    for id_idx, id in ipairs(ids) do
+        redis.pcall('zrem', source_queue, id)
+    end
+
+    -- Nothing else to move so the topic is no longer pending
+    if redis.call('zcard', source_queue) == 0 then
+        redis.pcall('srem', pending_topics, topic_name)
+    end
+
     return out
     """
 
@@ -148,6 +186,7 @@ lua_reject = """
    local cons_queue = KEYS[1]
    local cons_in_flight_ids = KEYS[2]
    local cons_in_flight_data = KEYS[3]
+   local consumer_channel = KEYS[4]
    local ids = ARGV
    local out = {}
 
@@ -160,6 +199,9 @@ lua_reject = """
         redis.pcall('lpush', cons_queue, id)
     end
 
+    -- Messages rejected are available again so consumers waiting for them can be woken up
+    redis.pcall('publish', consumer_channel, cons_queue)
+
     return out
 """
 
@@ -10,6 +10,8 @@ from __future__ import absolute_import, division, print_function, unicode_litera
 
 # stdlib
 import datetime
+from heapq import heapify, heappop, heappush
+from itertools import count
 from logging import getLogger, DEBUG
 from traceback import format_exc
 
@@ -19,6 +21,7 @@ from dateutil.rrule import rrule, SECONDLY
 # gevent
 import gevent # Imported directly so it can be mocked out in tests
 from gevent import lock
+from gevent.event import Event
 
 # paodate
 from paodate import Delta
@@ -78,10 +81,6 @@ class Job(object):
         else:
             self.start_time = self.get_start_time(start_time if start_time is not None else datetime.datetime.utcnow())
 
-        self.wait_sleep_time = 1
-        self.wait_iter_cb = None
-        self.wait_iter_cb_args = ()
-
         # TODO: Add skip_days, skip_hours and skip_dates
 
     def __str__(self):
@@ -193,77 +192,49 @@ class Job(object):
         else:
             raise ValueError('Unsupported job type `{}` ({})'.format(self.type, self.name))
 
-    def main_loop(self):
-
-        if logger.isEnabledFor(DEBUG):
-            logger.debug('Job entering main loop `%s`', self)
-
-        _sleep = gevent.sleep
-        _spawn = gevent.spawn
-
-        while self.keep_running:
-            try:
-                self.current_run += 1
-
-                # Perhaps we've already been executed enough times
-                if self.max_repeats and self.current_run == self.max_repeats:
-                    self.keep_running = False
-                    self.max_repeats_reached = True
-                    self.max_repeats_reached_at = datetime.datetime.utcnow()
-
-                    if self.on_max_repeats_reached_cb:
-                        self.on_max_repeats_reached_cb(self)
-
-                # Invoke callback in a new greenlet so it doesn't block the current one.
-                _spawn(self.callback, **{'ctx':self.get_context()})
-
-            except Exception, e:
-                logger.warn(format_exc(e))
-
-            finally:
-                # Pause the greenlet for however long is needed
-                _sleep(self.get_sleep_time(datetime.datetime.utcnow()))
-
-        if logger.isEnabledFor(DEBUG):
-            logger.debug('Job leaving main loop `%s` after %d iterations', self, self.current_run)
-
-        return True
-
-    def run(self):
-        if logger.isEnabledFor(DEBUG):
-            logger.debug('Job starting `%s`', self)
-
-        _utcnow = datetime.datetime.utcnow
-        _sleep = gevent.sleep
-
-        # If the job has a start time in the future, sleep until it's ready to go.
-        now = _utcnow()
+    def get_next_run_time(self, run_time, now):
+        """ Returns the time the job should run at next after it was due at run_time, or None if it should not run anymore.
+        Interval-based jobs keep to their original schedule rather than to the time they actually ran at, skipping any runs
+        that could not take place on time, e.g. because the server was busy.
+        """
+        if not self.keep_running or self.type == SCHEDULER.JOB_TYPE.ONE_TIME:
+            return None
 
-        while self.start_time > now:
-            _sleep(self.wait_sleep_time)
+        if self.type == SCHEDULER.JOB_TYPE.INTERVAL_BASED and self.interval.in_seconds > 0:
+            in_seconds = self.interval.in_seconds
+            runs = 1
 
-            if self.wait_iter_cb:
-                self.wait_iter_cb(self.start_time, now, *self.wait_iter_cb_args)
+            if run_time + datetime.timedelta(seconds=in_seconds) <= now:
+                runs += int((now - run_time).total_seconds() // in_seconds)
 
-            now = _utcnow()
+            return run_time + datetime.timedelta(seconds=in_seconds * runs)
 
-        # OK, we're ready
-        self.main_loop()
+        return now + datetime.timedelta(seconds=self.get_sleep_time(now))
 
 # ################################################################################################################################
 
 class Scheduler(object):
-    def __init__(self, on_job_executed_cb=None):
+    """ Runs all the jobs from a single greenlet. Each job's next run time is kept in a min-heap so creating, editing
+    and deleting jobs is O(log n) and each time the dispatcher wakes up it only looks at the jobs that are due.
+    All of the jobs due at the same time are handed over to on_job_executed in a batch, in one greenlet,
+    or, if on_jobs_executed_cb is given, to on_jobs_executed in a single call.
+    """
+    def __init__(self, on_job_executed_cb=None, on_jobs_executed_cb=None):
         self.on_job_executed_cb = on_job_executed_cb
+        self.on_jobs_executed_cb = on_jobs_executed_cb
         self.jobs = set()
-        self.job_greenlets = {}
+        self.scheduled_jobs = {} # Job name -> the job's instance whose next run is in self.heap
+        self.heap = [] # (next_run_time, seq, job) tuples
         self.keep_running = True
         self.lock = lock.RLock()
-        self.sleep_time = 0.1
         self.iter_cb = None
         self.iter_cb_args = ()
         self.ready = False
 
+        self._seq = count() # So that jobs due at the same time are never compared
+        self._stale = 0 # How many entries in self.heap belong to jobs that have been unscheduled or replaced since
+        self._wakeup = Event()
+
     def on_max_repeats_reached(self, job):
         with self.lock:
             job.is_active = False
@@ -275,7 +246,7 @@ class Scheduler(object):
 
         if job.is_active:
             if spawn:
-                self.spawn_job(job)
+                self.schedule_job(job)
 
                 if logger.isEnabledFor(DEBUG):
                     logger.debug('Job scheduled `%s`', job)
@@ -307,9 +278,11 @@ class Scheduler(object):
             self.jobs.remove(job)
             found = True
 
-        if job.name in self.job_greenlets:
-            self.job_greenlets[job.name].kill(timeout=2.0)
-            del self.job_greenlets[job.name]
+        scheduled = self.scheduled_jobs.pop(job.name, None)
+
+        if scheduled is not None:
+            scheduled.keep_running = False
+            self._on_stale()
             found = True
 
         return found
@@ -360,10 +333,15 @@ class Scheduler(object):
             for job in jobs:
                 self._unschedule_stop(job.clone(), 'stopped')
 
+            self.keep_running = False
+            self._wakeup.set()
+
     def sleep(self, value):
-        """ A method introduced so the class is easier to mock out in tests.
+        """ Sleeps for up to value seconds, or with value of None, for as long as needed, until a job is scheduled to run
+        before the dispatcher would otherwise wake up. A method introduced so the class is easier to mock out in tests.
         """
-        gevent.sleep(value)
+        self._wakeup.wait(value)
+        self._wakeup.clear()
 
     def execute(self, name):
         """ Executes a job no matter if it's active or not. One-time job are not unscheduled afterwards.
@@ -384,29 +362,169 @@ class Scheduler(object):
         if ctx['type'] == SCHEDULER.JOB_TYPE.ONE_TIME and unschedule_one_time:
             self.unschedule_by_name(ctx['name'])
 
-    def spawn_job(self, job):
-        """ Spawns a job's greenlet. Must be called with self.lock held.
+    def on_jobs_executed(self, ctx_list):
+        """ Same as on_job_executed but for all the jobs that were due at the same time, given to on_jobs_executed_cb at once.
+        """
+        logger.debug('Executing `%s`', ctx_list)
+        self.on_jobs_executed_cb(ctx_list)
+
+        for ctx in ctx_list:
+            logger.info('Job executed `%s`, `%s`', ctx['name'], ctx)
+
+            if ctx['type'] == SCHEDULER.JOB_TYPE.ONE_TIME:
+                self.unschedule_by_name(ctx['name'])
+
+    def _on_stale(self):
+        """ Called each time an entry in self.heap stops being used. Must be called with self.lock held.
+        Entries are not removed from the heap one by one, rather, it is rebuilt once most of them are no longer needed.
+        """
+        self._stale += 1
+
+        if self._stale > 1000 and self._stale > len(self.heap) // 2:
+            self.heap = [elem for elem in self.heap if self.scheduled_jobs.get(elem[2].name) is elem[2]]
+            heapify(self.heap)
+            self._stale = 0
+
+    def _push(self, job, run_time):
+        """ Adds a job's next run time to self.heap. Must be called with self.lock held.
+        """
+        heappush(self.heap, (run_time, next(self._seq), job))
+
+    def schedule_job(self, job):
+        """ Schedules a job's first run, replacing any other job of the same name. Must be called with self.lock held.
         """
         job.callback = self.on_job_executed
         job.on_max_repeats_reached_cb = self.on_max_repeats_reached
-        self.job_greenlets[job.name] = gevent.spawn(job.run)
+
+        scheduled = self.scheduled_jobs.pop(job.name, None)
+
+        # Already scheduled, e.g. created before the scheduler started
+        if scheduled is job:
+            self.scheduled_jobs[job.name] = job
+            return
+
+        if scheduled is not None:
+            self._on_stale()
+
+        if job.keep_running and job.start_time:
+            self.scheduled_jobs[job.name] = job
+            self._push(job, job.start_time)
+
+            # Wake up the dispatcher if this job is to run before any other
+            if self.heap[0][2] is job:
+                self._wakeup.set()
+
+    def get_due(self, now):
+        """ Returns callbacks and contexts of all the jobs due to run at or before now, scheduling the next runs of each.
+        Must be called with self.lock held.
+        """
+        heap = self.heap
+        scheduled_jobs = self.scheduled_jobs
+        due = []
+
+        while heap and heap[0][0] <= now:
+            run_time, _, job = heappop(heap)
+
+            # The job has been unscheduled or replaced since
+            if scheduled_jobs.get(job.name) is not job:
+                self._stale -= 1
+                continue
+
+            due.append((run_time, job))
+
+        batch = []
+
+        for run_time, job in due:
+            try:
+                job.current_run += 1
+
+                # Perhaps we've already been executed enough times
+                if job.max_repeats and job.current_run == job.max_repeats:
+                    job.keep_running = False
+                    job.max_repeats_reached = True
+                    job.max_repeats_reached_at = now
+
+                    if job.on_max_repeats_reached_cb:
+                        job.on_max_repeats_reached_cb(job)
+
+                batch.append((job.callback, job.get_context()))
+
+            except Exception, e:
+                logger.warn(format_exc(e))
+
+            # Jobs unscheduled in the meantime, e.g. by on_max_repeats_reached_cb, are not scheduled again
+            if scheduled_jobs.get(job.name) is not job:
+                continue
+
+            try:
+                next_run_time = job.get_next_run_time(run_time, now)
+            except Exception, e:
+                logger.warn(format_exc(e))
+                next_run_time = None
+
+            if next_run_time:
+                self._push(job, next_run_time)
+            else:
+                del scheduled_jobs[job.name]
+
+        return batch
+
+    def execute_batch(self, batch):
+        """ Invokes callbacks of all the jobs that were due at the same time. Jobs using the default callback are
+        executed in one call to on_jobs_executed if there is a batch callback to hand them over to.
+        """
+        if self.on_jobs_executed_cb:
+            ctx_list = []
+            other = []
+
+            for callback, ctx in batch:
+                if callback == self.on_job_executed:
+                    ctx_list.append(ctx)
+                else:
+                    other.append((callback, ctx))
+
+            if ctx_list:
+                try:
+                    self.on_jobs_executed(ctx_list)
+                except Exception, e:
+                    logger.warn(format_exc(e))
+
+            batch = other
+
+        for callback, ctx in batch:
+            try:
+                callback(ctx=ctx)
+            except Exception, e:
+                logger.warn(format_exc(e))
 
     def run(self):
         _sleep = self.sleep
-        _sleep_time = self.sleep_time
+        _utcnow = datetime.datetime.utcnow
+        _spawn = gevent.spawn
 
         with self.lock:
             for job in sorted(self.jobs):
                 if job.max_repeats_reached:
                     logger.info('Job `%s` already reached max runs count (%s UTC)', job.name, job.max_repeats_reached_at)
                 else:
-                    self.spawn_job(job)
+                    self.schedule_job(job)
 
         # Ok, we're good now.
         self.ready = True
 
         while self.keep_running:
-            _sleep(_sleep_time)
+
+            now = _utcnow()
+
+            if self.heap and self.heap[0][0] <= now:
+                with self.lock:
+                    batch = self.get_due(now)
+
+                if batch:
+                    _spawn(self.execute_batch, batch)
+
+            # Sleep until the next job is due or, if there are no jobs, until one is scheduled or the scheduler is stopped
+            _sleep(max((self.heap[0][0] - _utcnow()).total_seconds(), 0) if self.heap else None)
 
             if self.iter_cb:
                 self.iter_cb(*self.iter_cb_args)
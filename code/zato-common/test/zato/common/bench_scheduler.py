@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (C) 2016 Dariusz Suchojad <dsuch at zato.io>
+
+Licensed under LGPLv3, see LICENSE.txt for terms and conditions.
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+# stdlib
+import logging, subprocess, sys
+from datetime import datetime, timedelta
+
+# gevent
+import gevent
+
+# Zato
+from zato.common import SCHEDULER
+from zato.common.scheduler import Interval, Job, Scheduler
+
+# ################################################################################################################################
+
+# Compares how accurately jobs are run and how much RAM it takes when there are many of them. Before is each job running
+# in its own greenlet, as Scheduler.spawn_job used to do it. After is all of them run by the scheduler's dispatcher.
+#
+# Drift is how much later than they were due jobs actually ran. Each variant runs in a process of its own.
+#
+# Run as: python bench_scheduler.py [jobs] [seconds]
+
+# ################################################################################################################################
+
+def get_jobs(count):
+    start_time = datetime.utcnow() + timedelta(seconds=2)
+    jobs = []
+
+    for idx in range(count):
+        interval = Interval(seconds=10 + idx % 50)
+        job_start_time = start_time + timedelta(milliseconds=idx % 10000)
+        jobs.append(Job(idx, 'job.{}'.format(idx), SCHEDULER.JOB_TYPE.INTERVAL_BASED, interval, job_start_time))
+
+    return jobs
+
+def run_job(job):
+    """ How each job used to be run in a greenlet of its own, by Job.run and Job.main_loop.
+    """
+    while job.start_time > datetime.utcnow():
+        gevent.sleep(1)
+
+    while job.keep_running:
+        job.current_run += 1
+        gevent.spawn(job.callback, ctx=job.get_context())
+        gevent.sleep(job.get_sleep_time(datetime.utcnow()))
+
+def get_rss():
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1]) / 1024.0
+
+def run(name, count, seconds):
+    jobs = get_jobs(count)
+    jobs_by_name = dict((job.name, job) for job in jobs)
+    drift = []
+
+    def on_job_executed(ctx):
+        job = jobs_by_name[ctx['name']]
+        due = job.start_time + timedelta(seconds=job.interval.in_seconds * (ctx['current_run'] - 1))
+        drift.append((datetime.utcnow() - due).total_seconds())
+
+    if name == 'Before':
+        for job in jobs:
+            job.callback = on_job_executed
+            gevent.spawn(run_job, job)
+    else:
+        scheduler = Scheduler(on_job_executed)
+        for job in jobs:
+            scheduler.create(job)
+        gevent.spawn(scheduler.run)
+
+    gevent.sleep(seconds)
+
+    avg_drift = sum(drift) / len(drift) * 1000 if drift else 0
+    max_drift = max(drift) * 1000 if drift else 0
+
+    print('{:>10} {:>10} {:>10} {:>18.1f} {:>18.1f} {:>12.1f}'.format(
+        name, count, len(drift), avg_drift, max_drift, get_rss()))
+
+def main():
+    logging.disable(logging.CRITICAL)
+
+    if len(sys.argv) > 3:
+        run(sys.argv[1], int(sys.argv[2]), float(sys.argv[3]))
+        return
+
+    count = sys.argv[1] if len(sys.argv) > 1 else '100000'
+    seconds = sys.argv[2] if len(sys.argv) > 2 else '30'
+
+    print('{:>10} {:>10} {:>10} {:>18} {:>18} {:>12}'.format(
+        '', 'Jobs', 'Runs', 'Avg drift (ms)', 'Max drift (ms)', 'RSS (MB)'))
+
+    for name in 'Before', 'After':
+        sys.stdout.write(subprocess.check_output([sys.executable, __file__, name, count, seconds]))
+        sys.stdout.flush()
+
+if __name__ == '__main__':
+    main()
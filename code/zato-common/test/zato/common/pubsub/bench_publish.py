@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (C) 2016 Dariusz Suchojad <dsuch at zato.io>
+
+Licensed under LGPLv3, see LICENSE.txt for terms and conditions.
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+# stdlib
+import sys
+from timeit import default_timer
+
+# Redis
+from redis import StrictRedis
+
+# Zato
+from zato.common.pubsub import Client, PubSubAPI, RedisPubSub, Topic
+
+# ################################################################################################################################
+
+# Compares how long it takes to publish 10,000 messages one by one (before) and in 100 batches of 100 messages each (after).
+#
+# Run as: python bench_publish.py [redis-host:redis-port]
+#
+# Redis runs Lua programs so, unlike with other benchmarks, there is no in-memory connection to fall back to.
+# Make sure db 15 can be overwritten.
+
+# ################################################################################################################################
+
+def get_api(conn, max_depth):
+    api = PubSubAPI(RedisPubSub(conn, 'zato:pubsub:bench:'))
+
+    topic = Topic('/bench', max_depth=max_depth)
+    api.add_topic(topic)
+
+    producer = Client(1, 'bench')
+    api.add_producer(producer, topic)
+
+    return api, topic, producer
+
+def before(api, topic, producer, payloads, batch_size):
+    for payload in payloads:
+        api.publish(payload, topic.name, client_id=producer.id)
+
+def after(api, topic, producer, payloads, batch_size):
+    for idx in range(0, len(payloads), batch_size):
+        api.publish_many(payloads[idx:idx+batch_size], topic.name, producer.id)
+
+def main():
+    host, port = sys.argv[1].split(':') if len(sys.argv) > 1 else ('localhost', 6379)
+    conn = StrictRedis(host, int(port), db=15)
+
+    messages = 10000
+    batch_size = 100
+    payloads = ['{{"customer_id":{}, "status":"active"}}'.format(idx) for idx in range(messages)]
+
+    print('{:>10} {:>12} {:>20} {:>20}'.format('', 'Messages', 'Total time (s)', 'Messages/s'))
+
+    for name, func in (('Before', before), ('After', after)):
+        conn.flushdb()
+        api, topic, producer = get_api(conn, messages)
+
+        start = default_timer()
+        func(api, topic, producer, payloads, batch_size)
+        total = default_timer() - start
+
+        print('{:>10} {:>12} {:>20.2f} {:>20.0f}'.format(name, api.get_topic_depth(topic.name), total, messages / total))
+
+    conn.flushdb()
+
+if __name__ == '__main__':
+    main()
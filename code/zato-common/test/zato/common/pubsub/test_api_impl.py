@@ -11,6 +11,7 @@ from __future__ import absolute_import, division, print_function, unicode_litera
 # stdlib
 from json import loads
 from datetime import datetime
+from time import time
 from unittest import TestCase
 
 # datadiff
@@ -19,11 +20,14 @@ from datadiff.tools import assert_equal
 # dateutil
 from dateutil.parser import parse
 
+# gevent
+from gevent import joinall, spawn
+
 # Zato
 from zato.common import PUB_SUB
 from zato.common.log_message import CID_LENGTH
-from zato.common.pubsub import AckCtx, Client, Consumer, GetCtx, Message, PubCtx, PubSubAPI, PubSubException, RedisPubSub, \
-     RejectCtx, SubCtx, Topic
+from zato.common.pubsub import AckCtx, Client, Consumer, GetCtx, ItemFull, Message, PubCtx, PubManyCtx, PubSubAPI, \
+     PubSubException, RedisPubSub, RejectCtx, SubCtx, TooManyWaiters, Topic
 from zato.common.test import rand_bool, rand_date_utc, rand_int, rand_string
 from .common import RedisPubSubCommonTestCase
 
@@ -413,6 +417,255 @@ class RedisPubSubTestCase(RedisPubSubCommonTestCase):
         self.api.impl.producers[producer.id].is_active = True
         invoke_publish(payload, topic.name, producer.id)
 
+    def test_publish_many(self):
+        topic = Topic(rand_string(), max_depth=3)
+        self.api.add_topic(topic)
+
+        producer = Client(rand_int(), rand_string())
+        self.api.add_producer(producer, topic)
+
+        custom_msg_id = rand_string()
+        messages = [
+            rand_string(),
+            {'payload': rand_string(), 'msg_id': custom_msg_id, 'priority': 7},
+            {'payload': rand_string(), 'expiration': rand_string()}, # Invalid expiration so the message cannot be created
+            rand_string(),
+            rand_string(), # Above max_depth
+        ]
+
+        result = self.api.publish_many(messages, topic.name, producer.id)
+        self.assertEquals(len(result), len(messages))
+
+        # The first, second and fourth message were published ..
+        for idx in (0, 1, 3):
+            msg_id, error = result[idx]
+            self.assertIsNone(error)
+            self.assertEquals(len(msg_id), CID_LENGTH if idx != 1 else len(custom_msg_id))
+
+        self.assertEquals(result[1][0], custom_msg_id)
+
+        # .. the third one was not a valid message ..
+        self.assertIsNone(result[2][0])
+        self.assertIsInstance(result[2][1], TypeError)
+
+        # .. and the fifth one did not fit in the topic.
+        self.assertIsInstance(result[4][1], ItemFull)
+
+        published = [result[idx][0] for idx in (0, 1, 3)]
+
+        self.assertEquals(self.api.get_topic_depth(topic.name), 3)
+        self.assertEquals(sorted(self.kvdb.hkeys(self.api.impl.MSG_VALUES_KEY)), sorted(published))
+        self.assertEquals(self.kvdb.hget(self.api.impl.MSG_VALUES_KEY, published[0]), messages[0])
+        self.assertEquals(self.kvdb.hget(self.api.impl.MSG_VALUES_KEY, custom_msg_id), messages[1]['payload'])
+
+        msg_metadata = loads(self.kvdb.hget(self.api.impl.MSG_METADATA_KEY, custom_msg_id))
+        self.assertEquals(msg_metadata['priority'], 7)
+        self.assertEquals(msg_metadata['topic'], topic.name)
+        self.assertEquals(msg_metadata['producer'], producer.name)
+
+        self.assertIn(topic.name, self.kvdb.hkeys(self.api.impl.LAST_PUB_TIME_KEY))
+        self.assertIn(str(producer.id), self.kvdb.hkeys(self.api.impl.LAST_SEEN_PRODUCER_KEY))
+
+        # The topic is full now so the whole batch is rejected.
+        self.assertRaises(ItemFull, self.api.publish_many, [rand_string()], topic.name, producer.id)
+
+    def test_publish_many_exceptions(self):
+        producer = Client(rand_int(), rand_string())
+        topic = Topic(rand_string())
+        self.api.add_topic(topic)
+
+        # Not allowed to publish to the topic - no message is published.
+        self.api.add_producer(producer, Topic(rand_string()))
+        self.assertRaises(PubSubException, self.api.publish_many, [rand_string(), rand_string()], topic.name, producer.id)
+        self.assertEquals(self.api.get_topic_depth(topic.name), 0)
+
+        # Inactive producers cannot publish either.
+        self.api.add_producer(producer, topic)
+        self.api.impl.producers[producer.id].is_active = False
+        self.assertRaises(PubSubException, self.api.publish_many, [rand_string(), rand_string()], topic.name, producer.id)
+        self.assertEquals(self.api.get_topic_depth(topic.name), 0)
+
+    def test_move_pending_topics_only(self):
+        topic1, topic2 = Topic(rand_string()), Topic(rand_string())
+        producer = Client(rand_int(), rand_string())
+
+        for topic in topic1, topic2:
+            self.api.add_topic(topic)
+            self.api.add_producer(producer, topic)
+
+        # No consumers yet so messages are kept in the topic and it's no longer pending after a move
+        self.api.publish_many([rand_string(), rand_string()], topic1.name, producer.id)
+        self.assertEquals(self.kvdb.smembers(self.api.impl.PENDING_TOPICS_KEY), set([topic1.name]))
+
+        self.assertEquals(self.api.impl.move_to_target_queues(), [])
+        self.assertEquals(self.kvdb.smembers(self.api.impl.PENDING_TOPICS_KEY), set())
+        self.assertEquals(self.api.get_topic_depth(topic1.name), 2)
+
+        # A new consumer makes the topic pending again ..
+        consumer = Consumer(rand_int(), rand_string(), sub_key=rand_string())
+        self.api.add_consumer(consumer, topic1)
+        self.api.add_consumer(consumer, topic2)
+        self.assertEquals(self.kvdb.smembers(self.api.impl.PENDING_TOPICS_KEY), set([topic1.name, topic2.name]))
+
+        # .. and its messages are moved to the consumer's queue, while topic2 with no messages is only looked into once.
+        result = self.api.impl.move_to_target_queues()
+        self.assertEquals(len(result), 1)
+        self.assertEquals(self.api.get_topic_depth(topic1.name), 0)
+        self.assertEquals(self.api.get_consumer_queue_current_depth(consumer.sub_key), 2)
+        self.assertEquals(self.kvdb.smembers(self.api.impl.PENDING_TOPICS_KEY), set())
+
+        # Nothing was published since the last move so there is nothing to do.
+        self.assertEquals(self.api.impl.move_to_target_queues(), [])
+
+    def test_move_overflow(self):
+        topic = Topic(rand_string())
+        self.api.add_topic(topic)
+
+        producer = Client(rand_int(), rand_string())
+        self.api.add_producer(producer, topic)
+
+        consumer1 = Consumer(rand_int(), rand_string(), sub_key=rand_string(), max_depth=2)
+        consumer2 = Consumer(rand_int(), rand_string(), sub_key=rand_string(), max_depth=5)
+
+        self.api.add_consumer(consumer1, topic)
+        self.api.add_consumer(consumer2, topic)
+
+        result = self.api.publish_many([rand_string() for _ in range(3)], topic.name, producer.id)
+        msg_ids = [msg_id for msg_id, _ in result]
+
+        moved = self.api.impl.move_to_target_queues()[0]
+        moved_queue1 = [item for item in moved if item[1] == self.api.impl.CONSUMER_MSG_IDS_PREFIX.format(consumer1.sub_key)]
+        moved_queue2 = [item for item in moved if item[1] == self.api.impl.CONSUMER_MSG_IDS_PREFIX.format(consumer2.sub_key)]
+
+        # Only two messages fit in the first queue and all of them fit in the other one
+        moved, overflow = PUB_SUB.MOVE_RESULT.MOVED, PUB_SUB.MOVE_RESULT.OVERFLOW
+
+        self.assertEquals([item[0] for item in moved_queue1], [moved, moved, overflow])
+        self.assertEquals([item[0] for item in moved_queue2], [moved, moved, moved])
+
+        self.assertEquals(self.api.get_consumer_queue_current_depth(consumer1.sub_key), 2)
+        self.assertEquals(self.api.get_consumer_queue_current_depth(consumer2.sub_key), 3)
+
+        unack_counter = self.kvdb.hgetall(self.api.impl.UNACK_COUNTER_KEY)
+        self.assertEquals(sorted(unack_counter.values()), ['1', '2', '2'])
+        self.assertEquals(sorted(unack_counter), sorted(msg_ids))
+
+    def test_pending_notification(self):
+        topic = Topic(rand_string())
+        self.api.add_topic(topic)
+
+        producer = Client(rand_int(), rand_string())
+        self.api.add_producer(producer, topic)
+
+        client = self.kvdb.pubsub()
+        client.subscribe(self.api.impl.PENDING_CHANNEL)
+        listener = client.listen()
+
+        # Confirms the subscription
+        self.assertEquals(next(listener)['type'], 'subscribe')
+
+        # Each publication lets the listener know which topic has messages to move
+        self.api.publish(rand_string(), topic.name, client_id=producer.id)
+        msg = next(listener)
+
+        self.assertEquals(msg['type'], 'message')
+        self.assertEquals(msg['data'], topic.name)
+
+        self.api.publish_many([rand_string(), rand_string()], topic.name, producer.id)
+        msg = next(listener)
+
+        self.assertEquals(msg['type'], 'message')
+        self.assertEquals(msg['data'], topic.name)
+
+        client.close()
+
+    def test_consumer_notification(self):
+        topic = Topic(rand_string())
+        self.api.add_topic(topic)
+
+        producer = Client(rand_int(), rand_string())
+        self.api.add_producer(producer, topic)
+
+        consumer = Consumer(rand_int(), rand_string(), sub_key=rand_string())
+        self.api.add_consumer(consumer, topic)
+
+        cons_queue = self.api.impl.CONSUMER_MSG_IDS_PREFIX.format(consumer.sub_key)
+
+        client = self.kvdb.pubsub()
+        client.subscribe(self.api.impl.CONSUMER_CHANNEL)
+        listener = client.listen()
+
+        # Confirms the subscription
+        self.assertEquals(next(listener)['type'], 'subscribe')
+
+        # Consumers are notified once messages are in their queues ..
+        ctx = self.api.publish(rand_string(), topic.name, client_id=producer.id)
+        self.api.impl.move_to_target_queues()
+
+        msg = next(listener)
+        self.assertEquals(msg['type'], 'message')
+        self.assertEquals(msg['data'], cons_queue)
+
+        # .. and when messages are rejected, which makes them available again.
+        self.assertEquals(len(list(self.api.get(consumer.sub_key))), 1)
+        self.api.reject(consumer.sub_key, ctx.msg.msg_id)
+
+        msg = next(listener)
+        self.assertEquals(msg['type'], 'message')
+        self.assertEquals(msg['data'], cons_queue)
+
+        client.close()
+
+    def test_get_too_many_waiters(self):
+        api = PubSubAPI(RedisPubSub(self.kvdb, self.key_prefix, max_waiters=0))
+
+        topic = Topic(rand_string())
+        api.add_topic(topic)
+
+        producer = Client(rand_int(), rand_string())
+        api.add_producer(producer, topic)
+
+        consumer = Consumer(rand_int(), rand_string(), sub_key=rand_string())
+        api.add_consumer(consumer, topic)
+
+        # There are no messages and no one else may wait for them
+        self.assertRaises(TooManyWaiters, list, api.get(consumer.sub_key, wait_seconds=1))
+
+        # Messages that are already available are returned without waiting
+        api.publish(rand_string(), topic.name, client_id=producer.id)
+        api.impl.move_to_target_queues()
+
+        self.assertEquals(len(list(api.get(consumer.sub_key, wait_seconds=1))), 1)
+
+    def test_get_max_wait(self):
+        api = PubSubAPI(RedisPubSub(self.kvdb, self.key_prefix, max_wait=0.2))
+
+        # Nothing is published so there is no need to listen for notifications
+        api.impl._ensure_listener = lambda: None
+
+        topic = Topic(rand_string())
+        api.add_topic(topic)
+
+        consumer = Consumer(rand_int(), rand_string(), sub_key=rand_string())
+        api.add_consumer(consumer, topic)
+
+        # Consumers cannot wait for longer than the server allows
+        start = time()
+        self.assertEquals(list(api.get(consumer.sub_key, wait_seconds=10)), [])
+        self.assertTrue(time() - start < 5)
+
+    def test_wait_for_messages_consumer_events(self):
+        sub_key = rand_string()
+        self.api.impl._ensure_listener = lambda: None
+
+        # Consumers waiting for the same sub_key share an event which is removed once they all stop waiting
+        waiters = [spawn(self.api.impl.wait_for_messages, sub_key, 0.2) for _ in range(3)]
+        joinall(waiters)
+
+        self.assertEquals([waiter.value for waiter in waiters], [False, False, False])
+        self.assertEquals(self.api.impl.consumer_events, {})
+        self.assertEquals(self.api.impl.consumer_event_waiters, {})
+
     def test_ping(self):
         response = self.api.impl.ping()
         self.assertIsInstance(response, bool)
@@ -533,6 +786,20 @@ class CtxObjectsTestCase(TestCase):
         self.assertEquals(ctx.topic, topic)
         self.assertEquals(ctx.msg, msg)
 
+    def test_pub_many_ctx_defaults(self):
+        ctx = PubManyCtx()
+        self.assertEquals(ctx.client_id, None)
+        self.assertEquals(ctx.topic, None)
+        self.assertEquals(ctx.msgs, [])
+
+    def test_pub_many_ctx_custom_attrs(self):
+        client_id, topic = rand_string(2)
+        msgs = rand_string(3)
+        ctx = PubManyCtx(client_id, topic, msgs)
+        self.assertEquals(ctx.client_id, client_id)
+        self.assertEquals(ctx.topic, topic)
+        self.assertEquals(ctx.msgs, msgs)
+
 # ################################################################################################################################
 
     def test_sub_ctx_defaults(self):
@@ -554,19 +821,22 @@ class CtxObjectsTestCase(TestCase):
         self.assertEquals(ctx.max_batch_size, PUB_SUB.DEFAULT_GET_MAX_BATCH_SIZE)
         self.assertEquals(ctx.is_fifo, PUB_SUB.DEFAULT_IS_FIFO)
         self.assertEquals(ctx.get_format, PUB_SUB.GET_FORMAT.OBJECT.id)
+        self.assertEquals(ctx.wait_seconds, 0)
 
     def test_get_ctx_custom_attrs(self):
         sub_key = rand_string()
         max_batch_size = rand_int()
         is_fifo = rand_bool()
         get_format = rand_string()
+        wait_seconds = rand_int()
 
-        ctx = GetCtx(sub_key, max_batch_size, is_fifo, get_format)
+        ctx = GetCtx(sub_key, max_batch_size, is_fifo, get_format, wait_seconds)
 
         self.assertEquals(ctx.sub_key, sub_key)
         self.assertEquals(ctx.max_batch_size, max_batch_size)
         self.assertEquals(ctx.is_fifo, is_fifo)
         self.assertEquals(ctx.get_format, get_format)
+        self.assertEquals(ctx.wait_seconds, wait_seconds)
 
 # ################################################################################################################################
 
@@ -282,7 +282,7 @@ class RedisPubSubInternalTestCase(RedisPubSubCommonTestCase):
 
         # Check all the Lua programs are loaded
 
-        eq_(len(ps.lua_programs), 9)
+        eq_(len(ps.lua_programs), 10)
 
         for attr in dir(ps):
             if attr.startswith('LUA'):
@@ -406,9 +406,9 @@ class RedisPubSubInternalTestCase(RedisPubSubCommonTestCase):
         msg_billing2_id = ps.publish(pub_ctx_msg_billing2).msg.msg_id
 
         keys = self.kvdb.keys('{}*'.format(self.key_prefix))
-        eq_(len(keys), 9)
+        eq_(len(keys), 10)
 
-        expected_keys = [ps.MSG_VALUES_KEY, ps.MSG_EXPIRE_AT_KEY, ps.LAST_PUB_TIME_KEY]
+        expected_keys = [ps.MSG_VALUES_KEY, ps.MSG_EXPIRE_AT_KEY, ps.LAST_PUB_TIME_KEY, ps.PENDING_TOPICS_KEY]
         for topic in topic_cust_new, topic_cust_update, topic_adsl_new, topic_adsl_update:
             expected_keys.append(ps.MSG_IDS_PREFIX.format(topic.name))
 
@@ -428,6 +428,9 @@ class RedisPubSubInternalTestCase(RedisPubSubCommonTestCase):
         keys = self.kvdb.keys('{}*'.format(self.key_prefix))
         eq_(len(keys), 9)
 
+        # Nothing is left to move so no topic is pending anymore
+        self.assertNotIn(ps.PENDING_TOPICS_KEY, keys)
+
         self.assertIn(ps.UNACK_COUNTER_KEY, keys)
         self.assertIn(ps.MSG_VALUES_KEY, keys)
 
@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (C) 2016 Dariusz Suchojad <dsuch at zato.io>
+
+Licensed under LGPLv3, see LICENSE.txt for terms and conditions.
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+# stdlib
+from unittest import TestCase
+
+# nose
+from nose.tools import eq_
+
+# SQLAlchemy
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+# Zato
+from zato.common import BATCH_DEFAULTS, SORT_ORDER
+from zato.common.odb.model import Base, Cluster, HTTPBasicAuth
+from zato.common.odb.query import basic_auth_list, search, SearchResults
+
+# ################################################################################################################################
+
+class SearchResultsTestCase(TestCase):
+
+    def test_first_batch(self):
+        results = SearchResults(list(range(10)), 25, 1, 10)
+
+        eq_(len(results), 10)
+        eq_(list(results), list(range(10)))
+        eq_(results.to_dict(), {
+            'total_results': 25,
+            'num_batches': 3,
+            'current_batch': 1,
+            'batch_size': 10,
+            'has_previous': False,
+            'has_next': True,
+            'previous_batch_number': None,
+            'next_batch_number': 2,
+        })
+
+    def test_last_batch(self):
+        results = SearchResults(list(range(5)), 25, 3, 10)
+
+        eq_(results.num_batches, 3)
+        eq_(results.has_previous, True)
+        eq_(results.has_next, False)
+        eq_(results.previous_batch_number, 2)
+        eq_(results.next_batch_number, None)
+
+    def test_no_results(self):
+        results = SearchResults([], 0, 1, 10)
+
+        eq_(results.num_batches, 1)
+        eq_(results.has_previous, False)
+        eq_(results.has_next, False)
+
+# ################################################################################################################################
+
+class SearchTestCase(TestCase):
+
+    def setUp(self):
+        engine = create_engine('sqlite://')
+        Base.metadata.create_all(engine)
+
+        self.session = sessionmaker(bind=engine)()
+
+        self.cluster = Cluster(None, 'my.cluster', '', 'sqlite', broker_host='localhost', broker_port=6379,
+            lb_host='localhost', lb_port=11223, lb_agent_port=20151)
+        self.session.add(self.cluster)
+
+        for idx in range(25):
+            name = 'sec.{:02}.{}'.format(idx, 'odd' if idx % 2 else 'even')
+            self.session.add(HTTPBasicAuth(None, name, True, 'user.{}'.format(idx), 'realm', 'password', self.cluster))
+
+        self.session.add(HTTPBasicAuth(None, 'sec.100%', True, 'user.100', 'realm', 'password', self.cluster))
+        self.session.commit()
+
+    def tearDown(self):
+        self.session.close()
+
+    def get_query(self):
+        return self.session.query(HTTPBasicAuth.id, HTTPBasicAuth.name, HTTPBasicAuth.username).\
+            filter(HTTPBasicAuth.cluster_id==self.cluster.id).\
+            order_by(HTTPBasicAuth.name)
+
+    def get_names(self, result):
+        return [item.name for item in result]
+
+    def test_batches(self):
+        q = self.get_query()
+
+        result = search(q, 1, 10)
+        eq_(result.total, 26)
+        eq_(result.num_batches, 3)
+        eq_(self.get_names(result), ['sec.{:02}.{}'.format(idx, 'odd' if idx % 2 else 'even') for idx in range(10)])
+
+        result = search(q, 3, 10)
+        eq_(len(result), 6)
+        eq_(result.has_next, False)
+        eq_(self.get_names(result)[-1], 'sec.24.even')
+
+    def test_defaults(self):
+        q = self.get_query()
+
+        result = search(q, None, None)
+        eq_(result.current_batch, BATCH_DEFAULTS.PAGE_NO)
+        eq_(result.batch_size, BATCH_DEFAULTS.SIZE)
+
+        result = search(q, 1, BATCH_DEFAULTS.MAX_SIZE + 1)
+        eq_(result.batch_size, BATCH_DEFAULTS.MAX_SIZE)
+
+    def test_query(self):
+        q = self.get_query()
+
+        result = search(q, 1, 50, query='ODD 1')
+        eq_(self.get_names(result), ['sec.01.odd', 'sec.11.odd', 'sec.13.odd', 'sec.15.odd', 'sec.17.odd', 'sec.19.odd',
+            'sec.21.odd'])
+        eq_(result.total, 7)
+
+        # LIKE wildcards are matched literally
+        eq_(self.get_names(search(q, 1, 50, query='%')), ['sec.100%'])
+
+    def test_sort(self):
+        q = self.get_query()
+
+        result = search(q, 1, 2, sort_by='username', sort_order=SORT_ORDER.DESC)
+        eq_([item.username for item in result], ['user.9', 'user.8'])
+
+    def test_unknown_column(self):
+        q = self.get_query()
+
+        self.assertRaises(ValueError, search, q, 1, 10, sort_by='no_such_column')
+        self.assertRaises(ValueError, search, q, 1, 10, query='abc', query_column='no_such_column')
+
+    def test_needs_columns(self):
+        result, columns = basic_auth_list(self.session, self.cluster.id, True, search={'current_batch':2, 'batch_size':5})
+
+        eq_(isinstance(result, SearchResults), True)
+        eq_(result.current_batch, 2)
+        eq_(len(result), 5)
+        eq_('name' in columns, True)
+
+        # No search parameters means all of the rows, as previously
+        eq_(len(basic_auth_list(self.session, self.cluster.id, False)), 26)
@@ -10,7 +10,7 @@ from __future__ import absolute_import, division, print_function, unicode_litera
 
 # stdlib
 from datetime import datetime, timedelta
-from random import choice, seed
+from random import seed
 from unittest import TestCase
 
 # crontab
@@ -63,6 +63,14 @@ def iter_cb(scheduler, stop_time):
     if datetime.utcnow() >= stop_time:
         scheduler.keep_running = False
 
+def run_scheduler(scheduler, wait_time):
+    """ Runs the scheduler's dispatcher for wait_time seconds. The dispatcher sleeps until the next job is due,
+    possibly for longer than a test takes, so it's stopped from the outside rather than by iter_cb.
+    """
+    dispatcher = spawn(scheduler.run)
+    sleep(wait_time)
+    dispatcher.kill()
+
 class IntervalTestCase(TestCase):
 
     def test_interval_has_in_seconds(self):
@@ -88,47 +96,6 @@ class IntervalTestCase(TestCase):
 
 class JobTestCase(TestCase):
 
-    def setUp(self):
-
-        class _datetime(datetime):
-
-            class datetime:
-                @staticmethod
-                def utcnow():
-                    return self.now
-
-            @staticmethod
-            def timedelta(*args, **kwargs):
-                return timedelta(*args, **kwargs)
-
-        self._datetime = _datetime
-
-    def check_ctx(self, ctx, job, interval_in_seconds, max_repeats, idx, cb_kwargs,
-            len_runs_ctx, job_type=SCHEDULER.JOB_TYPE.INTERVAL_BASED):
-
-        self.assertEquals(ctx['name'], job.name)
-        self.assertEquals(ctx['max_repeats'], job.max_repeats)
-        self.assertDictEqual(ctx['cb_kwargs'], job.cb_kwargs)
-
-        if job_type == SCHEDULER.JOB_TYPE.INTERVAL_BASED:
-            self.assertEquals(ctx['interval_in_seconds'], interval_in_seconds)
-        else:
-            self.assertEquals(ctx['cron_definition'], DEFAULT_CRON_DEFINITION)
-
-        self.assertEquals(ctx['max_repeats'], max_repeats)
-        self.assertEquals(ctx['current_run'], idx)
-        self.assertDictEqual(ctx['cb_kwargs'], cb_kwargs)
-
-        func = self.assertFalse if idx < len_runs_ctx else self.assertTrue
-        func(ctx['max_repeats_reached'])
-
-        # Don't check an exact time. Simply parse it out and confirm it's in the past.
-        start_time = parse(ctx['start_time'])
-        now = datetime.utcnow()
-        self.assertTrue(start_time < now, 'start_time:`{}` is not less than now:`{}`'.format(start_time, now))
-
-        self.assertTrue(is_like_cid(ctx['cid']))
-
     def test_clone(self):
 
         interval = Interval(seconds=5)
@@ -204,144 +171,6 @@ class JobTestCase(TestCase):
 
             self.assertDictEqual(ctx, expected)
 
-    def test_main_loop_keep_running_false(self):
-
-        job = get_job()
-        job.keep_running = False
-
-        self.assertTrue(job.main_loop())
-        self.assertFalse(job.keep_running)
-        self.assertFalse(job.max_repeats_reached)
-
-        self.assertEquals(job.current_run, 0)
-
-    def test_main_loop_max_repeats_reached(self):
-
-        runs_ctx = []
-
-        def callback(ctx):
-            runs_ctx.append(ctx)
-
-        cb_kwargs = {
-            rand_string():rand_string(),
-            rand_string():rand_string()
-        }
-
-        interval_in_seconds = 0.01
-        max_repeats = choice(range(2, 5))
-
-        job = get_job(interval_in_seconds=interval_in_seconds, max_repeats=max_repeats)
-        job.callback = callback
-        job.cb_kwargs = cb_kwargs
-
-        self.assertTrue(job.main_loop())
-        sleep(0.2)
-
-        len_runs_ctx = len(runs_ctx)
-        self.assertEquals(len_runs_ctx, max_repeats)
-
-        self.assertFalse(job.keep_running)
-        self.assertIs(job.callback, callback)
-
-        for idx, ctx in enumerate(runs_ctx, 1):
-            self.check_ctx(ctx, job, interval_in_seconds, max_repeats, idx, cb_kwargs, len_runs_ctx)
-
-    def test_main_loop_sleep_spawn_called(self):
-
-        wait_time = 0.2
-        sleep_time = rand_int()
-
-        now_values = [parse('2019-12-23 22:19:03'), parse('2021-05-13 17:35:48')]
-
-        sleep_history = []
-        spawn_history = []
-        sleep_time_history = []
-
-        def sleep(value):
-            if value != wait_time:
-                sleep_history.append(value)
-
-        def spawn(*args, **kwargs):
-            spawn_history.append([args, kwargs])
-
-        def get_sleep_time(*args, **kwargs):
-            sleep_time_history.append(args[1])
-            return sleep_time
-
-        with patch('gevent.sleep', sleep):
-            with patch('gevent.spawn', spawn):
-                with patch('zato.common.scheduler.Job.get_sleep_time', get_sleep_time):
-                    for now in now_values:
-                        self.now = now
-                        with patch('zato.common.scheduler.datetime', self._datetime):
-                            for job_type in SCHEDULER.JOB_TYPE.CRON_STYLE, SCHEDULER.JOB_TYPE.INTERVAL_BASED:
-
-                                max_repeats = choice(range(2, 5))
-
-                                cb_kwargs = {
-                                    rand_string():rand_string(),
-                                    rand_string():rand_string()
-                                }
-
-                                interval = Interval(seconds=sleep_time) if job_type == SCHEDULER.JOB_TYPE.INTERVAL_BASED \
-                                    else CronTab(DEFAULT_CRON_DEFINITION)
-
-                                job = Job(rand_int(), rand_string(), job_type, interval, max_repeats=max_repeats)
-
-                                if job.type == SCHEDULER.JOB_TYPE.CRON_STYLE:
-                                    job.cron_definition = DEFAULT_CRON_DEFINITION
-
-                                job.cb_kwargs = cb_kwargs
-                                job.start_time = datetime.utcnow()
-                                job.callback = dummy_callback
-
-                                self.assertTrue(job.main_loop())
-                                sleep(0.2)
-
-                                self.assertEquals(max_repeats, len(sleep_history))
-                                self.assertEquals(max_repeats, len(spawn_history))
-
-                                for item in sleep_history:
-                                    self.assertEquals(sleep_time, item)
-
-                                for idx, (callback, ctx_dict) in enumerate(spawn_history, 1):
-                                    self.assertEquals(1, len(callback))
-                                    callback = callback[0]
-                                    self.check_ctx(
-                                        ctx_dict['ctx'], job, sleep_time, max_repeats, idx, cb_kwargs, len(spawn_history), job_type)
-                                    self.assertIs(callback, dummy_callback)
-
-                                del sleep_history[:]
-                                del spawn_history[:]
-
-                            for item in sleep_time_history:
-                                self.assertEquals(item, now)
-
-                            del sleep_time_history[:]
-
-    def test_run(self):
-
-        data = {'main_loop_called':False, 'sleep': False}
-
-        def main_loop():
-            data['main_loop_called'] = True
-
-        def sleep(value):
-            data['sleep'] = value # Should not be executed if start_time is None
-
-        start_time = datetime.utcnow() + timedelta(seconds=1.2)
-
-        with patch('gevent.sleep', sleep):
-
-            job = get_job()
-            job.main_loop = main_loop
-            job.start_time = start_time
-
-            job.run()
-
-            self.assertTrue(data['main_loop_called'])
-            self.assertEquals(data['sleep'], 1)
-
     def test_hash_eq(self):
         job1 = get_job(name='a')
         job2 = get_job(name='a')
@@ -364,6 +193,29 @@ class JobTestCase(TestCase):
         job2 = Job(2, 'b', SCHEDULER.JOB_TYPE.CRON_STYLE, CronTab(DEFAULT_CRON_DEFINITION), now)
         self.assertEquals(job2.get_sleep_time(now), 22.726)
 
+    def test_get_next_run_time(self):
+        now = parse('2015-11-27 19:13:37.274')
+        run_time = parse('2015-11-27 19:13:37')
+
+        # Interval-based jobs keep to their original schedule ..
+        job1 = Job(1, 'a', SCHEDULER.JOB_TYPE.INTERVAL_BASED, Interval(seconds=5), now, clone_start_time=True)
+        self.assertEquals(job1.get_next_run_time(run_time, now), parse('2015-11-27 19:13:42'))
+
+        # .. skipping any runs that could not take place on time.
+        self.assertEquals(job1.get_next_run_time(run_time, parse('2015-11-27 19:13:52.1')), parse('2015-11-27 19:13:57'))
+        self.assertEquals(job1.get_next_run_time(run_time, parse('2015-11-27 19:13:57')), parse('2015-11-27 19:14:02'))
+
+        # Cron-style jobs run when their definition says so
+        job2 = Job(2, 'b', SCHEDULER.JOB_TYPE.CRON_STYLE, CronTab(DEFAULT_CRON_DEFINITION), now, clone_start_time=True)
+        self.assertEquals(job2.get_next_run_time(run_time, now), parse('2015-11-27 19:14:00'))
+
+        # One-time jobs and the ones that are not to run anymore have no next run
+        job3 = Job(3, 'c', SCHEDULER.JOB_TYPE.ONE_TIME, Interval(seconds=5), now, clone_start_time=True)
+        self.assertIs(job3.get_next_run_time(run_time, now), None)
+
+        job1.keep_running = False
+        self.assertIs(job1.get_next_run_time(run_time, now), None)
+
 class JobStartTimeTestCase(TestCase):
     def setUp(self):
 
@@ -387,39 +239,17 @@ class JobStartTimeTestCase(TestCase):
         expected = parse(expected)
 
         interval = 1 # Days
-        data = {'start_time':[], 'now':[]}
-
-        def wait_iter_cb(start_time, now, *ignored):
-            data['start_time'].append(start_time)
-            data['now'].append(now)
 
         with patch('zato.common.scheduler.datetime', self._datetime):
 
             interval = Interval(days=interval)
             job = Job(rand_int(), rand_string(), SCHEDULER.JOB_TYPE.INTERVAL_BASED, start_time=start_time, interval=interval)
-            job.wait_iter_cb = wait_iter_cb
-            job.wait_sleep_time = 0.1
 
             self.assertEquals(job.start_time, expected)
             self.assertTrue(job.keep_running)
             self.assertFalse(job.max_repeats_reached)
             self.assertIs(job.max_repeats_reached_at, None)
 
-            spawn(job.run)
-            sleep(0.2)
-
-            len_start_time = len(data['start_time'])
-            len_now = len(data['now'])
-
-            self.assertNotEquals(len_start_time, 0)
-            self.assertNotEquals(len_now, 0)
-
-            for item in data['start_time']:
-                self.assertEquals(expected, item)
-
-            for item in data['now']:
-                self.assertEquals(self.now, item)
-
     def test_get_start_time_result_in_future(self):
         self.check_get_start_time('2017-03-20 19:11:37', '2017-03-21 15:11:37', '2017-03-21 19:11:37')
 
@@ -445,95 +275,75 @@ class SchedulerTestCase(TestCase):
 
     def test_create(self):
 
-        data = {'spawned_jobs': 0}
-
         def on_job_executed(*ignored):
             pass
 
-        def job_run(*ignored):
-            pass
-
-        def spawn(func):
-            self.assertIs(func, job_run)
-            data['spawned_jobs'] += 1
-
         scheduler = Scheduler(dummy_callback)
         scheduler.on_job_executed = on_job_executed
         scheduler.lock = RLock()
 
         job1 = get_job()
-        job1.run = job_run
-
         job2 = get_job()
-        job2.run = job_run
-
         job3 = get_job(name=job2.name)
-        job3.run = job_run
-
         job4 = get_job()
         job5 = get_job()
 
         job6 = get_job()
         job6.is_active = False
 
-        with patch('gevent.spawn', spawn):
-            scheduler.create(job1)
-            scheduler.create(job2)
+        scheduler.create(job1)
+        scheduler.create(job2)
+
+        # These two won't be added because scheduler.jobs is a set hashed by a job's name
+        # but job3 will replace job2 as the one scheduled to run.
+        scheduler.create(job2)
+        scheduler.create(job3)
 
-            # These two won't be added because scheduler.jobs is a set hashed by a job's name.
-            scheduler.create(job2)
-            scheduler.create(job3)
+        # The first one won't be scheduled but the second one will.
+        scheduler.create(job4, spawn=False)
+        scheduler.create(job5, spawn=True)
 
-            # The first one won't be spawned but the second one will.
-            scheduler.create(job4, spawn=False)
-            scheduler.create(job5, spawn=True)
+        # Won't be scheduled because it's inactive.
+        scheduler.create(job6)
 
-            # Won't be added anywhere nor spawned because it's inactive.
-            scheduler.create(job6)
+        self.assertEquals(scheduler.lock.called, 7)
+        self.assertEquals(len(scheduler.jobs), 5)
 
-            self.assertEquals(scheduler.lock.called, 7)
-            self.assertEquals(len(scheduler.jobs), 5)
+        self.assertIn(job1, scheduler.jobs)
+        self.assertIn(job2, scheduler.jobs)
 
-            self.assertIn(job1, scheduler.jobs)
-            self.assertIn(job2, scheduler.jobs)
+        self.assertIs(job1.callback, scheduler.on_job_executed)
+        self.assertIs(job2.callback, scheduler.on_job_executed)
 
-            self.assertIs(job1.callback, scheduler.on_job_executed)
-            self.assertIs(job2.callback, scheduler.on_job_executed)
+        self.assertEquals(sorted(scheduler.scheduled_jobs), sorted([job1.name, job2.name, job5.name]))
+        self.assertIs(scheduler.scheduled_jobs[job2.name], job3)
 
-            self.assertEquals(data['spawned_jobs'], 4)
+        # Each job created with spawn=True has been added to the heap once, including job2 replaced since
+        self.assertEquals(len(scheduler.heap), 4)
+        self.assertEquals(scheduler._stale, 1)
 
     def test_run(self):
 
         test_wait_time = 0.3
-        sched_sleep_time = 0.1
 
         data = {'sleep': [], 'jobs':set()}
 
         def _sleep(value):
             data['sleep'].append(value)
 
-        def spawn_job(job):
+        def schedule_job(job):
             data['jobs'].add(job)
 
-        def job_run(self):
-            pass
-
         job1, job2, job3 = [get_job(str(x)) for x in range(3)]
 
         # Already run out of max_repeats and should not be started
         job4 = Job(rand_int(), rand_string(), SCHEDULER.JOB_TYPE.INTERVAL_BASED, start_time=parse('1997-12-23 21:24:27'),
             interval=Interval(seconds=5), max_repeats=3)
 
-        job1.run = job_run
-        job2.run = job_run
-        job3.run = job_run
-        job4.run = job_run
-
         scheduler = Scheduler(dummy_callback)
-        scheduler.spawn_job = spawn_job
+        scheduler.schedule_job = schedule_job
         scheduler.lock = RLock()
         scheduler.sleep = _sleep
-        scheduler.sleep_time = sched_sleep_time
         scheduler.iter_cb = iter_cb
         scheduler.iter_cb_args = (scheduler, datetime.utcnow() + timedelta(seconds=test_wait_time))
 
@@ -547,24 +357,66 @@ class SchedulerTestCase(TestCase):
         self.assertEquals(3, len(data['jobs']))
         self.assertTrue(scheduler.lock.called)
 
+        # There are no jobs to run so the dispatcher sleeps until it's woken up
         for item in data['sleep']:
-            self.assertEquals(sched_sleep_time, item)
+            self.assertIs(item, None)
 
         for job in job1, job2, job3:
             self.assertIn(job, data['jobs'])
 
         self.assertNotIn(job4, data['jobs'])
 
+    def test_run_sleep_until_due(self):
+
+        data = {'sleep': []}
+        start_time = datetime.utcnow() + timedelta(seconds=30)
+
+        scheduler = Scheduler(dummy_callback)
+
+        def _sleep(value):
+            data['sleep'].append(value)
+            scheduler.keep_running = False
+
+        scheduler.sleep = _sleep
+        scheduler.create(get_job(start_time=start_time))
+        scheduler.run()
+
+        # The dispatcher doesn't wake up until the job is due
+        self.assertEquals(len(data['sleep']), 1)
+        self.assertTrue(29 < data['sleep'][0] <= 30)
+
+    def test_wakeup(self):
+
+        data = {'ctx': []}
+
+        def callback(ctx):
+            data['ctx'].append(ctx)
+
+        scheduler = Scheduler(callback)
+        dispatcher = spawn(scheduler.run)
+        sleep(0.1)
+
+        # There are no jobs yet so the dispatcher waits until a job is scheduled ..
+        scheduler.create(get_job('a', 30, datetime.utcnow() + timedelta(seconds=0.05)))
+        sleep(0.1)
+
+        self.assertEquals([ctx['name'] for ctx in data['ctx']], ['a'])
+
+        # .. and until the scheduler is stopped.
+        scheduler.stop()
+        sleep(0.1)
+
+        self.assertFalse(scheduler.keep_running)
+        self.assertTrue(dispatcher.dead)
+
     def test_on_max_repeats_reached(self):
 
         test_wait_time = 0.5
-        job_sleep_time = 0.02
         job_max_repeats = 3
 
         data = {'job':None, 'called':0}
 
         job = Job(rand_int(), 'a', SCHEDULER.JOB_TYPE.INTERVAL_BASED, Interval(seconds=0.1), max_repeats=job_max_repeats)
-        job.wait_sleep_time = job_sleep_time
 
         # Just to make sure it's inactive by default.
         self.assertTrue(job.is_active)
@@ -578,11 +430,9 @@ class SchedulerTestCase(TestCase):
             data['old_on_max_repeats_reached'](job)
 
         scheduler.on_max_repeats_reached = on_max_repeats_reached
-        scheduler.iter_cb = iter_cb
-        scheduler.iter_cb_args = (scheduler, datetime.utcnow() + timedelta(seconds=test_wait_time))
 
         scheduler.create(job)
-        scheduler.run()
+        run_scheduler(scheduler, test_wait_time)
 
         now = datetime.utcnow()
 
@@ -599,23 +449,20 @@ class SchedulerTestCase(TestCase):
 
     def test_delete(self):
         test_wait_time = 0.5
-        job_sleep_time = 10
         job_max_repeats = 30
 
-        job1 = Job(rand_int(), 'a', SCHEDULER.JOB_TYPE.INTERVAL_BASED, Interval(seconds=0.1), max_repeats=job_max_repeats)
-        job1.wait_sleep_time = job_sleep_time
+        # Neither of the jobs is due to run during the test
+        start_time = datetime.utcnow() + timedelta(seconds=10)
 
-        job2 = Job(rand_int(), 'b', SCHEDULER.JOB_TYPE.INTERVAL_BASED, Interval(seconds=0.1), max_repeats=job_max_repeats)
-        job2.wait_sleep_time = job_sleep_time
+        job1 = Job(rand_int(), 'a', SCHEDULER.JOB_TYPE.INTERVAL_BASED, Interval(seconds=0.1), start_time, max_repeats=job_max_repeats)
+        job2 = Job(rand_int(), 'b', SCHEDULER.JOB_TYPE.INTERVAL_BASED, Interval(seconds=0.1), start_time, max_repeats=job_max_repeats)
 
         scheduler = Scheduler(dummy_callback)
         scheduler.lock = RLock()
-        scheduler.iter_cb = iter_cb
-        scheduler.iter_cb_args = (scheduler, datetime.utcnow() + timedelta(seconds=test_wait_time))
 
         scheduler.create(job1)
         scheduler.create(job2)
-        scheduler.run()
+        run_scheduler(scheduler, test_wait_time)
 
         scheduler.unschedule(job1)
 
@@ -626,66 +473,49 @@ class SchedulerTestCase(TestCase):
         # run - 1
         # create - 2
         # delete - 1
-        # on_max_repeats_reached - 0 (because of how long it takes to run job_max_repeats with test_wait_time)
+        # on_max_repeats_reached - 0 (because the jobs never run within test_wait_time)
         # 1+2+1 = 4
         self.assertEquals(scheduler.lock.called, 4)
 
-    def test_job_greenlets(self):
-
-        data = {'spawned':[], 'stopped': []}
-
-        class FakeGreenlet(object):
-            def __init__(self, run):
-                self.run = self._run = run
-
-            def kill(self, *args, **kwargs):
-                data['stopped'].append([self, args, kwargs])
+    def test_scheduled_jobs(self):
 
-        def spawn(job):
-            g = FakeGreenlet(job)
-            data['spawned'].append(g)
-            return g
-
-        with patch('gevent.spawn', spawn):
-
-            test_wait_time = 0.5
-            job_sleep_time = 10
-            job_max_repeats = 30
+        test_wait_time = 0.5
+        job_max_repeats = 30
+        start_time = datetime.utcnow() + timedelta(seconds=10)
 
-            job1 = Job(rand_int(), 'a', SCHEDULER.JOB_TYPE.INTERVAL_BASED, Interval(seconds=0.1), max_repeats=job_max_repeats)
-            job1.wait_sleep_time = job_sleep_time
+        job1 = Job(rand_int(), 'a', SCHEDULER.JOB_TYPE.INTERVAL_BASED, Interval(seconds=0.1), start_time, max_repeats=job_max_repeats)
+        job2 = Job(rand_int(), 'b', SCHEDULER.JOB_TYPE.INTERVAL_BASED, Interval(seconds=0.1), start_time, max_repeats=job_max_repeats)
 
-            job2 = Job(rand_int(), 'b', SCHEDULER.JOB_TYPE.INTERVAL_BASED, Interval(seconds=0.1), max_repeats=job_max_repeats)
-            job2.wait_sleep_time = job_sleep_time
+        scheduler = Scheduler(dummy_callback)
+        scheduler.lock = RLock()
 
-            scheduler = Scheduler(dummy_callback)
-            scheduler.lock = RLock()
-            scheduler.iter_cb = iter_cb
-            scheduler.iter_cb_args = (scheduler, datetime.utcnow() + timedelta(seconds=test_wait_time))
+        scheduler.create(job1, spawn=False)
+        scheduler.create(job2, spawn=False)
+        run_scheduler(scheduler, test_wait_time)
 
-            scheduler.create(job1, spawn=False)
-            scheduler.create(job2, spawn=False)
-            scheduler.run()
+        self.assertIs(scheduler.scheduled_jobs[job1.name], job1)
+        self.assertIs(scheduler.scheduled_jobs[job2.name], job2)
+        self.assertEquals(sorted(elem[2].name for elem in scheduler.heap), ['a', 'b'])
 
-            self.assertEquals(scheduler.job_greenlets[job1.name]._run, job1.run)
-            self.assertEquals(scheduler.job_greenlets[job2.name]._run, job2.run)
+        self.assertTrue(job1.keep_running)
+        self.assertTrue(job2.keep_running)
 
-            self.assertTrue(job1.keep_running)
-            self.assertTrue(job2.keep_running)
+        scheduler.unschedule(job1)
 
-            scheduler.unschedule(job1)
+        self.assertFalse(job1.keep_running)
+        self.assertTrue(job2.keep_running)
 
-            self.assertFalse(job1.keep_running)
-            self.assertTrue(job2.keep_running)
+        self.assertNotIn(job1.name, scheduler.scheduled_jobs)
+        self.assertIs(scheduler.scheduled_jobs[job2.name], job2)
 
-            self.assertNotIn(job1.name, scheduler.job_greenlets)
-            self.assertEquals(scheduler.job_greenlets[job2.name]._run, job2.run)
+        # job1 is still in the heap but it will be skipped once due
+        self.assertEquals(len(scheduler.heap), 2)
+        self.assertEquals(scheduler._stale, 1)
 
-            self.assertEquals(len(data['stopped']), 1)
-            g, args, kwargs = data['stopped'][0]
-            self.assertIs(g.run.im_func, job1.run.im_func) # That's how we know it was job1 deleted not job2
-            self.assertIs(args, ())
-            self.assertDictEqual(kwargs, {'timeout':2.0})
+        batch = scheduler.get_due(start_time)
+        self.assertEquals([ctx['name'] for callback, ctx in batch], ['b'])
+        self.assertEquals(scheduler._stale, 0)
+        self.assertEquals([elem[2].name for elem in scheduler.heap], ['b'])
 
     def test_edit(self):
 
@@ -698,24 +528,20 @@ class SchedulerTestCase(TestCase):
         start_time = datetime.utcnow()
         test_wait_time = 0.5
         job_interval1, job_interval2 = 2, 3
-        job_sleep_time = 10
         job_max_repeats1, job_max_repeats2 = 20, 30
 
         scheduler = Scheduler(dummy_callback)
         scheduler.lock = RLock()
-        scheduler.iter_cb = iter_cb
-        scheduler.iter_cb_args = (scheduler, datetime.utcnow() + timedelta(seconds=test_wait_time))
 
         def check(scheduler, job, label):
-            self.assertIn(job.name, scheduler.job_greenlets)
+            self.assertIn(job.name, scheduler.scheduled_jobs)
             self.assertIn(job, scheduler.jobs)
 
-            self.assertEquals(1, len(scheduler.job_greenlets))
+            self.assertEquals(1, len(scheduler.scheduled_jobs))
             self.assertEquals(1, len(scheduler.jobs))
 
-            self.assertIs(job.run.im_func, scheduler.job_greenlets.values()[0]._run.im_func)
-
             clone = list(scheduler.jobs)[0]
+            self.assertIs(clone, scheduler.scheduled_jobs[job.name])
 
             for name in 'name', 'interval', 'cb_kwargs', 'max_repeats', 'is_active':
                 expected = getattr(job, name)
@@ -741,14 +567,12 @@ class SchedulerTestCase(TestCase):
         job1 = Job(rand_int(), 'a', SCHEDULER.JOB_TYPE.INTERVAL_BASED, Interval(seconds=job_interval1), start_time, max_repeats=job_max_repeats1)
         job1.callback = callback
         job1.on_max_repeats_reached_cb = on_max_repeats_reached_cb
-        job1.wait_sleep_time = job_sleep_time
 
         job2 = Job(rand_int(), 'a', SCHEDULER.JOB_TYPE.INTERVAL_BASED, Interval(seconds=job_interval2), start_time, max_repeats=job_max_repeats2)
         job2.callback = callback
         job2.on_max_repeats_reached_cb = on_max_repeats_reached_cb
-        job2.wait_sleep_time = job_sleep_time
 
-        scheduler.run()
+        run_scheduler(scheduler, test_wait_time)
         scheduler.create(job1)
 
         sleep(test_wait_time)
@@ -775,11 +599,9 @@ class SchedulerTestCase(TestCase):
             data['runs'].append(ctx)
 
         test_wait_time = 0.5
-        job_sleep_time = 0.1
         job_max_repeats = 10
 
         job = Job(rand_int(), 'a', SCHEDULER.JOB_TYPE.INTERVAL_BASED, Interval(seconds=0.1), max_repeats=job_max_repeats)
-        job.wait_sleep_time = job_sleep_time
         job.get_context = get_context
 
         scheduler = Scheduler(dummy_callback)
@@ -795,3 +617,77 @@ class SchedulerTestCase(TestCase):
 
         for idx, item in enumerate(data['runs']):
             self.assertEquals(data['ctx'][idx], item)
+
+    def test_get_due(self):
+
+        now = datetime.utcnow()
+        start_time = now + timedelta(seconds=10)
+
+        scheduler = Scheduler(dummy_callback)
+
+        # Three jobs are due at the same time, the last one later
+        jobs = [get_job(str(idx), 5, start_time, max_repeats=2) for idx in range(3)]
+        jobs.append(get_job('3', 5, start_time + timedelta(seconds=1)))
+
+        for job in jobs:
+            scheduler.create(job)
+
+        self.assertEquals(scheduler.get_due(now), [])
+
+        batch = scheduler.get_due(start_time)
+        self.assertEquals([ctx['name'] for callback, ctx in batch], ['0', '1', '2'])
+        self.assertEquals([ctx['current_run'] for callback, ctx in batch], [1, 1, 1])
+
+        for callback, ctx in batch:
+            self.assertEquals(callback, scheduler.on_job_executed)
+
+        # All of them have their next runs scheduled already
+        self.assertEquals(sorted(elem[0] for elem in scheduler.heap),
+            [start_time + timedelta(seconds=1)] + [start_time + timedelta(seconds=5)] * 3)
+
+        # Having reached max_repeats, the first three ones are not scheduled anymore
+        batch = scheduler.get_due(start_time + timedelta(seconds=5))
+        self.assertEquals(sorted(ctx['name'] for callback, ctx in batch), ['0', '1', '2', '3'])
+
+        self.assertEquals(sorted(scheduler.scheduled_jobs), ['3'])
+        self.assertEquals([elem[0] for elem in scheduler.heap], [start_time + timedelta(seconds=6)])
+
+        for job in jobs[:3]:
+            self.assertTrue(job.max_repeats_reached)
+            self.assertFalse(job.is_active)
+
+    def test_execute_batch(self):
+
+        data = []
+
+        def callback(ctx):
+            data.append(ctx)
+            if ctx == 2:
+                raise Exception('Should not stop other callbacks')
+
+        scheduler = Scheduler(dummy_callback)
+        scheduler.execute_batch([(callback, 1), (callback, 2), (callback, 3)])
+
+        self.assertEquals(data, [1, 2, 3])
+
+    def test_execute_batch_jobs_executed_cb(self):
+
+        data = []
+        batches = []
+
+        def callback(ctx):
+            data.append(ctx)
+
+        def on_jobs_executed_cb(ctx_list):
+            batches.append(ctx_list)
+
+        scheduler = Scheduler(dummy_callback, on_jobs_executed_cb)
+
+        ctx1 = {'name': 'a', 'type': SCHEDULER.JOB_TYPE.INTERVAL_BASED}
+        ctx2 = {'name': 'b', 'type': SCHEDULER.JOB_TYPE.CRON_STYLE}
+
+        # Only jobs using the scheduler's own callback are batched
+        scheduler.execute_batch([(scheduler.on_job_executed, ctx1), (callback, 1), (scheduler.on_job_executed, ctx2)])
+
+        self.assertEquals(batches, [[ctx1, ctx2]])
+        self.assertEquals(data, [1])
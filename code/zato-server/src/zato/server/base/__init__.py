@@ -12,9 +12,12 @@ from __future__ import absolute_import, division, print_function, unicode_litera
 import logging
 from traceback import format_exc
 
+# Bunch
+from bunch import Bunch
+
 # Zato
 from zato.common import ZATO_NONE
-from zato.common.broker_message import code_to_name
+from zato.common.broker_message import BATCH, code_to_name
 from zato.common.util import new_cid
 
 logger = logging.getLogger(__name__)
@@ -41,7 +44,13 @@ class BrokerMessageReceiver(object):
             if logger.isEnabledFor(logging.DEBUG):
                 logger.debug('Got message [{!r}]'.format(msg))
 
-            if self.filter(msg):
+            # A batch of messages, e.g. all of the objects of a given type created by enmasse, is handled one message
+            # at a time, in the order the messages were published in.
+            if msg['action'] == BATCH.MESSAGES.value:
+                for item in msg['msg_list']:
+                    self.on_broker_msg(Bunch(item))
+
+            elif self.filter(msg):
                 action = code_to_name[msg['action']]
                 handler = 'on_broker_msg_{0}'.format(action)
                 getattr(self, handler)(msg)
@@ -46,9 +46,9 @@ from tzlocal import get_localzone
 # Zato
 from zato.broker.client import BrokerClient
 from zato.bunch import Bunch
-from zato.common import ACCESS_LOG_DT_FORMAT, KVDB, MISC, SERVER_JOIN_STATUS, SERVER_UP_STATUS,\
-     ZATO_ODB_POOL_NAME
-from zato.common.broker_message import AMQP_CONNECTOR, code_to_name, HOT_DEPLOY, JMS_WMQ_CONNECTOR, MESSAGE_TYPE, TOPICS, \
+from zato.common import ACCESS_LOG_DT_FORMAT, BROKER, CONFIG_SNAPSHOT, KVDB, MISC, PUB_SUB, SERVER_JOIN_STATUS, \
+     SERVER_UP_STATUS, ZATO_ODB_POOL_NAME
+from zato.common.broker_message import AMQP_CONNECTOR, BATCH, code_to_name, HOT_DEPLOY, JMS_WMQ_CONNECTOR, MESSAGE_TYPE, TOPICS, \
      ZMQ_CONNECTOR
 from zato.common.pubsub import PubSubAPI, RedisPubSub
 from zato.common.time_util import TimeUtil
@@ -56,9 +56,10 @@ from zato.common.util import add_startup_jobs, get_kvdb_config_for_log, hot_depl
      invoke_startup_services as _invoke_startup_services, new_cid, StaticConfig, register_diag_handlers
 from zato.server.base import BrokerMessageReceiver
 from zato.server.base.worker import WorkerStore
-from zato.server.config import ConfigDict, ConfigStore
+from zato.server.config import ConfigDict, ConfigSnapshot, ConfigStore
 from zato.server.connection.amqp.channel import start_connector as amqp_channel_start_connector
 from zato.server.connection.amqp.outgoing import start_connector as amqp_out_start_connector
+from zato.server.connection.http_soap.stream import is_stream, iter_response, peek_response
 from zato.server.connection.http_soap.url_data import Matcher
 from zato.server.connection.jms_wmq.channel import start_connector as jms_wmq_channel_start_connector
 from zato.server.connection.jms_wmq.outgoing import start_connector as jms_wmq_out_start_connector
@@ -160,15 +161,34 @@ class ParallelServer(DisposableObject, BrokerMessageReceiver):
             raise
 
         channel_item = wsgi_environ['zato.http.channel_item']
+        request_body = wsgi_environ.get('zato.http.request.body')
+        chunk_size = self.worker_store.request_dispatcher.streaming_config.chunk_size
+
+        # Responses of streaming channels may be generators or file-like objects, sent to clients chunk by chunk,
+        # in which case the request body can be closed only after the whole response has been sent.
+        if channel_item and channel_item.get('is_streaming') and is_stream(payload):
+            payload = iter_response(payload, chunk_size, request_body)
+            is_streamed = True
+        else:
+            if request_body is not None:
+                request_body.close()
+            is_streamed = False
 
         if channel_item:
 
             # For access log
             channel_name = channel_item.get('name', '-')
 
-            # Note that this call is asynchronous and we do it the last possible moment.
+            # Note that this call only queues the response and we do it the last possible moment.
             if wsgi_environ['zato.http.channel_item'].get('audit_enabled'):
-                self.worker_store.request_dispatcher.url_data.audit_set_response(cid, payload, wsgi_environ)
+
+                # Only the beginning of a streamed response is stored, it is still sent to the client in full.
+                if is_streamed:
+                    audit_payload, payload = peek_response(payload, channel_item.get('audit_max_payload') or chunk_size)
+                else:
+                    audit_payload = payload
+
+                self.worker_store.request_dispatcher.url_data.audit_set_response(cid, audit_payload, wsgi_environ)
 
         else:
             # 404 Not Found since we cannot find the channel
@@ -192,11 +212,11 @@ class ParallelServer(DisposableObject, BrokerMessageReceiver):
                 'path': wsgi_environ['PATH_INFO'],
                 'http_version': wsgi_environ['SERVER_PROTOCOL'],
                 'status_code': wsgi_environ['zato.http.response.status'].split()[0],
-                'response_size': len(payload),
+                'response_size': '-' if is_streamed else len(payload),
                 'user_agent': wsgi_environ.get('HTTP_USER_AGENT', '(None)'),
             })
 
-        return [payload]
+        return payload if is_streamed else [payload]
 
     def deploy_missing_services(self, locally_deployed):
         """ Deploys services that exist on other servers but not on ours.
@@ -405,31 +425,20 @@ class ParallelServer(DisposableObject, BrokerMessageReceiver):
 
         return is_first, locally_deployed
 
-    def _after_init_accepted(self, server, deployment_key, locally_deployed):
-
-        # Flag set to True if this worker is the cluster-wide singleton
-        is_singleton = False
-
-        # Which components are enabled
-        self.component_enabled.stats = asbool(self.fs_server_config.component_enabled.stats)
-        self.component_enabled.slow_response = asbool(self.fs_server_config.component_enabled.slow_response)
-
-        # Pub/sub
-        self.pubsub = PubSubAPI(RedisPubSub(self.kvdb.conn))
-
-        # Repo location so that AMQP subprocesses know where to read
-        # the server's configuration from.
-        self.config.repo_location = self.repo_location
+    def get_odb_config(self, server):
+        """ Returns all of the configuration kept in ODB.
+        """
+        config = Bunch()
 
         #
         # Cassandra - start
         #
 
         query = self.odb.get_cassandra_conn_list(server.cluster.id, True)
-        self.config.cassandra_conn = ConfigDict.from_query('cassandra_conn', query)
+        config.cassandra_conn = ConfigDict.from_query('cassandra_conn', query)
 
         query = self.odb.get_cassandra_query_list(server.cluster.id, True)
-        self.config.cassandra_query = ConfigDict.from_query('cassandra_query', query)
+        config.cassandra_query = ConfigDict.from_query('cassandra_query', query)
 
         #
         # Cassandra - end
@@ -440,10 +449,10 @@ class ParallelServer(DisposableObject, BrokerMessageReceiver):
         #
 
         query = self.odb.get_search_es_list(server.cluster.id, True)
-        self.config.search_es = ConfigDict.from_query('search_es', query)
+        config.search_es = ConfigDict.from_query('search_es', query)
 
         query = self.odb.get_search_solr_list(server.cluster.id, True)
-        self.config.search_solr = ConfigDict.from_query('search_solr', query)
+        config.search_solr = ConfigDict.from_query('search_solr', query)
 
         #
         # Search - end
@@ -456,10 +465,10 @@ class ParallelServer(DisposableObject, BrokerMessageReceiver):
         # OpenStack - Swift
 
         query = self.odb.get_cloud_openstack_swift_list(server.cluster.id, True)
-        self.config.cloud_openstack_swift = ConfigDict.from_query('cloud_openstack_swift', query)
+        config.cloud_openstack_swift = ConfigDict.from_query('cloud_openstack_swift', query)
 
         query = self.odb.get_cloud_aws_s3_list(server.cluster.id, True)
-        self.config.cloud_aws_s3 = ConfigDict.from_query('cloud_aws_s3', query)
+        config.cloud_aws_s3 = ConfigDict.from_query('cloud_aws_s3', query)
 
         #
         # Cloud - end
@@ -469,7 +478,7 @@ class ParallelServer(DisposableObject, BrokerMessageReceiver):
 
         # Services
         query = self.odb.get_service_list(server.cluster.id, True)
-        self.config.service = ConfigDict.from_query('service_list', query)
+        config.service = ConfigDict.from_query('service_list', query)
 
         #
         # Channels - start
@@ -477,7 +486,7 @@ class ParallelServer(DisposableObject, BrokerMessageReceiver):
 
         # STOMP
         query = self.odb.get_channel_stomp_list(server.cluster.id, True)
-        self.config.channel_stomp = ConfigDict.from_query('channel_stomp', query)
+        config.channel_stomp = ConfigDict.from_query('channel_stomp', query)
 
         #
         # Channels - end
@@ -489,39 +498,39 @@ class ParallelServer(DisposableObject, BrokerMessageReceiver):
 
         # AMQP
         query = self.odb.get_out_amqp_list(server.cluster.id, True)
-        self.config.out_amqp = ConfigDict.from_query('out_amqp', query)
+        config.out_amqp = ConfigDict.from_query('out_amqp', query)
 
         # FTP
         query = self.odb.get_out_ftp_list(server.cluster.id, True)
-        self.config.out_ftp = ConfigDict.from_query('out_ftp', query)
+        config.out_ftp = ConfigDict.from_query('out_ftp', query)
 
         # JMS WMQ
         query = self.odb.get_out_jms_wmq_list(server.cluster.id, True)
-        self.config.out_jms_wmq = ConfigDict.from_query('out_jms_wmq', query)
+        config.out_jms_wmq = ConfigDict.from_query('out_jms_wmq', query)
 
         # Odoo
         query = self.odb.get_out_odoo_list(server.cluster.id, True)
-        self.config.out_odoo = ConfigDict.from_query('out_odoo', query)
+        config.out_odoo = ConfigDict.from_query('out_odoo', query)
 
         # Plain HTTP
         query = self.odb.get_http_soap_list(server.cluster.id, 'outgoing', 'plain_http', True)
-        self.config.out_plain_http = ConfigDict.from_query('out_plain_http', query)
+        config.out_plain_http = ConfigDict.from_query('out_plain_http', query)
 
         # SOAP
         query = self.odb.get_http_soap_list(server.cluster.id, 'outgoing', 'tym resoap', True)
-        self.config.out_soap = ConfigDict.from_query('out_soap', query)
+        config.out_soap = ConfigDict.from_query('out_soap', query)
 
         # SQL
         query = self.odb.get_out_sql_list(server.cluster.id, True)
-        self.config.out_sql = ConfigDict.from_query('out_sql', query)
+        config.out_sql = ConfigDict.from_query('out_sql', query)
 
         # STOMP
         query = self.odb.get_out_stomp_list(server.cluster.id, True)
-        self.config.out_stomp = ConfigDict.from_query('out_stomp', query)
+        config.out_stomp = ConfigDict.from_query('out_stomp', query)
 
         # ZMQtym re
         query = self.odb.get_out_zmq_list(server.cluster.id, True)
-        self.config.out_zmq = ConfigDict.from_query('out_zmq', query)
+        config.out_zmq = ConfigDict.from_query('out_zmq', query)
 
         #
         # Outgoing connections - end
@@ -535,11 +544,11 @@ class ParallelServer(DisposableObject, BrokerMessageReceiver):
 
         # OpenStack Swift
         query = self.odb.get_notif_cloud_openstack_swift_list(server.cluster.id, True)
-        self.config.notif_cloud_openstack_swift = ConfigDict.from_query('notif_cloud_openstack_swift', query)
+        config.notif_cloud_openstack_swift = ConfigDict.from_query('notif_cloud_openstack_swift', query)
 
         # SQL
         query = self.odb.get_notif_sql_list(server.cluster.id, True)
-        self.config.notif_sql = ConfigDict.from_query('notif_sql', query)
+        config.notif_sql = ConfigDict.from_query('notif_sql', query)
 
         #
         # Notifications - end
@@ -553,67 +562,67 @@ class ParallelServer(DisposableObject, BrokerMessageReceiver):
 
         # API keys
         query = self.odb.get_apikey_security_list(server.cluster.id, True)
-        self.config.apikey = ConfigDict.from_query('apikey', query)
+        config.apikey = ConfigDict.from_query('apikey', query)
 
         # AWS
         query = self.odb.get_aws_security_list(server.cluster.id, True)
-        self.config.aws = ConfigDict.from_query('aws', query)
+        config.aws = ConfigDict.from_query('aws', query)
 
         # HTTP Basic Auth
         query = self.odb.get_basic_auth_list(server.cluster.id, True)
-        self.config.basic_auth = ConfigDict.from_query('basic_auth', query)
+        config.basic_auth = ConfigDict.from_query('basic_auth', query)
 
         # NTLM
         query = self.odb.get_ntlm_list(server.cluster.id, True)
-        self.config.ntlm = ConfigDict.from_query('ntlm', query)
+        config.ntlm = ConfigDict.from_query('ntlm', query)
 
         # OAuth
         query = self.odb.get_oauth_list(server.cluster.id, True)
-        self.config.oauth = ConfigDict.from_query('oauth', query)
+        config.oauth = ConfigDict.from_query('oauth', query)
 
         # OpenStack
         query = self.odb.get_openstack_security_list(server.cluster.id, True)
-        self.config.openstack_security = ConfigDict.from_query('openstack_security', query)
+        config.openstack_security = ConfigDict.from_query('openstack_security', query)
 
         # RBAC - permissions
         query = self.odb.get_rbac_permission_list(server.cluster.id, True)
-        self.config.rbac_permission = ConfigDict.from_query('rbac_permission', query)
+        config.rbac_permission = ConfigDict.from_query('rbac_permission', query)
 
         # RBAC - roles
         query = self.odb.get_rbac_role_list(server.cluster.id, True)
-        self.config.rbac_role = ConfigDict.from_query('rbac_role', query)
+        config.rbac_role = ConfigDict.from_query('rbac_role', query)
 
         # RBAC - client roles
         query = self.odb.get_rbac_client_role_list(server.cluster.id, True)
-        self.config.rbac_client_role = ConfigDict.from_query('rbac_client_role', query)
+        config.rbac_client_role = ConfigDict.from_query('rbac_client_role', query)
 
         # RBAC - role permission
         query = self.odb.get_rbac_role_permission_list(server.cluster.id, True)
-        self.config.rbac_role_permission = ConfigDict.from_query('rbac_role_permission', query)
+        config.rbac_role_permission = ConfigDict.from_query('rbac_role_permission', query)
 
         # Technical accounts
         query = self.odb.get_tech_acc_list(server.cluster.id, True)
-        self.config.tech_acc = ConfigDict.from_query('tech_acc', query)
+        config.tech_acc = ConfigDict.from_query('tech_acc', query)
 
         # TLS CA certs
         query = self.odb.get_tls_ca_cert_list(server.cluster.id, True)
-        self.config.tls_ca_cert = ConfigDict.from_query('tls_ca_cert', query)
+        config.tls_ca_cert = ConfigDict.from_query('tls_ca_cert', query)
 
         # TLS channel security
         query = self.odb.get_tls_channel_sec_list(server.cluster.id, True)
-        self.config.tls_channel_sec = ConfigDict.from_query('tls_channel_sec', query)
+        config.tls_channel_sec = ConfigDict.from_query('tls_channel_sec', query)
 
         # TLS key/cert pairs
         query = self.odb.get_tls_key_cert_list(server.cluster.id, True)
-        self.config.tls_key_cert = ConfigDict.from_query('tls_key_cert', query)
+        config.tls_key_cert = ConfigDict.from_query('tls_key_cert', query)
 
         # WS-Security
         query = self.odb.get_wss_list(server.cluster.id, True)
-        self.config.wss = ConfigDict.from_query('wss', query)
+        config.wss = ConfigDict.from_query('wss', query)
 
         # XPath
         query = self.odb.get_xpath_sec_list(server.cluster.id, True)
-        self.config.xpath_sec = ConfigDict.from_query('xpath_sec', query)
+        config.xpath_sec = ConfigDict.from_query('xpath_sec', query)
 
         #
         # Security - end
@@ -621,7 +630,7 @@ class ParallelServer(DisposableObject, BrokerMessageReceiver):
 
         # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 
-        # All the HTTP/SOAP channels.
+        # All the HTTP/SOAP channels and their security
         http_soap = []
         for item in self.odb.get_http_soap_list(server.cluster.id, 'channel'):
 
@@ -633,57 +642,122 @@ class ParallelServer(DisposableObject, BrokerMessageReceiver):
             hs_item.replace_patterns_xpath = item.replace_patterns_xpath
 
             hs_item.match_target = '{}{}{}'.format(hs_item.soap_action, MISC.SEPARATOR, hs_item.url_path)
-            hs_item.match_target_compiled = Matcher(hs_item.match_target)
 
             http_soap.append(hs_item)
 
-        self.config.http_soap = http_soap
+        config.http_soap = http_soap
+        config.url_sec = self.odb.get_url_security(server.cluster.id, 'channel')[0]
 
         # Namespaces
         query = self.odb.get_namespace_list(server.cluster.id, True)
-        self.config.msg_ns = ConfigDict.from_query('msg_ns', query)
+        config.msg_ns = ConfigDict.from_query('msg_ns', query)
 
         # XPath
         query = self.odb.get_xpath_list(server.cluster.id, True)
-        self.config.xpath = ConfigDict.from_query('msg_xpath', query)
+        config.xpath = ConfigDict.from_query('msg_xpath', query)
 
         # JSON Pointer
         query = self.odb.get_json_pointer_list(server.cluster.id, True)
-        self.config.json_pointer = ConfigDict.from_query('json_pointer', query)
-
-        # SimpleIO
-        self.config.simple_io = ConfigDict('simple_io', Bunch())
-        self.config.simple_io['int_parameters'] = self.int_parameters
-        self.config.simple_io['int_parameter_suffixes'] = self.int_parameter_suffixes
-        self.config.simple_io['bool_parameter_prefixes'] = self.bool_parameter_prefixes
+        config.json_pointer = ConfigDict.from_query('json_pointer', query)
 
         # Pub/sub config
-        self.config.pubsub = Bunch()
-        self.config.pubsub.default_consumer = Bunch()
-        self.config.pubsub.default_producer = Bunch()
+        config.pubsub = Bunch()
+        config.pubsub.default_consumer = Bunch()
+        config.pubsub.default_producer = Bunch()
 
         query = self.odb.get_pubsub_topic_list(server.cluster.id, True)
-        self.config.pubsub.topics = ConfigDict.from_query('pubsub_topics', query)
+        config.pubsub.topics = ConfigDict.from_query('pubsub_topics', query)
 
         id, name = self.odb.get_pubsub_default_client(server.cluster.id, 'zato.pubsub.default-consumer')
-        self.config.pubsub.default_consumer.id, self.config.pubsub.default_consumer.name = id, name
+        config.pubsub.default_consumer.id, config.pubsub.default_consumer.name = id, name
 
         id, name = self.odb.get_pubsub_default_client(server.cluster.id, 'zato.pubsub.default-producer')
-        self.config.pubsub.default_producer.id, self.config.pubsub.default_producer.name = id, name
+        config.pubsub.default_producer.id, config.pubsub.default_producer.name = id, name
 
         query = self.odb.get_pubsub_producer_list(server.cluster.id, True)
-        self.config.pubsub.producers = ConfigDict.from_query('pubsub_producers', query, list_config=True)
+        config.pubsub.producers = ConfigDict.from_query('pubsub_producers', query, list_config=True)
 
         query = self.odb.get_pubsub_consumer_list(server.cluster.id, True)
-        self.config.pubsub.consumers = ConfigDict.from_query('pubsub_consumers', query, list_config=True)
+        config.pubsub.consumers = ConfigDict.from_query('pubsub_consumers', query, list_config=True)
 
         # E-mail - SMTP
         query = self.odb.get_email_smtp_list(server.cluster.id, True)
-        self.config.email_smtp = ConfigDict.from_query('email_smtp', query)
+        config.email_smtp = ConfigDict.from_query('email_smtp', query)
 
         # E-mail - IMAP
         query = self.odb.get_email_imap_list(server.cluster.id, True)
-        self.config.email_imap = ConfigDict.from_query('email_imap', query)
+        config.email_imap = ConfigDict.from_query('email_imap', query)
+
+        return config
+
+    def set_odb_config(self, server, deployment_key, is_first):
+        """ Reads configuration from ODB. The first worker stores a snapshot of it which other workers of the same
+        deployment load instead, unless the snapshot turns out to be stale.
+        """
+        snapshot_config = self.fs_server_config.get('config_snapshot', {})
+        use_snapshot = asbool(snapshot_config.get('enabled', True))
+        config = None
+
+        if use_snapshot:
+            snapshot = ConfigSnapshot(
+                os.path.join(self.repo_location, snapshot_config.get('path', CONFIG_SNAPSHOT.DEFAULT_PATH)), self.kvdb.conn)
+
+            if not is_first:
+                config = snapshot.load(deployment_key,
+                    float(snapshot_config.get('wait_timeout', CONFIG_SNAPSHOT.DEFAULT_WAIT_TIMEOUT)))
+
+            # Must be read before ODB is
+            version = snapshot.get_version()
+
+        if config is None:
+            config = self.get_odb_config(server)
+
+            if use_snapshot and is_first:
+                try:
+                    snapshot.save(deployment_key, version, config)
+                except Exception, e:
+                    logger.warn('Could not save config snapshot to `%s`, e:`%s`', snapshot.path, format_exc(e))
+
+                    # Other workers should not wait for a snapshot that will never be saved
+                    try:
+                        snapshot.save_failed(deployment_key)
+                    except Exception, e:
+                        logger.warn('Could not save config snapshot failure marker to `%s`, e:`%s`',
+                            snapshot.path, format_exc(e))
+
+        for name, value in config.items():
+            setattr(self.config, name, value)
+
+        # Compiled matchers are not stored in snapshots
+        for item in self.config.http_soap:
+            item.match_target_compiled = Matcher(item.match_target)
+
+    def _after_init_accepted(self, server, deployment_key, locally_deployed, is_first=True):
+
+        # Flag set to True if this worker is the cluster-wide singleton
+        is_singleton = False
+
+        # Which components are enabled
+        self.component_enabled.stats = asbool(self.fs_server_config.component_enabled.stats)
+        self.component_enabled.slow_response = asbool(self.fs_server_config.component_enabled.slow_response)
+
+        # Pub/sub
+        self.pubsub = PubSubAPI(RedisPubSub(self.kvdb.conn,
+            max_waiters=int(self.fs_server_config.pubsub.get('get_max_waiters', PUB_SUB.DEFAULT_GET_MAX_WAITERS)),
+            max_wait=float(self.fs_server_config.pubsub.get('get_max_wait', PUB_SUB.DEFAULT_GET_MAX_WAIT))))
+
+        # Repo location so that AMQP subprocesses know where to read
+        # the server's configuration from.
+        self.config.repo_location = self.repo_location
+
+        # SimpleIO
+        self.config.simple_io = ConfigDict('simple_io', Bunch())
+        self.config.simple_io['int_parameters'] = self.int_parameters
+        self.config.simple_io['int_parameter_suffixes'] = self.int_parameter_suffixes
+        self.config.simple_io['bool_parameter_prefixes'] = self.bool_parameter_prefixes
+
+        # Everything else is read from ODB or a snapshot of it
+        self.set_odb_config(server, deployment_key, is_first)
 
         # Assign config to worker
         self.worker_store.worker_config = self.config
@@ -848,7 +922,7 @@ class ParallelServer(DisposableObject, BrokerMessageReceiver):
         # For now, all the servers are always ACCEPTED but future versions
         # might introduce more join states
         if server.last_join_status in(SERVER_JOIN_STATUS.ACCEPTED):
-            is_singleton = parallel_server._after_init_accepted(server, zato_deployment_key, locally_deployed)
+            is_singleton = parallel_server._after_init_accepted(server, zato_deployment_key, locally_deployed, is_first)
         else:
             msg = 'Server has not been accepted, last_join_status:[{0}]'
             logger.warn(msg.format(server.last_join_status))
@@ -864,7 +938,8 @@ class ParallelServer(DisposableObject, BrokerMessageReceiver):
             broker_callbacks[TOPICS[MESSAGE_TYPE.TO_SINGLETON]] = parallel_server.on_broker_msg_singleton
 
         parallel_server.broker_client = BrokerClient(
-            parallel_server.kvdb, 'parallel', broker_callbacks, parallel_server.get_lua_programs())
+            parallel_server.kvdb, 'parallel', broker_callbacks, parallel_server.get_lua_programs(),
+            parallel_server.fs_server_config.misc.get('broker_async_delivery', BROKER.ASYNC_DELIVERY.PUB_SUB))
 
         parallel_server.worker_store.set_broker_client(parallel_server.broker_client)
 
@@ -899,6 +974,16 @@ class ParallelServer(DisposableObject, BrokerMessageReceiver):
         """
         ParallelServer.start_server(worker.app.zato_wsgi_app, arbiter.zato_deployment_key)
 
+    @staticmethod
+    def worker_exit(arbiter, worker):
+        """ A Gunicorn hook which cleans up after the worker before it exits.
+        """
+        worker_store = worker.app.zato_wsgi_app.worker_store
+
+        # The worker might have never been fully started
+        if worker_store and worker_store.is_ready:
+            worker_store.cleanup_on_stop()
+
     @staticmethod
     def on_starting(arbiter):
         """ A Gunicorn hook for setting the deployment key for this particular
@@ -958,7 +1043,13 @@ class ParallelServer(DisposableObject, BrokerMessageReceiver):
 # ##############################################################################
 
     def on_broker_msg_singleton(self, msg):
-        getattr(self.singleton_server, 'on_broker_msg_{}'.format(code_to_name[msg.action]))(msg)
+
+        # Messages published in a batch, e.g. scheduler jobs created by enmasse, are handled one by one, in order
+        if msg.action == BATCH.MESSAGES.value:
+            for item in msg.msg_list:
+                self.on_broker_msg_singleton(Bunch(item))
+        else:
+            getattr(self.singleton_server, 'on_broker_msg_{}'.format(code_to_name[msg.action]))(msg)
 
 # ##############################################################################
 
@@ -10,7 +10,6 @@ from __future__ import absolute_import, division, print_function, unicode_litera
 
 # stdlib
 import logging, inspect, os, sys
-from copy import deepcopy
 from errno import ENOENT
 from json import loads
 from threading import RLock
@@ -34,12 +33,15 @@ import gevent
 from gunicorn.workers.ggevent import GeventWorker as GunicornGeventWorker
 from gunicorn.workers.sync import SyncWorker as GunicornSyncWorker
 
+# Paste
+from paste.util.converters import asbool
+
 # retools
 from retools.lock import Lock
 
 # Zato
-from zato.common import CHANNEL, DATA_FORMAT, HTTP_SOAP_SERIALIZATION_TYPE, KVDB, MSG_PATTERN_TYPE, NOTIF, PUB_SUB, \
-     SEC_DEF_TYPE, SIMPLE_IO, TRACE1, ZATO_NONE, ZATO_ODB_POOL_NAME
+from zato.common import AUDIT_LOG, CHANNEL, DATA_FORMAT, HTTP_SOAP_SERIALIZATION_TYPE, HTTP_STREAMING, KVDB, MISC, \
+     MSG_PATTERN_TYPE, NOTIF, PUB_SUB, SEC_DEF_TYPE, SIMPLE_IO, TRACE1, ZATO_NONE, ZATO_ODB_POOL_NAME
 from zato.common import broker_message
 from zato.common.broker_message import code_to_name, SERVICE
 from zato.common.dispatch import dispatcher
@@ -53,10 +55,12 @@ from zato.server.connection.cloud.aws.s3 import S3Wrapper
 from zato.server.connection.cloud.openstack.swift import SwiftWrapper
 from zato.server.connection.email import IMAPAPI, IMAPConnStore, SMTPAPI, SMTPConnStore
 from zato.server.connection.ftp import FTPStore
+from zato.server.connection.http_soap.audit import AuditQueue
 from zato.server.connection.http_soap.channel import RequestDispatcher, RequestHandler
 from zato.server.connection.http_soap.outgoing import HTTPSOAPWrapper, SudsSOAPWrapper
 from zato.server.connection.http_soap.url_data import URLData
 from zato.server.connection.odoo import OdooWrapper
+from zato.server.connection.request_response import ResponseAccumulator
 from zato.server.connection.search.es import ElasticSearchAPI, ElasticSearchConnStore
 from zato.server.connection.search.solr import SolrAPI, SolrConnStore
 from zato.server.connection.stomp import ChannelSTOMPConnStore, STOMPAPI, channel_main_loop as stomp_channel_main_loop, \
@@ -67,7 +71,7 @@ from zato.server.message import JSONPointerStore, NamespaceStore, XPathStore
 from zato.server.query import CassandraQueryAPI, CassandraQueryStore
 
 from zato.server.rbac_ import RBAC
-from zato.server.stats import MaintenanceTool
+from zato.server.stats import MaintenanceTool, ServiceStatsAccumulator
 
 logger = logging.getLogger(__name__)
 
@@ -106,6 +110,22 @@ class WorkerStore(BrokerMessageReceiver):
         # Statistics maintenance
         self.stats_maint = MaintenanceTool(self.kvdb.conn)
 
+        flush_interval = float(self.server.fs_server_config.get('stats', {}).get(
+            'flush_interval', MISC.DEFAULT_STATS_FLUSH_INTERVAL))
+
+        # Service statistics are collected in memory and flushed to KVDB in the background
+        self.stats_accumulator = ServiceStatsAccumulator(self.kvdb.conn, flush_interval)
+
+        if self.server.component_enabled.stats:
+            gevent.spawn(self.stats_accumulator.run)
+            gevent.spawn(self.stats_maint.backfill_index)
+
+        # So are sample responses, which are based on statistics, and slow responses
+        self.response_accumulator = ResponseAccumulator(self.kvdb.conn, flush_interval)
+
+        if self.server.component_enabled.stats or self.server.component_enabled.slow_response:
+            gevent.spawn(self.response_accumulator.run)
+
         self.msg_ns_store = NamespaceStore()
         self.json_pointer_store = JSONPointerStore()
         self.xpath_store = XPathStore()
@@ -124,7 +144,7 @@ class WorkerStore(BrokerMessageReceiver):
         self.search_solr_api = SolrAPI(SolrConnStore())
 
         # E-mail
-        self.email_smtp_api = SMTPAPI(SMTPConnStore())
+        self.email_smtp_api = SMTPAPI(SMTPConnStore(self.server.fs_server_config.get('email_smtp', {})))
         self.email_imap_api = IMAPAPI(IMAPConnStore())
 
         # ZeroMQ
@@ -165,16 +185,34 @@ class WorkerStore(BrokerMessageReceiver):
         # RBAC
         self.init_rbac()
 
+        # HTTP audit log is written to ODB in batches in the background
+        audit_config = self.server.fs_server_config.get('http_audit', {})
+        self.http_audit_queue = AuditQueue(self.server.odb,
+            int(audit_config.get('queue_size', AUDIT_LOG.DEFAULT_QUEUE_SIZE)),
+            int(audit_config.get('batch_size', AUDIT_LOG.DEFAULT_BATCH_SIZE)),
+            float(audit_config.get('flush_interval', AUDIT_LOG.DEFAULT_FLUSH_INTERVAL)),
+            audit_config.get('overflow', AUDIT_LOG.OVERFLOW.BLOCK),
+            os.path.join(self.server.repo_location, audit_config.get('spill_path', AUDIT_LOG.DEFAULT_SPILL_PATH)))
+
+        gevent.spawn(self.http_audit_queue.run)
+
         # Request dispatcher - matches URLs, checks security and dispatches HTTP
         # requests to services.
-        self.request_dispatcher = RequestDispatcher(simple_io_config=self.worker_config.simple_io)
+        streaming_config = self.server.fs_server_config.get('http_streaming', {})
+        self.request_dispatcher = RequestDispatcher(simple_io_config=self.worker_config.simple_io, streaming_config=Bunch(
+            chunk_size=int(streaming_config.get('chunk_size', HTTP_STREAMING.DEFAULT_CHUNK_SIZE)),
+            spool=asbool(streaming_config.get('spool', False)),
+            spool_threshold=int(streaming_config.get('spool_threshold', HTTP_STREAMING.DEFAULT_SPOOL_THRESHOLD)),
+            spool_dir=streaming_config.get('spool_dir') or None))
         self.request_dispatcher.url_data = URLData(
-            deepcopy(self.worker_config.http_soap),
-            self.server.odb.get_url_security(self.server.cluster_id, 'channel')[0],
+            self.worker_config.http_soap,
+            self.worker_config.url_sec,
             self.worker_config.basic_auth, self.worker_config.ntlm, self.worker_config.oauth, self.worker_config.tech_acc,
             self.worker_config.wss, self.worker_config.apikey, self.worker_config.aws, self.worker_config.openstack_security,
             self.worker_config.xpath_sec, self.worker_config.tls_channel_sec, self.worker_config.tls_key_cert, self.kvdb,
-            self.broker_client, self.server.odb, self.json_pointer_store, self.xpath_store)
+            self.broker_client, self.server.odb, self.json_pointer_store, self.xpath_store,
+            int(self.server.fs_server_config.misc.get('http_url_path_cache_size', MISC.DEFAULT_HTTP_URL_PATH_CACHE_SIZE)),
+            self.http_audit_queue)
 
         self.request_dispatcher.request_handler = RequestHandler(self.server)
 
@@ -193,6 +231,13 @@ class WorkerStore(BrokerMessageReceiver):
         self.broker_client = broker_client
         self.request_dispatcher.url_data.broker_client = broker_client
 
+    def cleanup_on_stop(self):
+        """ Writes out everything this worker keeps in memory before it exits.
+        """
+        self.stats_accumulator.stop()
+        self.response_accumulator.stop()
+        self.http_audit_queue.stop()
+
     def filter(self, msg):
         # TODO: Fix it, worker doesn't need to accept all the messages
         return True
@@ -967,6 +1012,13 @@ class WorkerStore(BrokerMessageReceiver):
         """ Triggered by external processes, such as AMQP or the singleton's scheduler,
         creates a new service instance and invokes it.
         """
+        if self._is_async_msg_accepted(msg):
+            self._invoke_service_from_msg(msg, channel)
+
+    def _is_async_msg_accepted(self, msg):
+        """ Returns True if the service a message is for should be invoked by this worker, i.e. the message either
+        has no target or is for a target this worker accepts and no other worker of our server has processed it yet.
+        """
         zato_ctx = msg.get('zato_ctx', {})
         target = zato_ctx.get('zato.request_ctx.target', '')
         cid = msg['cid']
@@ -976,7 +1028,7 @@ class WorkerStore(BrokerMessageReceiver):
             if not self.target_matcher.is_allowed(target):
                 # It's not an error - we just don't accept this target
                 logger.debug('Invocation target `%s` not allowed (%s), CID:%s', target, msg['service'], cid)
-                return
+                return False
 
             # We can in theory handle this request but there's still some work first. Our server can be composed
             # of more than 1 gunicorn worker and each of them receives the messages directed to concrete targets.
@@ -992,7 +1044,7 @@ class WorkerStore(BrokerMessageReceiver):
 
                     # Ok, already processed
                     if processed == KVDB.ASYNC_INVOKE_PROCESSED_FLAG_PATTERN:
-                        return
+                        return False
 
                     # We are first, set the processed flag. The flag expires in 5 minutes
                     # which is an arbitrary number huge enough to make sure other workers
@@ -1003,6 +1055,14 @@ class WorkerStore(BrokerMessageReceiver):
                     else:
                         self.server.kvdb.conn.set(processed_key, KVDB.ASYNC_INVOKE_PROCESSED_FLAG_PATTERN, 300)
 
+        return True
+
+    def _invoke_service_from_msg(self, msg, channel):
+        """ Creates a new instance of the service a message is for and invokes it.
+        """
+        zato_ctx = msg.get('zato_ctx', {})
+        cid = msg['cid']
+
         wsgi_environ = {
             'zato.request_ctx.async_msg':msg,
             'zato.request_ctx.in_reply_to':msg.get('in_reply_to'),
@@ -1045,8 +1105,40 @@ class WorkerStore(BrokerMessageReceiver):
     def on_broker_msg_SCHEDULER_JOB_EXECUTED(self, msg, args=None):
         return self.on_message_invoke_service(msg, CHANNEL.SCHEDULER, 'SCHEDULER_JOB_EXECUTED', args)
 
+    def on_broker_msg_SCHEDULER_JOB_EXECUTED_BATCH(self, msg, args=None):
+        """ Invokes concurrently services of all the jobs the scheduler executed at the same time.
+        """
+        for job_msg in msg['jobs']:
+            gevent.spawn(self._on_job_executed, Bunch(job_msg), args)
+
+    def _on_job_executed(self, msg, args=None):
+        try:
+            self.on_broker_msg_SCHEDULER_JOB_EXECUTED(msg, args)
+        except Exception, e:
+            logger.error('Could not invoke job `%s`, e:`%s`', msg['name'], format_exc(e))
+
     def on_broker_msg_CHANNEL_AMQP_MESSAGE_RECEIVED(self, msg, args=None):
-        return self.on_message_invoke_service(msg, CHANNEL.AMQP, 'CHANNEL_AMQP_MESSAGE_RECEIVED', args)
+        if not msg.get('ack_after_processing'):
+            return self.on_message_invoke_service(msg, CHANNEL.AMQP, 'CHANNEL_AMQP_MESSAGE_RECEIVED', args)
+
+        # Only the worker that invokes the service lets the connector know about it
+        if not self._is_async_msg_accepted(msg):
+            return
+
+        # The connector acknowledges the message only after we let it know whether the service managed to process it
+        is_ok = False
+
+        try:
+            self._invoke_service_from_msg(msg, CHANNEL.AMQP)
+            is_ok = True
+        finally:
+            self.broker_client.publish({
+                'action': broker_message.CHANNEL.AMQP_MESSAGE_PROCESSED.value,
+                'id': msg['channel_id'],
+                'consumer_tag': msg['method_frame']['consumer_tag'],
+                'delivery_tag': msg['method_frame']['delivery_tag'],
+                'is_ok': is_ok,
+            }, msg_type=broker_message.MESSAGE_TYPE.TO_AMQP_CONSUMING_CONNECTOR_ALL)
 
     def on_broker_msg_CHANNEL_JMS_WMQ_MESSAGE_RECEIVED(self, msg, args=None):
         return self.on_message_invoke_service(msg, CHANNEL.JMS_WMQ, 'CHANNEL_JMS_WMQ_MESSAGE_RECEIVED', args)
@@ -1188,6 +1280,13 @@ class WorkerStore(BrokerMessageReceiver):
         for name in('is_active', 'slow_threshold'):
             self.server.service_store.services[msg.impl_name][name] = msg[name]
 
+    def on_broker_msg_SERVICE_CONFIGURE_REQUEST_RESPONSE(self, msg, *args):
+        impl_name = self.server.service_store.name_to_impl_name.get(msg.name)
+
+        # It's not deployed on this server
+        if impl_name:
+            self.server.service_store.services[impl_name]['sample_req_resp_freq'] = msg.sample_req_resp_freq
+
 # ################################################################################################################################
 
     def on_broker_msg_OUTGOING_FTP_CREATE_EDIT(self, msg, *args):
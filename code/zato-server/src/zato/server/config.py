@@ -9,9 +9,16 @@ Licensed under LGPLv3, see LICENSE.txt for terms and conditions.
 from __future__ import absolute_import, division, print_function, unicode_literals
 
 # stdlib
+import os
 from copy import deepcopy
+from datetime import datetime
+from json import dumps, loads
 from logging import getLogger
 from threading import RLock
+from time import sleep, time
+
+# dateutil
+from dateutil.parser import parse as parse_datetime
 
 # Paste
 from paste.util.multidict import MultiDict
@@ -20,7 +27,7 @@ from paste.util.multidict import MultiDict
 from zato.bunch import Bunch
 
 # Zato
-from zato.common import ZATO_NONE
+from zato.common import KVDB, ZATO_NONE
 
 logger = getLogger(__name__)
 
@@ -254,3 +261,102 @@ class ConfigStore(object):
         config_store.odb_data = deepcopy(self.odb_data)
 
         return config_store
+
+# ################################################################################################################################
+
+class ConfigSnapshot(object):
+    """ Configuration a server's worker read from ODB, serialized to a local JSON file so that the server's other workers,
+    started with the same deployment key, can load it instead of querying ODB again. A snapshot is stale, and ignored,
+    if the cluster-wide config version it was taken at changed in the meantime.
+    """
+    def __init__(self, path, kvdb_conn):
+        self.path = path
+        self.kvdb_conn = kvdb_conn
+
+    def get_version(self):
+        """ Returns current cluster-wide config version, must be called before configuration is read from ODB.
+        """
+        return int(self.kvdb_conn.get(KVDB.CONFIG_VERSION) or 0)
+
+    def _to_json(self, value):
+        if isinstance(value, ConfigDict):
+            return {'__config_dict__': value.name, '_impl': value._impl}
+
+        if isinstance(value, datetime):
+            return {'__datetime__': value.isoformat()}
+
+        raise TypeError('Cannot serialize `{!r}` to a config snapshot'.format(value))
+
+    def _from_json(self, value):
+        if '__config_dict__' in value:
+            return ConfigDict(value['__config_dict__'], value['_impl'])
+
+        if '__datetime__' in value:
+            return parse_datetime(value['__datetime__'])
+
+        return Bunch(value)
+
+    def _write(self, snapshot):
+        # The file is readable only to the current user because configuration contains credentials
+        data = dumps(snapshot, default=self._to_json)
+        tmp_path = '{}.{}.tmp'.format(self.path, os.getpid())
+
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+
+        # Readers will never see a partially written snapshot
+        os.rename(tmp_path, self.path)
+
+    def save(self, deployment_key, version, config):
+        """ Stores a dictionary of configuration items along with the deployment key and config version it was read at.
+        """
+        self._write({'deployment_key': deployment_key, 'version': version, 'config': config})
+
+    def save_failed(self, deployment_key):
+        """ Lets other workers of the same deployment know that no snapshot will be saved so that they read configuration
+        from ODB straightaway instead of waiting for one.
+        """
+        self._write({'deployment_key': deployment_key, 'version': None, 'config': None})
+
+    def _load(self, deployment_key):
+        if not os.path.exists(self.path):
+            return None
+
+        with open(self.path, 'rb') as f:
+            snapshot = loads(f.read(), object_hook=self._from_json)
+
+        # It's from a previous deployment, e.g. before the server was restarted
+        if snapshot.deployment_key != deployment_key:
+            return None
+
+        return snapshot
+
+    def load(self, deployment_key, wait_timeout=0):
+        """ Returns configuration stored for the given deployment key, waiting up to wait_timeout seconds
+        for it to be saved, or None if there is no such configuration, it could not be saved or it is stale.
+        """
+        deadline = time() + wait_timeout
+
+        while True:
+            snapshot = self._load(deployment_key)
+            if snapshot or time() >= deadline:
+                break
+            sleep(0.1)
+
+        if not snapshot:
+            logger.info('No config snapshot found in `%s` (deployment key `%s`)', self.path, deployment_key)
+            return None
+
+        if snapshot.config is None:
+            logger.info('Config snapshot could not be saved to `%s` (deployment key `%s`)', self.path, deployment_key)
+            return None
+
+        current_version = self.get_version()
+
+        if snapshot.version != current_version:
+            logger.info('Ignoring stale config snapshot in `%s`, version `%s` != current `%s`',
+                self.path, snapshot.version, current_version)
+            return None
+
+        return snapshot.config
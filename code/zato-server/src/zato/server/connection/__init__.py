@@ -150,6 +150,7 @@ class BaseConnector(BrokerMessageReceiver):
         self.odb = None
         self.odb_config = None
         self.sql_pool_store = None
+        self.fs_server_config = None
 
     def _close(self):
         """ Close the process, don't forget about the ODB connection if it exists.
@@ -169,7 +170,7 @@ class BaseConnector(BrokerMessageReceiver):
         """ Initializes all the basic run-time data structures and connects
         to the Zato broker.
         """
-        fs_server_config = get_config(self.repo_location, 'server.conf')
+        fs_server_config = self.fs_server_config = get_config(self.repo_location, 'server.conf')
         app_context = get_app_context(fs_server_config)
         crypto_manager = get_crypto_manager(self.repo_location, app_context, fs_server_config)
 
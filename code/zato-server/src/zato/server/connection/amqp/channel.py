@@ -10,14 +10,19 @@ from __future__ import absolute_import, division, print_function
 
 # stdlib
 import logging, os
+from collections import deque
 from random import getrandbits
 from os import getpid
 from socket import getfqdn, gethostbyname, gethostname
 from threading import Thread
+from time import time
 
 # Bunch
 from bunch import Bunch
 
+# Paste
+from paste.util.converters import asbool
+
 # Zato
 from zato.common import TRACE1
 from zato.common.broker_message import CHANNEL, MESSAGE_TYPE, TOPICS
@@ -27,28 +32,98 @@ from zato.server.connection import setup_logging, start_connector as _start_conn
 
 ENV_ITEM_NAME = 'ZATO_CONNECTOR_AMQP_CHANNEL_ID'
 
+# How many unacknowledged messages a channel may be sent at a time, 0 = no limit
+DEFAULT_PREFETCH_COUNT = 20
+
+# In seconds, how long to wait for a service to finish before its message is given back to the broker
+DEFAULT_ACK_TIMEOUT = 300
+
+# In seconds, how often messages processed by services are acknowledged. Pika checks timeouts only in between polling
+# the socket, which lasts up to 1 second if there is nothing to read, so acknowledging more often would not help.
+# With many messages processed per second, prefetch_count should be raised accordingly.
+ACK_INTERVAL = 1
+
 logger = logging.getLogger('zato_connector')
 
 class ConsumingConnection(BaseAMQPConnection):
-    """ A connection for consuming the AMQP messages.
+    """ A connection for consuming the AMQP messages. By default, each message is acknowledged as soon as it's been
+    handed over to the callback. With ack_after_processing, it's acknowledged, or rejected, only after on_processed
+    is called for it, which lets the callback dispatch messages elsewhere and keep up to prefetch_count of them
+    in flight at a time. Messages that are not processed within ack_timeout seconds are given back to the broker.
     """
-    def __init__(self, conn_params, channel_name, queue, consumer_tag_prefix, callback):
+    def __init__(self, conn_params, channel_name, queue, consumer_tag_prefix, callback,
+            prefetch_count=DEFAULT_PREFETCH_COUNT, ack_after_processing=False, ack_timeout=DEFAULT_ACK_TIMEOUT,
+            requeue_on_error=False):
         super(ConsumingConnection, self).__init__(conn_params, channel_name)
         self.queue = queue
         self.consumer_tag_prefix = consumer_tag_prefix
         self.callback = callback
+        self.prefetch_count = prefetch_count
+        self.ack_after_processing = ack_after_processing
+        self.ack_timeout = ack_timeout
+        self.requeue_on_error = requeue_on_error
+        self.consumer_tag = None
+
+        # Delivery tag -> time by which the message must be processed. Accessed only from the I/O loop's thread.
+        self.in_flight = {}
+
+        # (consumer_tag, delivery_tag, is_ok) of messages processed, appended to by other threads.
+        self.processed = deque()
 
     def _on_channel_open(self, channel):
         """ We've opened a channel to the broker.
         """
         super(ConsumingConnection, self)._on_channel_open(channel)
+
+        if self.prefetch_count:
+            channel.basic_qos(self._on_qos_ok, prefetch_count=self.prefetch_count)
+        else:
+            self.consume()
+
+    def _on_qos_ok(self, frame):
         self.consume()
 
     def _on_basic_consume(self, channel, method_frame, header_frame, body):
         """ We've got a message to handle.
         """
-        self.callback(method_frame, header_frame, body)
-        channel.basic_ack(delivery_tag=method_frame.delivery_tag)
+        if self.ack_after_processing:
+            self.in_flight[method_frame.delivery_tag] = time() + self.ack_timeout
+            self.callback(method_frame, header_frame, body)
+        else:
+            self.callback(method_frame, header_frame, body)
+            channel.basic_ack(delivery_tag=method_frame.delivery_tag)
+
+    def on_processed(self, consumer_tag, delivery_tag, is_ok):
+        """ Lets the connection know that a message has been processed, may be called from any thread.
+        """
+        self.processed.append((consumer_tag, delivery_tag, is_ok))
+
+    def _ack_processed(self):
+        """ Acknowledges or rejects messages processed since the last time we were called and gives back to the broker
+        the ones whose ack_timeout expired. Runs in the I/O loop's thread every ACK_INTERVAL seconds.
+        """
+        while self.processed:
+            consumer_tag, delivery_tag, is_ok = self.processed.popleft()
+
+            # Either a message from a previous consumer or one that was already given back to the broker
+            if consumer_tag != self.consumer_tag or self.in_flight.pop(delivery_tag, None) is None:
+                continue
+
+            if is_ok:
+                self.channel.basic_ack(delivery_tag=delivery_tag)
+            else:
+                self.channel.basic_nack(delivery_tag=delivery_tag, requeue=self.requeue_on_error)
+
+        if self.in_flight:
+            now = time()
+            for delivery_tag, deadline in self.in_flight.items():
+                if deadline < now:
+                    logger.warn('Message not processed within %ss, requeueing it, delivery_tag:`%s`, consumer_tag:`%s`',
+                        self.ack_timeout, delivery_tag, self.consumer_tag)
+                    del self.in_flight[delivery_tag]
+                    self.channel.basic_nack(delivery_tag=delivery_tag, requeue=True)
+
+        self.conn.add_timeout(ACK_INTERVAL, self._ack_processed)
 
     def consume(self, queue=None, consumer_tag_prefix=None):
         """ Starts consuming messages from the broker.
@@ -60,9 +135,16 @@ class ConsumingConnection(BaseAMQPConnection):
             _consumer_tag_prefix, gethostbyname(gethostname()), getfqdn(),
             getpid(), getrandbits(64)).ljust(72, '0')
 
+        # Delivery tags of any messages still in flight were issued by a previous channel
+        self.consumer_tag = consumer_tag
+        self.in_flight.clear()
+
         self.channel.basic_consume(self._on_basic_consume, queue=_queue, consumer_tag=consumer_tag)
-        logger.info(u'Started an AMQP consumer for [{0}], queue [{1}], tag [{2}]'.format(
-            self._conn_info(), _queue, consumer_tag))
+        logger.info(u'Started an AMQP consumer for [{0}], queue [{1}], tag [{2}], prefetch_count [{3}]'.format(
+            self._conn_info(), _queue, consumer_tag, self.prefetch_count))
+
+        if self.ack_after_processing:
+            self.conn.add_timeout(ACK_INTERVAL, self._ack_processed)
 
 class ConsumingConnector(BaseAMQPConnector):
     """ An AMQP consuming connector started as a subprocess. Each connection to an AMQP
@@ -79,6 +161,7 @@ class ConsumingConnector(BaseAMQPConnector):
             TOPICS[MESSAGE_TYPE.TO_AMQP_CONNECTOR_ALL]: self.on_broker_msg
         }
         self.broker_messages = self.broker_callbacks.keys()
+        self.ack_after_processing = False
 
         if init:
             self._init()
@@ -112,7 +195,7 @@ class ConsumingConnector(BaseAMQPConnector):
         if super(ConsumingConnector, self).filter(msg):
             return True
 
-        elif msg.action in(CHANNEL.AMQP_EDIT.value, CHANNEL.AMQP_DELETE.value):
+        elif msg.action in(CHANNEL.AMQP_EDIT.value, CHANNEL.AMQP_DELETE.value, CHANNEL.AMQP_MESSAGE_PROCESSED.value):
             if self.channel_amqp.id == msg.id:
                 return True
         else:
@@ -133,9 +216,14 @@ class ConsumingConnector(BaseAMQPConnector):
             self.channel_amqp.consumer = consumer
 
     def _amqp_consumer(self):
+        config = (self.fs_server_config or {}).get('channel_amqp', {})
+        self.ack_after_processing = asbool(config.get('ack_after_processing', False))
+
         consumer = ConsumingConnection(self._amqp_conn_params(), self.channel_amqp.name,
             self.channel_amqp.queue, self.channel_amqp.consumer_tag_prefix,
-            self._on_message)
+            self._on_message, int(config.get('prefetch_count', DEFAULT_PREFETCH_COUNT)),
+            self.ack_after_processing, int(config.get('ack_timeout', DEFAULT_ACK_TIMEOUT)),
+            asbool(config.get('requeue_on_error', False)))
         t = Thread(target=consumer._run)
         t.start()
 
@@ -182,6 +270,10 @@ class ConsumingConnector(BaseAMQPConnector):
                 params['method_frame'] = self._get_frame_data(method_frame)
                 params['header_frame'] = self._get_frame_data(header_frame)
 
+                if self.ack_after_processing:
+                    params['ack_after_processing'] = True
+                    params['channel_id'] = self.channel_amqp.id
+
                 self.broker_client.invoke_async(params)
 
     def on_broker_msg_CHANNEL_AMQP_CREATE(self, msg, *args):
@@ -202,6 +294,14 @@ class ConsumingConnector(BaseAMQPConnector):
         """
         self._close()
 
+    def on_broker_msg_CHANNEL_AMQP_MESSAGE_PROCESSED(self, msg, *args):
+        """ A service has finished processing a message so it can be acknowledged or rejected.
+        """
+        with self.channel_amqp_lock:
+            consumer = self.channel_amqp.get('consumer')
+            if consumer:
+                consumer.on_processed(msg.consumer_tag, msg.delivery_tag, msg.is_ok)
+
     def on_broker_msg_CHANNEL_AMQP_CLOSE(self, msg, *args):
         """ Stops the consumer, ODB connection and exits the process.
         """
@@ -11,15 +11,19 @@ from __future__ import absolute_import, division, print_function
 # stdlib
 import logging, os
 from datetime import datetime
+from threading import Event, RLock, Thread
+from traceback import format_exc
 
 # Bunch
 from bunch import Bunch
 
 # Kombu
 from kombu import Connection
-from kombu.pools import producers, reset as reset_pools
 from kombu.transport.pyamqp import Transport
 
+# Paste
+from paste.util.converters import asbool
+
 # Zato
 from zato.common import TRACE1
 from zato.common.broker_message import MESSAGE_TYPE, OUTGOING, TOPICS
@@ -30,6 +34,10 @@ from zato.server.connection import setup_logging, start_connector as _start_conn
 ENV_ITEM_NAME = 'ZATO_CONNECTOR_AMQP_OUT_ID'
 CONN_TEMPLATE = 'amqp://{username}:{password}@{host}:{port}/{vhost}'
 COMPONENT_PREFIX = 'out-amqp'
+
+# How many times within each heartbeat interval a connection checks whether heartbeats need to be sent or were missed
+DEFAULT_HEARTBEAT_CHECK_RATE = 2
+
 logger = logging.getLogger('zato_connector')
 
 class _Transport(Transport):
@@ -54,6 +62,7 @@ class _Transport(Transport):
                                ssl=conninfo.ssl,
                                connect_timeout=conninfo.connect_timeout,
                                heartbeat=conninfo.heartbeat,
+                               confirm_publish=(conninfo.transport_options or {}).get('confirm_publish', False),
                                client_properties={'zato-component':get_component_name(COMPONENT_PREFIX)})
 
         conn.client = self.client
@@ -89,12 +98,100 @@ class PublisherFacade(object):
 
         self.broker_client.publish(params, msg_type=MESSAGE_TYPE.TO_AMQP_PUBLISHING_CONNECTOR_ALL)
 
+    def send_many(self, msgs, out_name, exchange, routing_key, properties={}, headers={}, *args, **kwargs):
+        """ Like send but publishes a list of messages, all to the same exchange and with the same routing key,
+        properties and headers, in a single message to the Zato broker.
+        """
+        params = {}
+        params['action'] = OUTGOING.AMQP_PUBLISH_MANY.value
+        params['out_name'] = out_name
+        params['body'] = list(msgs)
+        params['exchange'] = bytes(exchange)
+        params['routing_key'] = bytes(routing_key)
+        params['properties'] = properties
+        params['headers'] = headers
+        params['args'] = args
+        params['kwargs'] = kwargs
+
+        self.broker_client.publish(params, msg_type=MESSAGE_TYPE.TO_AMQP_PUBLISHING_CONNECTOR_ALL)
+
     def conn(self):
         """ Returns self. Added to make the facade look like other outgoing
         connection wrappers.
         """
         return self
 
+class Publisher(object):
+    """ A long-lived connection, along with a channel, through which all messages of an outgoing AMQP connection
+    are published. It is established when the first message is published and re-established if the broker goes away,
+    either when publishing or when a background thread checking heartbeats finds out that the broker stopped responding.
+    With confirm_publish, each publish waits until the broker confirms it has taken over the message.
+    """
+    def __init__(self, conn_url, heartbeat=None, confirm_publish=False, heartbeat_check_rate=DEFAULT_HEARTBEAT_CHECK_RATE,
+            conn_class=_Connection):
+        self.conn_url = conn_url
+        self.heartbeat = int(heartbeat or 0)
+        self.confirm_publish = confirm_publish
+        self.heartbeat_check_rate = heartbeat_check_rate
+        self.conn_class = conn_class
+        self.conn = None
+        self.producer = None
+        self.lock = RLock()
+        self.closed = Event()
+        self.heartbeat_thread = None
+
+        # Metrics
+        self.connects = 0
+        self.published = 0
+
+        if self.heartbeat:
+            self.heartbeat_thread = Thread(target=self._check_heartbeats)
+            self.heartbeat_thread.daemon = True
+            self.heartbeat_thread.start()
+
+    def _connect(self):
+        self.conn = self.conn_class(self.conn_url, heartbeat=self.heartbeat,
+            transport_options={'confirm_publish': self.confirm_publish})
+        self.producer = self.conn.Producer()
+        self.connects += 1
+
+    def _disconnect(self):
+        if self.conn:
+            try:
+                self.conn.release()
+            except Exception, e:
+                logger.info('Ignoring exception while releasing an AMQP connection, e:`%s`', format_exc(e))
+            finally:
+                self.conn = None
+                self.producer = None
+
+    def _check_heartbeats(self):
+        while not self.closed.wait(self.heartbeat / float(self.heartbeat_check_rate)):
+            with self.lock:
+                if self.conn:
+                    try:
+                        self.conn.heartbeat_check(rate=self.heartbeat_check_rate)
+                    except Exception, e:
+                        logger.warn('AMQP heartbeat check failed, will reconnect on next publish, e:`%s`', format_exc(e))
+                        self._disconnect()
+
+    def publish(self, bodies, exchange, routing_key, headers, properties):
+        """ Publishes one or more messages, all to the same exchange and with the same routing key, headers and properties.
+        """
+        with self.lock:
+            if not self.conn:
+                self._connect()
+
+            for body in bodies:
+                self.producer.publish(body, retry=True, routing_key=routing_key, exchange=exchange, headers=headers,
+                    **properties)
+                self.published += 1
+
+    def close(self):
+        with self.lock:
+            self.closed.set()
+            self._disconnect()
+
 class OutgoingConnector(BaseAMQPConnector):
     """ An AMQP publishing connector started as a subprocess.
     """
@@ -109,6 +206,7 @@ class OutgoingConnector(BaseAMQPConnector):
         }
         self.broker_messages = self.broker_callbacks.keys()
         self.component_name = get_component_name('out-amqp')
+        self.publisher = None
 
         if init:
             self._init()
@@ -141,7 +239,7 @@ class OutgoingConnector(BaseAMQPConnector):
         if super(OutgoingConnector, self).filter(msg):
             return True
 
-        elif msg.action == OUTGOING.AMQP_PUBLISH.value:
+        elif msg.action in(OUTGOING.AMQP_PUBLISH.value, OUTGOING.AMQP_PUBLISH_MANY.value):
             if self.out_amqp.name == msg.out_name:
                 return True
         elif msg.action in(OUTGOING.AMQP_EDIT.value, OUTGOING.AMQP_DELETE.value):
@@ -191,9 +289,17 @@ class OutgoingConnector(BaseAMQPConnector):
         """
         self._close()
 
-    def on_broker_msg_OUTGOING_AMQP_PUBLISH(self, msg, *args):
-        """ Publishes an AMQP message on the broker.
+    def _get_publisher(self):
+        """ Returns a publisher using the current AMQP definition, creating it if there isn't any yet.
         """
+        if not self.publisher:
+            config = (self.fs_server_config or {}).get('out_amqp', {})
+            self.publisher = Publisher(CONN_TEMPLATE.format(**self.def_amqp), self.def_amqp.heartbeat,
+                asbool(config.get('confirm_publish', False)),
+                int(config.get('heartbeat_check_rate', DEFAULT_HEARTBEAT_CHECK_RATE)))
+        return self.publisher
+
+    def _publish(self, msg, bodies):
         properties = {}
         msg_properties = msg['properties']
 
@@ -214,15 +320,25 @@ class OutgoingConnector(BaseAMQPConnector):
         if not 'X-Zato-Msg-TS' in headers:
             headers['X-Zato-Msg-TS'] = datetime.utcnow().isoformat()
 
-        conn = _Connection(CONN_TEMPLATE.format(**self.def_amqp), heartbeat=self.def_amqp.heartbeat)
+        with self.out_amqp_lock:
+            self._get_publisher().publish(bodies, msg.exchange, msg.routing_key, headers, properties)
 
-        with producers[conn].acquire(block=True) as producer:
-            producer.publish(msg.body, retry=True, routing_key=msg.routing_key, exchange=msg.exchange, headers=headers, **properties)
+    def on_broker_msg_OUTGOING_AMQP_PUBLISH(self, msg, *args):
+        """ Publishes an AMQP message on the broker.
+        """
+        self._publish(msg, [msg.body])
+
+    def on_broker_msg_OUTGOING_AMQP_PUBLISH_MANY(self, msg, *args):
+        """ Publishes a list of AMQP messages on the broker.
+        """
+        self._publish(msg, msg.body)
 
     def _stop_amqp_connection(self):
         """ Stops any underlying connections.
         """
-        reset_pools()
+        if self.publisher:
+            self.publisher.close()
+            self.publisher = None
 
     def _recreate_sender(self):
         return self._stop_amqp_connection()
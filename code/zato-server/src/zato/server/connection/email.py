@@ -9,18 +9,24 @@ Licensed under LGPLv3, see LICENSE.txt for terms and conditions.
 from __future__ import absolute_import, division, print_function, unicode_literals
 
 # stdlib
+import socket
 from contextlib import contextmanager
 from cStringIO import StringIO
 from logging import getLogger, INFO
+from smtplib import SMTP, SMTP_SSL, SMTPServerDisconnected
+from time import time
 from traceback import format_exc
 
+# gevent
+from gevent.lock import RLock, Semaphore
+
 # imbox
 from imbox import Imbox as _Imbox
 from imbox.imap import ImapTransport as _ImapTransport
 from imbox.parser import parse_email
 
 # Outbox
-from outbox import AnonymousOutbox, Attachment, Email, Outbox
+from outbox import Attachment, Email
 
 # Zato
 from zato.common import IMAPMessage, EMAIL
@@ -34,6 +40,9 @@ _modes = {
     EMAIL.SMTP.MODE.STARTTLS.value: 'TLS'
 }
 
+# Errors after which an SMTP session cannot be used anymore
+_disconnected = (SMTPServerDisconnected, socket.error)
+
 # ################################################################################################################################
 
 class Imbox(_Imbox):
@@ -95,28 +104,130 @@ class _Connection(object):
 
 # ################################################################################################################################
 
+class SMTPPool(object):
+    """ A pool of sessions to an SMTP server. Sessions are established only when needed and are reused as long as they have not
+    been idle for longer than idle_timeout seconds. Sessions idle for longer than ping_after seconds are checked with NOOP
+    before they are reused. No more than size sessions are in use at a time, anyone else waits for one to be returned.
+    """
+    def __init__(self, connect_func, size=EMAIL.DEFAULT.SMTP_POOL_SIZE, idle_timeout=EMAIL.DEFAULT.SMTP_IDLE_TIMEOUT,
+            ping_after=EMAIL.DEFAULT.SMTP_PING_AFTER):
+        self.connect_func = connect_func
+        self.size = size
+        self.idle_timeout = idle_timeout
+        self.ping_after = ping_after
+        self.is_closed = False
+
+        self._idle = [] # (last_used, session) tuples, the most recently used session is the last one
+        self._semaphore = Semaphore(size)
+        self._lock = RLock()
+
+    def _ping(self, session):
+        try:
+            return session.noop()[0] == 250
+        except Exception:
+            return False
+
+    def _close(self, session):
+        try:
+            session.quit()
+        except Exception:
+            session.close()
+
+    def get(self, new=False):
+        """ Returns a session, either an idle one or a new one unless new is True in which case it is always a new one.
+        """
+        self._semaphore.acquire()
+
+        try:
+            while not new:
+
+                with self._lock:
+                    if not self._idle:
+                        break
+                    last_used, session = self._idle.pop()
+
+                idle_for = time() - last_used
+
+                if idle_for > self.idle_timeout or (idle_for > self.ping_after and not self._ping(session)):
+                    self._close(session)
+                else:
+                    return session
+
+            return self.connect_func()
+
+        except Exception:
+            self._semaphore.release()
+            raise
+
+    def put(self, session, is_usable=True):
+        """ Returns a session to the pool, closing it instead if it cannot be used anymore or if the pool has been closed.
+        Closes any other sessions that have been idle for too long too.
+        """
+        to_close = []
+        now = time()
+
+        try:
+            with self._lock:
+                if is_usable and not self.is_closed:
+                    self._idle.append((now, session))
+                else:
+                    to_close.append(session)
+
+                while self._idle and now - self._idle[0][0] > self.idle_timeout:
+                    to_close.append(self._idle.pop(0)[1])
+        finally:
+            self._semaphore.release()
+
+        for session in to_close:
+            self._close(session)
+
+    def close(self):
+        """ Closes all idle sessions, the ones currently in use are closed when they are returned.
+        """
+        with self._lock:
+            self.is_closed = True
+            to_close, self._idle = self._idle, []
+
+        for last_used, session in to_close:
+            self._close(session)
+
+# ################################################################################################################################
+
 class SMTPConnection(_Connection):
-    def __init__(self, config, config_no_sensitive):
+    def __init__(self, config, config_no_sensitive, pool_config=None):
         self.config = config
         self.config_no_sensitive = config_no_sensitive
 
-        self.conn_args = [self.config.host.encode('utf-8'), int(self.config.port), self.config.mode_outbox,
-            self.config.is_debug, self.config.timeout]
+        self.host = self.config.host.encode('utf-8')
+        self.port = int(self.config.port)
 
-        if config.username or config.password:
+        self.username = (self.config.username or '').encode('utf-8') or None
+        self.password = (self.config.password or '').encode('utf-8') or None
 
-            password = self.config.password.encode('utf-8') or None
-            username = self.config.username.encode('utf-8') or None
+        pool_config = pool_config or {}
 
-            self.conn_class = Outbox
+        self.pool = SMTPPool(self.connect,
+            int(pool_config.get('pool_size', EMAIL.DEFAULT.SMTP_POOL_SIZE)),
+            float(pool_config.get('idle_timeout', EMAIL.DEFAULT.SMTP_IDLE_TIMEOUT)),
+            float(pool_config.get('ping_after', EMAIL.DEFAULT.SMTP_PING_AFTER)))
 
-            self.conn_args.insert(0, password)
-            self.conn_args.insert(0, username)
+    def connect(self):
+        """ Returns a new SMTP session, already authenticated if credentials are configured.
+        """
+        smtp_class = SMTP_SSL if self.config.mode_outbox == 'SSL' else SMTP
 
-        else:
-            self.conn_class = AnonymousOutbox
+        session = smtp_class(self.host, self.port, timeout=self.config.timeout)
+        session.set_debuglevel(self.config.is_debug)
 
-    def send(self, msg, from_=None):
+        if self.config.mode_outbox == 'TLS':
+            session.starttls()
+
+        if self.username or self.password:
+            session.login(self.username, self.password)
+
+        return session
+
+    def _send(self, session, msg, from_):
 
         headers = msg.headers or {}
         atts = [Attachment(att['name'], StringIO(att['contents'])) for att in msg.attachments] if msg.attachments else []
@@ -133,16 +244,70 @@ class SMTPConnection(_Connection):
         body, html_body = (None, msg.body) if msg.is_html else (msg.body, None)
         email = Email(msg.to, msg.subject, body, html_body, msg.charset, headers, msg.is_rfc2231)
 
+        from_ = from_ or msg.from_
+        mime = email.as_mime(atts)
+
+        if 'From' not in mime:
+            mime['From'] = from_
+
+        session.sendmail(from_, email.recipients, mime.as_string())
+
+        if logger.isEnabledFor(INFO):
+            atts_info = ', '.join(att.name for att in atts) if atts else None
+            logger.info('SMTP message `%r` sent from `%r` to `%r`, attachments:`%r`', msg.subject, msg.from_, msg.to, atts_info)
+
+    def send(self, msg, from_=None):
+        """ Sends a message, returning True if it was sent and False otherwise.
+        """
+        return self.send_many([msg], from_)[0]
+
+    def send_many(self, messages, from_=None):
+        """ Sends all the messages, one after another, over a single session, reconnecting if the server closes it midway.
+        Returns a list of booleans, one for each message, indicating whether it was sent.
+        """
+        messages = list(messages)
+        results = []
+        session = None
+
         try:
-            with self.conn_class(*self.conn_args) as conn:
-                conn.send(email, atts, from_ or msg.from_)
-        except Exception, e:
-            logger.warn('Could not send an SMTP message to `%s`, e:`%s`', self.config_no_sensitive, format_exc(e))
-        else:
-            if logger.isEnabledFor(INFO):
-                atts_info = ', '.join(att.name for att in atts) if atts else None
-                logger.info('SMTP message `%r` sent from `%r` to `%r`, attachments:`%r`',
-                    msg.subject, msg.from_, msg.to, atts_info)
+            for idx, msg in enumerate(messages):
+
+                try:
+                    if session is None:
+                        session = self.pool.get()
+                except Exception, e:
+                    logger.warn('Could not connect to SMTP `%s`, e:`%s`', self.config_no_sensitive, format_exc(e))
+                    results.extend([False] * (len(messages) - idx))
+                    break
+
+                try:
+                    try:
+                        self._send(session, msg, from_)
+                    except _disconnected:
+
+                        # The server may have closed the session since it was last used, try once more over a new one.
+                        self.pool.put(session, False)
+                        session = None
+                        session = self.pool.get(True)
+                        self._send(session, msg, from_)
+
+                except Exception, e:
+                    if session is not None and isinstance(e, _disconnected):
+                        self.pool.put(session, False)
+                        session = None
+
+                    results.append(False)
+                    logger.warn('Could not send an SMTP message to `%s`, e:`%s`', self.config_no_sensitive, format_exc(e))
+                else:
+                    results.append(True)
+        finally:
+            if session is not None:
+                self.pool.put(session)
+
+        return results
+
+    def close(self):
+        self.pool.close()
 
 # ################################################################################################################################
 
@@ -155,9 +320,22 @@ class SMTPAPI(BaseAPI):
 class SMTPConnStore(BaseStore):
     """ Stores connections to SMTP.
     """
+    def __init__(self, pool_config=None):
+        super(SMTPConnStore, self).__init__()
+        self.pool_config = pool_config or {}
+
     def create_impl(self, config, config_no_sensitive):
         config.mode_outbox = _modes[config.mode]
-        return SMTPConnection(config, config_no_sensitive)
+        return SMTPConnection(config, config_no_sensitive, self.pool_config)
+
+    def _delete(self, name):
+        """ Closes sessions of a definition being deleted, or edited, before deleting it.
+        """
+        item = self.items.get(name)
+        if item and item.impl:
+            item.impl.close()
+
+        super(SMTPConnStore, self)._delete(name)
 
 # ################################################################################################################################
 
@@ -0,0 +1,209 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (C) 2016 Dariusz Suchojad <dsuch at zato.io>
+
+Licensed under LGPLv3, see LICENSE.txt for terms and conditions.
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+# stdlib
+import logging
+from collections import OrderedDict
+from datetime import datetime
+from json import dumps
+from time import time
+from traceback import format_exc
+
+# gevent
+from gevent.queue import Empty, Full, Queue
+
+# Zato
+from zato.common import AUDIT_LOG
+
+logger = logging.getLogger(__name__)
+
+# ################################################################################################################################
+
+# Response columns of a request stored before its response is known
+_no_response = {
+    'resp_time': None,
+    'invoke_ok': None,
+    'auth_ok': None,
+    'resp_headers': None,
+    'resp_payload': None,
+}
+
+def _json_default(value):
+    return value.isoformat() if isinstance(value, datetime) else repr(value)
+
+# ################################################################################################################################
+
+class AuditQueue(object):
+    """ A bounded per-worker queue of HTTP audit records, drained by a background greenlet which writes them to ODB
+    in batches of up to batch_size records or after flush_interval milliseconds, whichever comes first. A response
+    which is in the same batch as its request is stored along with it, other responses update their requests'
+    rows in the same transaction. What happens if the queue is full depends on the overflow policy - callers will
+    either wait for it to be drained, the oldest record will be dropped or the new one will be appended to a spill file.
+    """
+    def __init__(self, odb, max_size=AUDIT_LOG.DEFAULT_QUEUE_SIZE, batch_size=AUDIT_LOG.DEFAULT_BATCH_SIZE,
+            flush_interval=AUDIT_LOG.DEFAULT_FLUSH_INTERVAL, overflow=AUDIT_LOG.OVERFLOW.BLOCK, spill_path=None):
+
+        if overflow not in AUDIT_LOG.OVERFLOW:
+            raise ValueError('Invalid overflow `{}`, should be one of `{}`'.format(overflow, list(AUDIT_LOG.OVERFLOW)))
+
+        if overflow == AUDIT_LOG.OVERFLOW.SPILL_TO_FILE and not spill_path:
+            raise ValueError('Overflow `{}` requires spill_path'.format(overflow))
+
+        self.odb = odb
+        self.max_size = max_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval / 1000.0 # Given in milliseconds
+        self.overflow = overflow
+        self.spill_path = spill_path
+        self.queue = Queue(max_size)
+        self.keep_running = True
+
+        # Metrics
+        self.flushes = 0
+        self.flushed = 0
+        self.dropped = 0
+        self.spilled = 0
+        self.errors = 0
+        self.last_flush_time = 0.0
+        self.max_flush_time = 0.0
+        self.total_flush_time = 0.0
+
+    def put_request(self, item):
+        """ Enqueues information about a request - a dict of HTTSOAPAudit's request columns.
+        """
+        self._put((True, item))
+
+    def put_response(self, item):
+        """ Enqueues information about a response - a dict of HTTSOAPAudit's response columns along with a cid.
+        """
+        self._put((False, item))
+
+    def _put(self, record):
+        if self.overflow == AUDIT_LOG.OVERFLOW.BLOCK:
+            self.queue.put(record)
+            return
+
+        try:
+            self.queue.put_nowait(record)
+        except Full:
+            if self.overflow == AUDIT_LOG.OVERFLOW.DROP_OLDEST:
+                try:
+                    self.queue.get_nowait()
+                except Empty:
+                    pass
+                else:
+                    self.dropped += 1
+                self.queue.put_nowait(record)
+            else:
+                self._spill([record])
+
+    def _spill(self, records):
+        """ Appends records to the spill file, one JSON document per line.
+        """
+        try:
+            with open(self.spill_path, 'ab') as f:
+                for is_request, item in records:
+                    f.write(dumps({'type': 'request' if is_request else 'response', 'data': item}, default=_json_default))
+                    f.write(b'\n')
+        except Exception, e:
+            logger.warn('Could not spill %d HTTP audit record(s) to `%s`, e:`%s`', len(records), self.spill_path, format_exc(e))
+        else:
+            self.spilled += len(records)
+
+    def get_batch(self):
+        """ Blocks until there is at least one record in the queue and returns it along with any other records
+        that arrive within flush_interval, up to batch_size records.
+        """
+        batch = [self.queue.get()]
+        deadline = time() + self.flush_interval
+
+        while len(batch) < self.batch_size:
+            timeout = deadline - time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(self.queue.get(timeout=timeout))
+            except Empty:
+                break
+
+        return batch
+
+    def flush(self, batch):
+        """ Writes a batch of records to ODB.
+        """
+        requests = OrderedDict()
+        responses = []
+
+        for is_request, item in batch:
+            if is_request:
+                request = requests[item['cid']] = dict(_no_response)
+                request.update(item)
+            else:
+                request = requests.get(item['cid'])
+                if request:
+                    request.update(item)
+                else:
+                    responses.append(item)
+
+        start = time()
+
+        try:
+            self.odb.audit_set_many_http_soap(requests.values(), responses)
+        except Exception, e:
+            self.errors += 1
+            logger.warn('Could not store %d HTTP audit record(s), e:`%s`', len(batch), format_exc(e))
+
+            if self.overflow == AUDIT_LOG.OVERFLOW.SPILL_TO_FILE:
+                self._spill(batch)
+        else:
+            self.flushed += len(batch)
+        finally:
+            flush_time = (time() - start) * 1000
+            self.flushes += 1
+            self.last_flush_time = flush_time
+            self.max_flush_time = max(self.max_flush_time, flush_time)
+            self.total_flush_time += flush_time
+
+    def drain(self):
+        """ Writes to ODB all the records currently queued, without waiting for any new ones.
+        """
+        while not self.queue.empty():
+            batch = []
+            while len(batch) < self.batch_size and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+            self.flush(batch)
+
+    def run(self):
+        """ Writes records to ODB as they arrive, meant to be run in a background greenlet.
+        """
+        while self.keep_running:
+            self.flush(self.get_batch())
+
+    def stop(self):
+        """ Stops the background greenlet and writes to ODB all the records still queued.
+        """
+        self.keep_running = False
+        self.drain()
+
+    def get_stats(self):
+        """ Returns current depth of the queue and how long it takes to write batches to ODB, in milliseconds.
+        """
+        return {
+            'depth': self.queue.qsize(),
+            'max_size': self.max_size,
+            'flushes': self.flushes,
+            'flushed': self.flushed,
+            'dropped': self.dropped,
+            'spilled': self.spilled,
+            'errors': self.errors,
+            'last_flush_time': self.last_flush_time,
+            'max_flush_time': self.max_flush_time,
+            'mean_flush_time': self.total_flush_time / self.flushes if self.flushes else 0.0,
+        }
@@ -23,11 +23,13 @@ from django.http import QueryDict
 from paste.util.converters import asbool
 
 # Zato
-from zato.common import CHANNEL, DATA_FORMAT, HTTP_RESPONSES, SEC_DEF_TYPE, SIMPLE_IO, TOO_MANY_REQUESTS, TRACE1, \
-     URL_PARAMS_PRIORITY, URL_TYPE, zato_namespace, ZATO_ERROR, ZATO_NONE, ZATO_OK
+from zato.bunch import Bunch
+from zato.common import CHANNEL, DATA_FORMAT, HTTP_RESPONSES, HTTP_STREAMING, SEC_DEF_TYPE, SIMPLE_IO, TOO_MANY_REQUESTS, \
+     TRACE1, URL_PARAMS_PRIORITY, URL_TYPE, zato_namespace, ZATO_ERROR, ZATO_NONE, ZATO_OK
 from zato.common.util import payload_from_request
 from zato.server.connection.http_soap import BadRequest, ClientHTTPError, Forbidden, MethodNotAllowed, NotFound, \
      TooManyRequests, Unauthorized
+from zato.server.connection.http_soap.stream import is_stream, RequestBody
 from zato.server.service.internal import AdminService
 
 logger = logging.getLogger(__name__)
@@ -44,6 +46,9 @@ status_response = {}
 for code, response in HTTP_RESPONSES.items():
     status_response[code] = b'{} {}'.format(code, response)
 
+# Security definitions that need to read whole requests, including these of streaming channels
+sec_needs_body = (SEC_DEF_TYPE.OAUTH, SEC_DEF_TYPE.WSS, SEC_DEF_TYPE.XPATH_SEC)
+
 soap_doc = b"""<?xml version='1.0' encoding='UTF-8'?><soap:Envelope xmlns:soap="http://schemas.xmlsoap.org/soap/envelope/" xmlns="https://zato.io/ns/20130518"><soap:Body>{body}</soap:Body></soap:Envelope>""" # noqa
 
 zato_message_soap = b"""<soap:Envelope xmlns:soap="http://schemas.xmlsoap.org/soap/envelope/" xmlns="https://zato.io/ns/20130518">
@@ -94,11 +99,13 @@ def get_client_error_wrapper(transport, data_format):
 class RequestDispatcher(object):
     """ Dispatches all the incoming HTTP/SOAP requests to appropriate handlers.
     """
-    def __init__(self, url_data=None, security=None, request_handler=None, simple_io_config=None):
+    def __init__(self, url_data=None, security=None, request_handler=None, simple_io_config=None, streaming_config=None):
         self.url_data = url_data
         self.security = security
         self.request_handler = request_handler
         self.simple_io_config = simple_io_config
+        self.streaming_config = streaming_config or Bunch(chunk_size=HTTP_STREAMING.DEFAULT_CHUNK_SIZE, spool=False,
+            spool_threshold=HTTP_STREAMING.DEFAULT_SPOOL_THRESHOLD, spool_dir=None)
 
     def wrap_error_message(self, cid, url_type, msg):
         """ Wraps an error message in a transport-specific envelope.
@@ -121,8 +128,14 @@ class RequestDispatcher(object):
 
         return soap_action
 
+    def get_request_body(self, wsgi_environ):
+        """ Returns a file-like object through which services of streaming channels read their requests.
+        """
+        config = self.streaming_config
+        return RequestBody(wsgi_environ['wsgi.input'], config.chunk_size, config.spool, config.spool_threshold, config.spool_dir)
+
     def dispatch(self, cid, req_timestamp, wsgi_environ, worker_store, _status_response=status_response,
-        no_url_match=(None, False)):
+        no_url_match=(None, False), _sec_needs_body=sec_needs_body):
         """ Base method for dispatching incoming HTTP/SOAP messages. If the security
         configuration is one of the technical account or HTTP basic auth,
         the security validation is being performed. Otherwise, that step
@@ -149,12 +162,18 @@ class RequestDispatcher(object):
         # This is needed in parallel.py's on_wsgi_request
         wsgi_environ['zato.http.channel_item'] = channel_item
 
-        payload = wsgi_environ['wsgi.input'].read()
+        # Requests of streaming channels are not read here - it's up to services to read as much of them as they need to.
+        is_streaming = channel_item and channel_item.get('is_streaming')
+
+        if is_streaming:
+            payload = wsgi_environ['zato.http.request.body'] = self.get_request_body(wsgi_environ)
+        else:
+            payload = wsgi_environ['wsgi.input'].read()
 
         # OK, we can possibly handle it
         if url_match not in no_url_match:
 
-            # This is a synchronous call so that whatever happens next we are always
+            # Queued before anything else happens so that we are always
             # able to have at least initial audit log of requests.
             if channel_item['audit_enabled']:
                 self.url_data.audit_set_request(cid, channel_item, payload, wsgi_environ)
@@ -178,22 +197,28 @@ class RequestDispatcher(object):
                 # parsed. If so, we do it here and reuse it in other places
                 # so it doesn't have to be parsed two or more times.
                 sec = self.url_data.url_sec[channel_item['match_target']]
+                post_data = {}
+
                 if sec.sec_def != ZATO_NONE:
+
+                    # Streamed requests are read in full, without being consumed, only if credentials are in their bodies
+                    if is_streaming and sec.sec_def.sec_type in _sec_needs_body:
+                        sec_payload = payload.getvalue()
+                    else:
+                        sec_payload = payload
+
                     if sec.sec_def.sec_type == SEC_DEF_TYPE.OAUTH:
-                        post_data = QueryDict(payload, encoding='utf-8')
+                        post_data = QueryDict(sec_payload, encoding='utf-8')
 
                     # Eagerly parse the request but only if we expect XPath-based credentials. The request will be re-used
                     # in later steps, it won't be parsed twice or more.
                     elif sec.sec_def.sec_type == SEC_DEF_TYPE.XPATH_SEC:
                         wsgi_environ['zato.request.payload'] = payload_from_request(
-                            cid, payload, channel_item.data_format, channel_item.transport)
+                            cid, sec_payload, channel_item.data_format, channel_item.transport)
 
                     # Will raise an exception on any security violation
                     self.url_data.check_security(
-                        sec, cid, channel_item, path_info, payload, wsgi_environ, post_data, worker_store)
-
-                else:
-                    post_data = {}
+                        sec, cid, channel_item, path_info, sec_payload, wsgi_environ, post_data, worker_store)
 
                 # This is handy if someone invoked URLData's OAuth API manually
                 wsgi_environ['zato.oauth.post_data'] = post_data
@@ -286,9 +311,13 @@ class RequestHandler(object):
         """
         data_format = kwargs.get('data_format')
         transport = kwargs.get('transport')
+        channel_item = kwargs.get('channel_item')
+
+        # Services of streaming channels may return generators or file-like objects which are sent to clients as they are
+        if not (channel_item and channel_item.get('is_streaming') and is_stream(service.response.payload)):
+            self.set_payload(service.response, data_format, transport, service)
 
-        self.set_payload(service.response, data_format, transport, service)
-        self.set_content_type(service.response, data_format, transport, kwargs.get('url_match'), kwargs.get('channel_item'))
+        self.set_content_type(service.response, data_format, transport, kwargs.get('url_match'), channel_item)
 
         return service.response
 
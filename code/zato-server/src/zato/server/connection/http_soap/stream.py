@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (C) 2016 Dariusz Suchojad <dsuch at zato.io>
+
+Licensed under LGPLv3, see LICENSE.txt for terms and conditions.
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+# stdlib
+from itertools import chain
+from tempfile import SpooledTemporaryFile
+from types import GeneratorType
+
+# Zato
+from zato.common import HTTP_STREAMING
+
+# ################################################################################################################################
+
+class RequestBody(object):
+    """ A request body of a streaming HTTP channel. Rather than being read into RAM in full before a service is invoked,
+    it is read by the service itself, through a file-like API, when and how much of it the service needs.
+
+    Unless spooling is enabled, the body can be read once only, though its beginning can be peeked at without consuming it,
+    e.g. by audit log. If spooling is enabled, the body is copied to a temporary file upon first access, which is kept
+    in RAM as long as it is no bigger than spool_threshold bytes, and which can be read any number of times.
+    """
+    def __init__(self, wsgi_input, chunk_size=HTTP_STREAMING.DEFAULT_CHUNK_SIZE, spool=False,
+            spool_threshold=HTTP_STREAMING.DEFAULT_SPOOL_THRESHOLD, spool_dir=None):
+        self.chunk_size = chunk_size
+        self.spool = spool
+        self.spool_threshold = spool_threshold
+        self.spool_dir = spool_dir or None
+        self.bytes_read = 0 # How many bytes have been read off the wire so far
+
+        self._input = wsgi_input
+        self._head = b'' # Bytes already read off the wire but not consumed yet
+        self._spool_file = None
+
+    def _read_input(self, size):
+        data = self._input.read(size)
+        self.bytes_read += len(data)
+        return data
+
+    def _read_input_all(self):
+        chunks = []
+        while True:
+            data = self._read_input(self.chunk_size)
+            if not data:
+                break
+            chunks.append(data)
+
+        return b''.join(chunks)
+
+    def _get_spool_file(self):
+        if self._spool_file is None:
+            self._spool_file = SpooledTemporaryFile(self.spool_threshold, dir=self.spool_dir, prefix='zato-http-')
+            while True:
+                data = self._read_input(self.chunk_size)
+                if not data:
+                    break
+                self._spool_file.write(data)
+
+            self._spool_file.seek(0)
+
+        return self._spool_file
+
+    def read(self, size=-1):
+        """ Reads up to size bytes of the body or all of what is left if size is negative.
+        """
+        if self.spool:
+            return self._get_spool_file().read(size)
+
+        if size < 0:
+            data = self._head + self._read_input_all()
+            self._head = b''
+
+        elif self._head:
+            data, self._head = self._head[:size], self._head[size:]
+            if len(data) < size:
+                data += self._read_input(size - len(data))
+
+        else:
+            data = self._read_input(size)
+
+        return data
+
+    def peek(self, size=-1):
+        """ Returns up to size bytes of the body, or all of it if size is negative, without consuming them.
+        """
+        if self.spool:
+            spool_file = self._get_spool_file()
+            position = spool_file.tell()
+            data = spool_file.read(size)
+            spool_file.seek(position)
+
+            return data
+
+        if size < 0:
+            self._head += self._read_input_all()
+        elif len(self._head) < size:
+            self._head += self._read_input(size - len(self._head))
+
+        return self._head if size < 0 else self._head[:size]
+
+    def getvalue(self):
+        """ Returns the whole body as a string, without consuming it. Meant for security definitions that
+        need the whole of a request before a service is invoked, e.g. WS-Security or OAuth.
+        """
+        return self.peek()
+
+    def seek(self, offset, whence=0):
+        """ Moves the current position within the body - available only if spooling is enabled.
+        """
+        if not self.spool:
+            raise IOError('Request body can be seeked only if spooling is enabled')
+
+        self._get_spool_file().seek(offset, whence)
+
+    def __iter__(self):
+        while True:
+            data = self.read(self.chunk_size)
+            if not data:
+                break
+            yield data
+
+    def close(self):
+        if self._spool_file is not None:
+            self._spool_file.close()
+
+    def __repr__(self):
+        return '<{} at {}, bytes_read:`{}`, spool:`{}`>'.format(
+            self.__class__.__name__, hex(id(self)), self.bytes_read, self.spool)
+
+# ################################################################################################################################
+
+def is_stream(payload):
+    """ Returns True if a response payload produced by a service is to be streamed back to the client,
+    i.e. if it is a generator or a file-like object, rather than one string.
+    """
+    return isinstance(payload, GeneratorType) or hasattr(payload, 'read')
+
+def iter_response(payload, chunk_size=HTTP_STREAMING.DEFAULT_CHUNK_SIZE, request_body=None):
+    """ Yields a streamed response chunk by chunk, encoding any unicode objects to UTF-8 on the way. Closes both the response,
+    if it is a file-like object, and the request body, if any, once the response is sent or if the client goes away.
+    """
+    try:
+        if hasattr(payload, 'read'):
+            chunks = iter(lambda: payload.read(chunk_size), b'')
+        else:
+            chunks = payload
+
+        for data in chunks:
+            if data:
+                yield data.encode('utf-8') if isinstance(data, unicode) else data
+
+    finally:
+        if hasattr(payload, 'close'):
+            payload.close()
+
+        if request_body is not None:
+            request_body.close()
+
+def peek_response(chunks, size):
+    """ Reads chunks of a streamed response until at least size bytes are available, e.g. for audit log, and returns them
+    along with an iterator over the whole of the response, including chunks already read.
+    """
+    head = []
+    head_len = 0
+
+    for data in chunks:
+        head.append(data)
+        head_len += len(data)
+
+        if head_len >= size:
+            break
+
+    return b''.join(head)[:size], chain(head, chunks)
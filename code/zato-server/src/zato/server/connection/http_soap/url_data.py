@@ -24,6 +24,9 @@ from oauth.oauth import OAuthDataStore, OAuthConsumer, OAuthRequest, OAuthServer
 # regex
 from regex import compile as re_compile
 
+# repoze
+from repoze.lru import LRUCache
+
 # sec-wall
 from secwall.server import on_basic_auth, on_wsse_pwd
 from secwall.wsse import WSSE
@@ -33,11 +36,12 @@ from sortedcontainers import SortedListWithKey
 
 # Zato
 from zato.bunch import Bunch
-from zato.common import AUDIT_LOG, DATA_FORMAT, MISC, MSG_PATTERN_TYPE, SEC_DEF_TYPE, TRACE1, ZATO_NONE
-from zato.common.broker_message import code_to_name, CHANNEL, SECURITY
+from zato.common import AUDIT_LOG, MISC, MSG_PATTERN_TYPE, SEC_DEF_TYPE, TRACE1, ZATO_NONE
+from zato.common.broker_message import code_to_name, SECURITY
 from zato.common.dispatch import dispatcher
 from zato.common.util import parse_tls_channel_security_definition
 from zato.server.connection.http_soap import Forbidden, Unauthorized
+from zato.server.connection.http_soap.stream import RequestBody
 
 logger = logging.getLogger(__name__)
 
@@ -84,6 +88,302 @@ class Matcher(object):
         if m:
             return dict(zip(self.group_names, m.groups()))
 
+# ################################################################################################################################
+
+# Characters that have a special meaning in regular expressions - any literal part of a pattern using them
+# cannot be matched by a simple string comparison and needs to go through a Matcher instead.
+_regex_meta_chars = frozenset('.^$*+?{}[]\\|()')
+
+_brace_pattern = re_compile('\{([a-zA-Z0-9 _\$.\-|=~^]+)\}')
+_param_segment = re_compile('[a-zA-Z0-9 _\$.\-|=~^]+$')
+_param_only_segment = re_compile('\{([a-zA-Z0-9 _\$.\-|=~^]+)\}$')
+
+class _RouterNode(object):
+    """ A single node of the segment trie kept by Router. Each URL path segment in a pattern is either a literal,
+    a whole-segment parameter such as '{cust_id}' or a partial one such as 'order-{order_id}.json'.
+    """
+    __slots__ = ('literal', 'param', 'partial', 'items')
+
+    def __init__(self):
+        self.literal = {}
+        self.param = None
+        self.partial = {}
+        self.items = []
+
+    def is_empty(self):
+        return not(self.literal or self.param or self.partial or self.items)
+
+class Router(object):
+    """ Finds the HTTP channel matching a given SOAP action and URL path. Channels are kept in a trie of URL path segments,
+    one per SOAP action, so that the cost of a match depends on the number of segments in a URL path rather than on how many
+    channels there are. Patterns that cannot be represented in the trie, e.g. because they use regex characters in literal
+    parts, are kept on a side list and matched through their Matchers as previously.
+
+    If more than one channel matches a given target, the one with the lowest name wins, same as when channels were matched
+    against one by one in the order of URLData.channel_data.
+    """
+    def __init__(self, separator=MISC.SEPARATOR):
+        self.separator = separator
+        self.roots = {}
+        self.fallback = []
+        self.fallback_sorted = True
+        self.match_targets = {} # id(item) -> match_target
+
+    def __len__(self):
+        return len(self.match_targets)
+
+# ################################################################################################################################
+
+    def _parse(self, match_target):
+        """ Splits a match target into a SOAP action and a list of segment specs or returns None if the target
+        cannot be represented in the trie.
+        """
+        soap_action, sep, url_path = match_target.partition(self.separator)
+
+        if not sep or not url_path.startswith('/') or _regex_meta_chars.intersection(soap_action):
+            return None
+
+        segments = []
+
+        for segment in url_path.split('/'):
+
+            # A plain string
+            if not _regex_meta_chars.intersection(segment):
+                segments.append(('literal', segment, None))
+                continue
+
+            # Exactly one parameter spanning the whole segment
+            if _param_only_segment.match(segment):
+                segments.append(('param', None, None))
+                continue
+
+            # A segment mixing literals and parameters - literal parts must not require a regex on their own.
+            if _regex_meta_chars.intersection(_brace_pattern.sub('', segment)):
+                return None
+
+            segments.append(('partial', segment, Matcher(segment).matcher))
+
+        return soap_action, segments
+
+    def add(self, match_target, item):
+        """ Adds a channel item under a given match target.
+        """
+        self.match_targets[id(item)] = match_target
+        parsed = self._parse(match_target)
+
+        if not parsed:
+            self.fallback.append(item)
+            self.fallback_sorted = False
+            return
+
+        soap_action, segments = parsed
+        node = self.roots.setdefault(soap_action, _RouterNode())
+
+        for type_, segment, regex in segments:
+            if type_ == 'literal':
+                node = node.literal.setdefault(segment, _RouterNode())
+            elif type_ == 'param':
+                if not node.param:
+                    node.param = _RouterNode()
+                node = node.param
+            else:
+                if segment not in node.partial:
+                    node.partial[segment] = (regex, _RouterNode())
+                node = node.partial[segment][1]
+
+        node.items.append((_internal_url_path_indicator in match_target, item))
+
+    def remove(self, item):
+        """ Removes a channel item previously added to the router. Does nothing if there is no such item.
+        """
+        match_target = self.match_targets.pop(id(item), None)
+        if match_target is None:
+            return
+
+        parsed = self._parse(match_target)
+
+        if not parsed:
+            for idx, fallback_item in enumerate(self.fallback):
+                if fallback_item is item:
+                    del self.fallback[idx]
+                    return
+            return
+
+        soap_action, segments = parsed
+        node = self.roots.get(soap_action)
+        path = [(self.roots, soap_action, node)]
+
+        for type_, segment, _ in segments:
+            if not node:
+                return
+
+            if type_ == 'literal':
+                parent, key, node = node.literal, segment, node.literal.get(segment)
+            elif type_ == 'param':
+                parent, key, node = node, 'param', node.param
+            else:
+                parent, key, node = node.partial, segment, node.partial.get(segment, (None, None))[1]
+
+            path.append((parent, key, node))
+
+        if not node:
+            return
+
+        for idx, (_, node_item) in enumerate(node.items):
+            if node_item is item:
+                del node.items[idx]
+                break
+        else:
+            return
+
+        # Prune nodes that no longer lead to any item
+        for parent, key, node in reversed(path):
+            if not node.is_empty():
+                break
+            if key == 'param':
+                parent.param = None
+            else:
+                del parent[key]
+
+# ################################################################################################################################
+
+    def _find(self, node, segments, idx, values, needs_user, best):
+        """ Walks the trie depth-first, collecting parameter values along the way. Returns a (name, item, values) tuple
+        for the lowest-named item matching all the segments or whatever 'best' was on input if nothing better was found.
+        """
+        if idx == len(segments):
+            for is_internal, item in node.items:
+                if needs_user and is_internal:
+                    continue
+                if best is None or item.name < best[0]:
+                    best = (item.name, item, values)
+            return best
+
+        segment = segments[idx]
+
+        child = node.literal.get(segment)
+        if child:
+            best = self._find(child, segments, idx+1, values, needs_user, best)
+
+        if node.param and _param_segment.match(segment):
+            best = self._find(node.param, segments, idx+1, values + [segment], needs_user, best)
+
+        for regex, child in node.partial.itervalues():
+            m = regex.match(segment)
+            if m:
+                best = self._find(child, segments, idx+1, values + list(m.groups()), needs_user, best)
+
+        return best
+
+    def match(self, url_path, soap_action, needs_user):
+        """ Returns a (match, item) tuple for a given URL path and SOAP action or (None, None) if no channel matches.
+        """
+        target = '{}{}{}'.format(soap_action, self.separator, url_path)
+
+        # Anything that could make the separator appear elsewhere in the target needs a full scan.
+        if self.separator in soap_action or not url_path.startswith('/'):
+            return self._match_linear(target, needs_user)
+
+        best = None
+        root = self.roots.get(soap_action)
+
+        if root:
+            best = self._find(root, url_path.split('/'), 0, [], needs_user, None)
+
+        # Fallback items are kept in the order of their names but sorted only when needed, i.e. here.
+        if not self.fallback_sorted:
+            self.fallback.sort(key=attrgetter('name'))
+            self.fallback_sorted = True
+
+        # Only fallback items sorting before the best match found so far may still take precedence over it.
+        for item in self.fallback:
+            if best and item.name >= best[0]:
+                break
+
+            if needs_user and item.match_target_compiled.is_internal:
+                continue
+
+            match = item.match_target_compiled.match(target)
+            if match is not None:
+                return match, item
+
+        if best:
+            _, item, values = best
+            return dict(zip(item.match_target_compiled.group_names, values)), item
+
+        return None, None
+
+    def _iter_items(self):
+        """ Yields all the items known to the router, in no particular order.
+        """
+        for item in self.fallback:
+            yield item
+
+        stack = list(self.roots.values())
+        while stack:
+            node = stack.pop()
+            for _, item in node.items:
+                yield item
+
+            stack.extend(node.literal.values())
+            stack.extend(child for _, child in node.partial.values())
+
+            if node.param:
+                stack.append(node.param)
+
+    def _match_linear(self, target, needs_user):
+        """ Matches a target against each item in turn, in the order of their names.
+        """
+        for item in sorted(self._iter_items(), key=attrgetter('name')):
+            if needs_user and item.match_target_compiled.is_internal:
+                continue
+
+            match = item.match_target_compiled.match(target)
+            if match is not None:
+                return match, item
+
+        return None, None
+
+class ChannelData(object):
+    """ HTTP channel items sorted by their names along with a Router that each change to the items is applied to,
+    so the two never go out of sync.
+    """
+    def __init__(self, channel_data=None, separator=MISC.SEPARATOR):
+        self.items = SortedListWithKey(channel_data, key=attrgetter('name'))
+        self.router = Router(separator)
+
+        for item in self.items:
+            self.router.add(item.match_target, item)
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+    def __getitem__(self, idx):
+        return self.items[idx]
+
+    def index(self, item):
+        return self.items.index(item)
+
+    def add(self, item):
+        self.items.add(item)
+        self.router.add(item.match_target, item)
+
+    # Items are always kept sorted so there is nothing to append to
+    append = add
+
+    def remove(self, item):
+        self.items.remove(item)
+        self.router.remove(item)
+
+    def pop(self, idx=-1):
+        item = self.items.pop(idx)
+        self.router.remove(item)
+
+        return item
+
 class OAuthStore(object):
     def __init__(self, oauth_config):
         self.oauth_config = oauth_config
@@ -94,8 +394,9 @@ class URLData(OAuthDataStore):
     def __init__(self, channel_data=None, url_sec=None, basic_auth_config=None, ntlm_config=None, oauth_config=None,
                  tech_acc_config=None, wss_config=None, apikey_config=None, aws_config=None, openstack_config=None,
                  xpath_sec_config=None, tls_channel_sec_config=None, tls_key_cert_config=None, kvdb=None, broker_client=None,
-                 odb=None, json_pointer_store=None, xpath_store=None):
-        self.channel_data = SortedListWithKey(channel_data, key=attrgetter('name'))
+                 odb=None, json_pointer_store=None, xpath_store=None, url_path_cache_size=MISC.DEFAULT_HTTP_URL_PATH_CACHE_SIZE,
+                 audit_queue=None):
+        self.channel_data = ChannelData(channel_data)
         self.url_sec = url_sec
         self.basic_auth_config = basic_auth_config
         self.ntlm_config = ntlm_config
@@ -111,6 +412,7 @@ class URLData(OAuthDataStore):
         self.kvdb = kvdb
         self.broker_client = broker_client
         self.odb = odb
+        self.audit_queue = audit_queue
 
         self.json_pointer_store = json_pointer_store
         self.xpath_store = xpath_store
@@ -124,7 +426,9 @@ class URLData(OAuthDataStore):
         self._oauth_server.add_signature_method(OAuthSignatureMethod_HMAC_SHA1())
         self._oauth_server.add_signature_method(OAuthSignatureMethod_PLAINTEXT())
 
-        self.url_path_cache = {}
+        # Maps match targets to (match, channel_item) tuples of both static and dynamic URL paths
+        self.url_path_cache = LRUCache(url_path_cache_size)
+        self.router = self.channel_data.router
 
         dispatcher.listen_for_updates(SECURITY, self.dispatcher_callback)
 
@@ -352,27 +656,34 @@ class URLData(OAuthDataStore):
         target = '{}{}{}'.format(soap_action, self._target_separator, url_path)
 
         # Return from cache if already seen
-        try:
-            return self.url_path_cache[target]
-        except KeyError:
-            needs_user = not url_path.startswith('/zato')
+        cached = self.url_path_cache.get(target)
+        if cached:
+            match, item = cached
+            return match.copy(), item
 
-            for item in self.channel_data:
-                if needs_user and item.match_target_compiled.is_internal:
-                    continue
+        match, item = self.router.match(url_path, soap_action, not url_path.startswith('/zato'))
+        if match is not None:
+            if logger.isEnabledFor(TRACE1):
+                logger.log(TRACE1, 'Matched target:`%s` with:`%r`', target, item)
 
-                match = item.match_target_compiled.match(target)
-                if match is not None:
-                    if logger.isEnabledFor(TRACE1):
-                        logger.log(TRACE1, 'Matched target:`%s` with:`%r`', target, item)
+            # Callers are free to modify the match so the cache keeps its own copy
+            self.url_path_cache.put(target, (match.copy(), item))
 
-                    # Cache that URL if it's a static one, i.e. does not contain dynamically computed variables
-                    if item.match_target_compiled.is_static:
-                        self.url_path_cache[target] = (match, item)
+        return match, item
 
-                    return match, item
+    def get_url_path_cache_stats(self):
+        """ Returns statistics regarding the URL path cache.
+        """
+        cache = self.url_path_cache
 
-            return None, None
+        return {
+            'size': len(cache.data),
+            'max_size': cache.size,
+            'lookups': cache.lookups,
+            'hits': cache.hits,
+            'misses': cache.misses,
+            'evictions': cache.evictions,
+        }
 
     def check_security(self, sec, cid, channel_item, path_info, payload, wsgi_environ, post_data, worker_store):
         """ Authenticates and authorizes a given request. Returns None on success
@@ -420,6 +731,7 @@ class URLData(OAuthDataStore):
         # No error, let's delete channel info
         if match_idx != ZATO_NONE:
             self.channel_data.pop(match_idx)
+            self.url_path_cache.clear()
 
 # ################################################################################################################################
 
@@ -875,6 +1187,7 @@ class URLData(OAuthDataStore):
             channel_item['security_id'] = msg['security_id']
             channel_item['security_name'] = msg['security_name']
 
+        channel_item.is_streaming = msg.get('is_streaming', False)
         channel_item.audit_enabled = old_data.get('audit_enabled', False)
         channel_item.audit_max_payload = old_data.get('audit_max_payload', 0)
         channel_item.audit_repl_patt_type = old_data.get('audit_repl_patt_type', None)
@@ -910,16 +1223,18 @@ class URLData(OAuthDataStore):
 
     def _create_channel(self, msg, old_data):
         """ Creates a new channel, both its core data and the related security definition.
-        Clears out URL cache for that entry, if it existed at all.
+        Clears out URL cache because the new channel may take precedence over ones that paths were cached for.
         """
         match_target = '{}{}{}'.format(msg.soap_action, MISC.SEPARATOR, msg.url_path)
-        self.channel_data.add(self._channel_item_from_msg(msg, match_target, old_data))
+        channel_item = self._channel_item_from_msg(msg, match_target, old_data)
+
+        self.channel_data.add(channel_item)
         self.url_sec[match_target] = self._sec_info_from_msg(msg)
-        self.url_path_cache.pop(match_target, None)
+        self.url_path_cache.clear()
 
     def _delete_channel(self, msg):
-        """ Deletes a channel, both its core data and the related security definition. Clears relevant
-        entry in URL cache. Returns the deleted data.
+        """ Deletes a channel, both its core data and the related security definition. Clears out
+        URL cache. Returns the deleted data.
         """
         old_match_target = '{}{}{}'.format(
             msg.get('old_soap_action'), MISC.SEPARATOR, msg.get('old_url_path'))
@@ -940,7 +1255,7 @@ class URLData(OAuthDataStore):
         del self.url_sec[old_match_target]
 
         # Delete from URL cache
-        self.url_path_cache.pop(old_match_target, None)
+        self.url_path_cache.clear()
 
         return old_data
 
@@ -989,22 +1304,33 @@ class URLData(OAuthDataStore):
         return dumps({key: repr(value) for key, value in env})
 
     def audit_set_request(self, cid, channel_item, payload, wsgi_environ):
-        """ Stores initial audit information, right after receiving a request.
+        """ Stores initial audit information, right after receiving a request. The information is queued
+        and written to ODB in the background, along with other requests and responses.
         """
-        if channel_item['audit_repl_patt_type'] == MSG_PATTERN_TYPE.JSON_POINTER.id:
-            payload = loads(payload) if payload else ''
+        is_json_pointer = channel_item['audit_repl_patt_type'] == MSG_PATTERN_TYPE.JSON_POINTER.id
+
+        if is_json_pointer:
             pattern_list = channel_item['replace_patterns_json_pointer']
         else:
             pattern_list = channel_item['replace_patterns_xpath']
 
-        if payload:
-            for name in pattern_list:
-                logger.debug('Before `%r`:`%r`', name, payload)
-                payload = self.replace_payload(name, payload, channel_item.audit_repl_patt_type)
-                logger.debug('After `%r`:`%r`', name, payload)
+        # Only the beginning of a streamed request is stored and it is not consumed in the process. Patterns can be replaced
+        # in whole messages only so if there are any, nothing is stored - a part of a message could not be masked out.
+        if isinstance(payload, RequestBody):
+            payload = '' if pattern_list else payload.peek(channel_item['audit_max_payload'] or payload.chunk_size)
+
+        else:
+            if is_json_pointer:
+                payload = loads(payload) if payload else ''
 
-        if channel_item['audit_repl_patt_type'] == MSG_PATTERN_TYPE.JSON_POINTER.id:
-            payload = dumps(payload)
+            if payload:
+                for name in pattern_list:
+                    logger.debug('Before `%r`:`%r`', name, payload)
+                    payload = self.replace_payload(name, payload, channel_item.audit_repl_patt_type)
+                    logger.debug('After `%r`:`%r`', name, payload)
+
+            if is_json_pointer:
+                payload = dumps(payload)
 
         if channel_item['audit_max_payload']:
             payload = payload[:channel_item['audit_max_payload']]
@@ -1013,28 +1339,29 @@ class URLData(OAuthDataStore):
         if not remote_addr:
             remote_addr = wsgi_environ.get('REMOTE_ADDR', '(None)')
 
-        self.odb.audit_set_request_http_soap(channel_item['id'], channel_item['name'], cid,
-            channel_item['transport'], channel_item['connection'], datetime.utcnow(),
-            channel_item.get('username'), remote_addr, self._dump_wsgi_environ(wsgi_environ), payload)
+        self.audit_queue.put_request({
+            'conn_id': channel_item['id'],
+            'name': channel_item['name'],
+            'cid': cid,
+            'transport': channel_item['transport'],
+            'connection': channel_item['connection'],
+            'req_time': datetime.utcnow(),
+            'user_token': channel_item.get('username'),
+            'remote_addr': remote_addr,
+            'req_headers': self._dump_wsgi_environ(wsgi_environ),
+            'req_payload': payload,
+        })
 
     def audit_set_response(self, cid, response, wsgi_environ):
-        """ Stores audit info regarding a response to a previous request.
+        """ Stores audit info regarding a response to a previous request, queued the same way requests are.
         """
-        payload = dumps({
+        self.audit_queue.put_response({
             'cid': cid,
             'invoke_ok': wsgi_environ['zato.http.response.status'][0] not in ('4', '5'),
             'auth_ok': wsgi_environ['zato.http.response.status'][0] != '4',
-            'resp_time': datetime.utcnow().isoformat(),
-            'resp_headers': self._dump_wsgi_environ(wsgi_environ),
-            'resp_payload': response,
-        })
-
-        self.broker_client.publish({
-            'cid': cid,
-            'data_format':DATA_FORMAT.JSON,
-            'action': CHANNEL.HTTP_SOAP_AUDIT_RESPONSE.value,
-            'payload': payload,
-            'service': 'zato.http-soap.set-audit-response-data'
+            'resp_time': datetime.utcnow(),
+            'resp_headers': self._dump_wsgi_environ(wsgi_environ).encode('utf-8'),
+            'resp_payload': response.encode('utf-8') if isinstance(response, unicode) else response,
         })
 
     def on_broker_msg_CHANNEL_HTTP_SOAP_AUDIT_CONFIG(self, msg):
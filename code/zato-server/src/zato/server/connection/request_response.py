@@ -8,28 +8,97 @@ Licensed under LGPLv3, see LICENSE.txt for terms and conditions.
 
 # stdlib
 import logging
+from collections import deque
+from traceback import format_exc
+
+# gevent
+from gevent import sleep
 
 # Zato
-from zato.common import KVDB, TRACE1
+from zato.common import KVDB, MISC, TRACE1
+from zato.server.connection import slow_response
 
 logger = logging.getLogger(__name__)
 
-def should_store(kvdb, service_usage, service_name):
-    """ Decides whether a service's request/response pair should be kept in the DB.
+def get_freq(kvdb, service_name):
+    """ Returns how often a service's request/response pairs should be kept in the DB, 0 means never.
     """
-    key = '{}{}'.format(KVDB.REQ_RESP_SAMPLE, service_name)
-    freq = int(kvdb.conn.hget(key, 'freq') or 0)
+    return int(kvdb.conn.hget('{}{}'.format(KVDB.REQ_RESP_SAMPLE, service_name), 'freq') or 0)
 
-    if freq and service_usage % freq == 0:
-        return key, freq
-
-    return None, None
+def should_store(service_usage, freq):
+    """ Decides whether a service's request/response pair should be kept in the DB.
+    """
+    return bool(freq and service_usage % freq == 0)
 
-def store(kvdb, key, usage, freq, **data):
+def store(pipe, service_name, usage, freq, **data):
     """ Stores a service's request/response pair.
     """
+    key = '{}{}'.format(KVDB.REQ_RESP_SAMPLE, service_name)
+
     if logger.isEnabledFor(TRACE1):
         msg = 'key:[{}], usage:[{}], freq:[{}], data:[{}]'.format(key, usage, freq, data)
         logger.log(TRACE1, msg)
 
-    kvdb.conn.hmset(key, data)
+    pipe.hmset(key, data)
+
+# ################################################################################################################################
+
+class ResponseAccumulator(object):
+    """ Keeps sample request/response pairs and slow responses in memory and periodically flushes them to KVDB
+    in a single pipeline, instead of each service invocation talking to KVDB on its own. Only the latest sample
+    of each service is kept because it would overwrite older ones anyway and, likewise, only as many slow responses
+    of each service as KVDB will keep.
+    """
+    def __init__(self, conn, flush_interval=MISC.DEFAULT_STATS_FLUSH_INTERVAL):
+        self.conn = conn
+        self.flush_interval = flush_interval
+        self.keep_running = True
+
+        # Data collected since the last flush
+        self.samples = {}
+        self.slow = {}
+
+    def on_sample(self, service_name, usage, freq, **data):
+        self.samples[service_name] = (usage, freq, data)
+
+    def on_slow_response(self, service_name, **data):
+        responses = self.slow.get(service_name)
+        if responses is None:
+            responses = self.slow[service_name] = deque(maxlen=slow_response.MAX_RESPONSES)
+
+        responses.append(data)
+
+    def flush(self):
+        """ Writes everything accumulated so far to KVDB.
+        """
+        samples, self.samples = self.samples, {}
+        slow, self.slow = self.slow, {}
+
+        if not (samples or slow):
+            return
+
+        try:
+            with self.conn.pipeline() as pipe:
+
+                for service_name, (usage, freq, data) in samples.iteritems():
+                    store(pipe, service_name, usage, freq, **data)
+
+                for service_name, responses in slow.iteritems():
+                    for data in responses:
+                        slow_response.store(pipe, service_name, **data)
+
+                pipe.execute()
+
+        except Exception, e:
+            logger.warn('Could not flush sample and slow responses, e:`%s`', format_exc(e))
+
+    def run(self):
+        """ Flushes responses every self.flush_interval seconds, meant to be run in a background greenlet.
+        """
+        while self.keep_running:
+            sleep(self.flush_interval)
+            self.flush()
+
+    def stop(self):
+        self.keep_running = False
+        self.flush()
@@ -17,7 +17,10 @@ from zato.common import KVDB, TRACE1
 
 logger = logging.getLogger(__name__)
 
-def store(kvdb, name, **data):
+# How many slow responses of each service to keep
+MAX_RESPONSES = 100
+
+def store(pipe, name, **data):
     """ Stores information regarding an invocation that came later than it was allowed.
     """
     key = '{}{}'.format(KVDB.RESP_SLOW, name)
@@ -27,5 +30,5 @@ def store(kvdb, name, **data):
         msg = 'key:[{}], name:[{}], data:[{}]'.format(key, name, data)
         logger.log(TRACE1, msg)
 
-    kvdb.conn.lpush(key, data)
-    kvdb.conn.ltrim(key, 0, 99) # TODO: This should be configurable
+    pipe.lpush(key, data)
+    pipe.ltrim(key, 0, MAX_RESPONSES - 1) # TODO: This should be configurable
@@ -71,13 +71,15 @@ class MessageFacade(object):
     """ An object through which services access all the message-related features,
     such as namespaces, JSON Pointer or XPath.
     """
-    def __init__(self, msg_ns_store=None, json_pointer_store=None, xpath_store=None, ns_store=None, payload=None, time_util=None):
+    def __init__(self, msg_ns_store=None, json_pointer_store=None, xpath_store=None, ns_store=None, payload=None, time_util=None,
+            mapper_plans=None):
         self._ns = msg_ns_store
         self._json_pointer_store = json_pointer_store
         self._xpath_store = xpath_store
         self._ns_store = ns_store
         self._payload = payload
         self._time_util = time_util
+        self._mapper_plans = mapper_plans
 
     def json_pointer(self, doc=None):
         return JSONPointerAPI(doc if doc is not None else self._payload, self._json_pointer_store)
@@ -86,6 +88,7 @@ class MessageFacade(object):
         return XPathAPI(msg if msg is not None else self._payload, self._xpath_store, self._ns_store)
 
     def mapper(self, source, target=None, *args, **kwargs):
+        kwargs.setdefault('plans', self._mapper_plans)
         return Mapper(source, target, time_util=self._time_util, *args, **kwargs)
 
 # ################################################################################################################################
@@ -286,6 +289,85 @@ class JSONPointerStore(BaseStore):
 
 # ################################################################################################################################
 
+# Types DictNav descends into while looking up values
+_nav_types = (dict, list)
+
+def _set_path(target, to, to_keys, value):
+    """ Sets a value in target under a path that has already been split into keys. Creates any missing dicts along the way
+    and lets dpath handle anything else, e.g. lists or paths it would reject.
+    """
+    if to_keys:
+        current = target
+        for key in to_keys[:-1]:
+            if not isinstance(current, dict):
+                break
+            if key not in current:
+                current[key] = {}
+            current = current[key]
+        else:
+            if isinstance(current, dict):
+                current[to_keys[-1]] = value
+                return
+
+    dpath_util.new(target, to, value)
+
+# ################################################################################################################################
+
+class MapperPlan(object):
+    """ A list of mapping rules compiled by Mapper.compile - each rule has its paths already split into keys and its conversion
+    functions already resolved so that the plan can be applied to any number of documents without parsing the rules again.
+    """
+    def __init__(self, rules):
+        self.rules = rules
+
+    def __len__(self):
+        return len(self.rules)
+
+    def apply(self, source, target, time_util=None):
+        """ Applies all the rules to the source document, setting values in the target one, which is returned.
+        Each rule behaves exactly like a call to Mapper.map would.
+        """
+        for orig_from, to, from_keys, to_keys, force_func, force_func_name, from_format, to_format, skip_missing, default \
+            in self.rules:
+
+            # Obtain the value, the same way DictNav.get does.
+            value = source
+            try:
+                for key in from_keys:
+                    if type(value) in _nav_types:
+                        value = value[key]
+                    else:
+                        value = None
+                        break
+            except (LookupError, TypeError):
+                value = None
+
+            if from_format is not None:
+                value = time_util.reformat(value, from_format, to_format)
+
+            # Don't return anything if we are to skip missing values
+            # or, we aren't, return a default value.
+            if not value:
+                if skip_missing:
+                    continue
+                else:
+                    value = default if default != ZATO_NOT_GIVEN else value
+
+            # We have some value, let's process it using the function found while compiling.
+            if force_func:
+                try:
+                    value = force_func(value)
+                except Exception, e:
+                    logger.warn('Error in force_func:`%s` `%s` over `%s` in `%s` -> `%s` e:`%s`',
+                        force_func_name, force_func, value, orig_from, to, format_exc(e))
+                    raise
+
+            _set_path(target, to, to_keys, value)
+
+        return target
+
+# ################################################################################################################################
+
 class Mapper(object):
     def __init__(self, source, target=None, time_util=None, skip_missing=True, default=None, *args, **kwargs):
         self.target = target if target is not None else {}
@@ -300,6 +382,9 @@ class Mapper(object):
         self.times = {}
         self.cache = {}
 
+        # Compiled plans, keyed by their rules and configuration, if they are to be cached, e.g. by a service
+        self.plans = kwargs.get('plans')
+
         if isinstance(source, DictNav):
             self.source = source
         else:
@@ -381,12 +466,94 @@ class Mapper(object):
         for to, from_ in items:
             self.map(to, from_, *args, **kwargs)
 
+    def compile(self, items, separator='/', skip_missing=ZATO_NOT_GIVEN, default=ZATO_NOT_GIVEN):
+        """ Compiles (from_, to) rules, given in the same format map_many accepts, into a MapperPlan that can be applied
+        to any number of documents. Plans are cached if the mapper was given a cache, e.g. the per-service one of self.msg.
+        """
+        if skip_missing == ZATO_NOT_GIVEN:
+            skip_missing = self.skip_missing
+
+        if default == ZATO_NOT_GIVEN:
+            default = self.default
+
+        if self.plans is None:
+            return self._compile(items, separator, skip_missing, default)
+
+        items = tuple(tuple(item) for item in items)
+        key = (items, separator, skip_missing, default, tuple(sorted(self.funcs.items())), tuple(sorted(self.times.items())))
+
+        try:
+            plan = self.plans.get(key)
+        except TypeError:
+            # Default values that cannot be hashed, e.g. dicts, cannot be part of a key
+            return self._compile(items, separator, skip_missing, default)
+
+        if plan is None:
+            plan = self.plans[key] = self._compile(items, separator, skip_missing, default)
+
+        return plan
+
+    def _compile(self, items, separator, skip_missing, default):
+        rules = []
+
+        for from_, to in items:
+
+            orig_from = from_
+            force_func = None
+            force_func_name = None
+            from_format, to_format = None, None
+
+            # Pick at most one processing functions.
+            for key in self.func_keys:
+                if from_.startswith(key):
+                    from_ = from_.replace('{}:'.format(key), '', 1)
+                    force_func = self.funcs[key]
+                    force_func_name = key
+                    break
+
+            # Perhaps it's a date value that needs to be converted.
+            if from_.startswith('time:'):
+                from_format, from_ = self._get_time_format(from_)
+                to_format, _ = self._get_time_format(to)
+
+            # Target paths are always split on '/', as in map, and any that dpath rejects are left to it to reject.
+            to_keys = to.lstrip('/').split('/')
+            if not all(to_keys):
+                to_keys = None
+
+            rules.append((orig_from, to, from_.split(separator)[1:], to_keys, force_func, force_func_name,
+                from_format, to_format, skip_missing, default))
+
+        return MapperPlan(rules)
+
+    def apply(self, plan):
+        """ Applies a plan returned by self.compile to the source document.
+        """
+        return plan.apply(self.source.obj, self.target, self.time_util)
+
     def get(self, path, default=None, separator='/'):
-        for found_path, value in dpath_util.search(self.source.obj, path, yielded=True, separator=separator):
-            if path == '{}{}'.format(separator, found_path):
-                return value
+        """ Returns a value found under an exact path in the source document or default if there is none.
+        """
+        if not path.startswith(separator):
+            return default
+
+        value = self.source.obj
+
+        for key in path[len(separator):].split(separator):
+            if isinstance(value, dict):
+                if key not in value:
+                    return default
+                value = value[key]
+
+            elif isinstance(value, list):
+                if not key.isdigit() or int(key) >= len(value):
+                    return default
+                value = value[int(key)]
+
+            else:
+                return default
 
-        return default
+        return value
 
     def set(self, to, value):
         """ Sets 'to' to a static 'value'.
@@ -10,11 +10,13 @@ from __future__ import absolute_import, division, print_function, unicode_litera
 
 # stdlib
 import logging
+from collections import OrderedDict
 from contextlib import closing
 from datetime import datetime, timedelta
 from traceback import format_exc
 
 # SQLAlchemy
+from sqlalchemy import and_, bindparam
 from sqlalchemy.exc import IntegrityError, ProgrammingError
 
 # Bunch
@@ -164,7 +166,20 @@ class ODBManager(SessionWrapper):
             for c in q.statement.columns:
                 columns[c.name] = None
 
-            for item in q.all():
+            items = q.all()
+
+            # Security definitions of each type used by any channel, fetched with a single query per type
+            # rather than one per channel.
+            sec_defs = {}
+            for sec_type in set(item.sec_type for item in items if item.security_id):
+
+                # Will raise KeyError if the DB gets somehow misconfigured.
+                db_class = sec_type_db_class[sec_type]
+
+                sec_defs[sec_type] = dict((sec_def.id, sec_def) for sec_def in
+                    session.query(db_class).filter(db_class.cluster_id==cluster_id))
+
+            for item in items:
                 target = '{}{}{}'.format(item.soap_action, MISC.SEPARATOR, item.url_path)
 
                 result[target] = Bunch()
@@ -176,11 +191,7 @@ class ODBManager(SessionWrapper):
                     result[target].sec_def = Bunch()
 
                     # Will raise KeyError if the DB gets somehow misconfigured.
-                    db_class = sec_type_db_class[item.sec_type]
-
-                    sec_def = session.query(db_class).\
-                            filter(db_class.id==item.security_id).\
-                            one()
+                    sec_def = sec_defs[item.sec_type][item.security_id]
 
                     # Common things first
                     result[target].sec_def.id = sec_def.id
@@ -223,31 +234,90 @@ class ODBManager(SessionWrapper):
 
             return result, columns
 
-    def add_service(self, name, impl_name, is_internal, deployment_time, details, source_info):
-        """ Adds information about the server's service into the ODB.
+    def _get_service_map(self):
+        """ Returns IDs, is_active flags and slow response thresholds of all the cluster's services, keyed by their names.
         """
+        q = self._session.query(Service.name, Service.id, Service.is_active, Service.slow_threshold).\
+            filter(Service.cluster_id==self.cluster.id)
+
+        return dict((item.name, (item.id, item.is_active, item.slow_threshold)) for item in q)
+
+    def _add_services(self, services):
+
+        service_table = Service.__table__
+        ds_table = DeployedService.__table__
+
+        # Insert any services this cluster doesn't know about yet ..
+        service_map = self._get_service_map()
+        missing = []
+
+        for name, item in services.items():
+            if name not in service_map:
+                missing.append({'name': name, 'is_active': True, 'impl_name': item.impl_name,
+                    'is_internal': item.is_internal, 'cluster_id': self.cluster.id})
+
+        if missing:
+            self._session.execute(service_table.insert(), missing)
+            service_map = self._get_service_map()
+
+        # .. and mark all of them as deployed on this server, updating the ones that already were.
+        already_deployed = set(item.service_id for item in self._session.query(DeployedService.service_id).\
+            filter(DeployedService.server_id==self.server.id))
+
+        to_insert = []
+        to_update = []
+
+        for name, item in services.items():
+            service_id = service_map[name][0]
+
+            params = {'deployment_time': item.deployment_time, 'details': item.details, 'source': item.source_info.source,
+                'source_path': item.source_info.path, 'source_hash': item.source_info.hash,
+                'source_hash_method': item.source_info.hash_method}
+
+            if service_id in already_deployed:
+                params['b_server_id'] = self.server.id
+                params['b_service_id'] = service_id
+                to_update.append(params)
+            else:
+                params['server_id'] = self.server.id
+                params['service_id'] = service_id
+                to_insert.append(params)
+
+        if to_insert:
+            self._session.execute(ds_table.insert(), to_insert)
+
+        if to_update:
+            self._session.execute(ds_table.update().where(and_(
+                ds_table.c.server_id==bindparam('b_server_id'),
+                ds_table.c.service_id==bindparam('b_service_id'))), to_update)
+
+        self._session.commit()
+
+        return dict((name, service_map[name]) for name in services)
+
+    def add_services(self, services):
+        """ Adds information about many of the server's services into the ODB at once, using a few executemany
+        statements instead of several statements per service. Each of the services is a Bunch of name, impl_name,
+        is_internal, deployment_time, details and source_info. Returns a dictionary of (id, is_active, slow_threshold)
+        tuples keyed by service names.
+        """
+        # Last one wins if the same service is given more than once
+        services = OrderedDict((item.name, item) for item in services)
+
         try:
-            service = Service(None, name, True, impl_name, is_internal, self.cluster)
-            self._session.add(service)
             try:
-                self._session.commit()
+                return self._add_services(services)
             except(IntegrityError, ProgrammingError), e:
-                logger.log(TRACE1, 'IntegrityError (Service), e:[%s]', format_exc(e).decode('utf-8'))
-                self._session.rollback()
-
-                service = self._session.query(Service).\
-                    join(Cluster, Service.cluster_id==Cluster.id).\
-                    filter(Service.name==name).\
-                    filter(Cluster.id==self.cluster.id).\
-                    one()
 
-            self.add_deployed_service(deployment_time, details, service, source_info)
+                # Another server inserted some of the same services in the meantime - they will be found in ODB now.
+                logger.log(TRACE1, 'IntegrityError (add_services), e:[%s]', format_exc(e).decode('utf-8'))
+                self._session.rollback()
 
-            return service.id, service.is_active, service.slow_threshold
+                return self._add_services(services)
 
-        except Exception, e:
-            logger.error('Could not add service, name:[%s], e:[%s]', name, format_exc(e).decode('utf-8'))
+        except Exception:
             self._session.rollback()
+            raise
 
     def drop_deployed_services(self, server_id):
         """ Removes all the deployed services from a server.
@@ -258,40 +328,6 @@ class ODBManager(SessionWrapper):
                 delete()
             session.commit()
 
-    def add_deployed_service(self, deployment_time, details, service, source_info):
-        """ Adds information about the server's deployed service into the ODB.
-        """
-        try:
-            ds = DeployedService(deployment_time, details, self.server.id, service,
-                source_info.source, source_info.path, source_info.hash, source_info.hash_method)
-            self._session.add(ds)
-            try:
-                self._session.commit()
-            except(IntegrityError, ProgrammingError), e:
-
-                logger.log(TRACE1, 'IntegrityError (DeployedService), e:[%s]', format_exc(e).decode('utf-8'))
-                self._session.rollback()
-
-                ds = self._session.query(DeployedService).\
-                    filter(DeployedService.service_id==service.id).\
-                    filter(DeployedService.server_id==self.server.id).\
-                    one()
-
-                ds.deployment_time = deployment_time
-                ds.details = details
-                ds.source = source_info.source
-                ds.source_path = source_info.path
-                ds.source_hash = source_info.hash
-                ds.source_hash_method = source_info.hash_method
-
-                self._session.add(ds)
-                self._session.commit()
-
-        except Exception, e:
-            msg = 'Could not add the DeployedService, e:[{e}]'.format(e=format_exc(e))
-            logger.error(msg)
-            self._session.rollback()
-
     def is_service_active(self, service_id):
         """ Returns whether the given service is active or not.
         """
@@ -864,6 +900,44 @@ class ODBManager(SessionWrapper):
             session.add(audit)
             session.commit()
 
+    def audit_set_many_http_soap(self, requests, responses):
+        """ Stores audit information of many requests and responses at once. Each request is a dict of all the columns
+        of HTTSOAPAudit, possibly including its response already, and all of them are added in one multi-row INSERT,
+        unless the database does not support it. Responses to requests stored previously are dicts of response columns
+        and a cid to find their requests by - they are updated in a single executemany.
+        """
+        table = HTTSOAPAudit.__table__
+
+        with closing(self.session()) as session:
+
+            if requests:
+                dialect = session.get_bind().dialect
+
+                for item in requests:
+                    item['cluster_id'] = self.cluster.id
+
+                if dialect.supports_multivalues_insert:
+
+                    # Otherwise the sequence would be pre-executed once only and each row would get the same ID
+                    if dialect.supports_sequences:
+                        for item in requests:
+                            item['id'] = table.c.id.default.next_value()
+
+                    session.execute(table.insert().values(requests))
+                else:
+                    session.execute(table.insert(), requests)
+
+            if responses:
+                params = []
+                for item in responses:
+                    item = dict(item)
+                    item['b_cid'] = item.pop('cid')
+                    params.append(item)
+
+                session.execute(table.update().where(table.c.cid==bindparam('b_cid')), params)
+
+            session.commit()
+
 # ################################################################################################################################
 
     def get_cloud_openstack_swift_list(self, cluster_id, needs_columns=False):
@@ -88,6 +88,10 @@ class RBAC(object):
         self.client_def_to_role_id = {}
         self.role_id_to_client_def = {}
 
+        # Client definition -> {(perm_id, resource): is_allowed}, filled in as clients are checked and invalidated
+        # on each change to roles, permissions and client roles that can possibly affect it.
+        self.client_decisions = {}
+
 # ################################################################################################################################
 
     def __repr__(self):
@@ -109,6 +113,7 @@ class RBAC(object):
         with self.update_lock:
             del self.permissions[id]
             self.registry.delete_from_permissions('operation', id)
+            self.client_decisions.clear()
 
     def set_http_permissions(self):
         """ Maps HTTP verbs to CRUD permissions.
@@ -127,6 +132,40 @@ class RBAC(object):
                     self.http_permissions[verb] = perm_id
                     break
 
+# ################################################################################################################################
+
+    def _get_role_clients(self, role_id):
+        """ Returns client definitions that have a given role or any of the role's descendants.
+        Must be called with self.update_lock held.
+        """
+        children = {}
+        for child_id, parents in self.registry._roles.items():
+            for parent_id in parents:
+                children.setdefault(parent_id, []).append(child_id)
+
+        roles = set([role_id])
+        to_visit = [role_id]
+
+        while to_visit:
+            for child_id in children.get(to_visit.pop(), []):
+                if child_id not in roles:
+                    roles.add(child_id)
+                    to_visit.append(child_id)
+
+        clients = set()
+        for id in roles:
+            clients.update(self.role_id_to_client_def.get(id, []))
+
+        return clients
+
+    def _invalidate_role(self, role_id):
+        """ Forgets decisions about all the clients a change to a given role may affect.
+        Must be called with self.update_lock held.
+        """
+        if self.client_decisions:
+            for client_def in self._get_role_clients(role_id):
+                self.client_decisions.pop(client_def, None)
+
 # ################################################################################################################################
 
     def _rbac_create_role(self, id, name, parent_id):
@@ -144,15 +183,18 @@ class RBAC(object):
     def create_role(self, id, name, parent_id):
         with self.update_lock:
             self._rbac_create_role(id, name, parent_id)
+            self._invalidate_role(id)
 
     def edit_role(self, id, old_name, name, parent_id):
         with self.update_lock:
+            self._invalidate_role(id)
             self._rbac_delete_role(id, old_name)
             self.registry._roles[id].clear() # Roles can have one parent only
             self._rbac_create_role(id, name, parent_id)
 
     def delete_role(self, id, name):
         with self.update_lock:
+            self._invalidate_role(id)
             self.registry.delete_role(id)
 
 # ################################################################################################################################
@@ -165,11 +207,13 @@ class RBAC(object):
 
             self.client_def_to_role_id.setdefault(client_def, set()).add(role_id)
             self.role_id_to_client_def.setdefault(role_id, set()).add(client_def)
+            self.client_decisions.pop(client_def, None)
 
     def delete_client_role(self, client_def, role_id):
         with self.update_lock:
             self.client_def_to_role_id[client_def].remove(role_id)
             self.role_id_to_client_def[role_id].remove(client_def)
+            self.client_decisions.pop(client_def, None)
 
 # ################################################################################################################################
 
@@ -180,24 +224,29 @@ class RBAC(object):
     def delete_resource(self, resource):
         with self.update_lock:
             self.registry.delete_resource(resource)
+            self.client_decisions.clear()
 
 # ################################################################################################################################
 
     def create_role_permission_allow(self, role_id, perm_id, resource):
         with self.update_lock:
             self.registry.allow(role_id, perm_id, resource)
+            self._invalidate_role(role_id)
 
     def create_role_permission_deny(self, role_id, perm_id, resource):
         with self.update_lock:
             self.registry.deny(role_id, perm_id, resource)
+            self._invalidate_role(role_id)
 
     def delete_role_permission_allow(self, role_id, perm_id, resource):
         with self.update_lock:
             self.registry.delete_allow((role_id, perm_id, resource))
+            self._invalidate_role(role_id)
 
     def delete_role_permission_deny(self, role_id, perm_id, resource):
         with self.update_lock:
             self.registry.delete_deny((role_id, perm_id, resource))
+            self._invalidate_role(role_id)
 
 # ################################################################################################################################
 
@@ -209,9 +258,25 @@ class RBAC(object):
     def is_client_allowed(self, client_def, perm_id, resource):
         """ Returns True/False depending on whether a given client is allowed to obtain a selected permission for a resource.
         All of the client's roles are consulted and if any is allowed, True is returned. If none is, False is returned.
+
+        Each decision is computed once per client, permission and resource - subsequent checks only look it up
+        until roles or permissions the client depends on change.
         """
-        roles = self.client_def_to_role_id.get(client_def, ZATO_NONE)
-        return self.registry.is_any_allowed(roles, perm_id, resource) if roles != ZATO_NONE else False
+        decisions = self.client_decisions.get(client_def)
+        if decisions is not None:
+            is_allowed = decisions.get((perm_id, resource), ZATO_NONE)
+            if is_allowed != ZATO_NONE:
+                return is_allowed
+
+        with self.update_lock:
+            roles = self.client_def_to_role_id.get(client_def, ZATO_NONE)
+            if roles == ZATO_NONE:
+                return False
+
+            is_allowed = self.registry.is_any_allowed(roles, perm_id, resource)
+            self.client_decisions.setdefault(client_def, {})[(perm_id, resource)] = is_allowed
+
+            return is_allowed
 
     def is_http_client_allowed(self, client_def, http_verb, resource):
         """ Same as is_client_allowed but accepts a HTTP verb rather than a permission ID.
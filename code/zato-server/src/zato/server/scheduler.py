@@ -42,7 +42,7 @@ class Scheduler(object):
         self.singleton = singleton
         self.broker_token = None
         self.client_push_broker_pull = None
-        self.sched = _Scheduler(self.on_job_executed)
+        self.sched = _Scheduler(self.on_job_executed, self.on_jobs_executed)
 
         if init:
             self.init()
@@ -55,16 +55,12 @@ class Scheduler(object):
 
 # ################################################################################################################################
 
-    def on_job_executed(self, ctx, extra_data_format=ZATO_NONE):
-        """ Invoked by the underlying scheduler when a job is executed. Sends
-        the actual execution request to the broker so it can be picked up by
-        one of the parallel server's broker clients.
+    def _get_job_msg(self, ctx, extra_data_format=ZATO_NONE):
+        """ Returns a message to invoke the service a job points to with.
         """
-        name = ctx['name']
-
         msg = {
             'action': SCHEDULER_MSG.JOB_EXECUTED.value,
-            'name':name,
+            'name':ctx['name'],
             'service': ctx['cb_kwargs']['service'],
             'payload':ctx['cb_kwargs']['extra'],
             'cid':ctx['cid'],
@@ -74,6 +70,36 @@ class Scheduler(object):
         if extra_data_format != ZATO_NONE:
             msg['data_format'] = extra_data_format
 
+        return msg
+
+    def _deactivate(self, id_list):
+        """ Deactivates in ODB one-time jobs that have been executed, all of them in one go if there is more than one.
+        """
+        if len(id_list) == 1:
+            service = 'zato.scheduler.job.set-active-status'
+            payload = {'id':id_list[0], 'is_active':False}
+        else:
+            service = 'zato.scheduler.job.set-active-status-many'
+            payload = {'id_list':id_list, 'is_active':False}
+
+        msg = {
+            'action': SERVICE.PUBLISH.value,
+            'service': service,
+            'payload': payload,
+            'cid': new_cid(),
+            'channel': CHANNEL.SCHEDULER_AFTER_ONE_TIME,
+            'data_format': DATA_FORMAT.JSON,
+        }
+        self.singleton.broker_client.publish(msg)
+
+    def on_job_executed(self, ctx, extra_data_format=ZATO_NONE):
+        """ Invoked by the underlying scheduler when a job is executed. Sends
+        the actual execution request to the broker so it can be picked up by
+        one of the parallel server's broker clients.
+        """
+        name = ctx['name']
+        msg = self._get_job_msg(ctx, extra_data_format)
+
         # Special case an internal job that needs to be delivered to all parallel
         # servers.
         if name == ENSURE_SINGLETON_JOB:
@@ -88,15 +114,43 @@ class Scheduler(object):
 
         # Now, if it was a one-time job, it needs to be deactivated.
         if ctx['type'] == SCHEDULER.JOB_TYPE.ONE_TIME:
-            msg = {
-                'action': SERVICE.PUBLISH.value,
-                'service': 'zato.scheduler.job.set-active-status',
-                'payload': {'id':ctx['id'], 'is_active':False},
+            self._deactivate([ctx['id']])
+
+    def on_jobs_executed(self, ctx_list):
+        """ Invoked by the underlying scheduler with all the jobs executed at the same time. Rather than sending
+        a message per job, sends a single batch message that a worker will invoke all of the jobs' services from,
+        followed by a single message to deactivate all of the one-time jobs.
+        """
+        job_msgs = []
+        one_time_ids = []
+
+        for ctx in ctx_list:
+            msg = self._get_job_msg(ctx)
+
+            # Each parallel server needs to receive this one so it cannot be batched with other jobs
+            if ctx['name'] == ENSURE_SINGLETON_JOB:
+                self.singleton.broker_client.publish(msg)
+            else:
+                job_msgs.append(msg)
+
+            if ctx['type'] == SCHEDULER.JOB_TYPE.ONE_TIME:
+                one_time_ids.append(ctx['id'])
+
+        if len(job_msgs) == 1:
+            self.singleton.broker_client.invoke_async(job_msgs[0])
+
+        elif job_msgs:
+            self.singleton.broker_client.invoke_async({
+                'action': SCHEDULER_MSG.JOB_EXECUTED_BATCH.value,
+                'jobs': job_msgs,
                 'cid': new_cid(),
-                'channel': CHANNEL.SCHEDULER_AFTER_ONE_TIME,
-                'data_format': DATA_FORMAT.JSON,
-            }
-            self.singleton.broker_client.publish(msg)
+            })
+
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug('Sent a job execution request for %d job(s), %s', len(ctx_list), [ctx['name'] for ctx in ctx_list])
+
+        if one_time_ids:
+            self._deactivate(one_time_ids)
 
 # ################################################################################################################################
 
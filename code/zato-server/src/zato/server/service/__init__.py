@@ -40,9 +40,10 @@ from zato.common import BROKER, CHANNEL, DATA_FORMAT, KVDB, PARAMS_PRIORITY, Zat
 from zato.common.broker_message import SERVICE
 from zato.common.nav import DictNav, ListNav
 from zato.common.util import uncamelify, new_cid, payload_from_request, service_name_from_impl
-from zato.server.connection import request_response, slow_response
+from zato.server.connection import request_response
 from zato.server.connection.amqp.outgoing import PublisherFacade
 from zato.server.connection.email import EMailAPI
+from zato.server.connection.http_soap.stream import is_stream, RequestBody
 from zato.server.connection.jms_wmq.outgoing import WMQFacade
 from zato.server.connection.search import SearchAPI
 from zato.server.connection.zmq_.outgoing import ZMQFacade
@@ -51,6 +52,7 @@ from zato.server.pattern.fanout import FanOut
 from zato.server.pattern.invoke_retry import InvokeRetry
 from zato.server.pattern.parallel import ParallelExec
 from zato.server.service.reqresp import Cloud, Outgoing, Request, Response
+from zato.server.service.reqresp.sio import SIOPlan
 
 # Not used here in this module but it's convenient for callers to be able to import everything from a single namespace
 from zato.server.service.reqresp.sio import AsIs, CSV, Boolean, Dict, Float, ForceType, Integer, List, ListOfDicts, Nested, \
@@ -98,6 +100,12 @@ class Service(object):
     """
     http_method_handlers = {}
 
+    # Compiled SimpleIO definition, if any
+    _sio_plan = None
+
+    # Plans compiled through self.msg.mapper, if any
+    _mapper_plans = None
+
     def __init__(self, *ignored_args, **ignored_kwargs):
         self.logger = logging.getLogger(self.get_name())
         self.server = None
@@ -123,6 +131,7 @@ class Service(object):
         self.processing_time = None # Processing time in milliseconds
         self.usage = 0 # How many times the service has been invoked
         self.slow_threshold = maxint # After how many ms to consider the response came too late
+        self.sample_req_resp_freq = 0 # How often to store sample requests/responses, 0 means never
         self.name = self.__class__.get_name()
         self.impl_name = self.__class__.get_impl_name()
         self.time = None
@@ -183,6 +192,32 @@ class Service(object):
                 method = name.replace('handle_', '')
                 class_.http_method_handlers[method] = getattr(class_, name)
 
+    @classmethod
+    def compile_sio(class_):
+        """ Compiles the service's SimpleIO definition. Called once while the service is being deployed.
+        """
+        class_._sio_plan = SIOPlan(class_.SimpleIO)
+        return class_._sio_plan
+
+    @classmethod
+    def get_sio_plan(class_):
+        """ Returns the compiled SimpleIO definition, compiling it first if the service has not been deployed through
+        a service store or if its SimpleIO is not the one the plan was compiled from, e.g. it was inherited along with it.
+        """
+        sio_plan = class_._sio_plan
+        if sio_plan is None or sio_plan.sio is not class_.SimpleIO:
+            sio_plan = class_.compile_sio()
+        return sio_plan
+
+    @classmethod
+    def get_mapper_plans(class_):
+        """ Returns the cache of plans compiled through self.msg.mapper, creating it first if the service class
+        does not have one of its own yet, i.e. plans are never shared with base classes.
+        """
+        if class_.__dict__.get('_mapper_plans') is None:
+            class_._mapper_plans = {}
+        return class_._mapper_plans
+
     def _init(self):
         """ Actually initializes the service.
         """
@@ -190,7 +225,14 @@ class Service(object):
         self.kvdb = self.worker_store.kvdb
         self.pubsub = self.worker_store.pubsub
 
-        self.slow_threshold = self.server.service_store.services[self.impl_name]['slow_threshold']
+        service_info = self.server.service_store.services[self.impl_name]
+        self.slow_threshold = service_info['slow_threshold']
+
+        # Read from KVDB once per worker, broker messages keep it up to date afterwards
+        self.sample_req_resp_freq = service_info.get('sample_req_resp_freq')
+        if self.sample_req_resp_freq is None:
+            self.sample_req_resp_freq = service_info.setdefault(
+                'sample_req_resp_freq', request_response.get_freq(self.kvdb, self.name))
 
         # Queues
         out_amqp = PublisherFacade(self.broker_client)
@@ -228,12 +270,13 @@ class Service(object):
         self.request.http.init(self.wsgi_environ)
 
         if is_sio:
-            self.request.init(is_sio, self.cid, self.SimpleIO, self.data_format, self.transport, self.wsgi_environ)
-            self.response.init(self.cid, self.SimpleIO, self.data_format)
+            sio_plan = self.get_sio_plan()
+            self.request.init(is_sio, self.cid, sio_plan, self.data_format, self.transport, self.wsgi_environ)
+            self.response.init(self.cid, sio_plan, self.data_format)
 
         self.msg = MessageFacade(self.worker_store.msg_ns_store,
             self.worker_store.json_pointer_store, self.worker_store.xpath_store, self.worker_store.msg_ns_store,
-            self.request.payload, self.time)
+            self.request.payload, self.time, self.get_mapper_plans())
 
     def set_response_data(self, service, **kwargs):
         response = service.response.payload
@@ -300,10 +343,14 @@ class Service(object):
         wsgi_environ = kwargs.get('wsgi_environ', {})
         payload = wsgi_environ.get('zato.request.payload')
 
+        # Requests of streaming channels are never parsed, services read them on their own.
+        if isinstance(raw_request, RequestBody):
+            payload = raw_request
+
         # Here's an edge case. If a SOAP request has a single child in Body and this child is an empty element
         # (though possibly with attributes), checking for 'not payload' alone won't suffice - this evaluates
         # to False so we'd be parsing the payload again superfluously.
-        if not isinstance(payload, ObjectifiedElement) and not payload:
+        elif not isinstance(payload, ObjectifiedElement) and not payload:
             payload = payload_from_request(cid, raw_request, data_format, transport)
 
         job_type = kwargs.get('job_type')
@@ -496,7 +543,7 @@ class Service(object):
         Used for incrementing the service's usage count and storing the service invocation time.
         """
         if self.server.component_enabled.stats:
-            self.usage = self.kvdb.conn.incr('{}{}'.format(KVDB.SERVICE_USAGE, self.name))
+            self.usage = self.worker_store.stats_accumulator.on_invoked(self.name)
 
         self.invocation_time = datetime.utcnow()
 
@@ -520,40 +567,25 @@ class Service(object):
 
             self.processing_time = int(round(proc_time))
 
-            with self.kvdb.conn.pipeline() as pipe:
-
-                pipe.hset('{}{}'.format(KVDB.SERVICE_TIME_BASIC, self.name), 'last', self.processing_time)
-                pipe.rpush('{}{}'.format(KVDB.SERVICE_TIME_RAW, self.name), self.processing_time)
-
-                key = '{}{}:{}'.format(KVDB.SERVICE_TIME_RAW_BY_MINUTE,
-                    self.name, self.handle_return_time.strftime('%Y:%m:%d:%H:%M'))
-                pipe.rpush(key, self.processing_time)
-
-                # .. we'll have 5 minutes (5 * 60 seconds = 300 seconds)
-                # to aggregate processing times for a given minute and then it will expire
-
-                # Note that we need Redis 2.1.3+ otherwise the key has just been overwritten
-                pipe.expire(key, 300)
-
-                pipe.execute()
+            # Statistics are kept in memory and flushed to KVDB in the background by the worker
+            self.worker_store.stats_accumulator.on_processed(self.name, self.processing_time, self.handle_return_time)
 
         #
-        # Sample requests/responses
+        # Sample requests/responses - which ones to store depends on usage counters that only statistics keep
         #
-        key, freq = request_response.should_store(self.kvdb, self.usage, self.name)
-        if freq:
+        if self.server.component_enabled.stats and request_response.should_store(self.usage, self.sample_req_resp_freq):
 
             # TODO: Don't parse it here and a moment later below
-            resp = (self.response.payload.getvalue() if hasattr(self.response.payload, 'getvalue') else self.response.payload) or ''
+            resp = self._get_sample_response()
 
             data = {
                 'cid': self.cid,
                 'req_ts': self.invocation_time.isoformat(),
                 'resp_ts': self.handle_return_time.isoformat(),
-                'req': self.request.raw_request or '',
+                'req': self._get_sample_request(),
                 'resp':resp,
             }
-            request_response.store(self.kvdb, key, self.usage, freq, **data)
+            self.worker_store.response_accumulator.on_sample(self.name, self.usage, self.sample_req_resp_freq, **data)
 
         #
         # Slow responses
@@ -563,8 +595,7 @@ class Service(object):
             if self.processing_time > self.slow_threshold:
 
                 # TODO: Don't parse it here and a moment earlier above
-                resp = (self.response.payload.getvalue() if hasattr(self.response.payload, 'getvalue')
-                        else self.response.payload) or ''
+                resp = self._get_sample_response()
 
                 data = {
                     'cid': self.cid,
@@ -572,10 +603,26 @@ class Service(object):
                     'slow_threshold': self.slow_threshold,
                     'req_ts': self.invocation_time.isoformat(),
                     'resp_ts': self.handle_return_time.isoformat(),
-                    'req': self.request.raw_request or '',
+                    'req': self._get_sample_request(),
                     'resp': resp,
                 }
-                slow_response.store(self.kvdb, self.name, **data)
+                self.worker_store.response_accumulator.on_slow_response(self.name, **data)
+
+    def _get_sample_request(self):
+        """ Returns a request to store as a sample or slow response. Streamed requests are not read for that purpose.
+        """
+        raw_request = self.request.raw_request
+        return repr(raw_request) if isinstance(raw_request, RequestBody) else (raw_request or '')
+
+    def _get_sample_response(self):
+        """ Returns a response to store as a sample or slow response. Streamed responses are not read for that purpose.
+        """
+        payload = self.response.payload
+
+        if hasattr(payload, 'getvalue'):
+            return payload.getvalue() or ''
+
+        return repr(payload) if is_stream(payload) else (payload or '')
 
     def translate(self, *args, **kwargs):
         raise NotImplementedError('An initializer should override this method')
@@ -764,6 +811,7 @@ class Service(object):
         service.transport = transport
         service.request.simple_io_config = simple_io_config
         service.response.simple_io_config = simple_io_config
+        service.response.is_streaming = bool((wsgi_environ.get('zato.http.channel_item') or {}).get('is_streaming'))
         service.data_format = data_format
         service.wsgi_environ = wsgi_environ
         service.job_type = job_type
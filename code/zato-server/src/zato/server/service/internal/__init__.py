@@ -14,7 +14,7 @@ from contextlib import closing
 from traceback import format_exc
 
 # Zato
-from zato.common import SECRET_SHADOW, zato_namespace, ZATO_NONE
+from zato.common import KVDB, SECRET_SHADOW, SORT_ORDER, zato_namespace, ZATO_NONE
 from zato.common.broker_message import MESSAGE_TYPE
 from zato.common.util import replace_private_key
 from zato.server.service import Service
@@ -24,6 +24,9 @@ success = '<error_code>{}</error_code>'.format(success_code)
 
 logger = logging.getLogger('zato_admin')
 
+# Admin services whose class names start with any of these change ODB configuration
+config_change_prefixes = ('Create', 'Edit', 'Delete', 'ChangePassword')
+
 class AdminService(Service):
     """ A Zato admin service, part of the API.
     """
@@ -51,12 +54,41 @@ class AdminService(Service):
 
         logger.info('cid:[{}], name:[{}], response:[{}]'.format(self.cid, self.name, response))
 
+        # Lets workers find out whether a config snapshot taken before this change is stale
+        if self.__class__.__name__.startswith(config_change_prefixes):
+            self.kvdb.conn.incr(KVDB.CONFIG_VERSION)
+
     def get_data(self, *args, **kwargs):
         raise NotImplementedError('Should be overridden by subclasses')
 
+    def get_search_info(self):
+        """ Returns parameters for zato.common.odb.query.search if a list service has been asked for a single page
+        of results, otherwise None, meaning that all the results are to be returned.
+        """
+        input = self.request.input
+
+        for name in search_input_optional_names:
+            if input.get(name):
+                current_batch = input.get('current_batch')
+                return {
+                    'current_batch': int(current_batch) if current_batch else None,
+                    'batch_size': input.get('batch_size'),
+                    'query': input.get('query'),
+                    'sort_by': input.get('sort_by'),
+                    'sort_order': input.get('sort_order') or SORT_ORDER.ASC,
+                }
+
 class AdminSIO(object):
     namespace = zato_namespace
 
+# Services returning lists of objects accept these to return only a single page of results,
+# batch_size is an integer by its suffix and current_batch is converted in AdminService.get_search_info
+search_input_optional = ('current_batch', 'batch_size', 'query', 'sort_by', 'sort_order')
+search_input_optional_names = ('current_batch', 'batch_size', 'query', 'sort_by')
+
+class GetListAdminSIO(AdminSIO):
+    input_optional = search_input_optional
+
 class Ping(AdminService):
     class SimpleIO(AdminSIO):
         output_required = ('pong',)
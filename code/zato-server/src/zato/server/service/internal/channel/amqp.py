@@ -17,7 +17,7 @@ from zato.common.broker_message import CHANNEL, MESSAGE_TYPE
 from zato.common.odb.model import ChannelAMQP, Cluster, ConnDefAMQP, Service
 from zato.common.odb.query import channel_amqp_list
 from zato.server.connection.amqp.channel import start_connector
-from zato.server.service.internal import AdminService, AdminSIO
+from zato.server.service.internal import AdminService, AdminSIO, GetListAdminSIO
 
 class _AMQPService(AdminService):
     def delete_channel(self, channel):
@@ -27,7 +27,7 @@ class _AMQPService(AdminService):
 class GetList(AdminService):
     """ Returns a list of AMQP channels.
     """
-    class SimpleIO(AdminSIO):
+    class SimpleIO(GetListAdminSIO):
         request_elem = 'zato_channel_amqp_get_list_request'
         response_elem = 'zato_channel_amqp_get_list_response'
         input_required = ('cluster_id',)
@@ -36,7 +36,7 @@ class GetList(AdminService):
         output_optional = ('data_format',)
 
     def get_data(self, session):
-        return channel_amqp_list(session, self.request.input.cluster_id, False)
+        return channel_amqp_list(session, self.request.input.cluster_id, False, search=self.get_search_info())
 
     def handle(self):
         with closing(self.odb.session()) as session:
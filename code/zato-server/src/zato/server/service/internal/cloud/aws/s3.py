@@ -17,12 +17,12 @@ from zato.common.broker_message import CLOUD
 from zato.common.odb.model import AWSS3
 from zato.common.odb.query import cloud_aws_s3_list
 from zato.server.service import Bool, ForceType, Int
-from zato.server.service.internal import AdminService, AdminSIO
+from zato.server.service.internal import AdminService, AdminSIO, GetListAdminSIO
 
 class GetList(AdminService):
     """ Returns a list of AWS S3 connections.
     """
-    class SimpleIO(AdminSIO):
+    class SimpleIO(GetListAdminSIO):
         request_elem = 'zato_cloud_aws_s3_get_list_request'
         response_elem = 'zato_cloud_aws_s3_get_list_response'
         input_required = ('cluster_id',)
@@ -31,7 +31,7 @@ class GetList(AdminService):
         output_optional = ('metadata_', 'bucket')
 
     def get_data(self, session):
-        return cloud_aws_s3_list(session, self.request.input.cluster_id, False)
+        return cloud_aws_s3_list(session, self.request.input.cluster_id, False, search=self.get_search_info())
 
     def handle(self):
         with closing(self.odb.session()) as session:
@@ -16,12 +16,12 @@ from traceback import format_exc
 from zato.common.broker_message import CLOUD
 from zato.common.odb.model import OpenStackSwift
 from zato.common.odb.query import cloud_openstack_swift_list
-from zato.server.service.internal import AdminService, AdminSIO
+from zato.server.service.internal import AdminService, AdminSIO, GetListAdminSIO
 
 class GetList(AdminService):
     """ Returns a list of OpenStack Swift connections.
     """
-    class SimpleIO(AdminSIO):
+    class SimpleIO(GetListAdminSIO):
         request_elem = 'zato_cloud_openstack_swift_get_list_request'
         response_elem = 'zato_cloud_openstack_swift_get_list_response'
         input_required = ('cluster_id',)
@@ -32,7 +32,7 @@ class GetList(AdminService):
             'custom_options')
 
     def get_data(self, session):
-        return cloud_openstack_swift_list(session, self.request.input.cluster_id, False)
+        return cloud_openstack_swift_list(session, self.request.input.cluster_id, False, search=self.get_search_info())
 
     def handle(self):
         with closing(self.odb.session()) as session:
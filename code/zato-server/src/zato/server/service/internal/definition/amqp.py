@@ -17,12 +17,12 @@ from uuid import uuid4
 from zato.common.broker_message import MESSAGE_TYPE, DEFINITION
 from zato.common.odb.model import Cluster, ConnDefAMQP
 from zato.common.odb.query import def_amqp, def_amqp_list
-from zato.server.service.internal import AdminService, AdminSIO, ChangePasswordBase
+from zato.server.service.internal import AdminService, AdminSIO, ChangePasswordBase, GetListAdminSIO
 
 class GetList(AdminService):
     """ Returns a list of AMQP definitions available.
     """
-    class SimpleIO(AdminSIO):
+    class SimpleIO(GetListAdminSIO):
         request_elem = 'zato_definition_amqp_get_list_request'
         response_elem = 'zato_definition_amqp_get_list_response'
         input_required = ('cluster_id',)
@@ -30,7 +30,7 @@ class GetList(AdminService):
         output_repeated = True
 
     def get_data(self, session):
-        return def_amqp_list(session, self.request.input.cluster_id, False)
+        return def_amqp_list(session, self.request.input.cluster_id, False, search=self.get_search_info())
 
     def handle(self):
         with closing(self.odb.session()) as session:
@@ -17,12 +17,12 @@ from zato.common.broker_message import MESSAGE_TYPE, DEFINITION
 from zato.common.odb.model import Cluster, ConnDefWMQ
 from zato.common.odb.query import def_jms_wmq, def_jms_wmq_list
 from zato.server.service import Boolean, Integer
-from zato.server.service.internal import AdminService, AdminSIO
+from zato.server.service.internal import AdminService, AdminSIO, GetListAdminSIO
 
 class GetList(AdminService):
     """ Returns a list of JMS WebSphere MQ definitions available.
     """
-    class SimpleIO(AdminSIO):
+    class SimpleIO(GetListAdminSIO):
         request_elem = 'zato_definition_jms_wmq_get_list_request'
         response_elem = 'zato_definition_jms_wmq_get_list_response'
         input_required = ('cluster_id',)
@@ -33,7 +33,7 @@ class GetList(AdminService):
         output_optional = ('ssl_cipher_spec', 'ssl_key_repository')
 
     def get_data(self, session):
-        return def_jms_wmq_list(session, self.request.input.cluster_id, False)
+        return def_jms_wmq_list(session, self.request.input.cluster_id, False, search=self.get_search_info())
 
     def handle(self):
         with closing(self.odb.session()) as session:
@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (C) 2016 Dariusz Suchojad <dsuch at zato.io>
+
+Licensed under LGPLv3, see LICENSE.txt for terms and conditions.
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+# stdlib
+from contextlib import closing
+from traceback import format_exc
+
+# anyjson
+from anyjson import loads
+
+# Zato
+from zato.common.broker_message import BATCH, MESSAGE_TYPE
+from zato.common.odb.model import ConnDefAMQP, ConnDefWMQ, SecurityBase
+from zato.server.service.internal import AdminService, AdminSIO
+
+# ################################################################################################################################
+
+# Object types whose items point to connection definitions by name, mapped to models of the definitions
+def_models = {
+    'channel_amqp': ConnDefAMQP,
+    'outconn_amqp': ConnDefAMQP,
+    'channel_jms_wmq': ConnDefWMQ,
+    'outconn_jms_wmq': ConnDefWMQ,
+}
+
+# ################################################################################################################################
+
+class BatchBrokerClient(object):
+    """ Stands in for a broker client while objects are being imported. Messages published by services that create
+    or edit the objects are not sent out one by one but kept until flush is called, at which point all of the messages
+    of the same type are published as a single BATCH.MESSAGES one.
+    """
+    def __init__(self, broker_client):
+        self.broker_client = broker_client
+        self.msg_list = {} # msg_type -> messages published, in order
+
+    def publish(self, msg, msg_type=MESSAGE_TYPE.TO_PARALLEL_ALL, *ignored_args, **ignored_kwargs):
+        msg = dict(msg)
+        msg['msg_type'] = msg_type
+        self.msg_list.setdefault(msg_type, []).append(msg)
+
+    def flush(self):
+        for msg_type, msg_list in self.msg_list.items():
+            if len(msg_list) == 1:
+                self.broker_client.publish(msg_list[0], msg_type)
+            else:
+                self.broker_client.publish({'action': BATCH.MESSAGES.value, 'msg_list': msg_list}, msg_type)
+
+        self.msg_list.clear()
+
+    def __getattr__(self, name):
+        return getattr(self.broker_client, name)
+
+# ################################################################################################################################
+
+class Import(AdminService):
+    """ Creates or edits, in the order given, all of the objects enmasse imports from a JSON document. Input data is
+    a bz2-compressed, base64-encoded JSON list of items, each with the name of a service to create or edit the object with,
+    its request and, optionally, a service to set its password with.
+
+    Connection definitions and security definitions are looked up by name, including ones created by earlier requests.
+    Broker messages are sent once all the items have been imported, one message per message type. Importing stops
+    on the first error, objects imported up to that point are kept.
+    """
+    class SimpleIO(AdminSIO):
+        request_elem = 'zato_enmasse_import_request'
+        response_elem = 'zato_enmasse_import_response'
+        input_required = ('cluster_id', 'data')
+        output_required = ('imported',)
+        output_optional = ('error_name', 'error_service_name', 'error_details')
+
+    def _get_ids(self, session, model, cluster_id):
+        """ Returns IDs of all the objects of a given model, by their names, running a query once per request.
+        Objects a request refers to never are of the same type as the objects the request imports.
+        """
+        if model not in self.ids:
+            self.ids[model] = dict(session.query(model.name, model.id).filter(model.cluster_id==cluster_id).all())
+
+        return self.ids[model]
+
+    def _get_id(self, response):
+        for value in response.values():
+            if isinstance(value, dict) and 'id' in value:
+                return value['id']
+
+    def _set_def_ids(self, session, cluster_id, item_type, request):
+        if item_type == 'http_soap':
+            if request.get('sec_def'):
+                request['security_id'] = self._get_ids(session, SecurityBase, cluster_id)[request['sec_def']]
+
+        elif item_type in def_models:
+            request['def_id'] = self._get_ids(session, def_models[item_type], cluster_id)[request['def_name']]
+
+    def import_item(self, session, cluster_id, item):
+        request = item['request']
+        request['cluster_id'] = cluster_id
+
+        self._set_def_ids(session, cluster_id, item['item_type'], request)
+        response = self.invoke(item['service_name'], request)
+
+        password = request.get('password')
+        if item.get('password_service_name') and password:
+            item_id = request.get('id') or self._get_id(response)
+            self.invoke(item['password_service_name'], {'id':item_id, 'password1':password, 'password2':password})
+
+    def handle(self):
+        input = self.request.input
+        items = loads(input.data.decode('base64').decode('bz2'))
+        self.ids = {}
+
+        orig_broker_client = self.broker_client
+        self.broker_client = BatchBrokerClient(orig_broker_client)
+
+        imported = 0
+
+        try:
+            with closing(self.odb.session()) as session:
+                for item in items:
+                    try:
+                        self.import_item(session, input.cluster_id, item)
+                    except Exception, e:
+                        self.logger.warn('Could not import `%s` with `%s`, e:`%s`',
+                            item['request'].get('name'), item['service_name'], format_exc(e))
+
+                        self.response.payload.error_name = item['request'].get('name')
+                        self.response.payload.error_service_name = item['service_name']
+                        self.response.payload.error_details = e.message or repr(e)
+
+                        break
+                    else:
+                        imported += 1
+
+        finally:
+            self.broker_client.flush()
+            self.broker_client = orig_broker_client
+
+        self.response.payload.imported = imported
@@ -29,8 +29,8 @@ from zato.common.broker_message import CHANNEL, OUTGOING
 from zato.common.odb.model import Cluster, JSONPointer, HTTPSOAP, HTTSOAPAudit, HTTSOAPAuditReplacePatternsJSONPointer, \
      HTTSOAPAuditReplacePatternsXPath, SecurityBase, Service, TLSCACert, to_json, XPath
 from zato.common.odb.query import http_soap_audit_item, http_soap_audit_item_list, http_soap_list
-from zato.server.service import Boolean, Integer, List
-from zato.server.service.internal import AdminService, AdminSIO
+from zato.server.service import Boolean, Float, Integer, List
+from zato.server.service.internal import AdminService, AdminSIO, GetListAdminSIO
 
 class _HTTPSOAPService(object):
     """ A common class for various HTTP/SOAP-related services.
@@ -80,7 +80,7 @@ class _HTTPSOAPService(object):
 class GetList(AdminService):
     """ Returns a list of HTTP/SOAP connections.
     """
-    class SimpleIO(AdminSIO):
+    class SimpleIO(GetListAdminSIO):
         request_elem = 'zato_http_soap_get_list_request'
         response_elem = 'zato_http_soap_get_list_response'
         input_required = ('cluster_id', 'connection', 'transport')
@@ -88,13 +88,13 @@ class GetList(AdminService):
         output_optional = ('service_id', 'service_name', 'security_id', 'security_name', 'sec_type',
             'method', 'soap_action', 'soap_version', 'data_format', 'host', 'ping_method', 'pool_size', 'merge_url_params_req',
             'url_params_pri', 'params_pri', 'serialization_type', 'timeout', 'sec_tls_ca_cert_id', Boolean('has_rbac'),
-            'content_type')
+            'content_type', Boolean('is_streaming'))
         output_repeated = True
 
     def get_data(self, session):
         return http_soap_list(session, self.request.input.cluster_id,
             self.request.input.connection, self.request.input.transport,
-            asbool(self.server.fs_server_config.misc.return_internal_objects), False)
+            asbool(self.server.fs_server_config.misc.return_internal_objects), False, search=self.get_search_info())
 
     def handle(self):
         with closing(self.odb.session()) as session:
@@ -116,7 +116,8 @@ class Create(_CreateEdit):
         input_required = ('cluster_id', 'name', 'is_active', 'connection', 'transport', 'is_internal', 'url_path')
         input_optional = ('service', 'security_id', 'method', 'soap_action', 'soap_version', 'data_format',
             'host', 'ping_method', 'pool_size', Boolean('merge_url_params_req'), 'url_params_pri', 'params_pri',
-            'serialization_type', 'timeout', 'sec_tls_ca_cert_id', Boolean('has_rbac'), 'content_type')
+            'serialization_type', 'timeout', 'sec_tls_ca_cert_id', Boolean('has_rbac'), 'content_type',
+            Boolean('is_streaming'))
         output_required = ('id', 'name')
 
     def handle(self):
@@ -181,6 +182,7 @@ class Create(_CreateEdit):
                 item.timeout = input.get('timeout') or MISC.DEFAULT_HTTP_TIMEOUT
                 item.has_rbac = input.get('has_rbac') or False
                 item.content_type = input.get('content_type')
+                item.is_streaming = input.get('is_streaming') or False
 
                 sec_tls_ca_cert_id = input.get('sec_tls_ca_cert_id')
                 item.sec_tls_ca_cert_id = sec_tls_ca_cert_id if sec_tls_ca_cert_id and sec_tls_ca_cert_id != ZATO_NONE else None
@@ -192,6 +194,7 @@ class Create(_CreateEdit):
                     input.impl_name = service.impl_name
                     input.service_id = service.id
                     input.service_name = service.name
+                    input.is_streaming = item.is_streaming
 
                 if item.sec_tls_ca_cert_id and item.sec_tls_ca_cert_id != ZATO_NONE:
                     self.add_tls_ca_cert(input, item.sec_tls_ca_cert_id)
@@ -224,7 +227,8 @@ class Edit(_CreateEdit):
         input_required = ('id', 'cluster_id', 'name', 'is_active', 'connection', 'transport', 'url_path')
         input_optional = ('service', 'security_id', 'method', 'soap_action', 'soap_version', 'data_format',
             'host', 'ping_method', 'pool_size', Boolean('merge_url_params_req'), 'url_params_pri', 'params_pri',
-            'serialization_type', 'timeout', 'sec_tls_ca_cert_id', Boolean('has_rbac'), 'content_type')
+            'serialization_type', 'timeout', 'sec_tls_ca_cert_id', Boolean('has_rbac'), 'content_type',
+            Boolean('is_streaming'))
         output_required = ('id', 'name')
 
     def handle(self):
@@ -294,6 +298,7 @@ class Edit(_CreateEdit):
                 item.timeout = input.get('timeout') or MISC.DEFAULT_HTTP_TIMEOUT
                 item.has_rbac = input.get('has_rbac') or False
                 item.content_type = input.get('content_type')
+                item.is_streaming = input.get('is_streaming') or False
 
                 sec_tls_ca_cert_id = input.get('sec_tls_ca_cert_id')
                 item.sec_tls_ca_cert_id = sec_tls_ca_cert_id if sec_tls_ca_cert_id and sec_tls_ca_cert_id != ZATO_NONE else None
@@ -308,6 +313,7 @@ class Edit(_CreateEdit):
                     input.merge_url_params_req = item.merge_url_params_req
                     input.url_params_pri = item.url_params_pri
                     input.params_pri = item.params_pri
+                    input.is_streaming = item.is_streaming
                 else:
                     input.ping_method = item.ping_method
                     input.pool_size = item.pool_size
@@ -422,6 +428,18 @@ class GetURLSecurity(AdminService):
         self.response.payload = dumps(response, sort_keys=True, indent=4)
         self.response.content_type = 'application/json'
 
+class GetURLPathCacheStats(AdminService):
+    """ Returns statistics of the URL path cache of the worker this service runs in.
+    """
+    class SimpleIO(AdminSIO):
+        request_elem = 'zato_http_soap_get_url_path_cache_stats_request'
+        response_elem = 'zato_http_soap_get_url_path_cache_stats_response'
+        output_required = (Integer('size'), Integer('max_size'), Integer('lookups'), Integer('hits'), Integer('misses'),
+            Integer('evictions'))
+
+    def handle(self):
+        self.response.payload = self.server.worker_store.request_dispatcher.url_data.get_url_path_cache_stats()
+
 # ################################################################################################################################
 
 class GetAuditConfig(AdminService):
@@ -601,6 +619,18 @@ class SetAuditResponseData(AdminService):
             session.add(item)
             session.commit()
 
+class GetAuditQueueStats(AdminService):
+    """ Returns depth and flush times, in milliseconds, of the HTTP audit queue of the worker this service runs in.
+    """
+    class SimpleIO(AdminSIO):
+        request_elem = 'zato_http_soap_get_audit_queue_stats_request'
+        response_elem = 'zato_http_soap_get_audit_queue_stats_response'
+        output_required = (Integer('depth'), Integer('max_size'), Integer('flushes'), Integer('flushed'), Integer('dropped'),
+            Integer('spilled'), Integer('errors'), Float('last_flush_time'), Float('max_flush_time'), Float('mean_flush_time'))
+
+    def handle(self):
+        self.response.payload = self.server.worker_store.request_dispatcher.url_data.audit_queue.get_stats()
+
 # ################################################################################################################################
 
 class _BaseAuditService(AdminService):
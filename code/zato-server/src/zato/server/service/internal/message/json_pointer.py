@@ -21,21 +21,21 @@ from zato.common import MSG_PATTERN_TYPE
 from zato.common.broker_message import MSG_JSON_POINTER
 from zato.common.odb.model import Cluster, JSONPointer
 from zato.common.odb.query import json_pointer_list
-from zato.server.service.internal import AdminService, AdminSIO
+from zato.server.service.internal import AdminService, AdminSIO, GetListAdminSIO
 
 # ##############################################################################
 
 class GetList(AdminService):
     """ Returns a list of JSON Pointers available.
     """
-    class SimpleIO(AdminSIO):
+    class SimpleIO(GetListAdminSIO):
         request_elem = 'zato_message_json_pointer_get_list_request'
         response_elem = 'zato_message_json_pointer_get_list_response'
         input_required = ('cluster_id',)
         output_required = ('id', 'name', 'value')
 
     def get_data(self, session):
-        return json_pointer_list(session, self.request.input.cluster_id, False)
+        return json_pointer_list(session, self.request.input.cluster_id, False, search=self.get_search_info())
 
     def handle(self):
         with closing(self.odb.session()) as session:
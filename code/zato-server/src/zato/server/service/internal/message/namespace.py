@@ -16,19 +16,19 @@ from traceback import format_exc
 from zato.common.broker_message import MSG_NS
 from zato.common.odb.model import Cluster, MsgNamespace
 from zato.common.odb.query import namespace_list
-from zato.server.service.internal import AdminService, AdminSIO
+from zato.server.service.internal import AdminService, AdminSIO, GetListAdminSIO
 
 class GetList(AdminService):
     """ Returns a list of namespaces available.
     """
-    class SimpleIO(AdminSIO):
+    class SimpleIO(GetListAdminSIO):
         request_elem = 'zato_message_namespace_get_list_request'
         response_elem = 'zato_message_namespace_get_list_response'
         input_required = ('cluster_id',)
         output_required = ('id', 'name', 'value')
 
     def get_data(self, session):
-        return namespace_list(session, self.request.input.cluster_id, False)
+        return namespace_list(session, self.request.input.cluster_id, False, search=self.get_search_info())
 
     def handle(self):
         with closing(self.odb.session()) as session:
@@ -25,7 +25,7 @@ from zato.common.odb.model import NotificationOpenStackSwift, Service
 from zato.common.odb.query import notif_cloud_openstack_swift_list
 from zato.server.service import Bool, ForceType, Int
 from zato.server.service.internal.notif import NotifierService
-from zato.server.service.internal import AdminService, AdminSIO
+from zato.server.service.internal import AdminService, AdminSIO, GetListAdminSIO
 
 # ################################################################################################################################
 
@@ -39,7 +39,7 @@ common_optional = ('get_data_patt',)
 class GetList(AdminService):
     """ Returns a list of OpenStack Swift notification definitions.
     """
-    class SimpleIO(AdminSIO):
+    class SimpleIO(GetListAdminSIO):
         request_elem = 'zato_notif_cloud_openstack_swift_get_list_request'
         response_elem = 'zato_notif_cloud_openstack_swift_get_list_response'
         input_required = ('cluster_id',)
@@ -47,7 +47,7 @@ class GetList(AdminService):
         output_optional = common_optional
 
     def get_data(self, session):
-        return notif_cloud_openstack_swift_list(session, self.request.input.cluster_id, False)
+        return notif_cloud_openstack_swift_list(session, self.request.input.cluster_id, False, search=self.get_search_info())
 
     def handle(self):
         with closing(self.odb.session()) as session:
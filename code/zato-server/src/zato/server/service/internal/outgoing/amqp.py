@@ -18,7 +18,7 @@ from zato.common.odb.model import ConnDefAMQP, OutgoingAMQP
 from zato.common.odb.query import out_amqp_list
 from zato.server.connection.amqp.outgoing import start_connector
 from zato.server.service import AsIs, Integer
-from zato.server.service.internal import AdminService, AdminSIO
+from zato.server.service.internal import AdminService, AdminSIO, GetListAdminSIO
 
 class _AMQPService(AdminService):
     def delete_outgoing(self, outgoing):
@@ -28,7 +28,7 @@ class _AMQPService(AdminService):
 class GetList(AdminService):
     """ Returns a list of outgoing AMQP connections.
     """
-    class SimpleIO(AdminSIO):
+    class SimpleIO(GetListAdminSIO):
         request_elem = 'zato_outgoing_amqp_get_list_request'
         response_elem = 'zato_outgoing_amqp_get_list_response'
         input_required = ('cluster_id',)
@@ -36,7 +36,7 @@ class GetList(AdminService):
         output_optional = ('content_type', 'content_encoding', 'expiration', AsIs('user_id'), AsIs('app_id'))
 
     def get_data(self, session):
-        return out_amqp_list(session, self.request.input.cluster_id, False)
+        return out_amqp_list(session, self.request.input.cluster_id, False, search=self.get_search_info())
 
     def handle(self):
         with closing(self.odb.session()) as session:
@@ -17,7 +17,7 @@ from zato.common.broker_message import OUTGOING
 from zato.common.odb.model import OutgoingFTP
 from zato.common.odb.query import out_ftp_list
 from zato.server.service import Boolean
-from zato.server.service.internal import AdminService, AdminSIO, ChangePasswordBase
+from zato.server.service.internal import AdminService, AdminSIO, ChangePasswordBase, GetListAdminSIO
 
 class _FTPService(AdminService):
     """ A common class for various FTP-related services.
@@ -31,7 +31,7 @@ class _FTPService(AdminService):
 class GetList(AdminService):
     """ Returns a list of outgoing FTP connections.
     """
-    class SimpleIO(AdminSIO):
+    class SimpleIO(GetListAdminSIO):
         request_elem = 'zato_outgoing_ftp_get_list_request'
         response_elem = 'zato_outgoing_ftp_get_list_response'
         input_required = ('cluster_id',)
@@ -39,7 +39,7 @@ class GetList(AdminService):
         output_optional = ('user', 'acct', 'timeout', Boolean('dircache'))
 
     def get_data(self, session):
-        return out_ftp_list(session, self.request.input.cluster_id, False)
+        return out_ftp_list(session, self.request.input.cluster_id, False, search=self.get_search_info())
 
     def handle(self):
         with closing(self.odb.session()) as session:
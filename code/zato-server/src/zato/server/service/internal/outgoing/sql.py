@@ -19,7 +19,7 @@ from zato.common.broker_message import OUTGOING
 from zato.common.odb.model import SQLConnectionPool
 from zato.common.odb.query import out_sql_list
 from zato.server.service import Integer
-from zato.server.service.internal import AdminService, AdminSIO, ChangePasswordBase
+from zato.server.service.internal import AdminService, AdminSIO, ChangePasswordBase, GetListAdminSIO
 
 class _SQLService(object):
     """ A common class for various SQL-related services.
@@ -37,7 +37,7 @@ class _SQLService(object):
 class GetList(AdminService):
     """ Returns a list of outgoing SQL connections.
     """
-    class SimpleIO(AdminSIO):
+    class SimpleIO(GetListAdminSIO):
         request_elem = 'zato_outgoing_sql_get_list_request'
         response_elem = 'zato_outgoing_sql_get_list_response'
         input_required = ('cluster_id',)
@@ -45,7 +45,7 @@ class GetList(AdminService):
         output_optional = ('extra',)
 
     def get_data(self, session):
-        return out_sql_list(session, self.request.input.cluster_id, False)
+        return out_sql_list(session, self.request.input.cluster_id, False, search=self.get_search_info())
 
     def handle(self):
         with closing(self.odb.session()) as session:
@@ -16,19 +16,19 @@ from traceback import format_exc
 from zato.common.broker_message import OUTGOING
 from zato.common.odb.model import OutgoingZMQ
 from zato.common.odb.query import out_zmq_list
-from zato.server.service.internal import AdminService, AdminSIO
+from zato.server.service.internal import AdminService, AdminSIO, GetListAdminSIO
 
 class GetList(AdminService):
     """ Returns a list of outgoing ZeroMQ connections.
     """
-    class SimpleIO(AdminSIO):
+    class SimpleIO(GetListAdminSIO):
         request_elem = 'zato_outgoing_zmq_get_list_request'
         response_elem = 'zato_outgoing_zmq_get_list_response'
         input_required = ('cluster_id',)
         output_required = ('id', 'name', 'is_active', 'address', 'socket_type')
 
     def get_data(self, session):
-        return out_zmq_list(session, self.request.input.cluster_id, False)
+        return out_zmq_list(session, self.request.input.cluster_id, False, search=self.get_search_info())
 
     def handle(self):
         with closing(self.odb.session()) as session:
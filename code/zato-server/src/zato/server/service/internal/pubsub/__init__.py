@@ -22,7 +22,7 @@ from huTools.structured import dict2xml
 
 # Zato
 from zato.common import DATA_FORMAT, PUB_SUB, ZATO_ERROR, ZATO_NONE, ZATO_OK
-from zato.common.pubsub import ItemFull, PermissionDenied
+from zato.common.pubsub import ItemFull, PermissionDenied, TooManyWaiters
 from zato.common.util import get_basic_auth_credentials
 from zato.server.connection.http_soap import BadRequest, Forbidden, TooManyRequests, Unauthorized
 from zato.server.service import AsIs, Bool, Int, Service
@@ -32,6 +32,22 @@ logger_overflown = getLogger('zato_pubsub_overflown')
 
 # ################################################################################################################################
 
+def get_publish_many_response(result):
+    """ Turns (msg_id, error) pairs returned by PubSubAPI.publish_many into a list of dictionaries to return to callers.
+    """
+    out = []
+
+    for msg_id, error in result:
+        if error is None:
+            out.append({'msg_id': msg_id, 'status': ZATO_OK, 'details': ''})
+        else:
+            details = error.msg if isinstance(error, ItemFull) else (error.message or repr(error))
+            out.append({'msg_id': msg_id, 'status': ZATO_ERROR, 'details': details})
+
+    return out
+
+# ################################################################################################################################
+
 class DeleteExpired(AdminService):
     """ Invoked when a server is starting - periodically spawns a greenlet deleting expired messages.
     """
@@ -112,7 +128,8 @@ class InvokeCallbacks(AdminService):
 # ################################################################################################################################
 
 class MoveToTargetQueues(AdminService):
-    """ Invoked when a server is starting - periodically spawns a greenlet moving published messages to recipient queues.
+    """ Invoked when a server is starting - moves published messages to recipient queues as soon as they are published
+    to a topic, by any server. Runs at least once in each interval in case any notification was missed.
     """
     def _move_to_target_queues(self):
 
@@ -133,9 +150,14 @@ class MoveToTargetQueues(AdminService):
         interval = float(self.server.fs_server_config.pubsub.move_to_target_queues_interval)
 
         while True:
+            self.pubsub.impl.wait_for_pending(interval)
             self.logger.debug('Moving messages to target queues, interval %rs', interval)
-            spawn(self._move_to_target_queues)
-            sleep(interval)
+
+            # Not spawned in a new greenlet so that anything published while it runs is moved in one batch afterwards
+            try:
+                self._move_to_target_queues()
+            except Exception, e:
+                self.logger.warn('Could not move messages to target queues, e:`%s`', format_exc(e))
 
 # ################################################################################################################################
 
@@ -164,7 +186,7 @@ class RESTHandler(Service):
     class SimpleIO(object):
         input_required = ('item_type', 'item')
         input_optional = ('max', 'dir', 'format', 'mime_type', Int('priority'), Int('expiration'), AsIs('msg_id'),
-            Bool('ack'), Bool('reject'))
+            Bool('ack'), Bool('reject'), Bool('many'), Int('wait'))
         default = ZATO_NONE
         use_channel_params_only = True
 
@@ -220,8 +242,11 @@ class RESTHandler(Service):
 # ################################################################################################################################
 
     def _handle_POST_topic(self):
-        """ Publishes a message on a topic.
+        """ Publishes a message on a topic, or a batch of them if ?many=1 is given.
         """
+        if self.request.input.many:
+            return self._handle_POST_topic_many()
+
         pub_data = {
             'payload': self.request.raw_request,
             'topic': self.request.input.item,
@@ -237,10 +262,41 @@ class RESTHandler(Service):
             'msg_id':self.pubsub.publish(**pub_data).msg.msg_id
         })
 
+    def _handle_POST_topic_many(self):
+        """ Publishes a batch of messages on a topic. The request is a JSON list of dictionaries, each with a payload
+        and optionally its own mime_type, priority, expiration and msg_id. Ones not given are taken from the query string.
+        """
+        try:
+            messages = loads(self.request.raw_request)
+            if not isinstance(messages, list):
+                raise ValueError('Expected a list of messages')
+        except ValueError, e:
+            raise BadRequest(self.cid, 'Could not parse messages to publish `{}`'.format(e.message))
+
+        defaults = {
+            'mime_type': self.request.input.mime_type or PUB_SUB.DEFAULT_MIME_TYPE,
+            'priority': int(self.request.input.priority or PUB_SUB.DEFAULT_PRIORITY),
+            'expiration': int(self.request.input.expiration or PUB_SUB.DEFAULT_EXPIRATION),
+        }
+
+        for idx, item in enumerate(messages):
+            if not isinstance(item, dict):
+                item = messages[idx] = {'payload': item}
+
+            for key, value in defaults.iteritems():
+                item.setdefault(key, value)
+
+        self._set_payload_data({
+            'status': ZATO_OK,
+            'results': get_publish_many_response(
+                self.pubsub.publish_many(messages, self.request.input.item, self.environ['client_id']))
+        })
+
 # ################################################################################################################################
 
     def _handle_POST_msg(self):
-        """ Returns messages from topics, either in JSON or XML.
+        """ Returns messages from topics, either in JSON or XML. If there are none, waits for up to ?wait=N seconds
+        for any to arrive.
         """
         out = {
             'status': ZATO_OK,
@@ -250,9 +306,10 @@ class RESTHandler(Service):
 
         max_batch_size = int(self.request.input.max) if self.request.input.max else PUB_SUB.DEFAULT_GET_MAX_BATCH_SIZE
         is_fifo = True if (self.request.input.dir == PUB_SUB.GET_DIR.FIFO or not self.request.input.dir) else False
+        wait_seconds = int(self.request.input.wait) if self.request.input.wait else 0
 
         try:
-            for item in self.pubsub.get(self.environ['sub_key'], max_batch_size, is_fifo, self.environ['format']):
+            for item in self.pubsub.get(self.environ['sub_key'], max_batch_size, is_fifo, self.environ['format'], wait_seconds):
 
                 if self.environ['is_json']:
                     out_item = item
@@ -265,6 +322,8 @@ class RESTHandler(Service):
 
         except ItemFull, e:
             raise TooManyRequests(self.cid, e.msg)
+        except TooManyWaiters, e:
+            raise TooManyRequests(self.cid, e.message)
         else:
             self._set_payload_data(out)
 
@@ -19,8 +19,9 @@ from bunch import Bunch
 from zato.common.broker_message import PUB_SUB_TOPIC
 from zato.common.odb.model import Cluster, PubSubTopic
 from zato.common.odb.query import pubsub_topic_list
-from zato.server.service import AsIs, Int, UTC
+from zato.server.service import AsIs, Int, ListOfDicts, UTC
 from zato.server.service.internal import AdminService, AdminSIO
+from zato.server.service.internal.pubsub import get_publish_many_response
 
 # ################################################################################################################################
 
@@ -86,6 +87,25 @@ class Publish(AdminService):
 
 # ################################################################################################################################
 
+class PublishMany(AdminService):
+    """ Publishes a batch of messages to a topic of choice. Each message may carry its own payload, mime_type, priority,
+    expiration and msg_id. If no client_id is given on input the messages are published using an internal account.
+    """
+    class SimpleIO(AdminSIO):
+        request_elem = 'zato_pubsub_topics_publish_many_request'
+        response_elem = 'zato_pubsub_topics_publish_many_response'
+        input_required = ('cluster_id', 'name', ListOfDicts('messages'))
+        input_optional = ('client_id',)
+        output_required = ('status',)
+        output_optional = (AsIs('msg_id'), 'details')
+
+    def handle(self):
+        client_id = self.request.input.get('client_id') or self.pubsub.get_default_producer().id
+        self.response.payload[:] = get_publish_many_response(
+            self.pubsub.publish_many(self.request.input.messages, self.request.input.name, client_id))
+
+# ################################################################################################################################
+
 class Create(AdminService):
     """ Creates a new topic.
     """
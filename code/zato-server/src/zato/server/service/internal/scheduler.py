@@ -24,7 +24,8 @@ from zato.common.broker_message import MESSAGE_TYPE, SCHEDULER as SCHEDULER_MSG
 from zato.common.odb.model import Cluster, Job, CronStyleJob, IntervalBasedJob,\
      Service
 from zato.common.odb.query import job_by_name, job_list
-from zato.server.service.internal import AdminService, AdminSIO
+from zato.server.service import List
+from zato.server.service.internal import AdminService, AdminSIO, search_input_optional
 
 _service_name_prefix = 'zato.scheduler.job.'
 
@@ -202,9 +203,10 @@ class GetList(_Get):
     class SimpleIO(_Get.SimpleIO):
         request_elem = 'zato_scheduler_job_get_list_request'
         response_elem = 'zato_scheduler_job_get_list_response'
+        input_optional = search_input_optional
 
     def get_data(self, session):
-        return job_list(session, self.request.input.cluster_id, False)
+        return job_list(session, self.request.input.cluster_id, False, search=self.get_search_info())
 
     def handle(self):
         with closing(self.odb.session()) as session:
@@ -331,3 +333,32 @@ class SetActiveStatus(AdminService):
                 self.logger.error(msg)
 
                 raise
+
+class SetActiveStatusMany(AdminService):
+    """ Actives or deactivates a list of jobs in one go, e.g. all the one-time jobs the scheduler has just executed.
+    """
+    name = _service_name_prefix + 'set-active-status-many'
+
+    class SimpleIO(AdminSIO):
+        request_elem = 'zato_scheduler_job_set_active_status_many_request'
+        response_elem = 'zato_scheduler_job_set_active_status_many_response'
+        input_required = (List('id_list'), 'is_active')
+
+    def handle(self):
+        id_list = self.request.input.id_list
+        if not id_list:
+            return
+
+        with closing(self.odb.session()) as session:
+            try:
+                session.query(Job).\
+                    filter(Job.id.in_(id_list)).\
+                    update({'is_active': self.request.input.is_active}, synchronize_session=False)
+                session.commit()
+
+            except Exception, e:
+                session.rollback()
+                msg = 'Could not update is_active status of `{}`, e:[{}]'.format(id_list, format_exc(e))
+                self.logger.error(msg)
+
+                raise
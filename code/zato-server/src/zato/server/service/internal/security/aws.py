@@ -18,19 +18,19 @@ from zato.common import SEC_DEF_TYPE
 from zato.common.broker_message import SECURITY
 from zato.common.odb.model import Cluster, AWSSecurity
 from zato.common.odb.query import aws_security_list
-from zato.server.service.internal import AdminService, AdminSIO, ChangePasswordBase
+from zato.server.service.internal import AdminService, AdminSIO, ChangePasswordBase, GetListAdminSIO
 
 class GetList(AdminService):
     """ Returns a list of AWS definitions available.
     """
-    class SimpleIO(AdminSIO):
+    class SimpleIO(GetListAdminSIO):
         request_elem = 'zato_security_aws_get_list_request'
         response_elem = 'zato_security_aws_get_list_response'
         input_required = ('cluster_id',)
         output_required = ('id', 'name', 'is_active', 'username')
 
     def get_data(self, session):
-        return aws_security_list(session, self.request.input.cluster_id, False)
+        return aws_security_list(session, self.request.input.cluster_id, False, search=self.get_search_info())
 
     def handle(self):
         with closing(self.odb.session()) as session:
@@ -19,12 +19,12 @@ from zato.common.broker_message import SECURITY
 from zato.common.odb.model import Cluster, OAuth
 from zato.common.odb.query import oauth_list
 from zato.server.service import Integer
-from zato.server.service.internal import AdminService, AdminSIO, ChangePasswordBase
+from zato.server.service.internal import AdminService, AdminSIO, ChangePasswordBase, GetListAdminSIO
 
 class GetList(AdminService):
     """ Returns a list of OAuth definitions available.
     """
-    class SimpleIO(AdminSIO):
+    class SimpleIO(GetListAdminSIO):
         request_elem = 'zato_security_oauth_get_list_request'
         response_elem = 'zato_security_oauth_get_list_response'
         input_required = ('cluster_id',)
@@ -32,7 +32,7 @@ class GetList(AdminService):
             'sig_method', Integer('max_nonce_log'))
 
     def get_data(self, session):
-        return oauth_list(session, self.request.input.cluster_id, False)
+        return oauth_list(session, self.request.input.cluster_id, False, search=self.get_search_info())
 
     def handle(self):
         with closing(self.odb.session()) as session:
@@ -19,20 +19,20 @@ from zato.common.broker_message import SECURITY
 from zato.common.odb.model import Cluster, TechnicalAccount
 from zato.common.odb.query import tech_acc_list
 from zato.common.util import tech_account_password
-from zato.server.service.internal import AdminService, AdminSIO, ChangePasswordBase
+from zato.server.service.internal import AdminService, AdminSIO, ChangePasswordBase, GetListAdminSIO
 
 class GetList(AdminService):
     """ Returns a list of technical accounts defined in the ODB. The items are
     sorted by the 'name' attribute.
     """
-    class SimpleIO(AdminSIO):
+    class SimpleIO(GetListAdminSIO):
         request_elem = 'zato_security_tech_account_get_list_request'
         response_elem = 'zato_security_tech_account_get_list_response'
         input_required = ('cluster_id',)
         output_required = ('id', 'name', 'is_active')
 
     def get_data(self, session):
-        return tech_acc_list(session, self.request.input.cluster_id, False)
+        return tech_acc_list(session, self.request.input.cluster_id, False, search=self.get_search_info())
 
     def handle(self):
         with closing(self.odb.session()) as session:
@@ -19,12 +19,12 @@ from zato.common.broker_message import SECURITY
 from zato.common.odb.model import Cluster, WSSDefinition
 from zato.common.odb.query import wss_list
 from zato.server.service import Boolean, Integer
-from zato.server.service.internal import AdminService, AdminSIO, ChangePasswordBase
+from zato.server.service.internal import AdminService, AdminSIO, ChangePasswordBase, GetListAdminSIO
 
 class GetList(AdminService):
     """ Returns a list of WS-Security definitions available.
     """
-    class SimpleIO(AdminSIO):
+    class SimpleIO(GetListAdminSIO):
         request_elem = 'zato_security_wss_get_list_request'
         response_elem = 'zato_security_wss_get_list_response'
         input_required = ('cluster_id',)
@@ -33,7 +33,7 @@ class GetList(AdminService):
             Integer('nonce_freshness_time'))
 
     def get_data(self, session):
-        return wss_list(session, self.request.input.cluster_id, False)
+        return wss_list(session, self.request.input.cluster_id, False, search=self.get_search_info())
 
     def handle(self):
         with closing(self.odb.session()) as session:
@@ -19,12 +19,12 @@ from zato.common.broker_message import SECURITY
 from zato.common.odb.model import Cluster, XPathSecurity
 from zato.common.odb.query import xpath_sec_list
 from zato.common.util import validate_xpath
-from zato.server.service.internal import AdminService, AdminSIO, ChangePasswordBase
+from zato.server.service.internal import AdminService, AdminSIO, ChangePasswordBase, GetListAdminSIO
 
 class GetList(AdminService):
     """ Returns a list of XPath security definitions available.
     """
-    class SimpleIO(AdminSIO):
+    class SimpleIO(GetListAdminSIO):
         request_elem = 'zato_security_xpath_get_list_request'
         response_elem = 'zato_security_xpath_get_list_response'
         input_required = ('cluster_id',)
@@ -32,7 +32,7 @@ class GetList(AdminService):
         output_optional = ('password_expr',)
 
     def get_data(self, session):
-        return xpath_sec_list(session, self.request.input.cluster_id, False)
+        return xpath_sec_list(session, self.request.input.cluster_id, False, search=self.get_search_info())
 
     def handle(self):
         with closing(self.odb.session()) as session:
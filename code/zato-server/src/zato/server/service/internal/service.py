@@ -31,14 +31,14 @@ from zato.common.odb.model import Cluster, ChannelAMQP, ChannelWMQ, ChannelZMQ,
 from zato.common.odb.query import service_list
 from zato.common.util import hot_deploy, payload_from_request
 from zato.server.service import Boolean, Integer
-from zato.server.service.internal import AdminService, AdminSIO
+from zato.server.service.internal import AdminService, AdminSIO, GetListAdminSIO
 
 _no_such_service_name = uuid4().hex
 
 class GetList(AdminService):
     """ Returns a list of services.
     """
-    class SimpleIO(AdminSIO):
+    class SimpleIO(GetListAdminSIO):
         request_elem = 'zato_service_get_list_request'
         response_elem = 'zato_service_get_list_response'
         input_required = ('cluster_id', 'name_filter')
@@ -53,7 +53,7 @@ class GetList(AdminService):
         internal_del = is_boolean(self.server.fs_server_config.misc.internal_services_may_be_deleted)
 
         out = []
-        sl = service_list(session, self.request.input.cluster_id, return_internal, False)
+        search_info = self.get_search_info()
 
         name_filter = self.request.input.get('name_filter')
         if name_filter:
@@ -61,8 +61,15 @@ class GetList(AdminService):
         else:
             name_filter = [_no_such_service_name] # So it matches nothing
 
+        # If a single page is requested, services are filtered by their names in the same query the page is selected with
+        if search_info and self.request.input.name_filter != '*':
+            search_info['query'] = ' '.join([search_info['query'] or ''] + name_filter).strip()
+
+        sl = service_list(session, self.request.input.cluster_id, return_internal, False, search=search_info)
+
         for item in sl:
-            if self.request.input.name_filter != '*':
+
+            if not search_info and self.request.input.name_filter != '*':
                 skip_item = False
                 for filter in name_filter:
                     if not filter in item.name.lower():
@@ -76,6 +83,10 @@ class GetList(AdminService):
 
             out.append(item)
 
+        if search_info:
+            sl.result = out
+            return sl
+
         return out
 
     def handle(self):
@@ -477,6 +488,13 @@ class ConfigureRequestResponse(AdminService):
         key = '{}{}'.format(KVDB.REQ_RESP_SAMPLE, self.request.input.name)
         self.kvdb.conn.hset(key, 'freq', self.request.input.sample_req_resp_freq)
 
+        # Workers keep the frequency in their service stores
+        self.broker_client.publish({
+            'action': SERVICE.CONFIGURE_REQUEST_RESPONSE.value,
+            'name': self.request.input.name,
+            'sample_req_resp_freq': self.request.input.sample_req_resp_freq,
+        })
+
 class UploadPackage(AdminService):
     """ Returns a boolean flag indicating whether the server has a WSDL attached.
     """
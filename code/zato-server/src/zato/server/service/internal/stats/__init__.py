@@ -13,6 +13,7 @@ from calendar import mdays
 from collections import OrderedDict
 from contextlib import closing
 from datetime import datetime, timedelta
+from fnmatch import fnmatchcase
 from heapq import nlargest
 from operator import itemgetter
 from sys import maxint
@@ -23,7 +24,7 @@ from bunch import Bunch
 # dateutil
 from dateutil.parser import parse
 from dateutil.relativedelta import relativedelta
-from dateutil.rrule import MINUTELY, rrule, rruleset
+from dateutil.rrule import DAILY, HOURLY, MINUTELY, rrule, rruleset
 
 # SciPy
 from scipy import stats as sp_stats
@@ -34,9 +35,20 @@ from zato.common.broker_message import STATS
 from zato.common.odb.model import Service
 from zato.server.service import Integer, UTC
 from zato.server.service.internal import AdminService, AdminSIO
+from zato.server.stats import get_index, get_index_key, hgetall_many, Histogram
 
 STATS_KEYS = ('usage', 'max', 'rate', 'mean', 'min')
 
+PERCENTILES = (50, 95, 99)
+PERCENTILE_KEYS = tuple('p{}'.format(elem) for elem in PERCENTILES)
+
+# Format of keys a period of time is aggregated into -> frequency and format of keys it's aggregated from, and the period's length
+AGGREGATION_SOURCES = {
+    '%Y:%m:%d:%H': (MINUTELY, '%Y:%m:%d:%H:%M', relativedelta(hours=1)),
+    '%Y:%m:%d': (HOURLY, '%Y:%m:%d:%H', relativedelta(days=1)),
+    '%Y:%m': (DAILY, '%Y:%m:%d', relativedelta(months=1)),
+}
+
 def stop_excluding_rrset(freq, start, stop):
     rrs = rruleset()
     rrs.rrule(rrule(freq, dtstart=start, until=stop))
@@ -66,46 +78,50 @@ class BaseAggregatingService(AdminService):
     def stats_enabled(self):
         return self.server.component_enabled.stats
 
-    def aggregate_raw_times(self, key, service_name, max_batch_size=None):
-        """ Aggregates values from a list living under a given key. Returns its
-        min, max, mean and an overall usage count. 'max_batch_size' controls how
-        many items will be fetched from the list so it's possible to fetch less
-        items than its LLEN returns.
+    def get_histogram(self, key, needs_delete=False):
+        """ Returns a histogram of processing times stored under a given key, optionally deleting the key
+        in the same transaction so nothing written to it in between is lost.
         """
-        key_len = self.server.kvdb.conn.llen(key)
-        if max_batch_size:
-            batch_size = min(key_len, max_batch_size)
-            if batch_size < key_len:
-                msg = ('batch_size:[{}] < key_len:[{}], max_batch_size:[{}], key:[{}], '
-                'consider decreasing the job interval or increasing the max_batch_size').format(
-                    batch_size, key_len, max_batch_size, key)
-                self.logger.warn(msg)
-        else:
-            batch_size = key_len
+        with self.server.kvdb.conn.pipeline() as pipe:
+            pipe.hgetall(key)
+            if needs_delete:
+                pipe.delete(key)
 
-        times = [int(elem) for elem in self.server.kvdb.conn.lrange(key, 0, batch_size)]
+            return Histogram.from_kvdb(pipe.execute()[0])
 
-        if times:
+    def aggregate_histogram(self, histogram, service_name):
+        """ Returns min, max, mean and an overall usage count of processing times in a histogram.
+        """
+        if histogram.total:
             mean_percentile = int(self.server.kvdb.conn.hget(KVDB.SERVICE_TIME_BASIC + service_name, 'mean_percentile') or 0)
-            max_score = int(sp_stats.scoreatpercentile(times, mean_percentile))
+            max_score = histogram.percentile(mean_percentile)
 
-            return min(times), max(times), (sp_stats.tmean(times, (None, max_score)) or 0), len(times)
+            return histogram.min, histogram.max, histogram.mean(max_score), histogram.total
         else:
             return 0, 0, 0, 0
 
-    def collect_service_stats(self, keys_pattern, key_prefix, key_suffix, total_seconds,
-                              suffix_needs_colon=True, chop_off_service_name=True, needs_rate=True):
+    def get_percentiles(self, histogram):
+        return dict(zip(PERCENTILE_KEYS, (histogram.percentile(elem) for elem in PERCENTILES)))
 
-        service_stats = {}
-        if suffix_needs_colon:
-            key_suffix = ':' + key_suffix
+    def collect_histograms(self, key_prefix, index):
+        """ Merges histograms under all the (service name, suffix) keys from an index into one histogram per service.
+        """
+        histograms = {}
+        keys = ('{}{}:{}'.format(key_prefix, service_name, suffix) for service_name, suffix in index)
+
+        for (service_name, _), data in zip(index, hgetall_many(self.kvdb.conn, keys)):
+            histograms.setdefault(service_name, Histogram()).merge(Histogram.from_kvdb(data))
 
-        for key in self.kvdb.conn.keys(keys_pattern):
-            service_name = key.replace(key_prefix, '').replace(key_suffix, '')
-            if chop_off_service_name:
-                service_name = service_name[:-3]
+        return histograms
+
+    def collect_service_stats(self, key_prefix, index, total_seconds, needs_rate=True, needs_mean=True):
+        """ Collects statistics of all the (service name, suffix) keys from an index into a dictionary of service
+        names to their usage, min, max, mean and rate. If needs_mean is False, 'mean' will be a list of all mean values found.
+        """
+        service_stats = {}
+        keys = ('{}{}:{}'.format(key_prefix, service_name, suffix) for service_name, suffix in index)
 
-            values = self.kvdb.conn.hgetall(key)
+        for (service_name, _), values in zip(index, hgetall_many(self.kvdb.conn, keys)):
 
             stats = service_stats.setdefault(service_name, {})
 
@@ -137,7 +153,7 @@ class BaseAggregatingService(AdminService):
 
         for service_name, values in service_stats.items():
             mean = values.get('mean')
-            if mean:
+            if mean and needs_mean:
                 values['mean'] = sp_stats.tmean(mean)
 
             if needs_rate:
@@ -145,7 +161,16 @@ class BaseAggregatingService(AdminService):
 
         return service_stats
 
-    def aggregate_partly_aggregated(self, delta, source_strftime_format, source, target, now=None):
+    def get_source_suffixes(self, key_suffix, source_strftime_format):
+        """ Returns suffixes of all the keys that a period of time is aggregated from, e.g. all the minutes of an hour.
+        """
+        freq, strftime_format, delta = AGGREGATION_SOURCES[source_strftime_format]
+        start = datetime.strptime(key_suffix, source_strftime_format)
+
+        return [elem.strftime(strftime_format) for elem in stop_excluding_rrset(freq, start, start + delta)]
+
+    def aggregate_partly_aggregated(self, delta, source_strftime_format, source, target, now=None,
+                                    histogram_source=None, histogram_target=None):
         """ Further aggregates service statistics, e.g. turns per-minute statistics
         into per-hour statistcs.
         """
@@ -160,8 +185,16 @@ class BaseAggregatingService(AdminService):
             total_seconds = mdays[delta_diff.month] * SECONDS_IN_DAY # TODO: Use calendar.monthrange instead of mdays so leap years are taken into account
 
         key_suffix = delta_diff.strftime(source_strftime_format)
-        service_stats = self.collect_service_stats(
-            '{}*:{}*'.format(source, key_suffix), source, key_suffix, total_seconds)
+        index = get_index(self.kvdb.conn, source, self.get_source_suffixes(key_suffix, source_strftime_format))
+        service_stats = self.collect_service_stats(source, index, total_seconds)
+
+        # Percentiles can't be computed out of other percentiles so they're always read from merged histograms
+        if histogram_source:
+            histograms = self.collect_histograms(histogram_source, index)
+            for service_name, histogram in histograms.items():
+                if service_name in service_stats:
+                    service_stats[service_name].update(self.get_percentiles(histogram))
+                    self.set_aggr_histogram('{}{}:{}'.format(histogram_target, service_name, key_suffix), histogram)
 
         self.hset_aggr_keys(service_stats, target, key_suffix)
 
@@ -174,44 +207,69 @@ class BaseAggregatingService(AdminService):
             for name in STATS_KEYS:
                 self.hset_aggr_key(aggr_key, name, values[name])
 
+            for name in PERCENTILE_KEYS:
+                if name in values:
+                    self.hset_aggr_key(aggr_key, name, values[name])
+
+            self.add_to_index(key_prefix, key_suffix, service_name)
+
+    def get_expire_after(self):
+        """ Returns in how many seconds aggregated keys should expire.
+        """
+        expire_after = int(self.server.fs_server_config.get('stats', {}).get('expire_after', 24))
+        return expire_after * 60 * 60 # Hours times minutes in an hour and seconds in a minute
+
     def hset_aggr_key(self, aggr_key, hash_key, hash_value):
         self.server.kvdb.conn.hset(aggr_key, hash_key, hash_value)
 
         # Expire the aggregated key after that many hours
-        expire_after = int(self.server.fs_server_config.get('stats', {}).get('expire_after', 24))
-        expire_after = expire_after * 60 * 60 # Hours times minutes in an hour and seconds in a minute
-        self.server.kvdb.conn.expire(aggr_key, expire_after)
+        self.server.kvdb.conn.expire(aggr_key, self.get_expire_after())
+
+    def add_to_index(self, key_prefix, key_suffix, service_name):
+        """ Records that a service has statistics under a given prefix and suffix so they can be found without KEYS.
+        """
+        index_key = get_index_key(key_prefix, key_suffix)
+
+        with self.server.kvdb.conn.pipeline() as pipe:
+            pipe.sadd(index_key, service_name)
+            pipe.expire(index_key, self.get_expire_after())
+            pipe.execute()
+
+    def set_aggr_histogram(self, aggr_key, histogram):
+        """ Stores a histogram under an aggregated key so it can be merged into histograms of coarser granularity.
+        """
+        with self.server.kvdb.conn.pipeline() as pipe:
+            pipe.delete(aggr_key)
+            pipe.hmset(aggr_key, dict(histogram.counts))
+            pipe.expire(aggr_key, self.get_expire_after())
+            pipe.execute()
 
 # ##############################################################################
 
 class ProcessRawTimes(BaseAggregatingService):
+    """ Updates all-time statistics of each service with processing times collected since the previous run.
+    """
     def handle(self):
 
         if not self.stats_enabled():
             return
 
-        #
-        # Sample config values
-        #
-        # global_slow_threshold=120
-        # max_batch_size=99999
-        #
-        config = Bunch()
-        for item in self.request.payload.splitlines():
-            key, value = item.split('=')
-            config[key] = int(value)
-
-        for key in self.server.kvdb.conn.keys(KVDB.SERVICE_TIME_RAW + '*'):
+        for service_name in sorted(self.server.kvdb.conn.smembers(KVDB.SERVICE_TIME_INDEX_RAW)):
 
-            service_name = key.replace(KVDB.SERVICE_TIME_RAW, '')
+            key = KVDB.SERVICE_TIME_HISTOGRAM_RAW + service_name
 
             current_mean = float(
                 self.server.kvdb.conn.hget(KVDB.SERVICE_TIME_BASIC + service_name, 'mean_all_time') or 0)
             current_min = float(self.server.kvdb.conn.hget(KVDB.SERVICE_TIME_BASIC + service_name, 'min_all_time') or 0)
             current_max = float(self.server.kvdb.conn.hget(KVDB.SERVICE_TIME_BASIC + service_name, 'max_all_time') or 0)
 
-            batch_min, batch_max, batch_mean, batch_total = self.aggregate_raw_times(
-                key, service_name, config.max_batch_size)
+            # Servers use HINCRBY for storing raw times so we can delete the key as soon as it's been read,
+            # there is no need for batches because a histogram's size doesn't depend on how many times it holds.
+            batch_min, batch_max, batch_mean, batch_total = self.aggregate_histogram(
+                self.get_histogram(key, True), service_name)
+
+            if not batch_total:
+                continue
 
             self.server.kvdb.conn.hset(
                KVDB.SERVICE_TIME_BASIC + service_name, 'mean_all_time', sp_stats.tmean((batch_mean, current_mean)))
@@ -220,10 +278,6 @@ class ProcessRawTimes(BaseAggregatingService):
             self.server.kvdb.conn.hset(
                 KVDB.SERVICE_TIME_BASIC + service_name, 'max_all_time', max(current_max, batch_max))
 
-            # Services use RPUSH for storing raw times so we are safe to use LTRIM
-            # in order to do away with the already processed ones
-            self.server.kvdb.conn.ltrim(key, batch_total, -1)
-
 # ##############################################################################
 
 class AggregateByMinute(BaseAggregatingService):
@@ -237,17 +291,18 @@ class AggregateByMinute(BaseAggregatingService):
         # Get all keys from a minute that is sure to have passed, for instance,
         # say it's 13:19 right now (regardless of the seconds part), we'll process everything
         # that happened in 13:17. Hence it's also important that any changes in the minutes
-        # to be picked up here below be kept in sync with the EXPIRE command Service._post_handle uses.
+        # to be picked up here below be kept in sync with the EXPIRE command ServiceStatsAccumulator.flush uses.
 
         now = datetime.utcnow()
         key_suffix = (now - timedelta(minutes=2)).strftime('%Y:%m:%d:%H:%M')
 
-        for key in self.server.kvdb.conn.keys('{}*:{}'.format(KVDB.SERVICE_TIME_RAW_BY_MINUTE, key_suffix)):
+        for service_name, _ in get_index(self.server.kvdb.conn, KVDB.SERVICE_TIME_HISTOGRAM_RAW_BY_MINUTE, [key_suffix]):
 
-            service_name = key.replace(KVDB.SERVICE_TIME_RAW_BY_MINUTE, '').replace(':' + key_suffix, '')
+            key = '{}{}:{}'.format(KVDB.SERVICE_TIME_HISTOGRAM_RAW_BY_MINUTE, service_name, key_suffix)
             aggr_key = '{}{}:{}'.format(KVDB.SERVICE_TIME_AGGREGATED_BY_MINUTE, service_name, key_suffix)
 
-            batch_min, batch_max, batch_mean, batch_total = self.aggregate_raw_times(key, service_name)
+            histogram = self.get_histogram(key)
+            batch_min, batch_max, batch_mean, batch_total = self.aggregate_histogram(histogram, service_name)
 
             self.hset_aggr_key(aggr_key, 'min', batch_min)
             self.hset_aggr_key(aggr_key, 'max', batch_max)
@@ -255,6 +310,15 @@ class AggregateByMinute(BaseAggregatingService):
             self.hset_aggr_key(aggr_key, 'usage', batch_total)
             self.hset_aggr_key(aggr_key, 'rate', batch_total / 60.0) # I.e. req/s
 
+            for name, value in self.get_percentiles(histogram).items():
+                self.hset_aggr_key(aggr_key, name, value)
+
+            # Per-hour statistics will be built by merging per-minute histograms
+            self.set_aggr_histogram('{}{}:{}'.format(
+                KVDB.SERVICE_TIME_HISTOGRAM_AGGREGATED_BY_MINUTE, service_name, key_suffix), histogram)
+
+            self.add_to_index(KVDB.SERVICE_TIME_AGGREGATED_BY_MINUTE, key_suffix, service_name)
+
             # Raw per-minute statistics keys will expire by themselves, we don't need
             # to delete them manually.
 
@@ -271,7 +335,9 @@ class AggregateByHour(BaseAggregatingService):
         source = KVDB.SERVICE_TIME_AGGREGATED_BY_MINUTE
         target = KVDB.SERVICE_TIME_AGGREGATED_BY_HOUR
 
-        self.aggregate_partly_aggregated(delta, source_strftime_format, source, target)
+        self.aggregate_partly_aggregated(delta, source_strftime_format, source, target,
+            histogram_source=KVDB.SERVICE_TIME_HISTOGRAM_AGGREGATED_BY_MINUTE,
+            histogram_target=KVDB.SERVICE_TIME_HISTOGRAM_AGGREGATED_BY_HOUR)
 
 class AggregateByDay(BaseAggregatingService):
     """ Creates per-day stats.
@@ -286,7 +352,9 @@ class AggregateByDay(BaseAggregatingService):
         source = KVDB.SERVICE_TIME_AGGREGATED_BY_HOUR
         target = KVDB.SERVICE_TIME_AGGREGATED_BY_DAY
 
-        self.aggregate_partly_aggregated(delta, source_strftime_format, source, target)
+        self.aggregate_partly_aggregated(delta, source_strftime_format, source, target,
+            histogram_source=KVDB.SERVICE_TIME_HISTOGRAM_AGGREGATED_BY_HOUR,
+            histogram_target=KVDB.SERVICE_TIME_HISTOGRAM_AGGREGATED_BY_DAY)
 
 class AggregateByMonth(BaseAggregatingService):
     """ Creates per-month stats.
@@ -301,7 +369,9 @@ class AggregateByMonth(BaseAggregatingService):
         source = KVDB.SERVICE_TIME_AGGREGATED_BY_DAY
         target = KVDB.SERVICE_TIME_AGGREGATED_BY_MONTH
 
-        self.aggregate_partly_aggregated(delta, source_strftime_format, source, target)
+        self.aggregate_partly_aggregated(delta, source_strftime_format, source, target,
+            histogram_source=KVDB.SERVICE_TIME_HISTOGRAM_AGGREGATED_BY_DAY,
+            histogram_target=KVDB.SERVICE_TIME_HISTOGRAM_AGGREGATED_BY_MONTH)
 
 # ##############################################################################
 
@@ -382,17 +452,22 @@ class StatsReturningService(AdminService):
             suffixes = self.get_suffixes(start, stop)
 
         # We make several passes. First two passes are made over Redis keys, one gathers the services, if any at all,
-        # and another one actually collects statistics for each service found. Next pass, a partly optional one,
-        # computes trends for mean response time and service usage. Another one computes each of the service's
-        # average rate and updates other attributes basing on values collected in the previous step.
+        # out of per-suffix indexes and another one actually collects statistics for each service found.
+        # Next pass, a partly optional one, computes trends for mean response time and service usage.
+        # Another one computes each of the service's average rate and updates other attributes
+        # basing on values collected in the previous step.
         # Optionally, the last one will pick only top n elements of a given type (top mean response time
         # or top usage).
 
         # 1st pass
-        for suffix in suffixes:
-            keys = self.server.kvdb.conn.keys('{}{}:{}'.format(stats_key_prefix, service, suffix))
-            for key in keys:
-                service_name = key.replace(stats_key_prefix, '').replace(':{}'.format(suffix), '')
+        index = get_index(self.server.kvdb.conn, stats_key_prefix, suffixes)
+
+        # Service names may be glob patterns, matched the same way KEYS used to match them
+        if service != '*':
+            index = [elem for elem in index if fnmatchcase(elem[0], service)]
+
+        for service_name, _ in index:
+            if service_name not in stats_elems:
 
                 stats_elem = StatsElem(service_name)
                 stats_elems[service_name] = stats_elem
@@ -406,29 +481,29 @@ class StatsReturningService(AdminService):
                     (elem, Bunch({'mean':0, 'usage':0.0})) for elem in suffixes)
 
         # 2nd pass
-        for service, stats_elem in stats_elems.items():
-            for suffix in suffixes:
-                key = '{}{}:{}'.format(stats_key_prefix, service, suffix)
+        keys = ('{}{}:{}'.format(stats_key_prefix, service_name, suffix) for service_name, suffix in index)
+
+        for (service_name, suffix), values in zip(index, hgetall_many(self.server.kvdb.conn, keys)):
+            stats_elem = stats_elems[service_name]
 
-                # We can convert all the values to floats here to ease with computing
-                # all the stuff and convert them still to integers later on, when necessary.
-                key_values = Bunch(
-                    ((name, float(value)) for (name, value) in self.server.kvdb.conn.hgetall(key).items()))
+            # We can convert all the values to floats here to ease with computing
+            # all the stuff and convert them still to integers later on, when necessary.
+            key_values = Bunch(((name, float(value)) for (name, value) in values.items()))
 
-                if key_values:
+            if key_values:
 
-                    time = (key_values.usage * key_values.mean)
-                    stats_elem.time += time
+                time = (key_values.usage * key_values.mean)
+                stats_elem.time += time
 
-                    mean_all_services_list.append(key_values.mean)
-                    all_services_stats.time += time
-                    all_services_stats.usage += key_values.usage
+                mean_all_services_list.append(key_values.mean)
+                all_services_stats.time += time
+                all_services_stats.usage += key_values.usage
 
-                    stats_elem.min_resp_time = min(stats_elem.min_resp_time, key_values.min)
-                    stats_elem.max_resp_time = max(stats_elem.max_resp_time, key_values.max)
+                stats_elem.min_resp_time = min(stats_elem.min_resp_time, key_values.min)
+                stats_elem.max_resp_time = max(stats_elem.max_resp_time, key_values.max)
 
-                    for attr in('mean', 'usage'):
-                        stats_elem.expected_time_elems[suffix][attr] = key_values[attr]
+                for attr in('mean', 'usage'):
+                    stats_elem.expected_time_elems[suffix][attr] = key_values[attr]
 
         mean_all_services = '{:.0f}'.format(sp_stats.tmean(mean_all_services_list)) if mean_all_services_list else 0
 
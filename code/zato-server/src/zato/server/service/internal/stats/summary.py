@@ -12,7 +12,6 @@ from __future__ import absolute_import, division, print_function, unicode_litera
 from calendar import monthrange
 from copy import deepcopy
 from datetime import date, datetime, timedelta
-from itertools import chain
 from sys import maxint
 from traceback import format_exc
 
@@ -35,6 +34,7 @@ from zato.common import KVDB, StatsElem, ZatoException
 from zato.server.service import Integer, UTC
 from zato.server.service.internal.stats import BaseAggregatingService, STATS_KEYS, StatsReturningService, \
     stop_excluding_rrset
+from zato.server.stats import get_index
 
 # ##############################################################################
 
@@ -141,22 +141,24 @@ class BaseSummarizingService(BaseAggregatingService):
 
         return (elem.strftime('%Y') for elem in stop_excluding_rrset(YEARLY, start, stop))
 
-    def _get_patterns(self, now, start, stop, kvdb_key, method):
-        return ('{}*:{}'.format(kvdb_key, elem) for elem in method(now, start, stop))
+    def _get_keys(self, now, start, stop, kvdb_key, method):
+        """ Returns a prefix and suffixes of all the keys of a given type that a summary should be built from.
+        """
+        return kvdb_key, list(method(now, start, stop))
 
-    def get_by_minute_patterns(self, now, start=None, stop=None):
-        return self._get_patterns(now, start, stop, KVDB.SERVICE_TIME_AGGREGATED_BY_MINUTE, self.get_minutely_suffixes)
+    def get_by_minute_keys(self, now, start=None, stop=None):
+        return self._get_keys(now, start, stop, KVDB.SERVICE_TIME_AGGREGATED_BY_MINUTE, self.get_minutely_suffixes)
 
-    def get_by_hour_patterns(self, now, start=None, stop=None):
-        return self._get_patterns(now, start, stop, KVDB.SERVICE_TIME_AGGREGATED_BY_HOUR, self.get_hourly_suffixes)
+    def get_by_hour_keys(self, now, start=None, stop=None):
+        return self._get_keys(now, start, stop, KVDB.SERVICE_TIME_AGGREGATED_BY_HOUR, self.get_hourly_suffixes)
 
-    def get_by_day_patterns(self, now, start=None, stop=None):
-        return self._get_patterns(now, start, stop, KVDB.SERVICE_TIME_AGGREGATED_BY_DAY, self.get_daily_suffixes)
+    def get_by_day_keys(self, now, start=None, stop=None):
+        return self._get_keys(now, start, stop, KVDB.SERVICE_TIME_AGGREGATED_BY_DAY, self.get_daily_suffixes)
 
-    def get_by_month_patterns(self, now, start=None, stop=None):
-        return self._get_patterns(now, start, stop, KVDB.SERVICE_TIME_AGGREGATED_BY_MONTH, self.get_monthly_suffixes)
+    def get_by_month_keys(self, now, start=None, stop=None):
+        return self._get_keys(now, start, stop, KVDB.SERVICE_TIME_AGGREGATED_BY_MONTH, self.get_monthly_suffixes)
 
-    def create_summary(self, target, *pattern_names):
+    def create_summary(self, target, *key_types):
         try:
 
             now = datetime.utcnow()
@@ -170,16 +172,12 @@ class BaseSummarizingService(BaseAggregatingService):
                 key_suffix = now.strftime(DT_PATTERNS.SUMMARY_SUFFIX_PATTERNS[target])
             total_seconds = (now - start).total_seconds()
 
-            patterns = []
-            for name in pattern_names:
-                patterns.append(getattr(self, 'get_by_{}_patterns'.format(name))(now))
-
             services = {}
 
-            for elem in chain(*patterns):
-                prefix, suffix = elem.split('*')
-                suffix = suffix[1:]
-                stats = self.collect_service_stats(elem, prefix, suffix, None, False, False, False)
+            for key_type in key_types:
+                prefix, suffixes = getattr(self, 'get_by_{}_keys'.format(key_type))(now)
+                index = get_index(self.kvdb.conn, prefix, suffixes)
+                stats = self.collect_service_stats(prefix, index, None, False, False)
 
                 for service_name, values in stats.items():
                     stats = services.setdefault(service_name, deepcopy(DEFAULT_STATS))
@@ -191,7 +189,7 @@ class BaseSummarizingService(BaseAggregatingService):
                         elif name == 'max':
                             stats[name] = max(stats[name], value)
                         elif name == 'mean':
-                            stats[name].append(value)
+                            stats[name].extend(value)
                         elif name == 'min':
                             stats[name] = min(stats[name], value)
 
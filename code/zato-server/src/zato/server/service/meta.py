@@ -26,7 +26,7 @@ from sqlalchemy import Boolean, Integer
 from zato.common import NO_DEFAULT_VALUE, ZATO_NOT_GIVEN
 from zato.common.odb.model import Base, Cluster
 from zato.server.service import Bool as BoolSIO, Int as IntSIO
-from zato.server.service.internal import AdminSIO
+from zato.server.service.internal import AdminSIO, search_input_optional
 
 logger = getLogger(__name__)
 
@@ -169,6 +169,9 @@ class AdminServiceMeta(type):
             output_optional = attrs['output_optional_extra']
             default_value = attrs.default_value
 
+        if name == 'GetList':
+            SimpleIO.input_optional.extend(search_input_optional)
+
         for io in 'input', 'output':
             for req in 'required', 'optional':
                 _name = '{}_{}'.format(io, req)
@@ -206,7 +209,7 @@ class GetListMeta(AdminServiceMeta):
     @staticmethod
     def get_data(get_data_func):
         def get_data_impl(self, session):
-            return get_data_func(session, self.request.input.cluster_id, False)
+            return get_data_func(session, self.request.input.cluster_id, False, search=self.get_search_info())
         return get_data_impl
 
     @staticmethod
@@ -12,7 +12,6 @@ from __future__ import absolute_import, division, print_function, unicode_litera
 import logging
 from copy import deepcopy
 from httplib import OK
-from itertools import chain
 from traceback import format_exc
 
 # anyjson
@@ -30,9 +29,12 @@ from lxml.objectify import deannotate, Element, ElementMaker, ObjectifiedElement
 from sqlalchemy.util import KeyedTuple
 
 # Zato
-from zato.common import NO_DEFAULT_VALUE, PARAMS_PRIORITY, SIMPLE_IO, TRACE1, ZatoException, ZATO_OK
+from zato.common import PARAMS_PRIORITY, SIMPLE_IO, TRACE1, ZatoException, ZATO_OK
+from zato.common.odb.query import SearchResults
 from zato.common.util import make_repr
-from zato.server.service.reqresp.sio import AsIs, convert_param, ForceType, ServiceInput, SIOConverter
+from zato.server.connection.http_soap.stream import is_stream
+from zato.server.service.reqresp.sio import convert_elem, get_xml_children, run_converter, ServiceInput, SIOConverter, \
+     SIOPlan
 
 logger = logging.getLogger(__name__)
 
@@ -89,7 +91,8 @@ class Request(SIOConverter):
         self.params_priority = PARAMS_PRIORITY.DEFAULT
 
     def init(self, is_sio, cid, sio, data_format, transport, wsgi_environ):
-        """ Initializes the object with an invocation-specific data.
+        """ Initializes the object with an invocation-specific data. sio may be either an already compiled SIOPlan
+        or a SimpleIO definition which will be compiled on the fly.
         """
 
         if is_sio:
@@ -98,12 +101,8 @@ class Request(SIOConverter):
             self.transport = transport
             self._wsgi_environ = wsgi_environ
 
-            path_prefix = getattr(sio, 'request_elem', 'request')
-            required_list = getattr(sio, 'input_required', [])
-            optional_list = getattr(sio, 'input_optional', [])
-            default_value = getattr(sio, 'default_value', NO_DEFAULT_VALUE)
-            use_text = getattr(sio, 'use_text', True)
-            use_channel_params_only = getattr(sio, 'use_channel_params_only', False)
+            sio_plan = sio if isinstance(sio, SIOPlan) else SIOPlan(sio)
+            required_elems, optional_elems, _ = sio_plan.get_elems(self.simple_io_config)
 
             if self.simple_io_config:
                 self.has_simple_io_config = True
@@ -115,18 +114,25 @@ class Request(SIOConverter):
 
             required_params = {}
 
-            if required_list:
+            # All the elements of an XML request are found in one go rather than each with an ObjectPath of its own
+            if self.is_xml and sio_plan.is_xml_flat and not sio_plan.use_channel_params_only \
+               and hasattr(self.payload, 'iterchildren'):
+                xml_children = get_xml_children(self.payload, sio_plan.request_elem)
+            else:
+                xml_children = None
+
+            if required_elems:
 
                 # Needs to check for this exact default value to prevent a FutureWarning in 'if not self.payload'
                 if self.payload == '' and not self.channel_params:
                     raise ZatoException(cid, 'Missing input')
 
                 required_params.update(self.get_params(
-                    required_list, use_channel_params_only, path_prefix, default_value, use_text))
+                    required_elems, sio_plan.use_channel_params_only, sio_plan.use_text, xml_children=xml_children))
 
-            if optional_list:
+            if optional_elems:
                 optional_params = self.get_params(
-                    optional_list, use_channel_params_only, path_prefix, default_value, use_text, False)
+                    optional_elems, sio_plan.use_channel_params_only, sio_plan.use_text, False, xml_children)
             else:
                 optional_params = {}
 
@@ -142,23 +148,20 @@ class Request(SIOConverter):
             if self.merge_channel_params:
                 self.input.update(self.channel_params)
 
-    def get_params(self, params_to_visit, use_channel_params_only, path_prefix='', default_value=NO_DEFAULT_VALUE,
-            use_text=True, is_required=True):
+    def get_params(self, elems, use_channel_params_only, use_text=True, is_required=True, xml_children=None):
         """ Gets all requested parameters from a message. Will raise ParsingException if any is missing.
         """
         params = {}
+        payload = '' if use_channel_params_only else self.payload
 
-        for param in params_to_visit:
+        for elem in elems:
             try:
-                param_name, value = convert_param(
-                    self.cid, '' if use_channel_params_only else self.payload, param, self.data_format, is_required,
-                    default_value, path_prefix, use_text, self.channel_params, self.has_simple_io_config,
-                    self.bool_parameter_prefixes, self.int_parameters, self.int_parameter_suffixes, self.params_priority)
-                params[param_name] = value
+                params[elem.name] = convert_elem(self.cid, payload, elem, self.data_format, use_text, self.channel_params,
+                    self.params_priority, xml_children)
 
             except Exception, e:
                 msg = 'Caught an exception, param:`{}`, params_to_visit:`{}`, has_simple_io_config:`{}`, e:`{}`'.format(
-                    param, params_to_visit, self.has_simple_io_config, format_exc(e))
+                    elem.source, [item.source for item in elems], self.has_simple_io_config, format_exc(e))
                 self.logger.error(msg)
                 raise Exception(msg)
 
@@ -196,30 +199,24 @@ class SimpleIOPayload(SIOConverter):
     SimpleIO abstract data. All of the attributes are prefixed with zato_ so that
     they don't conflict with user-provided data.
     """
-    def __init__(self, zato_cid, logger, data_format, required_list, optional_list, simple_io_config, response_elem, namespace,
-            output_repeated):
+    def __init__(self, zato_cid, logger, data_format, sio_plan, simple_io_config):
         self.zato_cid = zato_cid
         self.zato_logger = logger
         self.zato_data_format = data_format
         self.zato_is_xml = self.zato_data_format == SIMPLE_IO.FORMAT.XML
         self.zato_output = []
-        self.zato_required = [(True, name) for name in required_list]
-        self.zato_optional = [(False, name) for name in optional_list]
-        self.zato_output_repeated = output_repeated
+        self.zato_meta = None # Information about other pages of results if only a single one is returned
+        self.zato_elems = sio_plan.get_elems(simple_io_config)[2]
+        self.zato_output_repeated = sio_plan.output_repeated
         self.bool_parameter_prefixes = simple_io_config.get('bool_parameter_prefixes', [])
         self.int_parameters = simple_io_config.get('int_parameters', [])
         self.int_parameter_suffixes = simple_io_config.get('int_parameter_suffixes', [])
         self.date_time_format = simple_io_config.get('date_time_format', 'YYYY-MM-DDTHH:MM:SS.mmmmmm+HH:MM')
-        self.response_elem = response_elem
-        self.namespace = namespace
-
-        self.zato_all_attrs = set()
-        for name in chain(required_list, optional_list):
-            if isinstance(name, ForceType):
-                name = name.name
-            self.zato_all_attrs.add(name)
+        self.response_elem = sio_plan.response_elem
+        self.namespace = sio_plan.namespace
+        self.zato_all_attrs = sio_plan.output_names
 
-        self.set_expected_attrs(required_list, optional_list)
+        self.set_expected_attrs(sio_plan)
 
     def __setslice__(self, i, j, seq):
         """ Assigns a list of output elements to self.zato_output, so that they
@@ -229,6 +226,9 @@ class SimpleIOPayload(SIOConverter):
         self.zato_output[i:j] = seq
         self.zato_output_repeated = True
 
+        if isinstance(seq, SearchResults):
+            self.zato_meta = seq.to_dict()
+
     def __setitem__(self, key, value):
         setattr(self, key, value)
 
@@ -238,14 +238,11 @@ class SimpleIOPayload(SIOConverter):
     def _is_sqlalchemy(self, item):
         return hasattr(item, '_sa_class_manager')
 
-    def set_expected_attrs(self, required_list, optional_list):
+    def set_expected_attrs(self, sio_plan):
         """ Dynamically assigns all the expected attributes to self. Setting a value
         of an attribute will actually add data to self.zato_output.
         """
-        for name in chain(required_list, optional_list):
-            if isinstance(name, ForceType):
-                name = name.name
-            setattr(self, name, '')
+        self.__dict__.update(sio_plan.output_attrs)
 
     def set_payload_attrs(self, attrs):
         """ Called when the user wants to set the payload to a bunch of attributes.
@@ -270,32 +267,29 @@ class SimpleIOPayload(SIOConverter):
         self.zato_output.append(item)
         self.zato_output_repeated = True
 
-    def _getvalue(self, name, item, is_sa_namedtuple, is_required, leave_as_is):
+    def _getvalue(self, elem, item, use_getattr):
         """ Returns an element's value if any has been provided while taking
         into account the differences between dictionaries and other formats
         as well as the type conversions.
         """
-        lookup_name = name.name if isinstance(name, ForceType) else name
-
-        if is_sa_namedtuple or self._is_sqlalchemy(item):
-            elem_value = getattr(item, lookup_name, '')
+        if use_getattr:
+            elem_value = getattr(item, elem.name, '')
         else:
-            elem_value = item.get(lookup_name, '')
+            elem_value = item.get(elem.name, '')
 
         if isinstance(elem_value, basestring) and not elem_value:
-            msg = self._missing_value_log_msg(name, item, is_sa_namedtuple, is_required)
-            if is_required:
+            msg = self._missing_value_log_msg(elem.source, item, isinstance(item, KeyedTuple), elem.is_required)
+            if elem.is_required:
                 self.zato_logger.debug(msg)
                 raise ZatoException(self.zato_cid, msg)
             else:
                 if self.zato_logger.isEnabledFor(TRACE1):
                     self.zato_logger.log(TRACE1, msg)
 
-        if leave_as_is:
+        if elem.is_as_is or not elem.converter:
             return elem_value
         else:
-            return self.convert(name, lookup_name, elem_value, True, self.zato_is_xml, self.bool_parameter_prefixes,
-                self.int_parameters, self.int_parameter_suffixes, None, self.zato_data_format, True)
+            return run_converter(elem, elem_value, self.zato_data_format, True)
 
     def _missing_value_log_msg(self, name, item, is_sa_namedtuple, is_required):
         """ Returns a log message indicating that an element was missing.
@@ -325,8 +319,8 @@ class SimpleIOPayload(SIOConverter):
         if self.zato_output_repeated:
             output = self.zato_output
         else:
-            output = set(dir(self)) & self.zato_all_attrs
-            output = [dict((name, getattr(self, name)) for name in output)]
+            attrs = self.__dict__
+            output = [dict((name, attrs[name]) for name in self.zato_all_attrs if name in attrs)]
 
         if output:
 
@@ -338,12 +332,12 @@ class SimpleIOPayload(SIOConverter):
                     out_item = Element('item')
                 else:
                     out_item = {}
-                for is_required, name in chain(self.zato_required, self.zato_optional):
-                    leave_as_is = isinstance(name, AsIs)
-                    elem_value = self._getvalue(name, item, is_sa_namedtuple, is_required, leave_as_is)
 
-                    if isinstance(name, ForceType):
-                        name = name.name
+                use_getattr = is_sa_namedtuple or self._is_sqlalchemy(item)
+
+                for elem in self.zato_elems:
+                    name = elem.name
+                    elem_value = self._getvalue(elem, item, use_getattr)
 
                     if isinstance(elem_value, basestring):
                         elem_value = elem_value if isinstance(elem_value, unicode) else elem_value.decode('utf-8')
@@ -363,9 +357,18 @@ class SimpleIOPayload(SIOConverter):
             zato_env = em.zato_env(em.cid(self.zato_cid), em.result(ZATO_OK))
             top = getattr(em, self.response_elem)(zato_env)
             top.append(value)
+
+            if self.zato_meta:
+                meta = Element('_meta')
+                for name, meta_value in self.zato_meta.items():
+                    setattr(meta, name, meta_value)
+                top.append(meta)
         else:
             top = {self.response_elem: value}
 
+            if self.zato_meta:
+                top['_meta'] = self.zato_meta
+
         if serialize:
             if self.zato_is_xml:
                 deannotate(top, cleanup_namespaces=True)
@@ -418,7 +421,7 @@ class Response(object):
     """
     __slots__ = ('logger', 'result', 'result_details', '_payload', 'payload',
         '_content_type', 'content_type', 'content_type_changed', 'content_encoding',
-        'headers', 'status_code', 'data_format', 'simple_io_config', 'outgoing_declared')
+        'headers', 'status_code', 'data_format', 'simple_io_config', 'outgoing_declared', 'is_streaming')
 
     def __init__(self, logger, result=ZATO_OK, result_details='', payload='',
             _content_type='text/plain', content_encoding=None, data_format=None, headers=None,
@@ -438,6 +441,7 @@ class Response(object):
 
         self.simple_io_config = simple_io_config
         self.outgoing_declared = False
+        self.is_streaming = False
 
     def __len__(self):
         return len(self._payload)
@@ -460,6 +464,11 @@ class Response(object):
         """
         if isinstance(value, (basestring, list, tuple, EtreeElement, ObjectifiedElement)) and not isinstance(value, KeyedTuple):
             self._payload = value
+
+        # Generators and file-like objects, streamed back to clients of streaming channels
+        elif self.is_streaming and is_stream(value):
+            self._payload = value
+
         else:
             if isinstance(value, dict):
                 if not self.outgoing_declared:
@@ -475,13 +484,8 @@ class Response(object):
 
     def init(self, cid, io, data_format):
         self.data_format = data_format
-        required_list = getattr(io, 'output_required', [])
-        optional_list = getattr(io, 'output_optional', [])
-        response_elem = getattr(io, 'response_elem', 'response')
-        namespace = getattr(io, 'namespace', '')
-        output_repeated = getattr(io, 'output_repeated', False)
-        self.outgoing_declared = True if required_list or optional_list else False
-
-        if required_list or optional_list:
-            self._payload = SimpleIOPayload(cid, self.logger, data_format, required_list, optional_list, self.simple_io_config,
-                response_elem, namespace, output_repeated)
+        sio_plan = io if isinstance(io, SIOPlan) else SIOPlan(io)
+        self.outgoing_declared = sio_plan.has_output
+
+        if sio_plan.has_output:
+            self._payload = SimpleIOPayload(cid, self.logger, data_format, sio_plan, self.simple_io_config)
@@ -10,7 +10,9 @@ from __future__ import absolute_import, division, print_function, unicode_litera
 
 # stdlib
 import logging
+from collections import namedtuple
 from copy import deepcopy
+from itertools import chain
 from traceback import format_exc
 
 # Bunch
@@ -24,7 +26,8 @@ from lxml.objectify import Element
 from paste.util.converters import asbool
 
 # Zato
-from zato.common import DATA_FORMAT, NO_DEFAULT_VALUE, PARAMS_PRIORITY, ParsingException, path, ZatoException, ZATO_NONE
+from zato.common import DATA_FORMAT, get_object_path, NO_DEFAULT_VALUE, PARAMS_PRIORITY, ParsingException, path, \
+     ZatoException, ZATO_NONE
 
 logger = logging.getLogger(__name__)
 
@@ -358,13 +361,57 @@ def convert_from_json(payload, param_name, cid, *ignored):
 convert_from_dict = convert_from_json
 
 def convert_from_xml(payload, param_name, cid, is_required, is_complex, default_value, path_prefix, use_text):
+    return get_from_xml(payload, path('{}.{}'.format(path_prefix, param_name), is_required), cid, is_complex,
+        default_value, use_text)
+
+def get_from_xml(payload, xml_path, cid, is_complex, default_value, use_text):
     try:
-        elem = path('{}.{}'.format(path_prefix, param_name), is_required).get_from(payload)
+        elem = xml_path.get_from(payload)
     except ParsingException, e:
         msg = 'Caught an exception while parsing, payload:[<![CDATA[{}]]>], e:[{}]'.format(
             etree.tostring(payload), format_exc(e))
         raise ParsingException(cid, msg)
 
+    return get_xml_value(elem, is_complex, default_value, use_text)
+
+def get_xml_children(payload, request_elem):
+    """ Returns children of an XML request keyed by their names, found in a single pass over the request element.
+    Matches what ObjectPath expressions of request_elem.name would find - the first child of a given name in the same
+    namespace its parent is in, or in any namespace if the parent has none, provided the request element itself
+    is called request_elem.
+    """
+    children = {}
+    root_ns, root_name = _split_tag(payload.tag)
+
+    if request_elem == (payload.tag if request_elem[0] == '{' else root_name):
+
+        # Comments and processing instructions are skipped
+        for child in payload.iterchildren(tag=etree.Element):
+            ns, name = _split_tag(child.tag)
+            if (root_ns is None or ns == root_ns) and name not in children:
+                children[name] = child
+
+    return children
+
+def _split_tag(tag):
+    if tag[0] == '{':
+        ns, name = tag[1:].split('}', 1)
+        return ns, name
+    return None, tag
+
+def get_from_xml_children(children, payload, elem, cid, use_text):
+    """ Same as get_from_xml but for children of a request already found by get_xml_children.
+    """
+    value = children.get(elem.name)
+
+    if value is None and elem.is_required:
+        msg = 'Caught an exception while parsing, payload:[<![CDATA[{}]]>], e:[no such child: {}]'.format(
+            etree.tostring(payload), elem.name)
+        raise ParsingException(cid, msg)
+
+    return get_xml_value(value, elem.is_complex, elem.default, use_text)
+
+def get_xml_value(elem, is_complex, default_value, use_text):
     if is_complex:
         value = elem
     else:
@@ -443,3 +490,179 @@ def convert_param(cid, payload, param, data_format, is_required, default_value,
                 bool_parameter_prefixes, int_parameters, int_parameter_suffixes, None, data_format, False)
 
     return param_name, value
+
+# ################################################################################################################################
+
+# A single element of a compiled SimpleIO definition. Source is the element exactly as declared in SimpleIO, converter is None
+# if values need no conversion and xml_path is None for output elements.
+SIOElem = namedtuple('SIOElem', 'name source converter is_required default xml_path is_complex is_as_is')
+
+# ################################################################################################################################
+
+def get_sio_converter(param, param_name, has_simple_io_config, bool_parameter_prefixes, int_parameters,
+        int_parameter_suffixes):
+    """ Returns a function converting values of a single SimpleIO element or None if they are to be used as they are.
+    All the checks that convert_sio needs to carry out for each value are carried out here only once.
+    """
+    is_bool = isinstance(param, Boolean) or any(param_name.startswith(prefix) for prefix in bool_parameter_prefixes)
+
+    if isinstance(param, ForceType):
+        convert = param.convert
+
+        if is_bool:
+            def converter(value, data_format, from_sio_to_external):
+                return convert(asbool(value or None), param_name, data_format, from_sio_to_external)
+        else:
+            def converter(value, data_format, from_sio_to_external):
+                return convert(value, param_name, data_format, from_sio_to_external)
+
+    elif is_bool:
+        def converter(value, *ignored):
+            return asbool(value or None) # value can be an empty string and asbool chokes on that
+
+    elif has_simple_io_config and (param_name in int_parameters or \
+         any(param_name.endswith(suffix) for suffix in int_parameter_suffixes)):
+        def converter(value, *ignored):
+            return int(value) if value and value != ZATO_NONE else value
+
+    else:
+        converter = None
+
+    return converter
+
+# ################################################################################################################################
+
+def run_converter(elem, value, data_format, from_sio_to_external):
+    """ Converts a value using an element's converter, reporting errors the same way convert_sio does.
+    """
+    try:
+        return elem.converter(value, data_format, from_sio_to_external)
+    except Exception, e:
+        msg = 'Conversion error, param:`{}`, param_name:`{}`, repr:`{}`, type:`{}`, e:`{}`'.format(
+            elem.source, elem.name, repr(value), type(value), format_exc(e))
+        logger.error(msg)
+
+        raise ZatoException(msg=msg)
+
+# ################################################################################################################################
+
+class SIOPlan(object):
+    """ A service's SimpleIO definition compiled into elements that requests and responses use directly, without having
+    to look up the definition's attributes or to match names of parameters against simple_io_config each time.
+    """
+    def __init__(self, sio):
+        self.sio = sio
+        self.request_elem = getattr(sio, 'request_elem', 'request')
+        self.response_elem = getattr(sio, 'response_elem', 'response')
+        self.namespace = getattr(sio, 'namespace', '')
+        self.default_value = getattr(sio, 'default_value', NO_DEFAULT_VALUE)
+        self.use_text = getattr(sio, 'use_text', True)
+        self.use_channel_params_only = getattr(sio, 'use_channel_params_only', False)
+        self.output_repeated = getattr(sio, 'output_repeated', False)
+
+        self.input_required = getattr(sio, 'input_required', [])
+        self.input_optional = getattr(sio, 'input_optional', [])
+        self.output_required = getattr(sio, 'output_required', [])
+        self.output_optional = getattr(sio, 'output_optional', [])
+        self.has_output = bool(self.output_required or self.output_optional)
+
+        # XML input can be read in a single pass over the request element unless any of the elements is a path itself
+        self.is_xml_flat = '.' not in self.request_elem and not any(('.' in name or '{' in name) for name in
+            (self.get_name(param) for param in chain(self.input_required, self.input_optional)))
+
+        self.output_names = frozenset(self.get_name(param) for param in chain(self.output_required, self.output_optional))
+        self.output_attrs = dict.fromkeys(self.output_names, '')
+
+        # Converters depend on simple_io_config which is not known until a server's worker starts,
+        # hence elements are built the first time they are requested for a given config.
+        self._elems = None
+
+    def get_name(self, param):
+        return param.name if isinstance(param, ForceType) else param
+
+    def _get_elem(self, param, is_required, is_input, has_simple_io_config, bool_parameter_prefixes, int_parameters,
+            int_parameter_suffixes):
+        name = self.get_name(param)
+
+        if is_input:
+            xml_path = path('{}.{}'.format(self.request_elem, name), is_required)
+
+            # Compiled up front so that requests need not do it
+            get_object_path(xml_path.path)
+        else:
+            xml_path = None
+
+        return SIOElem(name, param, get_sio_converter(
+            param, name, has_simple_io_config, bool_parameter_prefixes, int_parameters, int_parameter_suffixes),
+            is_required, self.default_value if is_input else None, xml_path,
+            isinstance(param, COMPLEX_VALUE), isinstance(param, AsIs))
+
+    def get_elems(self, simple_io_config):
+        """ Returns a three-element tuple of required input, optional input and output elements,
+        with converters matching the simple_io_config given on input.
+        """
+        elems = self._elems
+
+        if not elems or elems[0] is not simple_io_config:
+            config = simple_io_config or {}
+            args = (bool(config), config.get('bool_parameter_prefixes', []), config.get('int_parameters', []),
+                config.get('int_parameter_suffixes', []))
+
+            input_required = [self._get_elem(param, True, True, *args) for param in self.input_required]
+            input_optional = [self._get_elem(param, False, True, *args) for param in self.input_optional]
+            output = [self._get_elem(param, True, False, *args) for param in self.output_required]
+            output.extend(self._get_elem(param, False, False, *args) for param in self.output_optional)
+
+            elems = self._elems = (simple_io_config, (input_required, input_optional, output))
+
+        return elems[1]
+
+# ################################################################################################################################
+
+def convert_elem(cid, payload, elem, data_format, use_text, channel_params, params_priority, xml_children=None):
+    """ Same as convert_param but for an element of a compiled SIOPlan. Returns the converted value only.
+    If xml_children are given, XML values are looked up in them instead of by evaluating ObjectPath expressions.
+    """
+    name, source, converter, is_required, default_value, xml_path, is_complex, is_as_is = elem
+
+    channel_value = channel_params.get(name, ZATO_NONE)
+
+    if channel_value != ZATO_NONE and converter:
+        channel_value = run_converter(elem, channel_value, data_format, False)
+
+    if params_priority == PARAMS_PRIORITY.CHANNEL_PARAMS_OVER_MSG and channel_value != ZATO_NONE:
+        return channel_value
+
+    if payload is not None:
+        if data_format == DATA_FORMAT.XML:
+            if xml_children is not None:
+                value = get_from_xml_children(xml_children, payload, elem, cid, use_text)
+            else:
+                value = get_from_xml(payload, xml_path, cid, is_complex, default_value, use_text)
+        else:
+            value = convert_impl[data_format](payload, name, cid)
+    else:
+        value = NOT_GIVEN
+
+    if value == NOT_GIVEN:
+        if default_value != NO_DEFAULT_VALUE:
+            value = default_value
+        else:
+            if is_required:
+                value = channel_value if (channel_value is not None and channel_value != ZATO_NONE) else ZATO_NONE
+
+                if value == ZATO_NONE:
+                    msg = 'Required input element:`{}` not found, value:`{}`, data_format:`{}`, payload:`{}`'\
+                        ', channel_params:`{}`'.format(source, value, data_format, payload, channel_params)
+                    raise ParsingException(cid, msg)
+            else:
+                value = ''
+
+    else:
+        if value is not None and not is_complex:
+            value = unicode(value)
+
+        if not is_as_is and converter:
+            value = run_converter(elem, value, data_format, False)
+
+    return value
@@ -17,6 +17,9 @@ from json import dumps
 from traceback import format_exc
 from uuid import uuid4
 
+# Bunch
+from bunch import Bunch
+
 # gevent
 from gevent.lock import RLock
 
@@ -112,8 +115,9 @@ class ServiceStore(InitializingObject):
     def import_services_from_anywhere(self, items, base_dir, work_dir=None):
         """ Imports services from any of the supported sources, be it module names,
         individual files, directories or distutils2 packages (compressed or not).
+        All of the services found are stored in the ODB at once.
         """
-        deployed = []
+        to_process = []
 
         for item_name in items:
             logger.debug('About to import services from:[%s]', item_name)
@@ -122,22 +126,45 @@ class ServiceStore(InitializingObject):
 
             # A regular directory
             if os.path.isdir(item_name):
-                deployed.extend(self.import_services_from_directory(item_name, base_dir))
+                to_process.extend(self._visit_directory(item_name, base_dir))
 
             # .. a .py/.pyw
             elif is_python_file(item_name):
-                deployed.extend(self.import_services_from_file(item_name, is_internal, base_dir))
+                to_process.extend(self._visit_file(item_name, is_internal, base_dir))
 
             # .. must be a module object
             else:
-                deployed.extend(self.import_services_from_module(item_name, is_internal))
+                to_process.extend(self._visit_module_name(item_name, is_internal))
 
-        return deployed
+        return self._store_services(to_process)
 
     def import_services_from_file(self, file_name, is_internal, base_dir):
         """ Imports all the services from the path to a file.
         """
-        deployed = []
+        return self._store_services(self._visit_file(file_name, is_internal, base_dir))
+
+    def import_services_from_directory(self, dir_name, base_dir):
+        """ dir_name points to a directory.
+
+        If dist2 is True, the directory is assumed to be a Distutils2 one and its
+        setup.cfg file is read and all the modules from packages pointed to by the
+        'files' section are scanned for services.
+
+        If dist2 is False, this will be treated as a directory with a flat list
+        of Python source code to import, as is the case with services that have
+        been hot-deployed.
+        """
+        return self._store_services(self._visit_directory(dir_name, base_dir))
+
+    def import_services_from_module(self, mod_name, is_internal):
+        """ Imports all the services from a module specified by the given name.
+        """
+        return self._store_services(self._visit_module_name(mod_name, is_internal))
+
+    def _visit_file(self, file_name, is_internal, base_dir):
+        """ Returns services to be deployed from the path to a file.
+        """
+        to_process = []
 
         if not os.path.isabs(file_name):
             file_name = os.path.normpath(os.path.join(base_dir, file_name))
@@ -162,30 +189,22 @@ class ServiceStore(InitializingObject):
                 mod_name, file_name, format_exc(e))
             logger.error(msg)
         else:
-            deployed.extend(self._visit_module(mod, is_internal, file_name))
+            to_process.extend(self._visit_module(mod, is_internal, file_name))
         finally:
-            return deployed
-
-    def import_services_from_directory(self, dir_name, base_dir):
-        """ dir_name points to a directory.
-
-        If dist2 is True, the directory is assumed to be a Distutils2 one and its
-        setup.cfg file is read and all the modules from packages pointed to by the
-        'files' section are scanned for services.
+            return to_process
 
-        If dist2 is False, this will be treated as a directory with a flat list
-        of Python source code to import, as is the case with services that have
-        been hot-deployed.
+    def _visit_directory(self, dir_name, base_dir):
+        """ Returns services to be deployed from all the Python files in a directory.
         """
-        deployed = []
+        to_process = []
 
         for py_path in visit_py_source(dir_name):
-            deployed.extend(self.import_services_from_file(py_path, False, base_dir))
+            to_process.extend(self._visit_file(py_path, False, base_dir))
 
-        return deployed
+        return to_process
 
-    def import_services_from_module(self, mod_name, is_internal):
-        """ Imports all the services from a module specified by the given name.
+    def _visit_module_name(self, mod_name, is_internal):
+        """ Returns services to be deployed from a module specified by the given name.
         """
         mod = import_module(mod_name)
         return self._visit_module(mod, is_internal, inspect.getfile(mod))
@@ -231,9 +250,12 @@ class ServiceStore(InitializingObject):
         return si
 
     def _visit_module(self, mod, is_internal, fs_location):
-        """ Actually imports services from a module object.
+        """ Actually imports services from a module object. Returns a list of services to be stored in the ODB
+        and in RAM by _store_services.
         """
-        deployed = []
+        to_process = []
+        si = None
+
         try:
             for name in sorted(dir(mod)):
                 with self.update_lock:
@@ -248,31 +270,17 @@ class ServiceStore(InitializingObject):
 
                             item.add_http_method_handlers()
 
-                            name = item.get_name()
-                            impl_name = item.get_impl_name()
-
-                            self.services[impl_name] = {}
-                            self.services[impl_name]['name'] = name
-                            self.services[impl_name]['deployment_info'] = depl_info
-                            self.services[impl_name]['service_class'] = item
+                            if hasattr(item, 'SimpleIO'):
+                                item.compile_sio()
 
-                            si = self._get_source_code_info(mod)
+                            # The same for all the services in a module
+                            if si is None:
+                                si = self._get_source_code_info(mod)
 
-                            service_id, is_active, slow_threshold = self.odb.add_service(
-                                name, impl_name, is_internal, timestamp, dumps(str(depl_info)), si)
-
-                            deployed.append(name)
-
-                            self.services[impl_name]['is_active'] = is_active
-                            self.services[impl_name]['slow_threshold'] = slow_threshold
-
-                            self.id_to_impl_name[service_id] = impl_name
-                            self.impl_name_to_id[impl_name] = service_id
-                            self.name_to_impl_name[name] = impl_name
-
-                            logger.debug('Imported service:[{}]'.format(name))
-
-                            item.after_add_to_store(logger)
+                            to_process.append(Bunch(
+                                service_class=item, name=item.get_name(), impl_name=item.get_impl_name(),
+                                is_internal=is_internal, deployment_time=timestamp, deployment_info=depl_info,
+                                details=dumps(str(depl_info)), source_info=si))
 
                         else:
                             msg = 'Skipping [{}] from [{}], should_add:[{}] is not True'.format(
@@ -284,4 +292,55 @@ class ServiceStore(InitializingObject):
                 mod, is_internal, fs_location, format_exc(e))
             logger.error(msg)
         finally:
+            return to_process
+
+    def _store_services(self, to_process):
+        """ Stores in the ODB all the services found in modules, in one go, and makes them available for invocation.
+        """
+        deployed = []
+
+        if not to_process:
             return deployed
+
+        try:
+            odb_info = self.odb.add_services(to_process)
+        except Exception, e:
+            logger.warn('Could not add services in one batch, will add them one by one, e:[%s]', format_exc(e))
+            odb_info = {}
+
+            # A single invalid service should not stop all of the other ones from being deployed
+            for item in to_process:
+                try:
+                    odb_info.update(self.odb.add_services([item]))
+                except Exception, e:
+                    logger.error('Could not add service:[%s], e:[%s]', item.name, format_exc(e))
+
+        for item in to_process:
+            if item.name not in odb_info:
+                continue
+
+            with self.update_lock:
+                try:
+                    service_id, is_active, slow_threshold = odb_info[item.name]
+
+                    self.services[item.impl_name] = {}
+                    self.services[item.impl_name]['name'] = item.name
+                    self.services[item.impl_name]['deployment_info'] = item.deployment_info
+                    self.services[item.impl_name]['service_class'] = item.service_class
+                    self.services[item.impl_name]['is_active'] = is_active
+                    self.services[item.impl_name]['slow_threshold'] = slow_threshold
+
+                    self.id_to_impl_name[service_id] = item.impl_name
+                    self.impl_name_to_id[item.impl_name] = service_id
+                    self.name_to_impl_name[item.name] = item.impl_name
+
+                    deployed.append(item.name)
+
+                    logger.debug('Imported service:[{}]'.format(item.name))
+
+                    item.service_class.after_add_to_store(logger)
+
+                except Exception, e:
+                    logger.error('Exception while storing service:[%s], e:[%s]', item.name, format_exc(e))
+
+        return deployed
@@ -60,6 +60,7 @@ class ZatoContext(PythonConfig):
             'zato.server.service.internal.definition.jms_wmq',
             'zato.server.service.internal.email.imap',
             'zato.server.service.internal.email.smtp',
+            'zato.server.service.internal.enmasse',
             'zato.server.service.internal.helpers',
             'zato.server.service.internal.hot_deploy',
             'zato.server.service.internal.info',
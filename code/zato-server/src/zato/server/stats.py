@@ -10,15 +10,78 @@ from __future__ import absolute_import, division, print_function, unicode_litera
 
 # stdlib
 import logging
+from collections import Counter
+from datetime import datetime
+from math import ceil
+from traceback import format_exc
 
 # dateutil
 from dateutil.rrule import MINUTELY, rrule
 
+# gevent
+from gevent import sleep
+
 # Zato
-from zato.common import KVDB
+from zato.common import KVDB, MISC
 
 logger = logging.getLogger(__name__)
 
+# How many commands to send to KVDB in a single pipeline when reading statistics in bulk
+PIPELINE_BATCH_SIZE = 5000
+
+def batches(items, batch_size=PIPELINE_BATCH_SIZE):
+    items = list(items)
+    for idx in range(0, len(items), batch_size):
+        yield items[idx:idx+batch_size]
+
+def get_index_key(key_prefix, key_suffix):
+    """ Returns a key of the set of services that have statistics under a given prefix and time suffix,
+    e.g. zato:stats:service:time:index:aggr-by-minute:2016:01:02:03:04 for per-minute statistics.
+    """
+    return '{}{}:{}'.format(KVDB.SERVICE_TIME_INDEX, key_prefix.rstrip(':').rsplit(':', 1)[-1], key_suffix)
+
+def get_index(conn, key_prefix, suffixes):
+    """ Returns (service name, suffix) tuples for each time suffix given on input,
+    i.e. a list of all the keys with statistics under a given prefix.
+    """
+    out = []
+    for batch in batches(suffixes):
+        with conn.pipeline(transaction=False) as pipe:
+            for suffix in batch:
+                pipe.smembers(get_index_key(key_prefix, suffix))
+
+            for suffix, service_names in zip(batch, pipe.execute()):
+                out.extend((service_name, suffix) for service_name in sorted(service_names))
+
+    return out
+
+def hgetall_many(conn, keys):
+    """ Returns contents of all the hashes under keys given on input, in pipelined batches.
+    """
+    out = []
+    for batch in batches(keys):
+        with conn.pipeline(transaction=False) as pipe:
+            for key in batch:
+                pipe.hgetall(key)
+            out.extend(pipe.execute())
+
+    return out
+
+# Prefixes of keys found through per-suffix indexes -> how many elements their time suffixes consist of
+INDEXED_PREFIXES = {
+    KVDB.SERVICE_TIME_HISTOGRAM_RAW_BY_MINUTE: 5,
+    KVDB.SERVICE_TIME_AGGREGATED_BY_MINUTE: 5,
+    KVDB.SERVICE_TIME_AGGREGATED_BY_HOUR: 4,
+    KVDB.SERVICE_TIME_AGGREGATED_BY_DAY: 3,
+    KVDB.SERVICE_TIME_AGGREGATED_BY_MONTH: 2,
+    KVDB.SERVICE_SUMMARY_BY_DAY: 3,
+    KVDB.SERVICE_SUMMARY_BY_WEEK: 3,
+    KVDB.SERVICE_SUMMARY_BY_MONTH: 2,
+    KVDB.SERVICE_SUMMARY_BY_YEAR: 1,
+}
+
+# ################################################################################################################################
+
 class MaintenanceTool(object):
     """ A tool for performing maintenance-related tasks, such as deleting the statistics.
     """
@@ -26,10 +89,279 @@ class MaintenanceTool(object):
         self.conn = conn
 
     def delete(self, start, stop, interval):
+        suffixes = [elem.strftime('%Y:%m:%d:%H:%M') for elem in rrule(MINUTELY, dtstart=start, until=stop)]
+        index = get_index(self.conn, KVDB.SERVICE_TIME_AGGREGATED_BY_MINUTE, suffixes)
+
         with self.conn.pipeline() as p:
-            suffixes = (elem.strftime(':%Y:%m:%d:%H:%M') for elem in rrule(MINUTELY, dtstart=start, until=stop))
+            for service_name, suffix in index:
+                for prefix in (KVDB.SERVICE_TIME_AGGREGATED_BY_MINUTE, KVDB.SERVICE_TIME_HISTOGRAM_AGGREGATED_BY_MINUTE):
+                    p.delete('{}{}:{}'.format(prefix, service_name, suffix))
+
             for suffix in suffixes:
-                for key in self.conn.keys('{}*{}'.format(KVDB.SERVICE_TIME_AGGREGATED_BY_MINUTE, suffix)):
-                    p.delete(key)
+                p.delete(get_index_key(KVDB.SERVICE_TIME_AGGREGATED_BY_MINUTE, suffix))
 
             p.execute()
+
+    def backfill_index(self):
+        """ Indexes statistics written before indexes were introduced. This is the only place KEYS is still used in
+        so it runs once per cluster - in whichever worker sets the marker key first.
+        """
+        if not self.conn.setnx(KVDB.SERVICE_TIME_INDEX_BACKFILLED, datetime.utcnow().isoformat()):
+            return
+
+        try:
+            index = {} # Index key -> names of services it points to
+            index_keys = [] # (Index key, key of statistics it points to) tuples
+
+            for prefix, suffix_len in INDEXED_PREFIXES.iteritems():
+                for key in self.conn.keys('{}*'.format(prefix)):
+                    elems = key.replace(prefix, '', 1).rsplit(':', suffix_len)
+                    index_key = get_index_key(prefix, ':'.join(elems[1:]))
+
+                    index.setdefault(index_key, set()).add(elems[0])
+                    index_keys.append((index_key, key))
+
+            raw_names = [key.replace(KVDB.SERVICE_TIME_HISTOGRAM_RAW, '', 1)
+                for key in self.conn.keys('{}*'.format(KVDB.SERVICE_TIME_HISTOGRAM_RAW))]
+
+            # An index expires along with the last of the keys it points to
+            ttls = {}
+            for batch in batches(index_keys):
+                with self.conn.pipeline(transaction=False) as pipe:
+                    for _, key in batch:
+                        pipe.ttl(key)
+
+                    for (index_key, _), ttl in zip(batch, pipe.execute()):
+                        ttls.setdefault(index_key, []).append(ttl)
+
+            for batch in batches(index.items()):
+                with self.conn.pipeline(transaction=False) as pipe:
+                    for index_key, service_names in batch:
+                        pipe.sadd(index_key, *sorted(service_names))
+
+                        # Keys that never expire have a TTL of -1, or None with older versions of Redis
+                        if all(ttl is not None and ttl > 0 for ttl in ttls[index_key]):
+                            pipe.expire(index_key, max(ttls[index_key]))
+
+                    pipe.execute()
+
+            if raw_names:
+                self.conn.sadd(KVDB.SERVICE_TIME_INDEX_RAW, *raw_names)
+
+        except Exception, e:
+            logger.warn('Could not backfill statistics indexes, e:`%s`', format_exc(e))
+
+            # Let the next server to start try again
+            self.conn.delete(KVDB.SERVICE_TIME_INDEX_BACKFILLED)
+
+        else:
+            logger.info('Backfilled %d statistics indexes', len(index))
+
+# ################################################################################################################################
+
+class Histogram(object):
+    """ A mergeable histogram of non-negative integers, such as processing times in ms. Values below 2 ** precision_bits
+    are counted exactly, larger ones fall into log-linear buckets, i.e. each power of two is split into 2 ** (precision_bits-1)
+    buckets of equal width, so the relative error of anything read out of a histogram is below 1 / 2 ** (precision_bits-1).
+
+    Buckets are identified by their lowest value which means histograms can be kept in KVDB as hashes of bucket -> count
+    and merged simply by adding counts, with HINCRBY or in Python, regardless of how many values they were built from.
+    """
+    precision_bits = 7
+
+    def __init__(self, counts=None):
+        self.counts = Counter(counts or {})
+
+    @classmethod
+    def get_bucket(class_, value):
+        """ Returns the bucket a given value falls into.
+        """
+        shift = value.bit_length() - class_.precision_bits
+        if shift <= 0:
+            return value
+        return (value >> shift) << shift
+
+    @classmethod
+    def get_bucket_width(class_, bucket):
+        return 1 << max(bucket.bit_length() - class_.precision_bits, 0)
+
+    @classmethod
+    def from_kvdb(class_, data):
+        """ Builds a histogram out of a hash returned by HGETALL.
+        """
+        return class_(dict((int(bucket), int(count)) for bucket, count in data.iteritems()))
+
+    def add(self, value, count=1):
+        self.counts[self.get_bucket(value)] += count
+
+    def merge(self, other):
+        self.counts.update(other.counts)
+
+    @property
+    def total(self):
+        return sum(self.counts.itervalues())
+
+    @property
+    def min(self):
+        return min(self.counts) if self.counts else 0
+
+    @property
+    def max(self):
+        """ Returns the highest value the last bucket could have been built from.
+        """
+        if not self.counts:
+            return 0
+
+        bucket = max(self.counts)
+        return bucket + self.get_bucket_width(bucket) - 1
+
+    def _get_value(self, bucket):
+        """ Returns a value representing all values in a given bucket, its midpoint.
+        """
+        return bucket + (self.get_bucket_width(bucket) - 1) / 2.0
+
+    def percentile(self, percentile):
+        """ Returns a value below or at which a given percentage of all values falls.
+        """
+        total = self.total
+        if not total:
+            return 0
+
+        rank = max(int(ceil(percentile / 100.0 * total)), 1)
+        seen = 0
+
+        for bucket in sorted(self.counts):
+            seen += self.counts[bucket]
+            if seen >= rank:
+                return self._get_value(bucket)
+
+    def mean(self, upper_limit=None):
+        """ Returns a mean of all values, optionally ignoring the ones above upper_limit.
+        """
+        total = 0
+        count = 0
+
+        for bucket, bucket_count in self.counts.iteritems():
+            value = self._get_value(bucket)
+            if upper_limit is None or value <= upper_limit:
+                total += value * bucket_count
+                count += bucket_count
+
+        return total / count if count else 0
+
+# ################################################################################################################################
+
+class ServiceStatsAccumulator(object):
+    """ Keeps service usage counters and processing times in memory and periodically flushes them
+    to KVDB in a single pipeline, instead of each service invocation talking to KVDB on its own.
+    The keys written to are the same ones ProcessRawTimes and AggregateByMinute read from.
+    """
+    def __init__(self, conn, flush_interval=MISC.DEFAULT_STATS_FLUSH_INTERVAL):
+        self.conn = conn
+        self.flush_interval = flush_interval
+        self.keep_running = True
+
+        # How many times each service has been invoked by this worker, never reset. Sampling of requests/responses
+        # is based on it rather than on a cluster-wide counter so that it needs no KVDB round-trip - each worker
+        # samples every N-th invocation it handles so overall about one in N invocations is still sampled.
+        self.total_usage = {}
+
+        # Data collected since the last flush
+        self.usage = {}
+        self.last = {}
+        self.by_minute = {} # (service name, minute) -> Histogram of processing times
+
+    def on_invoked(self, name):
+        """ Called each time a service is about to be invoked. Returns the total usage count of the service
+        in this worker which is what sampling of requests/responses is based on.
+        """
+        self.usage[name] = self.usage.get(name, 0) + 1
+        usage = self.total_usage[name] = self.total_usage.get(name, 0) + 1
+
+        return usage
+
+    def on_processed(self, name, proc_time, now=None):
+        """ Stores processing time of a service that has just completed, in milliseconds.
+        """
+        now = now or datetime.utcnow()
+        self.last[name] = proc_time
+
+        key = (name, now.strftime('%Y:%m:%d:%H:%M'))
+        histogram = self.by_minute.get(key)
+        if histogram is None:
+            histogram = self.by_minute[key] = Histogram()
+
+        histogram.add(proc_time)
+
+    def flush(self):
+        """ Writes everything accumulated so far to KVDB. Data is swapped out before talking to KVDB
+        so invocations that complete while the pipeline executes are kept for the next flush.
+        """
+        usage, self.usage = self.usage, {}
+        last, self.last = self.last, {}
+        by_minute, self.by_minute = self.by_minute, {}
+
+        if not (usage or by_minute):
+            return
+
+        try:
+            with self.conn.pipeline() as pipe:
+
+                for name, count in usage.iteritems():
+                    pipe.incrby('{}{}'.format(KVDB.SERVICE_USAGE, name), count)
+
+                for name, proc_time in last.iteritems():
+                    pipe.hset('{}{}'.format(KVDB.SERVICE_TIME_BASIC, name), 'last', proc_time)
+
+                for (name, minute), histogram in by_minute.iteritems():
+
+                    raw_key = '{}{}'.format(KVDB.SERVICE_TIME_HISTOGRAM_RAW, name)
+                    key = '{}{}:{}'.format(KVDB.SERVICE_TIME_HISTOGRAM_RAW_BY_MINUTE, name, minute)
+                    index_key = get_index_key(KVDB.SERVICE_TIME_HISTOGRAM_RAW_BY_MINUTE, minute)
+
+                    pipe.sadd(KVDB.SERVICE_TIME_INDEX_RAW, name)
+                    pipe.sadd(index_key, name)
+
+                    # Histograms from all workers are merged in KVDB directly
+                    for bucket, count in histogram.counts.iteritems():
+                        pipe.hincrby(raw_key, bucket, count)
+                        pipe.hincrby(key, bucket, count)
+
+                    # .. we'll have 5 minutes (5 * 60 seconds = 300 seconds)
+                    # to aggregate processing times for a given minute and then it will expire
+                    pipe.expire(key, 300)
+                    pipe.expire(index_key, 300)
+
+                pipe.execute()
+
+        except Exception, e:
+            logger.warn('Could not flush service statistics, e:`%s`', format_exc(e))
+            self._merge_back(usage, last, by_minute)
+
+    def _merge_back(self, usage, last, by_minute):
+        """ Puts data of a batch that could not be flushed back so that it's written to KVDB along with the next one.
+        """
+        for name, count in usage.iteritems():
+            self.usage[name] = self.usage.get(name, 0) + count
+
+        # Processing times collected in the meantime are newer than the ones from the batch
+        for name, proc_time in last.iteritems():
+            self.last.setdefault(name, proc_time)
+
+        for key, histogram in by_minute.iteritems():
+            current = self.by_minute.get(key)
+            if current is None:
+                self.by_minute[key] = histogram
+            else:
+                current.merge(histogram)
+
+    def run(self):
+        """ Flushes statistics every self.flush_interval seconds, meant to be run in a background greenlet.
+        """
+        while self.keep_running:
+            sleep(self.flush_interval)
+            self.flush()
+
+    def stop(self):
+        self.keep_running = False
+        self.flush()
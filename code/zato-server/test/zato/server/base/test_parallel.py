@@ -20,7 +20,7 @@ from unittest import TestCase
 from bunch import Bunch
 
 # mock
-from mock import patch
+from mock import MagicMock, patch
 
 # nose
 from nose.tools import eq_, ok_
@@ -32,10 +32,12 @@ from pytz import UTC
 from tzlocal import get_localzone
 
 # Zato
-from zato.common import ACCESS_LOG_DT_FORMAT, CHANNEL, DATA_FORMAT, ZATO_NONE
-from zato.common.broker_message import CHANNEL as CHANNEL_BROKER_MESSAGE, SERVICE
+from zato.broker.client import BrokerClient
+from zato.common import ACCESS_LOG_DT_FORMAT, BROKER, CHANNEL, DATA_FORMAT, ZATO_NONE
+from zato.common.broker_message import BATCH, MESSAGE_TYPE, SCHEDULER, SERVICE, TOPICS
 from zato.common.test import rand_int, rand_string
 from zato.common.util import new_cid, utcnow
+from zato.server.connection.http_soap.audit import AuditQueue
 from zato.server.connection.http_soap.channel import RequestDispatcher
 from zato.server.connection.http_soap.url_data import URLData
 from zato.server.base.parallel import ParallelServer
@@ -107,6 +109,41 @@ class ParallelServerTestCase(TestCase):
             eq_(msg.service, expected_service)
             self.assertEquals(len(msg.cid), 24)
 
+    def test_worker_exit(self):
+
+        ps = ParallelServer()
+        worker = Bunch(app=Bunch(zato_wsgi_app=ps))
+
+        # Nothing to clean up after a worker that has not been started
+        ParallelServer.worker_exit(None, worker)
+
+        ps.worker_store = MagicMock(is_ready=True)
+        ParallelServer.worker_exit(None, worker)
+
+        ps.worker_store.cleanup_on_stop.assert_called_once_with()
+
+    def test_on_broker_msg_singleton(self):
+
+        class FakeSingletonServer(object):
+            def __init__(self):
+                self.jobs = []
+
+            def on_broker_msg_SCHEDULER_CREATE(self, msg):
+                self.jobs.append(msg.name)
+
+        ps = ParallelServer()
+        ps.singleton_server = FakeSingletonServer()
+
+        ps.on_broker_msg_singleton(Bunch(action=SCHEDULER.CREATE.value, name='job1'))
+
+        # Each message in a batch is handled on its own, in the order published
+        ps.on_broker_msg_singleton(Bunch(action=BATCH.MESSAGES.value, msg_list=[
+            {'action': SCHEDULER.CREATE.value, 'name': 'job2'},
+            {'action': SCHEDULER.CREATE.value, 'name': 'job3'},
+        ]))
+
+        eq_(ps.singleton_server.jobs, ['job1', 'job2', 'job3'])
+
 # ################################################################################################################################
 
 class AuditTestCase(TestCase):
@@ -181,22 +218,6 @@ class AuditTestCase(TestCase):
                         expected_remote_addr_header = 'REMOTE_ADDR'
                         wsgi_environ[expected_remote_addr_header] = expected_remote_addr
 
-                    class FakeSession:
-                        def __init__(self, audit=None):
-                            self.audit = audit
-                            self.commit_called = False
-
-                        def close(self):
-                            pass
-
-                        def commit(self):
-                            self.commit_called = True
-
-                        def add(self, audit):
-                            self.audit = audit
-
-                    fake_session = FakeSession()
-
                     class FakeBrokerClient(object):
                         def __init__(self):
                             self.msg = None
@@ -206,11 +227,14 @@ class AuditTestCase(TestCase):
 
                     class FakeODB(ODBManager):
                         def __init__(self):
-                            self.msg = None
-                            self.cluster = Bunch(id=expected_cluster_id)
+                            self.requests = []
+                            self.responses = []
+
+                        def audit_set_many_http_soap(self, requests, responses):
+                            self.requests.extend(requests)
+                            self.responses.extend(responses)
 
-                        def session(self):
-                            return fake_session
+                    odb = FakeODB()
 
                     class FakeURLData(URLData):
                         def __init__(self):
@@ -229,35 +253,42 @@ class AuditTestCase(TestCase):
                     ws.request_dispatcher.request_handler = FakeRequestHandler()
                     ws.request_dispatcher.url_data = FakeURLData()
                     ws.request_dispatcher.url_data.broker_client = bc
-                    ws.request_dispatcher.url_data.odb = FakeODB()
+                    ws.request_dispatcher.url_data.audit_queue = AuditQueue(odb)
 
                     ps = ParallelServer()
                     ps.worker_store = ws
                     ps.on_wsgi_request(wsgi_environ, StartResponse(), cid=expected_cid)
 
+                    ws.request_dispatcher.url_data.audit_queue.drain()
+
+                    # Nothing is ever published on the broker, audit records are written to ODB directly
+                    self.assertTrue(bc.msg is None)
+
                     if expected_audit_enabled:
 
+                        # The response was in the same batch as its request so both were stored in the same row
+                        self.assertEquals(len(odb.requests), 1)
+                        self.assertEquals(odb.responses, [])
+
+                        audit = Bunch(odb.requests[0])
+
                         #
                         # Audit 1/2 - Request
                         #
 
                         # Parsing will confirm the proper value was used
-                        datetime.strptime(fake_session.audit.req_time.isoformat(), '%Y-%m-%dT%H:%M:%S.%f')
-
-                        self.assertEquals(fake_session.audit.name, expected_name)
-                        self.assertEquals(fake_session.audit.cid, expected_cid)
-                        self.assertEquals(fake_session.audit.transport, expected_transport)
-                        self.assertEquals(fake_session.audit.connection, expected_connection)
-                        self.assertEquals(fake_session.audit.resp_time, None)
-                        self.assertEquals(fake_session.audit.user_token, expected_username)
-                        self.assertEquals(fake_session.audit.auth_ok, None)
-                        self.assertEquals(fake_session.audit.invoke_ok, None)
-                        self.assertEquals(fake_session.audit.remote_addr, expected_remote_addr)
-                        self.assertEquals(fake_session.audit.req_payload, expected_request[:expected_audit_max_payload])
-                        self.assertEquals(fake_session.audit.resp_headers, None)
-                        self.assertEquals(fake_session.audit.resp_payload, None)
-
-                        req_headers = literal_eval(fake_session.audit.req_headers)
+                        datetime.strptime(audit.req_time.isoformat(), '%Y-%m-%dT%H:%M:%S.%f')
+
+                        self.assertEquals(audit.conn_id, expected_id)
+                        self.assertEquals(audit.name, expected_name)
+                        self.assertEquals(audit.cid, expected_cid)
+                        self.assertEquals(audit.transport, expected_transport)
+                        self.assertEquals(audit.connection, expected_connection)
+                        self.assertEquals(audit.user_token, expected_username)
+                        self.assertEquals(audit.remote_addr, expected_remote_addr)
+                        self.assertEquals(audit.req_payload, expected_request[:expected_audit_max_payload])
+
+                        req_headers = literal_eval(audit.req_headers)
 
                         self.assertEquals(req_headers[expected_remote_addr_header], repr(expected_remote_addr))
                         self.assertEquals(req_headers['wsgi.url_scheme'], repr(expected_url_scheme))
@@ -282,21 +313,14 @@ class AuditTestCase(TestCase):
                         # Audit 2/2 - Response
                         #
 
-                        self.assertEquals(bc.msg['action'], CHANNEL_BROKER_MESSAGE.HTTP_SOAP_AUDIT_RESPONSE.value)
-                        self.assertEquals(bc.msg['cid'], expected_cid)
-                        self.assertEquals(bc.msg['data_format'], DATA_FORMAT.JSON)
-                        self.assertEquals(bc.msg['service'], 'zato.http-soap.set-audit-response-data')
-
-                        payload = loads(bc.msg['payload'])
-
-                        self.assertEquals(payload['auth_ok'], expected_auth_ok)
-                        self.assertEquals(payload['invoke_ok'], expected_invoke_ok)
-                        self.assertEquals(payload['resp_payload'], expected_payload)
+                        self.assertEquals(audit.auth_ok, expected_auth_ok)
+                        self.assertEquals(audit.invoke_ok, expected_invoke_ok)
+                        self.assertEquals(audit.resp_payload, expected_payload)
 
-                        # Parsing alone will check its format is valid
-                        datetime.strptime(payload['resp_time'], '%Y-%m-%dT%H:%M:%S.%f')
+                        # Parsing will confirm the proper value was used
+                        datetime.strptime(audit.resp_time.isoformat(), '%Y-%m-%dT%H:%M:%S.%f')
 
-                        wsgi_environ = loads(payload['resp_headers'])
+                        wsgi_environ = loads(audit.resp_headers)
 
                         self.assertEquals(wsgi_environ['wsgi.url_scheme'], repr(expected_url_scheme))
                         self.assertEquals(wsgi_environ['gunicorn.socket'], repr(FakeGunicornSocket(None, None)))
@@ -322,8 +346,9 @@ class AuditTestCase(TestCase):
                         self.assertEquals(channel_item['audit_max_payload'], expected_audit_max_payload)
                         self.assertEquals(channel_item['is_active'], expected_is_active)
                     else:
-                        # Audit not enabled so no response audit message was published on the broker
-                        self.assertTrue(bc.msg is None)
+                        # Audit not enabled so nothing was stored
+                        self.assertEquals(odb.requests, [])
+                        self.assertEquals(odb.responses, [])
 
 # ################################################################################################################################
 
@@ -441,3 +466,25 @@ class HTTPAccessLogTestCase(TestCase):
             eq_(extra.req_timestamp, request_timestamp)
 
 # ################################################################################################################################
+
+class BrokerClientTestCase(TestCase):
+
+    def test_async_delivery(self):
+
+        # Same arguments as in ParallelServer.start_server
+        topic_callbacks = {TOPICS[MESSAGE_TYPE.TO_PARALLEL_ALL]: rand_string()}
+
+        with patch('thread.start_new_thread') as start_new_thread:
+            client = BrokerClient(MagicMock(), 'parallel', topic_callbacks, {}, BROKER.ASYNC_DELIVERY.QUEUE)
+
+        eq_(client.async_delivery, BROKER.ASYNC_DELIVERY.QUEUE)
+        eq_(client.topic_callbacks, topic_callbacks)
+        start_new_thread.assert_called_once_with(client.run, ())
+
+        # Publish/subscribe is the default
+        with patch('thread.start_new_thread'):
+            client = BrokerClient(MagicMock(), 'parallel', topic_callbacks, {})
+
+        eq_(client.async_delivery, BROKER.ASYNC_DELIVERY.PUB_SUB)
+
+# ################################################################################################################################
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (C) 2016 Dariusz Suchojad <dsuch at zato.io>
+
+Licensed under LGPLv3, see LICENSE.txt for terms and conditions.
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+# stdlib
+from unittest import TestCase
+
+# Bunch
+from bunch import Bunch
+
+# mock
+from mock import MagicMock
+
+# nose
+from nose.tools import eq_
+
+# Zato
+from zato.common import CHANNEL
+from zato.common.broker_message import CHANNEL as BROKER_MSG_CHANNEL, MESSAGE_TYPE
+from zato.common.test import rand_int, rand_string
+from zato.common.util import new_cid
+from zato.server.base.worker import WorkerStore
+
+# ################################################################################################################################
+
+class AMQPMessageReceivedTestCase(TestCase):
+
+    def setUp(self):
+        self.worker_store = WorkerStore(server=MagicMock())
+        self.worker_store.broker_client = MagicMock()
+        self.worker_store._invoke_service_from_msg = MagicMock()
+
+    def get_msg(self, **kwargs):
+        msg = Bunch(cid=new_cid(), service=rand_string(), ack_after_processing=True, channel_id=rand_int(),
+            method_frame={'consumer_tag': rand_string(), 'delivery_tag': rand_int()})
+        msg.update(kwargs)
+
+        return msg
+
+    def test_processed(self):
+        msg = self.get_msg()
+        self.worker_store.on_broker_msg_CHANNEL_AMQP_MESSAGE_RECEIVED(msg)
+
+        self.worker_store._invoke_service_from_msg.assert_called_once_with(msg, CHANNEL.AMQP)
+        self.worker_store.broker_client.publish.assert_called_once_with({
+            'action': BROKER_MSG_CHANNEL.AMQP_MESSAGE_PROCESSED.value,
+            'id': msg.channel_id,
+            'consumer_tag': msg.method_frame['consumer_tag'],
+            'delivery_tag': msg.method_frame['delivery_tag'],
+            'is_ok': True,
+        }, msg_type=MESSAGE_TYPE.TO_AMQP_CONSUMING_CONNECTOR_ALL)
+
+    def test_processed_error(self):
+        self.worker_store._invoke_service_from_msg.side_effect = Exception()
+
+        msg = self.get_msg()
+        self.assertRaises(Exception, self.worker_store.on_broker_msg_CHANNEL_AMQP_MESSAGE_RECEIVED, msg)
+
+        eq_(self.worker_store.broker_client.publish.call_args[0][0]['is_ok'], False)
+
+    def test_not_accepted(self):
+        self.worker_store.target_matcher = MagicMock()
+        self.worker_store.target_matcher.is_allowed.return_value = False
+
+        msg = self.get_msg(zato_ctx={'zato.request_ctx.target': rand_string()})
+        self.worker_store.on_broker_msg_CHANNEL_AMQP_MESSAGE_RECEIVED(msg)
+
+        # Another worker invokes the service so it's the one to report the outcome
+        self.assertFalse(self.worker_store._invoke_service_from_msg.called)
+        self.assertFalse(self.worker_store.broker_client.publish.called)
+
+    def test_no_ack_after_processing(self):
+        msg = self.get_msg(ack_after_processing=False)
+        self.worker_store.on_broker_msg_CHANNEL_AMQP_MESSAGE_RECEIVED(msg)
+
+        self.worker_store._invoke_service_from_msg.assert_called_once_with(msg, CHANNEL.AMQP)
+        self.assertFalse(self.worker_store.broker_client.publish.called)
@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (C) 2016 Dariusz Suchojad <dsuch at zato.io>
+
+Licensed under LGPLv3, see LICENSE.txt for terms and conditions.
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+# stdlib
+import os, sys
+from contextlib import closing
+from copy import deepcopy
+from shutil import rmtree
+from tempfile import mkdtemp
+from timeit import default_timer
+
+# Bunch
+from bunch import Bunch
+
+# Zato
+from zato.common import MISC
+from zato.common.odb import query
+from zato.common.odb.model import HTTPBasicAuth
+from zato.server.config import ConfigSnapshot
+
+# Test helpers, this file is in the same directory
+from test_config import FakeKVDBConn, get_odb
+
+# ################################################################################################################################
+
+# Compares how long it takes for all workers of a server to read HTTP channels and their security definitions.
+# Before is how each worker used to do it - reading everything from ODB on its own, with one query per channel
+# to look up channel's security definition. After is the first worker reading it from ODB, with one query per security
+# definition type, and storing a snapshot that the other workers load.
+#
+# Run as: python bench_config_snapshot.py [channels] [workers]
+
+# ################################################################################################################################
+
+def get_http_soap(odb):
+    http_soap = []
+
+    for item in odb.get_http_soap_list(odb.cluster.id, 'channel'):
+        hs_item = Bunch()
+        for key in item.keys():
+            hs_item[key] = getattr(item, key)
+        hs_item.match_target = '{}{}{}'.format(hs_item.soap_action, MISC.SEPARATOR, hs_item.url_path)
+        http_soap.append(hs_item)
+
+    return http_soap
+
+def get_url_security_before(odb):
+    result = {}
+
+    with closing(odb.session()) as session:
+        for item in query.http_soap_security_list(session, odb.cluster.id, 'channel').all():
+            target = '{}{}{}'.format(item.soap_action, MISC.SEPARATOR, item.url_path)
+            result[target] = Bunch(is_active=item.is_active, transport=item.transport, data_format=item.data_format)
+
+            if item.security_id:
+                sec_def = session.query(HTTPBasicAuth).filter(HTTPBasicAuth.id==item.security_id).one()
+                result[target].sec_def = Bunch(id=sec_def.id, name=sec_def.name, username=sec_def.username,
+                    password=sec_def.password, realm=sec_def.realm, sec_type=item.sec_type)
+
+    return result
+
+def before(odb, workers, path):
+    for idx in range(workers):
+        deepcopy(get_http_soap(odb))
+        get_url_security_before(odb)
+
+def after(odb, workers, path):
+    deployment_key = 'bench'
+    snapshot = ConfigSnapshot(path, FakeKVDBConn())
+
+    config = Bunch()
+    config.http_soap = get_http_soap(odb)
+    config.url_sec = odb.get_url_security(odb.cluster.id, 'channel')[0]
+    snapshot.save(deployment_key, snapshot.get_version(), config)
+
+    for idx in range(workers - 1):
+        snapshot.load(deployment_key)
+
+def main():
+    channels = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+
+    odb = get_odb(channels, 1)
+    dir_name = mkdtemp(prefix='zato-bench-config-snapshot')
+    path = os.path.join(dir_name, 'config-snapshot.json')
+
+    print('{:>10} {:>12} {:>12} {:>20}'.format('', 'Channels', 'Workers', 'Total time (s)'))
+
+    try:
+        for name, func in (('Before', before), ('After', after)):
+            start = default_timer()
+            func(odb, workers, path)
+            total = default_timer() - start
+
+            print('{:>10} {:>12} {:>12} {:>20.2f}'.format(name, channels, workers, total))
+    finally:
+        rmtree(dir_name)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (C) 2016 Dariusz Suchojad <dsuch at zato.io>
+
+Licensed under LGPLv3, see LICENSE.txt for terms and conditions.
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+# stdlib
+import sys
+from json import dumps
+from time import sleep
+from timeit import default_timer
+
+# Bunch
+from bunch import Bunch
+
+# Zato
+from zato.common.broker_message import CHANNEL
+from zato.server.service.internal.enmasse import Import
+
+# ################################################################################################################################
+
+# Compares how long it takes enmasse to import a number of HTTP channels. Before is how each channel used to be created
+# with a separate request from enmasse to the server, followed by the 21 get-list requests enmasse sent to refresh
+# its view of ODB after each object. Each channel is a broker message published to workers. After is one request
+# to zato.enmasse.import per 1000 channels and one broker message per request.
+#
+# Neither a server nor Redis is used, each request to the server and each command the broker client would send
+# to Redis, i.e. INCR and PUBLISH for publish, is a round-trip of a given number of milliseconds.
+#
+# Run as: python bench_enmasse.py [channels] [round-trip in ms]
+
+# ################################################################################################################################
+
+batch_size = 1000
+refresh_requests = 21
+
+class RoundTrips(object):
+    def __init__(self, round_trip):
+        self.round_trip = round_trip
+        self.count = 0
+
+    def __call__(self, count=1):
+        self.count += count
+        sleep(self.round_trip * count)
+
+class BrokerClient(object):
+    def __init__(self, round_trips):
+        self.round_trips = round_trips
+
+    def publish(self, msg, msg_type=None):
+        dumps(msg)
+        self.round_trips(2)
+
+class BenchImport(Import):
+    def invoke(self, name, request):
+        self.broker_client.publish(dict(request, action=CHANNEL.HTTP_SOAP_CREATE_EDIT.value))
+        return {'zato_http_soap_create_response': {'id': 1, 'name': request['name']}}
+
+def get_items(count):
+    items = []
+
+    for idx in range(count):
+        items.append({'item_type': 'http_soap', 'service_name': 'zato.http-soap.create', 'request': {
+            'name': 'channel.{}'.format(idx), 'is_active': True, 'is_internal': False, 'connection': 'channel',
+            'transport': 'plain_http', 'url_path': '/channel/{}'.format(idx), 'service': 'my.service'}})
+
+    return items
+
+def before(items, round_trips):
+    broker_client = BrokerClient(round_trips)
+
+    for item in items:
+        round_trips()
+        broker_client.publish(dict(item['request'], action=CHANNEL.HTTP_SOAP_CREATE_EDIT.value))
+        round_trips(refresh_requests)
+
+def after(items, round_trips):
+    for idx in range(0, len(items), batch_size):
+        round_trips()
+
+        service = BenchImport()
+        service.odb = Bunch(session=lambda: Bunch(close=lambda: None))
+        service.broker_client = BrokerClient(round_trips)
+        service.request.input = Bunch(cluster_id=1, data=dumps(items[idx:idx+batch_size]).encode('bz2').encode('base64'))
+        service.response.payload = Bunch()
+        service.handle()
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    round_trip = float(sys.argv[2]) / 1000.0 if len(sys.argv) > 2 else 0.2 / 1000.0
+
+    items = get_items(count)
+
+    print('{:>10} {:>12} {:>14} {:>20}'.format('', 'Channels', 'Round-trips', 'Total time (s)'))
+
+    for name, func in (('Before', before), ('After', after)):
+        round_trips = RoundTrips(round_trip)
+
+        start = default_timer()
+        func(items, round_trips)
+        total = default_timer() - start
+
+        print('{:>10} {:>12} {:>14} {:>20.2f}'.format(name, count, round_trips.count, total))
+
+if __name__ == '__main__':
+    main()
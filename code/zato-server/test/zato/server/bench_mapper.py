@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (C) 2016 Dariusz Suchojad <dsuch at zato.io>
+
+Licensed under LGPLv3, see LICENSE.txt for terms and conditions.
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+# stdlib
+import sys
+from timeit import default_timer
+
+# Zato
+from zato.server.message import Mapper
+
+# ################################################################################################################################
+
+# Compares how long it takes to map documents using msg.mapper. Before is each document mapped with map_many, which parses
+# each of the rules again for each document. After is the rules compiled once, and the plan cached, with each document
+# mapped through the plan.
+#
+# Run as: python bench_mapper.py [documents] [fields]
+
+# ################################################################################################################################
+
+def get_items(fields):
+    items = []
+
+    for idx in range(fields):
+        prefix = 'int:' if idx % 2 else ''
+        items.append(('{}/customer/group{}/field{}'.format(prefix, idx % 10, idx), '/out/field{}'.format(idx)))
+
+    return items
+
+def get_doc(fields):
+    doc = {'customer': {}}
+
+    for idx in range(fields):
+        doc['customer'].setdefault('group{}'.format(idx % 10), {})['field{}'.format(idx)] = str(idx + 1)
+
+    return doc
+
+def before(docs, items, plans):
+    for doc in docs:
+        Mapper(doc).map_many(items)
+
+def after(docs, items, plans):
+    for doc in docs:
+        mapper = Mapper(doc, plans=plans)
+        mapper.apply(mapper.compile(items))
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    fields = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+
+    items = get_items(fields)
+    docs = [get_doc(fields) for idx in range(count)]
+
+    print('{:>10} {:>12} {:>12} {:>20}'.format('', 'Documents', 'Fields', 'Total time (s)'))
+
+    for name, func in (('Before', before), ('After', after)):
+        start = default_timer()
+        func(docs, items, {})
+        total = default_timer() - start
+
+        print('{:>10} {:>12} {:>12} {:>20.2f}'.format(name, count, fields, total))
+
+if __name__ == '__main__':
+    main()
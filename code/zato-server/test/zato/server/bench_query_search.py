@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (C) 2016 Dariusz Suchojad <dsuch at zato.io>
+
+Licensed under LGPLv3, see LICENSE.txt for terms and conditions.
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+# stdlib
+import sys
+from timeit import default_timer
+
+# Zato
+from zato.common.odb.query import http_soap_list
+
+# Test helpers, this file is in the same directory
+from test_config import get_odb
+
+# ################################################################################################################################
+
+# Compares how long it takes to list HTTP channels in web-admin. Before is how all of the channels were always returned.
+# After is a single page of them, filtered by name, along with the total number of matching channels.
+#
+# Run as: python bench_query_search.py [channels] [batch size] [requests]
+
+# ################################################################################################################################
+
+def before(odb, batch_size):
+    session = odb.session()
+    try:
+        return len(http_soap_list(session, odb.cluster.id, 'channel', 'plain_http', False, False))
+    finally:
+        session.close()
+
+def after(odb, batch_size):
+    session = odb.session()
+    try:
+        search = {'current_batch': 2, 'batch_size': batch_size, 'query': 'channel.1'}
+        return len(http_soap_list(session, odb.cluster.id, 'channel', 'plain_http', False, False, search=search))
+    finally:
+        session.close()
+
+def main():
+    channels = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    batch_size = int(sys.argv[2]) if len(sys.argv) > 2 else 25
+    count = int(sys.argv[3]) if len(sys.argv) > 3 else 20
+
+    odb = get_odb(channels)
+
+    print('{:>10} {:>12} {:>12} {:>12} {:>20}'.format('', 'Channels', 'Rows', 'Requests', 'Total time (s)'))
+
+    for name, func in (('Before', before), ('After', after)):
+        start = default_timer()
+        for idx in range(count):
+            rows = func(odb, batch_size)
+        total = default_timer() - start
+
+        print('{:>10} {:>12} {:>12} {:>12} {:>20.2f}'.format(name, channels, rows, count, total))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (C) 2016 Dariusz Suchojad <dsuch at zato.io>
+
+Licensed under LGPLv3, see LICENSE.txt for terms and conditions.
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+# stdlib
+import sys
+from random import Random
+from timeit import default_timer
+
+# Zato
+from zato.common import ZATO_NONE
+from zato.server.rbac_ import RBAC
+
+# ################################################################################################################################
+
+# Compares how long it takes to check whether HTTP clients are allowed to invoke services. Before is how each check
+# used to walk the whole role hierarchy of each of the client's roles. After is a decision looked up in a table
+# that is filled in as clients are checked.
+#
+# Roles form several chains, each of a given depth, permissions are granted to roots of the chains and each client
+# has a few leaf roles.
+#
+# Run as: python bench_rbac_.py [clients] [depth] [checks]
+
+# ################################################################################################################################
+
+verbs = ('GET', 'POST', 'PUT', 'DELETE')
+chains = 20
+roles_per_client = 3
+resources = 200
+
+def get_rbac(clients, depth, random):
+    rbac = RBAC()
+
+    for idx, name in enumerate(('Create', 'Read', 'Update', 'Delete')):
+        rbac.create_permission(idx, name)
+    rbac.set_http_permissions()
+
+    for resource in range(resources):
+        rbac.create_resource(resource)
+
+    leaves = []
+    role_id = 0
+
+    for chain in range(chains):
+        parent_id = None
+        for level in range(depth):
+            role_id += 1
+            rbac.create_role(role_id, 'role.{}'.format(role_id), parent_id)
+            parent_id = role_id
+
+            # Roots of the chains are granted permissions, the deepest roles are denied some
+            if level == 0:
+                for resource in random.sample(range(resources), resources // 2):
+                    rbac.create_role_permission_allow(role_id, random.randrange(4), resource)
+            elif level == depth - 1:
+                rbac.create_role_permission_deny(role_id, random.randrange(4), random.randrange(resources))
+
+        leaves.append(role_id)
+
+    client_defs = []
+
+    for idx in range(clients):
+        client_def = 'sec_def:::basic_auth:::client.{}'.format(idx)
+        client_defs.append(client_def)
+
+        for role_id in random.sample(leaves, roles_per_client):
+            rbac.create_client_role(client_def, role_id)
+
+    return rbac, client_defs
+
+def before(rbac, checks):
+    for client_def, verb, resource in checks:
+        roles = rbac.client_def_to_role_id.get(client_def, ZATO_NONE)
+        rbac.registry.is_any_allowed(roles, rbac.http_permissions[verb], resource) if roles != ZATO_NONE else False
+
+def after(rbac, checks):
+    for client_def, verb, resource in checks:
+        rbac.is_http_client_allowed(client_def, verb, resource)
+
+def main():
+    clients = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    depth = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    count = int(sys.argv[3]) if len(sys.argv) > 3 else 200000
+
+    random = Random(0)
+    rbac, client_defs = get_rbac(clients, depth, random)
+
+    # Each client invokes a couple of services, all of them with the same HTTP verb
+    checks = []
+    for idx in range(count):
+        client_idx = random.randrange(clients)
+        checks.append((client_defs[client_idx], verbs[client_idx % len(verbs)], random.randrange(2)))
+
+    print('{:>10} {:>12} {:>12} {:>12} {:>20}'.format('', 'Clients', 'Depth', 'Checks', 'Total time (s)'))
+
+    for name, func in (('Before', before), ('After', after)):
+        start = default_timer()
+        func(rbac, checks)
+        total = default_timer() - start
+
+        print('{:>10} {:>12} {:>12} {:>12} {:>20.2f}'.format(name, clients, depth, count, total))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (C) 2016 Dariusz Suchojad <dsuch at zato.io>
+
+Licensed under LGPLv3, see LICENSE.txt for terms and conditions.
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+# stdlib
+import sys
+from json import dumps
+from time import sleep
+from timeit import default_timer
+
+# Zato
+from zato.common import SCHEDULER
+from zato.common.util import new_cid
+from zato.server.scheduler import Scheduler
+
+# ################################################################################################################################
+
+# Compares how long it takes the singleton server to hand over to workers all the jobs that are due in the same tick,
+# e.g. hourly cron jobs. Before is a broker message per job and another one per one-time job to deactivate it.
+# After is one batch message with all the jobs and one message to deactivate all of the one-time jobs.
+#
+# Redis itself is not used, each command the broker client would send to Redis, i.e. SET, EXPIRE and PUBLISH
+# for invoke_async and INCR and PUBLISH for publish, is a round-trip of a given number of milliseconds.
+#
+# Run as: python bench_scheduler.py [jobs] [one-time jobs] [round-trip in ms]
+
+# ################################################################################################################################
+
+class BrokerClient(object):
+    def __init__(self, round_trip):
+        self.round_trip = round_trip
+        self.round_trips = 0
+
+    def _send(self, msg, commands):
+        dumps(msg)
+        self.round_trips += commands
+        sleep(self.round_trip * commands)
+
+    def invoke_async(self, msg):
+        self._send(msg, 3)
+
+    def publish(self, msg):
+        self._send(msg, 2)
+
+class Singleton(object):
+    def __init__(self, round_trip):
+        self.broker_client = BrokerClient(round_trip)
+
+def get_ctx_list(count, one_time):
+    ctx_list = []
+
+    for idx in range(count):
+        ctx_list.append({
+            'id': idx,
+            'name': 'job.{}'.format(idx),
+            'cb_kwargs': {'service': 'my.service.{}'.format(idx), 'extra': ''},
+            'cid': new_cid(),
+            'type': SCHEDULER.JOB_TYPE.ONE_TIME if idx < one_time else SCHEDULER.JOB_TYPE.CRON_STYLE,
+        })
+
+    return ctx_list
+
+def before(sched, ctx_list):
+    for ctx in ctx_list:
+        sched.on_job_executed(ctx)
+
+def after(sched, ctx_list):
+    sched.on_jobs_executed(ctx_list)
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    one_time = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    round_trip = float(sys.argv[3]) / 1000.0 if len(sys.argv) > 3 else 0.0002
+
+    ctx_list = get_ctx_list(count, one_time)
+
+    print('{:>10} {:>12} {:>14} {:>14} {:>16}'.format('', 'Jobs', 'One-time jobs', 'Round-trips', 'Total time (ms)'))
+
+    for name, func in (('Before', before), ('After', after)):
+        singleton = Singleton(round_trip)
+        sched = Scheduler(singleton)
+
+        start = default_timer()
+        func(sched, ctx_list)
+        total = default_timer() - start
+
+        print('{:>10} {:>12} {:>14} {:>14} {:>16.1f}'.format(
+            name, count, one_time, singleton.broker_client.round_trips, total * 1000))
+
+if __name__ == '__main__':
+    main()
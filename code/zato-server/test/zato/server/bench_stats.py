@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (C) 2016 Dariusz Suchojad <dsuch at zato.io>
+
+Licensed under LGPLv3, see LICENSE.txt for terms and conditions.
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+# stdlib
+import sys
+from datetime import datetime
+from time import sleep
+from timeit import default_timer
+
+# Zato
+from zato.common import KVDB
+from zato.server.stats import ServiceStatsAccumulator
+
+# ################################################################################################################################
+
+# Compares how many requests a second can be processed with service statistics enabled
+# when each request talks to KVDB directly (before) and when statistics are accumulated in memory (after).
+#
+# Run as: python bench_stats.py [redis-host:redis-port]
+#
+# Without a Redis address, a fake connection is used which only simulates the network round-trip time of each command.
+
+# ################################################################################################################################
+
+class FakePipeline(object):
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *ignored):
+        pass
+
+    def __getattr__(self, ignored):
+        return lambda *args: None
+
+    def execute(self):
+        sleep(self.conn.rtt)
+
+class FakeConn(object):
+    def __init__(self, rtt=0.0002):
+        self.rtt = rtt
+
+    def incr(self, *ignored):
+        sleep(self.rtt)
+        return 1
+
+    def pipeline(self):
+        return FakePipeline(self)
+
+# ################################################################################################################################
+
+def before(conn, name):
+    """ What Service.pre_handle and .post_handle used to do for each request.
+    """
+    conn.incr('{}{}'.format(KVDB.SERVICE_USAGE, name))
+
+    now = datetime.utcnow()
+    proc_time = 1
+
+    with conn.pipeline() as pipe:
+        pipe.hset('{}{}'.format(KVDB.SERVICE_TIME_BASIC, name), 'last', proc_time)
+        pipe.rpush('{}{}'.format(KVDB.SERVICE_TIME_RAW, name), proc_time)
+
+        key = '{}{}:{}'.format(KVDB.SERVICE_TIME_RAW_BY_MINUTE, name, now.strftime('%Y:%m:%d:%H:%M'))
+        pipe.rpush(key, proc_time)
+        pipe.expire(key, 300)
+        pipe.execute()
+
+def run(conn, requests):
+    names = ['zato.bench.service{}'.format(idx) for idx in range(10)]
+
+    start = default_timer()
+    for idx in xrange(requests):
+        before(conn, names[idx % 10])
+    before_rps = requests / (default_timer() - start)
+
+    acc = ServiceStatsAccumulator(conn)
+
+    start = default_timer()
+    for idx in xrange(requests):
+        name = names[idx % 10]
+        acc.on_invoked(name)
+        acc.on_processed(name, 1, datetime.utcnow())
+
+    # A single flush covers all the requests, in a server it runs every few seconds in background
+    acc.flush()
+    after_rps = requests / (default_timer() - start)
+
+    return before_rps, after_rps
+
+def main():
+    if len(sys.argv) > 1:
+        from redis import StrictRedis
+        host, port = sys.argv[1].split(':')
+        conn = StrictRedis(host, int(port))
+    else:
+        conn = FakeConn()
+
+    before_rps, after_rps = run(conn, 10000)
+
+    print('{:>10} {:>20}'.format('', 'Requests/s'))
+    print('{:>10} {:>20.0f}'.format('Before', before_rps))
+    print('{:>10} {:>20.0f}'.format('After', after_rps))
+
+if __name__ == '__main__':
+    main()
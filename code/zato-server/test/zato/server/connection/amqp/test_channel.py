@@ -0,0 +1,206 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (C) 2016 Dariusz Suchojad <dsuch at zato.io>
+
+Licensed under LGPLv3, see LICENSE.txt for terms and conditions.
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+# stdlib
+from threading import RLock
+from unittest import TestCase
+
+# Bunch
+from bunch import Bunch, bunchify
+
+# nose
+from nose.tools import eq_
+
+# Pika
+from pika.adapters.select_connection import SelectPoller
+from pika.spec import Basic, BasicProperties
+
+# Zato
+from zato.common.broker_message import CHANNEL
+from zato.server.connection.amqp import BaseAMQPConnection
+from zato.server.connection.amqp.channel import ACK_INTERVAL, ConsumingConnection, ConsumingConnector
+
+# ################################################################################################################################
+
+class FakeChannel(object):
+    def __init__(self):
+        self.calls = []
+
+    def basic_qos(self, callback, prefetch_count):
+        self.calls.append(('qos', prefetch_count))
+        callback(None)
+
+    def basic_consume(self, callback, queue, consumer_tag):
+        self.calls.append(('consume', queue))
+
+    def basic_ack(self, delivery_tag):
+        self.calls.append(('ack', delivery_tag))
+
+    def basic_nack(self, delivery_tag, requeue):
+        self.calls.append(('nack', delivery_tag, requeue))
+
+class FakeConn(object):
+    def __init__(self):
+        self.timeouts = []
+
+    def add_timeout(self, deadline, callback):
+        self.timeouts.append((deadline, callback))
+
+class FakeBrokerClient(object):
+    def __init__(self):
+        self.messages = []
+
+    def invoke_async(self, msg):
+        self.messages.append(msg)
+
+# ################################################################################################################################
+
+class ConsumingConnectionTestCase(TestCase):
+
+    def setUp(self):
+        self.orig_poller_timeout = SelectPoller.TIMEOUT
+        self.received = []
+
+    def get_connection(self, prefetch_count=10, ack_after_processing=True, ack_timeout=300, requeue_on_error=False):
+        conn = ConsumingConnection(Bunch(host='localhost', port=5672, virtual_host='/'), 'my.channel', 'my.queue',
+            'zato', self.on_message, prefetch_count, ack_after_processing, ack_timeout, requeue_on_error)
+        conn.conn = FakeConn()
+        conn._on_channel_open(FakeChannel())
+
+        return conn
+
+    def on_message(self, method_frame, header_frame, body):
+        self.received.append(body)
+
+    def deliver(self, conn, delivery_tag):
+        conn._on_basic_consume(conn.channel, Basic.Deliver(conn.consumer_tag, delivery_tag), BasicProperties(), 'abc')
+
+    def test_prefetch_count(self):
+        conn = self.get_connection(prefetch_count=10)
+        eq_(conn.channel.calls, [('qos', 10), ('consume', 'my.queue')])
+
+        conn = self.get_connection(prefetch_count=0)
+        eq_(conn.channel.calls, [('consume', 'my.queue')])
+
+    def test_ack_on_receive(self):
+        conn = self.get_connection(ack_after_processing=False)
+        self.deliver(conn, 1)
+
+        eq_(self.received, ['abc'])
+        eq_(conn.channel.calls[-1], ('ack', 1))
+        eq_(conn.in_flight, {})
+        eq_(conn.conn.timeouts, [])
+
+    def test_ack_after_processing(self):
+        conn = self.get_connection(requeue_on_error=False)
+        eq_(conn.conn.timeouts, [(ACK_INTERVAL, conn._ack_processed)])
+
+        self.deliver(conn, 1)
+        self.deliver(conn, 2)
+        self.deliver(conn, 3)
+
+        eq_(self.received, ['abc', 'abc', 'abc'])
+        eq_(sorted(conn.in_flight), [1, 2, 3])
+        eq_(conn.channel.calls, [('qos', 10), ('consume', 'my.queue')])
+
+        conn.on_processed(conn.consumer_tag, 2, True)
+        conn.on_processed(conn.consumer_tag, 1, False)
+        conn.on_processed('abc', 3, True) # From a previous consumer
+        conn.on_processed(conn.consumer_tag, 2, True) # Already acknowledged
+
+        conn._ack_processed()
+
+        eq_(conn.channel.calls[2:], [('ack', 2), ('nack', 1, False)])
+        eq_(sorted(conn.in_flight), [3])
+        eq_(len(conn.processed), 0)
+
+        # The next check is scheduled
+        eq_(len(conn.conn.timeouts), 2)
+
+    def test_requeue_on_error(self):
+        conn = self.get_connection(requeue_on_error=True)
+        self.deliver(conn, 1)
+        conn.on_processed(conn.consumer_tag, 1, False)
+        conn._ack_processed()
+
+        eq_(conn.channel.calls[-1], ('nack', 1, True))
+
+    def test_ack_timeout(self):
+        conn = self.get_connection(ack_timeout=-1)
+        self.deliver(conn, 1)
+        conn._ack_processed()
+
+        eq_(conn.channel.calls[-1], ('nack', 1, True))
+        eq_(conn.in_flight, {})
+
+        # Processed after it was given back to the broker
+        conn.on_processed(conn.consumer_tag, 1, True)
+        conn._ack_processed()
+
+        eq_(conn.channel.calls[-1], ('nack', 1, True))
+
+    def test_poller_timeout(self):
+        orig_start = BaseAMQPConnection._start
+        BaseAMQPConnection._start = lambda self: None
+
+        try:
+            self.get_connection(ack_after_processing=False)._start()
+            eq_(SelectPoller.TIMEOUT, self.orig_poller_timeout)
+
+            # Pika's poller is not changed globally
+            self.get_connection(ack_after_processing=True)._start()
+            eq_(SelectPoller.TIMEOUT, self.orig_poller_timeout)
+        finally:
+            BaseAMQPConnection._start = orig_start
+
+# ################################################################################################################################
+
+class ConsumingConnectorTestCase(TestCase):
+
+    def get_connector(self, ack_after_processing):
+        connector = ConsumingConnector(init=False)
+        connector.broker_client = FakeBrokerClient()
+        connector.def_amqp_lock = RLock()
+        connector.channel_amqp_lock = RLock()
+        connector.ack_after_processing = ack_after_processing
+        connector.channel_amqp = Bunch(id=123, service='my.service', data_format='json', consumer=Bunch(processed=[]))
+        connector.channel_amqp.consumer.on_processed = lambda *args: connector.channel_amqp.consumer.processed.append(args)
+
+        return connector
+
+    def test_on_message(self):
+        for ack_after_processing in (True, False):
+            connector = self.get_connector(ack_after_processing)
+            connector._on_message(Basic.Deliver('my.tag', 1), BasicProperties(), 'abc')
+
+            msg = connector.broker_client.messages[0]
+            eq_(msg['action'], CHANNEL.AMQP_MESSAGE_RECEIVED.value)
+            eq_(msg['payload'], 'abc')
+            eq_(msg['method_frame']['consumer_tag'], 'my.tag')
+            eq_(msg['method_frame']['delivery_tag'], 1)
+
+            if ack_after_processing:
+                eq_(msg['ack_after_processing'], True)
+                eq_(msg['channel_id'], 123)
+            else:
+                self.assertNotIn('ack_after_processing', msg)
+
+    def test_on_processed(self):
+        connector = self.get_connector(True)
+        msg = bunchify({'action': CHANNEL.AMQP_MESSAGE_PROCESSED.value, 'id': 123, 'consumer_tag': 'my.tag',
+            'delivery_tag': 1, 'is_ok': True})
+
+        self.assertTrue(connector.filter(msg))
+        connector.on_broker_msg_CHANNEL_AMQP_MESSAGE_PROCESSED(msg)
+
+        eq_(connector.channel_amqp.consumer.processed, [('my.tag', 1, True)])
+
+        msg.id = 456
+        self.assertFalse(connector.filter(msg))
@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (C) 2016 Dariusz Suchojad <dsuch at zato.io>
+
+Licensed under LGPLv3, see LICENSE.txt for terms and conditions.
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+# stdlib
+from threading import RLock
+from time import sleep
+from unittest import TestCase
+
+# Bunch
+from bunch import Bunch, bunchify
+
+# Kombu
+from kombu import Connection
+
+# nose
+from nose.tools import eq_
+
+# Zato
+from zato.common.broker_message import MESSAGE_TYPE, OUTGOING
+from zato.common.test import rand_string
+from zato.server.connection.amqp.outgoing import OutgoingConnector, Publisher, PublisherFacade
+
+# ################################################################################################################################
+
+class FakeBrokerClient(object):
+    def __init__(self):
+        self.messages = []
+
+    def publish(self, msg, msg_type):
+        self.messages.append((msg, msg_type))
+
+class _OutgoingConnector(OutgoingConnector):
+    def _conn_info(self):
+        return '' # There is no AMQP definition before _init is called
+
+def get_messages(queue_name):
+    conn = Connection('memory://')
+    queue = conn.SimpleQueue(queue_name)
+    messages = []
+
+    while queue.qsize():
+        message = queue.get(timeout=1)
+        message.ack()
+        messages.append(message)
+
+    conn.release()
+    return messages
+
+# ################################################################################################################################
+
+class PublisherFacadeTestCase(TestCase):
+
+    def test_send_many(self):
+        broker_client = FakeBrokerClient()
+        facade = PublisherFacade(broker_client)
+        facade.send_many(['a', 'b', 'c'], 'my.out', 'my.exchange', 'my.key', {'priority': 5}, {'X-Custom': 'abc'})
+
+        eq_(len(broker_client.messages), 1)
+        msg, msg_type = broker_client.messages[0]
+
+        eq_(msg_type, MESSAGE_TYPE.TO_AMQP_PUBLISHING_CONNECTOR_ALL)
+        eq_(msg['action'], OUTGOING.AMQP_PUBLISH_MANY.value)
+        eq_(msg['out_name'], 'my.out')
+        eq_(msg['body'], ['a', 'b', 'c'])
+        eq_(msg['exchange'], b'my.exchange')
+        eq_(msg['routing_key'], b'my.key')
+        eq_(msg['properties'], {'priority': 5})
+        eq_(msg['headers'], {'X-Custom': 'abc'})
+
+# ################################################################################################################################
+
+class PublisherTestCase(TestCase):
+
+    def test_connection_reused(self):
+        queue_name = rand_string()
+        publisher = Publisher('memory://', conn_class=Connection)
+
+        publisher.publish(['a'], '', queue_name, {}, {})
+        conn = publisher.conn
+
+        publisher.publish(['b', 'c'], '', queue_name, {}, {})
+
+        self.assertIs(publisher.conn, conn)
+        eq_(publisher.connects, 1)
+        eq_(publisher.published, 3)
+        eq_([message.payload for message in get_messages(queue_name)], ['a', 'b', 'c'])
+
+    def test_close(self):
+        queue_name = rand_string()
+        publisher = Publisher('memory://', conn_class=Connection)
+
+        publisher.publish(['a'], '', queue_name, {}, {})
+        publisher.close()
+
+        self.assertIsNone(publisher.conn)
+        self.assertTrue(publisher.closed.is_set())
+
+        # The next publish re-establishes the connection
+        publisher.publish(['b'], '', queue_name, {}, {})
+        eq_(publisher.connects, 2)
+        eq_([message.payload for message in get_messages(queue_name)], ['a', 'b'])
+
+    def test_confirm_publish(self):
+        publisher = Publisher('memory://', confirm_publish=True, conn_class=Connection)
+        publisher.publish(['a'], '', rand_string(), {}, {})
+
+        eq_(publisher.conn.transport_options, {'confirm_publish': True})
+
+    def test_heartbeat_check_error(self):
+
+        class _Connection(Connection):
+            def heartbeat_check(self, rate=2):
+                raise Exception('Heartbeat missed')
+
+        publisher = Publisher('memory://', heartbeat=1, heartbeat_check_rate=20, conn_class=_Connection)
+        publisher.publish(['a'], '', rand_string(), {}, {})
+        self.assertIsNotNone(publisher.conn)
+
+        sleep(0.2)
+
+        # The connection was dropped and will be re-established on next publish
+        self.assertIsNone(publisher.conn)
+
+        publisher.close()
+        publisher.heartbeat_thread.join()
+
+# ################################################################################################################################
+
+class OutgoingConnectorTestCase(TestCase):
+
+    def get_connector(self):
+        connector = _OutgoingConnector(init=False)
+        connector.def_amqp = Bunch(username='user', password='password', host='localhost', port=5672, vhost='/', heartbeat=0)
+        connector.out_amqp = Bunch(name='my.out', delivery_mode=2, priority=5, content_type='text/plain',
+            content_encoding=None, expiration=None, user_id=None, app_id=None)
+        connector.out_amqp_lock = RLock()
+        connector.publisher = Publisher('memory://', conn_class=Connection)
+
+        return connector
+
+    def get_msg(self, action, body, queue_name):
+        return bunchify({'action': action, 'out_name': 'my.out', 'body': body, 'exchange': '', 'routing_key': queue_name,
+            'properties': {'priority': 7}, 'headers': {'X-Custom': 'abc'}})
+
+    def test_publish_many(self):
+        queue_name = rand_string()
+        connector = self.get_connector()
+        publisher = connector.publisher
+
+        msg = self.get_msg(OUTGOING.AMQP_PUBLISH_MANY.value, ['a', 'b'], queue_name)
+        self.assertTrue(connector.filter(msg))
+        connector.on_broker_msg_OUTGOING_AMQP_PUBLISH_MANY(msg)
+
+        msg = self.get_msg(OUTGOING.AMQP_PUBLISH.value, 'c', queue_name)
+        self.assertTrue(connector.filter(msg))
+        connector.on_broker_msg_OUTGOING_AMQP_PUBLISH(msg)
+
+        # The same publisher was used for all the messages
+        self.assertIs(connector.publisher, publisher)
+        eq_(publisher.connects, 1)
+
+        messages = get_messages(queue_name)
+        eq_([message.payload for message in messages], ['a', 'b', 'c'])
+
+        for message in messages:
+            eq_(message.headers['X-Custom'], 'abc')
+            eq_(message.headers['X-Zato-Component'], connector.component_name)
+            eq_(message.delivery_info['priority'], 7)
+            eq_(message.properties['delivery_mode'], 2)
+            eq_(message.content_type, 'text/plain')
+
+    def test_recreate_sender(self):
+        connector = self.get_connector()
+        publisher = connector.publisher
+
+        connector._recreate_sender()
+
+        self.assertIsNone(connector.publisher)
+        self.assertTrue(publisher.closed.is_set())
@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (C) 2016 Dariusz Suchojad <dsuch at zato.io>
+
+Licensed under LGPLv3, see LICENSE.txt for terms and conditions.
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+# stdlib
+import asyncore, logging, sys
+from threading import Thread
+from timeit import default_timer
+
+# Zato
+from zato.server.connection.email import SMTPConnection
+
+# Test helpers, this file is in the same directory
+from test_email import SMTPServer, get_config, get_message
+
+# ################################################################################################################################
+
+# Compares how many messages a second can be sent to a local SMTP server. Before is a new session, i.e. a TCP connection,
+# and TLS and AUTH if configured, for each message, as SMTPConnection.send used to do. Pooled is send reusing sessions
+# from the pool and After is send_many sending all of them over a single session.
+#
+# The server is local and requires neither TLS nor AUTH so the difference against a remote server is bigger still.
+#
+# Run as: python bench_email.py [messages]
+
+# ################################################################################################################################
+
+def before(conn, messages):
+    for msg in messages:
+        session = conn.connect()
+        conn._send(session, msg, None)
+        session.quit()
+
+def pooled(conn, messages):
+    for msg in messages:
+        conn.send(msg)
+
+def after(conn, messages):
+    conn.send_many(messages)
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+
+    logging.disable(logging.CRITICAL)
+
+    server = SMTPServer()
+    thread = Thread(target=asyncore.loop, kwargs={'timeout':0.01})
+    thread.daemon = True
+    thread.start()
+
+    config = get_config(server.port)
+    messages = [get_message(idx) for idx in range(count)]
+
+    print('{:>10} {:>12} {:>20} {:>20}'.format('', 'Messages', 'Total time (s)', 'Messages/s'))
+
+    for name, func in (('Before', before), ('Pooled', pooled), ('After', after)):
+        conn = SMTPConnection(config, config)
+
+        start = default_timer()
+        func(conn, messages)
+        total = default_timer() - start
+
+        conn.close()
+
+        print('{:>10} {:>12} {:>20.2f} {:>20.0f}'.format(name, count, total, count / total))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (C) 2016 Dariusz Suchojad <dsuch at zato.io>
+
+Licensed under LGPLv3, see LICENSE.txt for terms and conditions.
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+# stdlib
+import resource, sys
+from multiprocessing import Process, Queue
+
+# Zato
+from zato.server.connection.http_soap.stream import iter_response, RequestBody
+
+# ################################################################################################################################
+
+# Compares peak memory usage of a worker that receives a large request and sends it back to the client. Before is how
+# it used to be done - the request read into memory in full before a service was invoked and the service's response
+# returned as a single string. After is a streaming channel - the service reading the request and producing
+# its response chunk by chunk.
+#
+# Each variant runs in a process of its own so that their peak memory usages do not affect each other.
+#
+# Run as: python bench_stream.py [size in MB]
+
+# ################################################################################################################################
+
+class ClientInput(object):
+    """ Mimics wsgi.input - a client sending size bytes.
+    """
+    def __init__(self, size):
+        self.remaining = size
+        self.chunk = b'z' * 65536
+
+    def read(self, size=-1):
+        if size < 0:
+            chunks = []
+            while self.remaining:
+                chunks.append(self.read(len(self.chunk)))
+            return b''.join(chunks)
+
+        size = min(size, self.remaining, len(self.chunk))
+        self.remaining -= size
+        return self.chunk[:size]
+
+def before(wsgi_input):
+    payload = wsgi_input.read()
+    response = payload.upper()
+    return [response]
+
+def after(wsgi_input):
+
+    def handle(body):
+        for data in body:
+            yield data.upper()
+
+    return iter_response(handle(RequestBody(wsgi_input)))
+
+def run(func, size, queue):
+    sent = 0
+    for data in func(ClientInput(size)):
+        sent += len(data)
+
+    queue.put((sent, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0))
+
+def main():
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+
+    print('{:>10} {:>15} {:>20}'.format('', 'Request (MB)', 'Peak RSS (MB)'))
+
+    for name, func in (('Before', before), ('After', after)):
+        queue = Queue()
+        process = Process(target=run, args=(func, size * 1024 * 1024, queue))
+        process.start()
+
+        sent, max_rss = queue.get()
+        process.join()
+
+        assert sent == size * 1024 * 1024
+        print('{:>10} {:>15} {:>20.1f}'.format(name, size, max_rss))
+
+if __name__ == '__main__':
+    main()
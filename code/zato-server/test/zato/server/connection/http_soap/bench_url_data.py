@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (C) 2016 Dariusz Suchojad <dsuch at zato.io>
+
+Licensed under LGPLv3, see LICENSE.txt for terms and conditions.
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+# stdlib
+from random import choice, seed
+from timeit import default_timer
+
+# Bunch
+from bunch import Bunch
+
+# Zato
+from zato.common import MISC
+from zato.server.connection.http_soap import url_data
+
+# ################################################################################################################################
+
+# Measures how long it takes for URLData.match to find a channel, depending on how many channels there are.
+# The match time should remain roughly the same no matter the number of channels.
+#
+# Run as: python bench_url_data.py
+
+# ################################################################################################################################
+
+def get_url_data(channels):
+    items = []
+
+    for idx in range(channels):
+        item = Bunch()
+        item.name = 'channel-{}'.format(idx)
+        item.match_target = '{}{}/api/v1/resource{}/{{res_id}}/item/{{item_id}}'.format('', MISC.SEPARATOR, idx)
+        item.match_target_compiled = url_data.Matcher(item.match_target)
+        items.append(item)
+
+    return url_data.URLData(items)
+
+def run(channels, requests=10000):
+    seed(channels)
+    ud = get_url_data(channels)
+    url_paths = ['/api/v1/resource{}/123/item/456'.format(choice(range(channels))) for _ in range(requests)]
+
+    # Warm-up
+    ud.match(url_paths[0], '')
+
+    start = default_timer()
+    for url_path in url_paths:
+        ud.match(url_path, '')
+
+    return (default_timer() - start) / requests * 1000000
+
+def main():
+    print('{:>10} {:>20}'.format('Channels', 'Match time (us)'))
+    for channels in (10, 100, 1000, 10000):
+        print('{:>10} {:>20.2f}'.format(channels, run(channels)))
+
+if __name__ == '__main__':
+    main()
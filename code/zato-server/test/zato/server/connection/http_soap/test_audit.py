@@ -0,0 +1,253 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (C) 2016 Dariusz Suchojad <dsuch at zato.io>
+
+Licensed under LGPLv3, see LICENSE.txt for terms and conditions.
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+# stdlib
+import os
+from datetime import datetime
+from json import loads
+from tempfile import mkstemp
+from unittest import TestCase
+
+# Bunch
+from bunch import Bunch
+
+# gevent
+from gevent import Timeout
+
+# mock
+from mock import MagicMock
+
+# nose
+from nose.tools import eq_
+
+# SQLAlchemy
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+# Zato
+from zato.common import AUDIT_LOG
+from zato.common.odb.model import HTTSOAPAudit
+from zato.common.test import rand_string
+from zato.server.connection.http_soap.audit import AuditQueue
+from zato.server.odb import ODBManager
+
+# ################################################################################################################################
+
+class FakeODB(object):
+    def __init__(self, exc=None):
+        self.exc = exc
+        self.calls = []
+
+    def audit_set_many_http_soap(self, requests, responses):
+        if self.exc:
+            raise self.exc
+        self.calls.append((list(requests), responses))
+
+def get_request(cid):
+    return {'conn_id': 1, 'name': rand_string(), 'cid': cid, 'transport': 'plain_http', 'connection': 'channel',
+        'req_time': datetime.utcnow(), 'user_token': None, 'remote_addr': '127.0.0.1', 'req_headers': '{}',
+        'req_payload': rand_string()}
+
+def get_response(cid):
+    return {'cid': cid, 'invoke_ok': True, 'auth_ok': True, 'resp_time': datetime.utcnow(), 'resp_headers': b'{}',
+        'resp_payload': b'abc'}
+
+# ################################################################################################################################
+
+class AuditQueueTestCase(TestCase):
+
+    def setUp(self):
+        self.spill_path = mkstemp('-zato-test-audit')[1]
+
+    def tearDown(self):
+        os.remove(self.spill_path)
+
+    def test_invalid_config(self):
+        self.assertRaises(ValueError, AuditQueue, FakeODB(), overflow=rand_string())
+        self.assertRaises(ValueError, AuditQueue, FakeODB(), overflow=AUDIT_LOG.OVERFLOW.SPILL_TO_FILE)
+
+    def test_flush_merges_responses_with_requests(self):
+        odb = FakeODB()
+        queue = AuditQueue(odb)
+
+        queue.put_response(get_response('cid0')) # Its request was stored in a previous batch
+        queue.put_request(get_request('cid1'))
+        queue.put_request(get_request('cid2'))
+        queue.put_response(get_response('cid1'))
+
+        queue.drain()
+
+        eq_(len(odb.calls), 1)
+        requests, responses = odb.calls[0]
+
+        eq_([item['cid'] for item in requests], ['cid1', 'cid2'])
+        eq_(requests[0]['resp_payload'], b'abc')
+        eq_(requests[0]['invoke_ok'], True)
+        eq_(requests[1]['resp_payload'], None)
+        eq_(requests[1]['invoke_ok'], None)
+
+        eq_([item['cid'] for item in responses], ['cid0'])
+
+    def test_get_batch_batch_size(self):
+        queue = AuditQueue(FakeODB(), batch_size=2)
+
+        for idx in range(5):
+            queue.put_request(get_request('cid{}'.format(idx)))
+
+        eq_([item['cid'] for _, item in queue.get_batch()], ['cid0', 'cid1'])
+        eq_([item['cid'] for _, item in queue.get_batch()], ['cid2', 'cid3'])
+        eq_(queue.queue.qsize(), 1)
+
+    def test_get_batch_flush_interval(self):
+        queue = AuditQueue(FakeODB(), batch_size=2, flush_interval=10)
+        queue.put_request(get_request('cid1'))
+
+        eq_([item['cid'] for _, item in queue.get_batch()], ['cid1'])
+
+    def test_drain_batch_size(self):
+        odb = FakeODB()
+        queue = AuditQueue(odb, batch_size=2)
+
+        for idx in range(5):
+            queue.put_request(get_request('cid{}'.format(idx)))
+
+        queue.drain()
+
+        eq_([len(requests) for requests, _ in odb.calls], [2, 2, 1])
+        eq_(queue.queue.qsize(), 0)
+
+    def test_stop(self):
+        odb = FakeODB()
+        queue = AuditQueue(odb)
+
+        queue.put_request(get_request('cid1'))
+        queue.put_response(get_response('cid1'))
+        queue.stop()
+
+        eq_(queue.keep_running, False)
+        eq_(queue.queue.qsize(), 0)
+        eq_([item['cid'] for item in odb.calls[0][0]], ['cid1'])
+
+    def test_overflow_block(self):
+        queue = AuditQueue(FakeODB(), max_size=1, overflow=AUDIT_LOG.OVERFLOW.BLOCK)
+        queue.put_request(get_request('cid1'))
+
+        with self.assertRaises(Timeout):
+            with Timeout(0.01):
+                queue.put_request(get_request('cid2'))
+
+        eq_(queue.queue.qsize(), 1)
+
+    def test_overflow_drop_oldest(self):
+        odb = FakeODB()
+        queue = AuditQueue(odb, max_size=2, overflow=AUDIT_LOG.OVERFLOW.DROP_OLDEST)
+
+        for idx in range(4):
+            queue.put_request(get_request('cid{}'.format(idx)))
+
+        eq_(queue.dropped, 2)
+
+        queue.drain()
+        eq_([item['cid'] for item in odb.calls[0][0]], ['cid2', 'cid3'])
+
+    def test_overflow_spill_to_file(self):
+        queue = AuditQueue(FakeODB(), max_size=1, overflow=AUDIT_LOG.OVERFLOW.SPILL_TO_FILE, spill_path=self.spill_path)
+
+        queue.put_request(get_request('cid1'))
+        queue.put_request(get_request('cid2'))
+        queue.put_response(get_response('cid2'))
+
+        eq_(queue.spilled, 2)
+        eq_(queue.queue.qsize(), 1)
+
+        lines = [loads(line) for line in open(self.spill_path)]
+
+        eq_([(line['type'], line['data']['cid']) for line in lines], [('request', 'cid2'), ('response', 'cid2')])
+
+    def test_flush_error(self):
+        queue = AuditQueue(FakeODB(Exception()), overflow=AUDIT_LOG.OVERFLOW.SPILL_TO_FILE, spill_path=self.spill_path)
+        queue.put_request(get_request('cid1'))
+        queue.drain()
+
+        eq_(queue.errors, 1)
+        eq_(queue.flushed, 0)
+        eq_(queue.spilled, 1)
+        eq_(len(open(self.spill_path).readlines()), 1)
+
+    def test_stats(self):
+        queue = AuditQueue(FakeODB(), max_size=10, batch_size=2)
+
+        for idx in range(3):
+            queue.put_request(get_request('cid{}'.format(idx)))
+
+        stats = queue.get_stats()
+        eq_(stats['depth'], 3)
+        eq_(stats['max_size'], 10)
+        eq_(stats['flushes'], 0)
+        eq_(stats['mean_flush_time'], 0.0)
+
+        queue.drain()
+
+        stats = queue.get_stats()
+        eq_(stats['depth'], 0)
+        eq_(stats['flushes'], 2)
+        eq_(stats['flushed'], 3)
+        eq_(stats['dropped'], 0)
+        eq_(stats['spilled'], 0)
+        eq_(stats['errors'], 0)
+        self.assertTrue(stats['max_flush_time'] >= stats['mean_flush_time'] >= 0)
+        self.assertTrue(stats['max_flush_time'] >= stats['last_flush_time'] >= 0)
+
+# ################################################################################################################################
+
+class ODBAuditSetManyTestCase(TestCase):
+
+    def test_audit_set_many_http_soap(self):
+        engine = create_engine('sqlite://')
+        HTTSOAPAudit.__table__.create(engine)
+
+        odb = ODBManager()
+        odb.session = sessionmaker(bind=engine)
+        odb.cluster = Bunch(id=123)
+
+        queue = AuditQueue(odb)
+        queue.put_request(get_request('cid1'))
+        queue.put_request(get_request('cid2'))
+        queue.put_response(get_response('cid1'))
+        queue.drain()
+
+        queue.put_response(get_response('cid2'))
+        queue.drain()
+
+        eq_(queue.errors, 0)
+
+        rows = engine.execute(HTTSOAPAudit.__table__.select().order_by('cid')).fetchall()
+
+        eq_([row.cid for row in rows], ['cid1', 'cid2'])
+        eq_([row.cluster_id for row in rows], [123, 123])
+        eq_([row.invoke_ok for row in rows], [True, True])
+        eq_([row.resp_payload for row in rows], [b'abc', b'abc'])
+        self.assertNotEquals(rows[0].id, rows[1].id)
+
+    def test_audit_set_many_http_soap_executemany(self):
+        session = MagicMock()
+        session.get_bind.return_value.dialect = Bunch(supports_sequences=True, supports_multivalues_insert=False)
+
+        odb = ODBManager()
+        odb.session = MagicMock(return_value=session)
+        odb.cluster = Bunch(id=123)
+
+        odb.audit_set_many_http_soap([get_request('cid1'), get_request('cid2')], [])
+
+        # The sequence is left to be fired by the database for each of the rows
+        _, params = session.execute.call_args[0]
+        eq_([item['cid'] for item in params], ['cid1', 'cid2'])
+        eq_(['id' in item for item in params], [False, False])
+        session.commit.assert_called_once_with()
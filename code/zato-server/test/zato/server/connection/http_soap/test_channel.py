@@ -29,10 +29,12 @@ from lxml import etree
 from nose.tools import eq_
 
 # Zato
-from zato.common import CHANNEL, DATA_FORMAT, SIMPLE_IO, URL_PARAMS_PRIORITY, URL_TYPE, zato_namespace, ZATO_NONE, ZATO_OK
+from zato.common import CHANNEL, DATA_FORMAT, SEC_DEF_TYPE, SIMPLE_IO, URL_PARAMS_PRIORITY, URL_TYPE, zato_namespace, ZATO_NONE, \
+     ZATO_OK
 from zato.common.test import rand_string
 from zato.common.util import new_cid
 from zato.server.connection.http_soap import channel
+from zato.server.connection.http_soap.stream import RequestBody
 from zato.server.service.internal import AdminService, Service
 
 # ##############################################################################
@@ -343,6 +345,56 @@ class TestRequestDispatcher(MessageHandlingBase):
         eq_(rd.request_handler.worker_store, worker_store)
         eq_(rd.request_handler.simple_io_config, simple_io_config)
 
+    def test_dispatch_streaming(self):
+
+        class DummyRequestHandler(object):
+            def handle(self, cid, url_match, channel_item, wsgi_environ, payload, worker_store, simple_io_config, post_data):
+                self.payload = payload
+                return Bunch(content_type='text/plain', headers={}, status_code=200, payload=iter([payload.read(4)]))
+
+        payload = uuid4().hex
+
+        for sec_type, sec_payload_expected, bytes_read_expected in (
+            (SEC_DEF_TYPE.BASIC_AUTH, None, 0),
+            (SEC_DEF_TYPE.WSS, payload, len(payload)),
+            ):
+
+            channel_item = Bunch()
+            channel_item.is_active = True
+            channel_item.is_streaming = True
+            channel_item.match_target = uuid4().hex
+            channel_item.audit_enabled = False
+            channel_item.method = ''
+
+            wsgi_environ = {
+                'PATH_INFO': uuid4().hex,
+                'wsgi.input': StringIO(payload),
+                'zato.http.response.headers': {},
+            }
+
+            ud = DummyURLData(Bunch(), channel_item)
+            ud.url_sec[channel_item.match_target] = Bunch(sec_def=Bunch(sec_type=sec_type))
+
+            rd = channel.RequestDispatcher(ud)
+            rd.request_handler = DummyRequestHandler()
+            response = rd.dispatch(new_cid(), None, wsgi_environ, None)
+
+            # Services get a file-like object to read the request from ..
+            body = rd.request_handler.payload
+            self.assertIsInstance(body, RequestBody)
+            self.assertIs(wsgi_environ['zato.http.request.body'], body)
+
+            # .. which security definitions read from only if they need to ..
+            if sec_payload_expected:
+                eq_(ud.payload, sec_payload_expected)
+            else:
+                self.assertIs(ud.payload, body)
+
+            eq_(body.bytes_read, bytes_read_expected or 4)
+
+            # .. and their responses are returned as they are.
+            eq_(list(response), [payload[:4]])
+
 # ##############################################################################
 
 class TestRequestHandler(TestCase):
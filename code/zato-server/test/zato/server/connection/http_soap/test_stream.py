@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (C) 2016 Dariusz Suchojad <dsuch at zato.io>
+
+Licensed under LGPLv3, see LICENSE.txt for terms and conditions.
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+# stdlib
+from cStringIO import StringIO
+from unittest import TestCase
+
+# nose
+from nose.tools import eq_
+
+# Zato
+from zato.server.connection.http_soap.stream import is_stream, iter_response, peek_response, RequestBody
+
+# ################################################################################################################################
+
+class ClosableStringIO(object):
+    def __init__(self, value):
+        self.buff = StringIO(value)
+        self.is_closed = False
+
+    def read(self, size=-1):
+        return self.buff.read(size)
+
+    def close(self):
+        self.is_closed = True
+
+# ################################################################################################################################
+
+class RequestBodyTestCase(TestCase):
+
+    def get_body(self, data=b'abcdefghij', **kwargs):
+        return RequestBody(StringIO(data), 4, **kwargs)
+
+    def test_read(self):
+        body = self.get_body()
+
+        eq_(body.read(3), b'abc')
+        eq_(body.bytes_read, 3)
+        eq_(body.read(), b'defghij')
+        eq_(body.read(), b'')
+        eq_(body.bytes_read, 10)
+
+    def test_peek(self):
+        body = self.get_body()
+
+        eq_(body.peek(3), b'abc')
+        eq_(body.peek(5), b'abcde')
+        eq_(body.bytes_read, 5)
+
+        # Peeked data is not consumed
+        eq_(body.read(2), b'ab')
+        eq_(body.read(6), b'cdefgh')
+        eq_(body.read(), b'ij')
+
+    def test_getvalue(self):
+        body = self.get_body()
+
+        eq_(body.getvalue(), b'abcdefghij')
+        eq_(body.read(), b'abcdefghij')
+
+    def test_iter(self):
+        eq_(list(self.get_body()), [b'abcd', b'efgh', b'ij'])
+
+        body = self.get_body()
+        body.peek(2)
+        eq_(list(body), [b'abcd', b'efgh', b'ij'])
+
+    def test_seek_no_spool(self):
+        self.assertRaises(IOError, self.get_body().seek, 0)
+
+    def test_spool(self):
+        body = self.get_body(spool=True, spool_threshold=1000)
+
+        eq_(body.bytes_read, 0)
+        eq_(body.peek(3), b'abc')
+        eq_(body.bytes_read, 10)
+
+        eq_(body.read(4), b'abcd')
+        eq_(list(body), [b'efgh', b'ij'])
+
+        # Spooled bodies can be read more than once
+        body.seek(0)
+        eq_(body.read(), b'abcdefghij')
+        eq_(body.getvalue(), b'')
+
+        body.close()
+
+    def test_spool_threshold(self):
+        body = self.get_body(spool=True, spool_threshold=1000)
+        body.peek()
+        self.assertFalse(body._spool_file._rolled)
+
+        body = self.get_body(spool=True, spool_threshold=5)
+        body.peek()
+        self.assertTrue(body._spool_file._rolled)
+        eq_(body.read(), b'abcdefghij')
+
+        body.close()
+
+# ################################################################################################################################
+
+class ResponseTestCase(TestCase):
+
+    def test_is_stream(self):
+        eq_(is_stream(b'abc'), False)
+        eq_(is_stream({'a': 'b'}), False)
+        eq_(is_stream(StringIO(b'abc')), True)
+        eq_(is_stream(elem for elem in 'abc'), True)
+
+    def test_iter_response_file(self):
+        response = ClosableStringIO(b'abcdefghij')
+        request_body = ClosableStringIO(b'')
+
+        eq_(list(iter_response(response, 4, request_body)), [b'abcd', b'efgh', b'ij'])
+        self.assertTrue(response.is_closed)
+        self.assertTrue(request_body.is_closed)
+
+    def test_iter_response_generator(self):
+
+        def get_response():
+            yield b'abc'
+            yield b''
+            yield '東京'
+
+        eq_(list(iter_response(get_response(), 4)), [b'abc', '東京'.encode('utf-8')])
+
+    def test_iter_response_client_gone(self):
+        response = ClosableStringIO(b'abcdefghij')
+        request_body = ClosableStringIO(b'')
+
+        chunks = iter_response(response, 4, request_body)
+        next(chunks)
+        chunks.close()
+
+        self.assertTrue(response.is_closed)
+        self.assertTrue(request_body.is_closed)
+
+    def test_peek_response(self):
+        chunks = iter([b'abcd', b'efgh', b'ij'])
+        head, chunks = peek_response(chunks, 6)
+
+        eq_(head, b'abcdef')
+        eq_(b''.join(chunks), b'abcdefghij')
+
+        head, chunks = peek_response(iter([b'ab']), 6)
+        eq_(head, b'ab')
+        eq_(list(chunks), [b'ab'])
@@ -9,6 +9,7 @@ Licensed under LGPLv3, see LICENSE.txt for terms and conditions.
 from __future__ import absolute_import, division, print_function, unicode_literals
 
 # stdlib
+from cStringIO import StringIO
 from unittest import TestCase
 from uuid import uuid4
 
@@ -22,10 +23,11 @@ from nose.tools import eq_
 from sortedcontainers import SortedList
 
 # Zato
-from zato.common import DATA_FORMAT, MISC, URL_TYPE, ZATO_NONE
+from zato.common import DATA_FORMAT, MISC, MSG_PATTERN_TYPE, URL_TYPE, ZATO_NONE
 from zato.common.test import rand_string
 from zato.common.util import new_cid, payload_from_request
 from zato.server.connection.http_soap import Unauthorized, url_data
+from zato.server.connection.http_soap.stream import RequestBody
 
 # ################################################################################################################################
 
@@ -224,6 +226,236 @@ class URLDataTestCase(TestCase):
         match, _ = ud.match('/customer/1 23/order/4 56', soap_action3)
         eq_(sorted(match.items()), [(u'cid', u'1 23'), (u'oid', u'4 56')])
 
+    def _get_channel_item(self, name, soap_action, url_path):
+        item = Bunch()
+        item.name = name
+        item.match_target = '{}{}{}'.format(soap_action, MISC.SEPARATOR, url_path)
+        item.match_target_compiled = url_data.Matcher(item.match_target)
+
+        return item
+
+    def test_match_precedence(self):
+        """ The channel with the lowest name wins if more than one matches, no matter if it's a static or a dynamic one.
+        """
+        ud = url_data.URLData([])
+
+        item1 = self._get_channel_item('name-1', '', '/customer/{cid}')
+        item2 = self._get_channel_item('name-2', '', '/customer/abc')
+        item3 = self._get_channel_item('name-3', '', '/customer/order-{oid}.json')
+        item4 = self._get_channel_item('name-0', '', '/customer/o.+r-123')
+
+        for item in item1, item2, item3:
+            ud.channel_data.add(item)
+
+        match, info = ud.match('/customer/abc', '')
+        eq_(sorted(match.items()), [('cid', 'abc')])
+        eq_(info.name, 'name-1')
+
+        match, info = ud.match('/customer/order-123.json', '')
+        eq_(sorted(match.items()), [('cid', 'order-123.json')])
+        eq_(info.name, 'name-1')
+
+        ud.channel_data.remove(item1)
+        ud.url_path_cache.clear()
+
+        match, info = ud.match('/customer/abc', '')
+        eq_(match, {})
+        eq_(info.name, 'name-2')
+
+        match, info = ud.match('/customer/order-123.json', '')
+        eq_(sorted(match.items()), [('oid', '123')])
+        eq_(info.name, 'name-3')
+
+        # A pattern requiring a regex in its literal parts is matched through its Matcher but still takes precedence
+        ud.channel_data.add(item4)
+        ud.url_path_cache.clear()
+
+        match, info = ud.match('/customer/order-123', '')
+        eq_(match, {})
+        eq_(info.name, 'name-0')
+
+        match, info = ud.match('/customer/order-123.json', '')
+        eq_(sorted(match.items()), [('oid', '123')])
+        eq_(info.name, 'name-3')
+
+    def test_match_soap_action(self):
+        ud = url_data.URLData([])
+
+        ud.channel_data.add(self._get_channel_item('name-1', 'action1', '/customer/{cid}'))
+        ud.channel_data.add(self._get_channel_item('name-2', 'action2', '/customer/{id}'))
+        ud.channel_data.add(self._get_channel_item('name-3', 'http://example.com/action3', '/customer/{cust_id}'))
+
+        match, info = ud.match('/customer/123', 'action2')
+        eq_(sorted(match.items()), [('id', '123')])
+        eq_(info.name, 'name-2')
+
+        match, info = ud.match('/customer/123', 'http://example.com/action3')
+        eq_(sorted(match.items()), [('cust_id', '123')])
+        eq_(info.name, 'name-3')
+
+        match, info = ud.match('/customer/123', 'action3')
+        self.assertIsNone(match)
+        self.assertIsNone(info)
+
+    def test_match_internal(self):
+        ud = url_data.URLData([])
+        ud.channel_data.add(self._get_channel_item('name-1', '', '/zato/{name}'))
+
+        match, info = ud.match('/zato/abc', '')
+        eq_(sorted(match.items()), [('name', 'abc')])
+        eq_(info.name, 'name-1')
+
+        match, info = ud.match('/zato//abc', '')
+        self.assertIsNone(match)
+
+    def test_match_url_path_cache(self):
+
+        ud = url_data.URLData([], url_path_cache_size=2)
+
+        item1 = self._get_channel_item('name-1', '', '/customer/{cid}')
+        item2 = self._get_channel_item('name-2', '', '/order/{oid}')
+
+        ud.channel_data.add(item1)
+        ud.channel_data.add(item2)
+
+        match, info = ud.match('/customer/123', '')
+        eq_(sorted(match.items()), [('cid', '123')])
+
+        # Dynamic URL paths are cached too and callers get their own copy of the match
+        match['abc'] = 'def'
+        match, info = ud.match('/customer/123', '')
+        eq_(sorted(match.items()), [('cid', '123')])
+        eq_(info.name, 'name-1')
+
+        ud.match('/order/1', '')
+        ud.match('/order/2', '')
+        ud.match('/foo', '')
+
+        stats = ud.get_url_path_cache_stats()
+        eq_(stats['size'], 2)
+        eq_(stats['max_size'], 2)
+        eq_(stats['lookups'], 5)
+        eq_(stats['hits'], 1)
+        eq_(stats['misses'], 4)
+        eq_(stats['evictions'], 1)
+
+    def test_router_add_remove(self):
+
+        router = url_data.Router()
+
+        item1 = self._get_channel_item('name-1', '', '/customer/{cid}/order/{oid}')
+        item2 = self._get_channel_item('name-2', '', '/customer/{cid}/order')
+        item3 = self._get_channel_item('name-3', '', '/cust(omer)?')
+
+        for item in item1, item2, item3:
+            router.add(item.match_target, item)
+
+        eq_(len(router), 3)
+        eq_(len(router.fallback), 1)
+
+        match, info = router.match('/customer/123/order/456', '', True)
+        eq_(sorted(match.items()), [('cid', '123'), ('oid', '456')])
+        eq_(info.name, 'name-1')
+
+        match, info = router.match('/cust', '', True)
+        eq_(match, {})
+        eq_(info.name, 'name-3')
+
+        router.remove(item1)
+        eq_(len(router), 2)
+
+        match, info = router.match('/customer/123/order/456', '', True)
+        self.assertIsNone(match)
+
+        match, info = router.match('/customer/123/order', '', True)
+        eq_(sorted(match.items()), [('cid', '123')])
+        eq_(info.name, 'name-2')
+
+        router.remove(item2)
+        router.remove(item3)
+        router.remove(item3)
+
+        eq_(len(router), 0)
+        eq_(router.roots, {})
+        eq_(len(router.fallback), 0)
+
+    def test_channel_data_router(self):
+
+        item1 = self._get_channel_item('name-1', '', '/customer/{cid}')
+        item2 = self._get_channel_item('name-2', '', '/order/{oid}')
+        item3 = self._get_channel_item('name-2', '', '/invoice/{iid}')
+
+        channel_data = url_data.ChannelData([item2, item1])
+        eq_(list(channel_data), [item1, item2])
+        eq_(len(channel_data.router), 2)
+
+        match, info = channel_data.router.match('/order/1', '', True)
+        eq_(info.name, 'name-2')
+
+        # An item replaced by another one leaves the number of items unchanged but the router still follows it
+        channel_data.pop(channel_data.index(item2))
+        channel_data.add(item3)
+
+        eq_(len(channel_data), 2)
+        eq_(channel_data[1], item3)
+
+        match, info = channel_data.router.match('/order/1', '', True)
+        self.assertIsNone(match)
+
+        match, info = channel_data.router.match('/invoice/1', '', True)
+        eq_(sorted(match.items()), [('iid', '1')])
+        self.assertIs(info, item3)
+
+        channel_data.remove(item1)
+        eq_(len(channel_data.router), 1)
+
+        match, info = channel_data.router.match('/customer/1', '', True)
+        self.assertIsNone(match)
+
+    def test_on_broker_msg_CHANNEL_HTTP_SOAP_router(self):
+
+        ud = url_data.URLData([])
+        ud.url_sec = {}
+        ud._sec_info_from_msg = lambda msg: None
+
+        msg = Bunch()
+        for name in('connection', 'content_type', 'data_format', 'host', 'id', 'has_rbac', 'impl_name', 'is_active',
+            'is_internal', 'merge_url_params_req', 'method', 'params_pri', 'ping_method', 'pool_size', 'service_id',
+            'service_name', 'soap_version', 'transport', 'url_params_pri'):
+            msg[name] = None
+
+        msg.name = 'name-1'
+        msg.soap_action = ''
+        msg.url_path = '/customer/{cid}'
+
+        ud.on_broker_msg_CHANNEL_HTTP_SOAP_CREATE_EDIT(msg)
+        eq_(len(ud.router), 1)
+
+        match, _ = ud.match('/customer/123', '')
+        eq_(sorted(match.items()), [('cid', '123')])
+
+        msg.old_name = msg.name
+        msg.old_soap_action = msg.soap_action
+        msg.old_url_path = msg.url_path
+        msg.url_path = '/customer/{cust_id}'
+
+        # Cached URL paths are forgotten whenever channels change
+        ud.on_broker_msg_CHANNEL_HTTP_SOAP_CREATE_EDIT(msg)
+        eq_(len(ud.router), 1)
+        eq_(ud.get_url_path_cache_stats()['size'], 0)
+
+        match, _ = ud.match('/customer/123', '')
+        eq_(sorted(match.items()), [('cust_id', '123')])
+
+        msg.old_url_path = msg.url_path
+        ud.match('/customer/123', '')
+        ud.on_broker_msg_CHANNEL_HTTP_SOAP_DELETE(msg)
+        eq_(len(ud.router), 0)
+        eq_(ud.get_url_path_cache_stats()['size'], 0)
+
+        match, _ = ud.match('/customer/123', '')
+        self.assertIsNone(match)
+
 # ################################################################################################################################
 
     def test_check_security(self):
@@ -401,17 +633,20 @@ class URLDataTestCase(TestCase):
         sec1.name = uuid4().hex
         sec1.sec_type = uuid4().hex
         sec1.security_name = uuid4().hex
+        sec1.match_target = '{}/{}'.format(MISC.SEPARATOR, sec1.name)
 
         sec2 = Bunch()
         sec2.name = uuid4().hex
         sec2.sec_type = uuid4().hex
         sec2.security_name = uuid4().hex
+        sec2.match_target = '{}/{}'.format(MISC.SEPARATOR, sec2.name)
 
         ud = url_data.URLData(channel_data=[sec1, sec2])
         eq_(len(ud.channel_data), 2)
 
         ud._delete_channel_data(sec1.sec_type, sec1.security_name)
         eq_(len(ud.channel_data), 1)
+        eq_(len(ud.router), 1)
 
         channel_data = ud.channel_data[0]
         eq_(channel_data.sec_type, sec2.sec_type)
@@ -1411,7 +1646,8 @@ class URLDataTestCase(TestCase):
             for name in('connection', 'data_format', 'has_rbac', 'host', 'id', 'is_active', 'is_internal', 'method', 'name',
                 'ping_method', 'pool_size', 'service_id', 'impl_name', 'service_name', 'soap_action', 'soap_version',
                 'transport', 'url_path', 'merge_url_params_req', 'url_params_pri', 'params_pri', 'audit_max_payload',
-                'audit_repl_patt_type', 'replace_patterns_json_pointer', 'replace_patterns_xpath', 'content_type'):
+                'audit_repl_patt_type', 'replace_patterns_json_pointer', 'replace_patterns_xpath', 'content_type',
+                'is_streaming'):
                 msg[name] = uuid4().hex
 
             if needs_security_id:
@@ -1431,15 +1667,15 @@ class URLDataTestCase(TestCase):
                 'is_internal', 'method', 'name', 'ping_method', 'pool_size',
                 'service_id', 'impl_name', 'service_name',
                 'soap_action', 'soap_version', 'transport', 'url_path',
-                'merge_url_params_req', 'url_params_pri', 'params_pri'):
+                'merge_url_params_req', 'url_params_pri', 'params_pri', 'is_streaming'):
                 eq_(msg[name], channel_item[name])
 
             if needs_security_id:
-                eq_(len(channel_item.keys()), 33)
+                eq_(len(channel_item.keys()), 34)
                 for name in('sec_type', 'security_id', 'security_name'):
                     eq_(msg[name], channel_item[name])
             else:
-                eq_(len(channel_item.keys()), 30)
+                eq_(len(channel_item.keys()), 31)
 
         for needs_security_id in(True, False):
             msg = get_msg(needs_security_id)
@@ -1610,3 +1846,37 @@ class URLDataTestCase(TestCase):
         eq_(dummy_lock.enter_called, True)
 
 # ################################################################################################################################
+
+class FakeAuditQueue(object):
+    def __init__(self):
+        self.requests = []
+
+    def put_request(self, request):
+        self.requests.append(request)
+
+class AuditStreamingTestCase(TestCase):
+
+    def get_channel_item(self, audit_max_payload, replace_patterns_xpath):
+        return Bunch(id=1, name='my.channel', transport=URL_TYPE.PLAIN_HTTP, connection='channel',
+            audit_max_payload=audit_max_payload, audit_repl_patt_type=MSG_PATTERN_TYPE.XPATH.id, replace_patterns_json_pointer=[],
+            replace_patterns_xpath=replace_patterns_xpath)
+
+    def test_audit_set_request_streaming(self):
+        audit_queue = FakeAuditQueue()
+        ud = url_data.URLData(audit_queue=audit_queue)
+
+        for audit_max_payload, replace_patterns_xpath, expected in (
+            (3, [], b'abc'),
+            (0, [], b'abcd'),
+            (3, ['my.pattern'], ''),
+            ):
+
+            body = RequestBody(StringIO(b'abcdefghij'), 4)
+            ud.audit_set_request(new_cid(), self.get_channel_item(audit_max_payload, replace_patterns_xpath), body, {})
+
+            eq_(audit_queue.requests[-1]['req_payload'], expected)
+
+            # Audit log did not consume any of the request
+            eq_(body.read(), b'abcdefghij')
+
+# ################################################################################################################################
@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (C) 2016 Dariusz Suchojad <dsuch at zato.io>
+
+Licensed under LGPLv3, see LICENSE.txt for terms and conditions.
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+# stdlib
+import asyncore, smtpd
+from threading import Thread
+from unittest import TestCase
+
+# Bunch
+from bunch import Bunch
+
+# nose
+from nose.tools import eq_
+
+# Zato
+from zato.common import EMAIL, SMTPMessage
+from zato.server.connection.email import SMTPConnection
+
+# ################################################################################################################################
+
+class SMTPServer(smtpd.SMTPServer):
+    """ A local SMTP server that keeps all the messages it receives in RAM.
+    """
+    def __init__(self):
+        smtpd.SMTPServer.__init__(self, (b'127.0.0.1', 0), None)
+        self.port = self.socket.getsockname()[1]
+        self.messages = []
+        self.channels = []
+
+    @property
+    def sessions(self):
+        return len(self.channels)
+
+    def handle_accept(self):
+        pair = self.accept()
+        if pair is not None:
+            self.channels.append(smtpd.SMTPChannel(self, *pair))
+
+    def stop(self):
+        self.close()
+        for channel in self.channels:
+            channel.close()
+
+    def process_message(self, peer, mail_from, rcpt_to, data):
+        self.messages.append((mail_from, rcpt_to, data))
+
+def get_config(port):
+    return Bunch(host='127.0.0.1', port=port, mode=EMAIL.SMTP.MODE.PLAIN.value, mode_outbox=None, is_debug=False, timeout=5,
+        username='', password='')
+
+def get_message(idx):
+    return SMTPMessage('from@example.com', 'to{}@example.com'.format(idx), 'Subject {}'.format(idx), 'Body {}'.format(idx))
+
+# ################################################################################################################################
+
+class SMTPConnectionTestCase(TestCase):
+
+    def setUp(self):
+        self.server = SMTPServer()
+        self.keep_running = True
+        self.thread = Thread(target=self.run_server)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def tearDown(self):
+        self.keep_running = False
+        self.server.stop()
+        self.thread.join(1)
+
+    def run_server(self):
+        # Servers may be replaced during tests so, unlike asyncore.loop, this one does not stop if there are none for a moment
+        while self.keep_running:
+            asyncore.loop(0.01, count=1)
+
+    def get_conn(self, **pool_config):
+        config = get_config(self.server.port)
+        return SMTPConnection(config, config, pool_config)
+
+    def test_send(self):
+        conn = self.get_conn()
+
+        eq_(conn.send(get_message(1)), True)
+        eq_(conn.send(get_message(2)), True)
+        conn.close()
+
+        eq_(self.server.sessions, 1)
+        eq_([elem[1] for elem in self.server.messages], [['to1@example.com'], ['to2@example.com']])
+        self.assertIn('Subject: Subject 1', self.server.messages[0][2])
+
+    def test_send_many(self):
+        conn = self.get_conn()
+
+        messages = [get_message(idx) for idx in range(20)]
+        messages[5].to = [] # No recipients, cannot be sent
+
+        results = conn.send_many(messages)
+        conn.close()
+
+        eq_(results, [idx != 5 for idx in range(20)])
+        eq_(len(self.server.messages), 19)
+        eq_(self.server.sessions, 1)
+
+    def test_idle_timeout(self):
+        conn = self.get_conn(idle_timeout=-1)
+
+        conn.send(get_message(1))
+        conn.send(get_message(2))
+        conn.close()
+
+        eq_(len(self.server.messages), 2)
+        eq_(self.server.sessions, 2)
+
+    def test_reconnect(self):
+        conn = self.get_conn(ping_after=3600)
+        conn.send(get_message(1))
+
+        # The server goes away while the session is idle and another one is started in its place
+        self.server.stop()
+        self.server = SMTPServer()
+
+        conn.port = self.server.port
+        eq_(conn.send(get_message(2)), True)
+        conn.close()
+
+        eq_(len(self.server.messages), 1)
+        eq_(self.server.sessions, 1)
+
+    def test_ping(self):
+        conn = self.get_conn(ping_after=-1)
+        conn.send(get_message(1))
+
+        self.server.stop()
+        self.server = SMTPServer()
+
+        conn.port = self.server.port
+        eq_(conn.send(get_message(2)), True)
+        conn.close()
+
+        eq_(len(self.server.messages), 1)
+
+    def test_connect_error(self):
+        port = self.server.port
+        self.server.stop()
+
+        conn = SMTPConnection(get_config(port), get_config(port))
+        eq_(conn.send_many([get_message(1), get_message(2)]), [False, False])
@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (C) 2016 Dariusz Suchojad <dsuch at zato.io>
+
+Licensed under LGPLv3, see LICENSE.txt for terms and conditions.
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+# stdlib
+from json import loads
+from unittest import TestCase
+
+# Bunch
+from bunch import Bunch
+
+# mock
+from mock import MagicMock
+
+# nose
+from nose.tools import eq_
+
+# Zato
+from zato.common import KVDB
+from zato.common.test import FakeServer
+from zato.server.connection import slow_response
+from zato.server.connection.request_response import ResponseAccumulator, should_store
+from zato.server.service import Service
+
+# ################################################################################################################################
+
+class FakePipeline(object):
+    def __init__(self, conn):
+        self.conn = conn
+        self.commands = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *ignored):
+        pass
+
+    def __getattr__(self, name):
+        def _command(*args):
+            self.commands.append((name,) + args)
+        return _command
+
+    def execute(self):
+        self.conn.executed.append(self.commands)
+
+class FakeConn(object):
+    def __init__(self):
+        self.executed = []
+        self.hget_calls = []
+        self.data = {}
+
+    def pipeline(self):
+        return FakePipeline(self)
+
+    def hget(self, key, field):
+        self.hget_calls.append((key, field))
+        return self.data.get(key, {}).get(field)
+
+# ################################################################################################################################
+
+class ShouldStoreTestCase(TestCase):
+
+    def test_should_store(self):
+        eq_(should_store(10, 0), False)
+        eq_(should_store(10, 3), False)
+        eq_(should_store(9, 3), True)
+
+# ################################################################################################################################
+
+class ResponseAccumulatorTestCase(TestCase):
+
+    def test_flush_nothing(self):
+        conn = FakeConn()
+        ResponseAccumulator(conn).flush()
+
+        eq_(conn.executed, [])
+
+    def test_flush(self):
+        conn = FakeConn()
+        acc = ResponseAccumulator(conn)
+
+        acc.on_sample('my.service', 3, 3, cid='cid1')
+        acc.on_sample('my.service', 6, 3, cid='cid2') # Only the latest sample is kept
+        acc.on_slow_response('my.service', cid='cid1')
+        acc.on_slow_response('my.service', cid='cid2')
+
+        acc.flush()
+
+        eq_(len(conn.executed), 1)
+        commands = conn.executed[0]
+
+        sample_key = '{}my.service'.format(KVDB.REQ_RESP_SAMPLE)
+        slow_key = '{}my.service'.format(KVDB.RESP_SLOW)
+
+        eq_(commands[0], ('hmset', sample_key, {'cid': 'cid2'}))
+        eq_([(elem[0], elem[1]) for elem in commands[1:]], [('lpush', slow_key), ('ltrim', slow_key)] * 2)
+        eq_([loads(elem[2])['cid'] for elem in commands[1:] if elem[0] == 'lpush'], ['cid1', 'cid2'])
+
+        # Everything has been flushed already
+        acc.flush()
+        eq_(len(conn.executed), 1)
+
+    def test_stop(self):
+        conn = FakeConn()
+        acc = ResponseAccumulator(conn)
+
+        acc.on_sample('my.service', 3, 3, cid='cid1')
+
+        # Responses not flushed yet are written out when stopping
+        acc.stop()
+        eq_(acc.keep_running, False)
+        eq_(len(conn.executed), 1)
+
+    def test_slow_responses_max(self):
+        conn = FakeConn()
+        acc = ResponseAccumulator(conn)
+
+        for idx in range(slow_response.MAX_RESPONSES + 10):
+            acc.on_slow_response('my.service', cid=str(idx))
+
+        acc.flush()
+
+        pushed = [loads(elem[2])['cid'] for elem in conn.executed[0] if elem[0] == 'lpush']
+        eq_(len(pushed), slow_response.MAX_RESPONSES)
+        eq_(pushed[0], '10')
+        eq_(pushed[-1], str(slow_response.MAX_RESPONSES + 9))
+
+# ################################################################################################################################
+
+class ServiceSampleFreqTestCase(TestCase):
+
+    def get_service(self, services, conn):
+        service = Service()
+        service.server = FakeServer()
+        service.server.service_store.services = services
+        service.worker_store = MagicMock()
+        service.worker_store.kvdb = Bunch(conn=conn)
+        service.worker_store.worker_config.outgoing_connections = MagicMock(return_value=(None, None, None, None))
+        service.wsgi_environ = {}
+
+        return service
+
+    def test_freq_cached(self):
+        conn = FakeConn()
+        conn.data['{}{}'.format(KVDB.REQ_RESP_SAMPLE, Service.get_name())] = {'freq': '5'}
+
+        services = {Service.get_impl_name(): {'slow_threshold': 100}}
+
+        for idx in range(3):
+            service = self.get_service(services, conn)
+            service._init()
+            eq_(service.sample_req_resp_freq, 5)
+            eq_(service.slow_threshold, 100)
+
+        # KVDB was consulted only once
+        eq_(len(conn.hget_calls), 1)
+
+        # Updated through a broker message
+        services[Service.get_impl_name()]['sample_req_resp_freq'] = 0
+
+        service = self.get_service(services, conn)
+        service._init()
+        eq_(service.sample_req_resp_freq, 0)
+        eq_(len(conn.hget_calls), 1)
@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (C) 2016 Dariusz Suchojad <dsuch at zato.io>
+
+Licensed under LGPLv3, see LICENSE.txt for terms and conditions.
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+# stdlib
+import os, sys
+from datetime import datetime
+from shutil import rmtree
+from tempfile import mkdtemp
+from timeit import default_timer
+
+# Bunch
+from bunch import Bunch
+
+# SQLAlchemy
+from sqlalchemy import create_engine
+from sqlalchemy.exc import IntegrityError
+
+# Zato
+from zato.common import SourceInfo
+from zato.common.odb.model import Base, DeployedService, Service
+
+# Test helpers, this file is in the same directory
+from test_store import get_odb
+
+# ################################################################################################################################
+
+# Compares how long it takes to register services in ODB when a server with several workers starts. Before is how
+# each service used to be added, one by one, with a commit per Service and DeployedService each, and a rollback
+# and another query if the service already existed. After is all of the services added at once.
+#
+# Each run consists of the server's very first start, with no services in ODB yet, followed by a restart
+# during which each of the workers registers all the services again.
+#
+# Run as: python bench_store.py [services] [workers]
+
+# ################################################################################################################################
+
+def get_services(count):
+    source_info = SourceInfo()
+    source_info.source = b'# ' * 5000
+    source_info.path = '/opt/zato/services.py'
+    source_info.hash = 'abc'
+    source_info.hash_method = 'SHA-256'
+
+    services = []
+
+    for idx in range(count):
+        services.append(Bunch(name='my.service.{}'.format(idx), impl_name='my.module.MyService{}'.format(idx),
+            is_internal=False, deployment_time=datetime.utcnow(), details='{}', source_info=source_info))
+
+    return services
+
+def add_service(odb, item):
+    """ How ODBManager.add_service and add_deployed_service used to store a single service.
+    """
+    session = odb._session
+    source_info = item.source_info
+
+    service = Service(None, item.name, True, item.impl_name, item.is_internal, odb.cluster)
+    session.add(service)
+    try:
+        session.commit()
+    except IntegrityError:
+        session.rollback()
+        service = session.query(Service).\
+            filter(Service.name==item.name).\
+            filter(Service.cluster_id==odb.cluster.id).\
+            one()
+
+    ds = DeployedService(item.deployment_time, item.details, odb.server.id, service,
+        source_info.source, source_info.path, source_info.hash, source_info.hash_method)
+    session.add(ds)
+    try:
+        session.commit()
+    except IntegrityError:
+        session.rollback()
+        ds = session.query(DeployedService).\
+            filter(DeployedService.service_id==service.id).\
+            filter(DeployedService.server_id==odb.server.id).\
+            one()
+
+        ds.deployment_time = item.deployment_time
+        ds.details = item.details
+        ds.source = source_info.source
+        ds.source_path = source_info.path
+        ds.source_hash = source_info.hash
+        ds.source_hash_method = source_info.hash_method
+
+        session.add(ds)
+        session.commit()
+
+    return service.id, service.is_active, service.slow_threshold
+
+def before(odb, services):
+    for item in services:
+        add_service(odb, item)
+
+def after(odb, services):
+    odb.add_services(services)
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else 2
+
+    services = get_services(count)
+
+    print('{:>10} {:>12} {:>12} {:>20}'.format('', 'Services', 'Workers', 'Total time (s)'))
+
+    for name, func in (('Before', before), ('After', after)):
+        dir_name = mkdtemp(prefix='zato-bench-store')
+
+        try:
+            engine = create_engine('sqlite:///{}'.format(os.path.join(dir_name, 'odb.db')))
+            Base.metadata.create_all(engine)
+
+            odb = get_odb(engine, 'server1')
+
+            start = default_timer()
+
+            # First start ..
+            func(odb, services)
+
+            # .. and a restart.
+            odb.drop_deployed_services(odb.server.id)
+            for idx in range(workers):
+                func(odb, services)
+
+            total = default_timer() - start
+
+            print('{:>10} {:>12} {:>12} {:>20.2f}'.format(name, count, workers, total))
+
+        finally:
+            rmtree(dir_name)
+
+if __name__ == '__main__':
+    main()
@@ -19,6 +19,7 @@ from zato.common import zato_namespace
 from zato.common.broker_message import CHANNEL, MESSAGE_TYPE
 from zato.common.odb.model import ChannelAMQP, Service
 from zato.common.test import rand_bool, rand_int, rand_string, ServiceTestCase
+from zato.server.service.internal import search_input_optional
 from zato.server.service.internal.channel.amqp import Create, Edit, Delete, GetList
 
 # ##############################################################################
@@ -49,7 +50,8 @@ class GetListTestCase(ServiceTestCase):
         self.sio = self.service_class.SimpleIO
 
     def get_request_data(self):
-        return {'cluster_id': rand_int()}
+        return {'cluster_id': rand_int(), 'current_batch': str(rand_int()), 'batch_size': rand_int(), 'query': rand_string(),
+            'sort_by': rand_string(), 'sort_order': rand_string()}
 
     def get_response_data(self):
         return Bunch(
@@ -65,7 +67,7 @@ class GetListTestCase(ServiceTestCase):
         self.assertEquals(self.sio.output_required, ('id', 'name', 'is_active', 'queue', 'consumer_tag_prefix',
             'def_name', 'def_id', 'service_name', 'data_format'))
         self.assertEquals(self.sio.namespace, zato_namespace)
-        self.assertRaises(AttributeError, getattr, self.sio, 'input_optional')
+        self.assertEquals(self.sio.input_optional, search_input_optional)
         self.assertRaises(AttributeError, getattr, self.sio, 'output_optional')
 
     def test_impl(self):
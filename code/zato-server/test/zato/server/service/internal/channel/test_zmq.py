@@ -14,6 +14,7 @@ from bunch import Bunch
 # Zato
 from zato.common import zato_namespace
 from zato.common.test import rand_bool, rand_int, rand_string, ServiceTestCase
+from zato.server.service.internal import search_input_optional
 from zato.server.service.internal.channel.zmq import Create, Edit, Delete, GetList
 
 ################################################################################
@@ -41,7 +42,7 @@ class GetListTestCase(ServiceTestCase):
         self.assertEquals(self.sio.output_required, ('id', 'name', 'is_active', 'address', 'socket_type', 'service_name', 'data_format'))
         self.assertEquals(self.sio.output_optional, ('sub_key',))
         self.assertEquals(self.sio.namespace, zato_namespace)
-        self.assertRaises(AttributeError, getattr, self.sio, 'input_optional')
+        self.assertEquals(self.sio.input_optional, search_input_optional)
 
     def test_impl(self):
         self.assertEquals(self.service_class.get_name(), 'zato.channel.zmq.get-list')
@@ -14,6 +14,7 @@ from bunch import Bunch
 # Zato
 from zato.common import zato_namespace
 from zato.common.test import rand_bool, rand_int, rand_string, ServiceTestCase
+from zato.server.service.internal import search_input_optional
 from zato.server.service.internal.definition.amqp import GetList, GetByID, Create, Edit, Delete, ChangePassword
 
 ################################################################################
@@ -41,7 +42,7 @@ class GetListTestCase(ServiceTestCase):
         self.assertEquals(self.sio.output_required, ('id', 'name', 'host', 'port', 'vhost', 'username', 'frame_max', 'heartbeat'))
         self.assertEquals(self.sio.output_repeated, (True))
         self.assertEquals(self.sio.namespace, zato_namespace)
-        self.assertRaises(AttributeError, getattr, self.sio, 'input_optional')
+        self.assertEquals(self.sio.input_optional, search_input_optional)
         self.assertRaises(AttributeError, getattr, self.sio, 'output_optional')
 
     def test_impl(self):
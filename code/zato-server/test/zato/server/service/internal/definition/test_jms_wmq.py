@@ -15,6 +15,7 @@ from bunch import Bunch
 from zato.common import zato_namespace
 from zato.common.test import rand_bool, rand_int, rand_string, ServiceTestCase
 from zato.server.service import Boolean, Integer
+from zato.server.service.internal import search_input_optional
 from zato.server.service.internal.definition.jms_wmq import Create, GetByID, Edit, Delete, GetList
 
 ################################################################################
@@ -50,7 +51,7 @@ class GetListTestCase(ServiceTestCase):
                                                      self.wrap_force_type(Integer('max_chars_printed'))))
         self.assertEquals(self.sio.output_optional,('ssl_cipher_spec', 'ssl_key_repository'))
         self.assertEquals(self.sio.namespace, zato_namespace)
-        self.assertRaises(AttributeError, getattr, self.sio, 'input_optional')
+        self.assertEquals(self.sio.input_optional, search_input_optional)
 
     def test_impl(self):
         self.assertEquals(self.service_class.get_name(), 'zato.definition.jms-wmq.get-list')
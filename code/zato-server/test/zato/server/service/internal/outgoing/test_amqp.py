@@ -15,6 +15,7 @@ from bunch import Bunch
 from zato.common import zato_namespace
 from zato.common.test import rand_bool, rand_int, rand_string, ServiceTestCase
 from zato.server.service import AsIs, Integer
+from zato.server.service.internal import search_input_optional
 from zato.server.service.internal.outgoing.amqp import Create, Edit, Delete, GetList
 
 ##############################################################################
@@ -45,7 +46,7 @@ class GetListTestCase(ServiceTestCase):
         self.assertEquals(self.sio.output_optional, ('content_type', 'content_encoding', 'expiration',
             self.wrap_force_type(AsIs('user_id')), self.wrap_force_type(AsIs('app_id'))))
         self.assertEquals(self.sio.namespace, zato_namespace)
-        self.assertRaises(AttributeError, getattr, self.sio, 'input_optional')
+        self.assertEquals(self.sio.input_optional, search_input_optional)
 
     def test_impl(self):
         self.assertEquals(self.service_class.get_name(), 'zato.outgoing.amqp.get-list')
@@ -15,6 +15,7 @@ from bunch import Bunch
 from zato.common import zato_namespace
 from zato.common.test import rand_bool, rand_int, rand_string, ServiceTestCase
 from zato.server.service import Boolean
+from zato.server.service.internal import search_input_optional
 from zato.server.service.internal.outgoing.ftp import GetList, Create, Edit, Delete, ChangePassword
 
 ##############################################################################
@@ -42,7 +43,7 @@ class GetListTestCase(ServiceTestCase):
         self.assertEquals(self.sio.output_required, ('id', 'name', 'is_active', 'host', 'port'))
         self.assertEquals(self.sio.output_optional, ('user', 'acct', 'timeout', self.wrap_force_type(Boolean('dircache'))))
         self.assertEquals(self.sio.namespace, zato_namespace)
-        self.assertRaises(AttributeError, getattr, self.sio, 'input_optional')
+        self.assertEquals(self.sio.input_optional, search_input_optional)
 
     def test_impl(self):
         self.assertEquals(self.service_class.get_name(), 'zato.outgoing.ftp.get-list')
@@ -15,6 +15,7 @@ from bunch import Bunch
 from zato.common import zato_namespace
 from zato.common.test import rand_bool, rand_int, rand_string, ServiceTestCase
 from zato.server.service import Boolean, Integer
+from zato.server.service.internal import search_input_optional
 from zato.server.service.internal.security.wss import GetList, Create, Edit, ChangePassword, Delete
 
 ################################################################################
@@ -44,7 +45,7 @@ class GetListTestCase(ServiceTestCase):
                                                      self.wrap_force_type(Integer('reject_expiry_limit')),
                                                      self.wrap_force_type(Integer('nonce_freshness_time'))))
         self.assertEquals(self.sio.namespace, zato_namespace)
-        self.assertRaises(AttributeError, getattr, self.sio, 'input_optional')
+        self.assertEquals(self.sio.input_optional, search_input_optional)
         self.assertRaises(AttributeError, getattr, self.sio, 'output_optional')
         self.assertRaises(AttributeError, getattr, self.sio, 'output_repeated')
 
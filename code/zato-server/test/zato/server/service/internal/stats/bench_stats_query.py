@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (C) 2016 Dariusz Suchojad <dsuch at zato.io>
+
+Licensed under LGPLv3, see LICENSE.txt for terms and conditions.
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+# stdlib
+import sys
+from datetime import datetime, timedelta
+from fnmatch import fnmatchcase
+from timeit import default_timer
+
+# Bunch
+from bunch import Bunch
+
+# Zato
+from zato.common import KVDB
+from zato.server.service.internal.stats import StatsReturningService
+from zato.server.stats import get_index_key
+
+# ################################################################################################################################
+
+# Compares how long it takes to read an hour of per-minute statistics of all services using KEYS (before)
+# and per-minute indexes (after). Apart from the overall time, the longest single call to KVDB is reported,
+# which is for how long KVDB could not serve anyone else, e.g. the broker or pub/sub.
+#
+# Run as: python bench_stats_query.py [services minutes [redis-host:redis-port]]
+#
+# Without a Redis address, an in-memory connection is used whose KEYS walks the whole keyspace just like Redis does.
+# When using Redis, make sure db 15 can be overwritten.
+
+# ################################################################################################################################
+
+class MemoryPipeline(object):
+    def __init__(self, conn):
+        self.conn = conn
+        self.commands = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *ignored):
+        pass
+
+    def __getattr__(self, name):
+        def _command(*args):
+            self.commands.append((name, args))
+        return _command
+
+    def execute(self):
+        return [getattr(self.conn, name)(*args) for name, args in self.commands]
+
+class MemoryConn(object):
+    def __init__(self):
+        self.data = {}
+
+    def keys(self, pattern):
+        return [key for key in self.data if fnmatchcase(key, pattern)]
+
+    def hgetall(self, key):
+        return self.data.get(key, {})
+
+    def hmset(self, key, value):
+        self.data[key] = value
+
+    def smembers(self, key):
+        return self.data.get(key, set())
+
+    def sadd(self, key, *values):
+        self.data.setdefault(key, set()).update(values)
+
+    def pipeline(self, *ignored_args, **ignored_kwargs):
+        return MemoryPipeline(self)
+
+# ################################################################################################################################
+
+class TimingPipeline(object):
+    def __init__(self, conn, pipe):
+        self.conn = conn
+        self.pipe = pipe
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *ignored):
+        pass
+
+    def __getattr__(self, name):
+        return getattr(self.pipe, name)
+
+    def execute(self):
+        return self.conn.timed(self.pipe.execute)
+
+class TimingConn(object):
+    """ Keeps track of the longest call to KVDB.
+    """
+    def __init__(self, conn):
+        self.conn = conn
+        self.max_time = 0
+
+    def timed(self, func, *args):
+        start = default_timer()
+        out = func(*args)
+        self.max_time = max(self.max_time, default_timer() - start)
+        return out
+
+    def keys(self, pattern):
+        return self.timed(self.conn.keys, pattern)
+
+    def hgetall(self, key):
+        return self.timed(self.conn.hgetall, key)
+
+    def pipeline(self, *args, **kwargs):
+        return TimingPipeline(self, self.conn.pipeline(*args, **kwargs))
+
+# ################################################################################################################################
+
+def populate(conn, services, minutes, now):
+    """ Stores per-minute statistics of that many services for that many minutes, along with their indexes.
+    """
+    values = {'usage': '10', 'mean': '5.0', 'min': '1', 'max': '9', 'rate': '0.17'}
+    prefix = KVDB.SERVICE_TIME_AGGREGATED_BY_MINUTE
+    names = ['zato.bench.service{}'.format(idx) for idx in range(services)]
+
+    for idx in range(minutes):
+        suffix = (now - timedelta(minutes=idx)).strftime('%Y:%m:%d:%H:%M')
+        with conn.pipeline(transaction=False) as pipe:
+            for name in names:
+                pipe.hmset('{}{}:{}'.format(prefix, name, suffix), values)
+            pipe.sadd(get_index_key(prefix, suffix), *names)
+            pipe.execute()
+
+def before(conn, suffixes):
+    """ How StatsReturningService.get_stats used to read statistics.
+    """
+    prefix = KVDB.SERVICE_TIME_AGGREGATED_BY_MINUTE
+    service_names = set()
+
+    for suffix in suffixes:
+        for key in conn.keys('{}*:{}'.format(prefix, suffix)):
+            service_names.add(key.replace(prefix, '').replace(':{}'.format(suffix), ''))
+
+    for service_name in service_names:
+        for suffix in suffixes:
+            conn.hgetall('{}{}:{}'.format(prefix, service_name, suffix))
+
+    return len(service_names)
+
+def after(conn, start, stop):
+    service = StatsReturningService()
+    service.server = Bunch(kvdb=Bunch(conn=conn))
+
+    return len(list(service.get_stats(start.isoformat(), stop.isoformat(), needs_trends=False)))
+
+def main():
+    services = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    minutes = int(sys.argv[2]) if len(sys.argv) > 2 else 1440
+
+    if len(sys.argv) > 3:
+        from redis import StrictRedis
+        host, port = sys.argv[3].split(':')
+        conn = StrictRedis(host, int(port), db=15)
+        conn.flushdb()
+    else:
+        conn = MemoryConn()
+
+    now = datetime.utcnow().replace(second=0, microsecond=0)
+    populate(conn, services, minutes, now)
+
+    # The last hour, just like web-admin's default view
+    start = now - timedelta(minutes=59)
+    stop = now + timedelta(minutes=1)
+    suffixes = StatsReturningService().get_suffixes(start, stop)
+
+    print('{:>10} {:>12} {:>20} {:>20}'.format('', 'Services', 'Total time (s)', 'Longest call (ms)'))
+
+    for name, func, args in (('Before', before, (suffixes,)), ('After', after, (start, stop))):
+        timing_conn = TimingConn(conn)
+
+        begin = default_timer()
+        found = func(timing_conn, *args)
+        total = default_timer() - begin
+
+        print('{:>10} {:>12} {:>20.2f} {:>20.2f}'.format(name, found, total, timing_conn.max_time * 1000))
+
+if __name__ == '__main__':
+    main()
@@ -11,6 +11,12 @@ from __future__ import absolute_import, division, print_function, unicode_litera
 # Bunch
 from bunch import Bunch
 
+# mock
+from mock import patch
+
+# nose
+from nose.tools import eq_
+
 # Zato
 from zato.common import zato_namespace
 from zato.common.test import rand_float, rand_int, rand_string, ServiceTestCase
@@ -76,6 +82,21 @@ class StatsReturningServiceTestCase(ServiceTestCase):
     def test_impl(self):
         self.assertEquals(self.service_class.get_name(), 'zato.stats.stats-returning-service')
 
+    def test_get_stats_service_pattern(self):
+        suffix = '2016:01:02:03:04'
+        values = {'usage': '1', 'mean': '10', 'min': '5', 'max': '15', 'rate': '0.1'}
+
+        service = self.service_class()
+        service.server = Bunch(kvdb=Bunch(conn=None))
+
+        # Service names may be glob patterns, just like when KEYS was used to find them
+        with patch('zato.server.service.internal.stats.get_index', return_value=[('a.b', suffix), ('a.c', suffix), ('d', suffix)]):
+            with patch('zato.server.service.internal.stats.hgetall_many', lambda conn, keys: [values for key in keys]):
+
+                for service_name, expected in (('a.*', ['a.b', 'a.c']), ('d', ['d']), ('*', ['a.b', 'a.c', 'd']), ('e*', [])):
+                    stats = service.get_stats('2016-01-02T03:04:00', '2016-01-02T03:05:00', service_name, needs_trends=False)
+                    eq_(sorted(elem.service_name for elem in stats), expected)
+
 ###############################################################################
 
 class GetByServiceTestCase(ServiceTestCase):
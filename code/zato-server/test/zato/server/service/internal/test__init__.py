@@ -8,13 +8,19 @@ Licensed under LGPLv3, see LICENSE.txt for terms and conditions.
 
 from __future__ import absolute_import, division, print_function, unicode_literals
 
+# stdlib
+from unittest import TestCase
+
 # Bunch
 from bunch import Bunch
 
+# mock
+from mock import MagicMock
+
 # Zato
-from zato.common import zato_namespace
+from zato.common import KVDB, zato_namespace
 from zato.common.test import rand_int, rand_string, ServiceTestCase
-from zato.server.service.internal import Ping, Ping2, ChangePasswordBase
+from zato.server.service.internal import AdminService, Ping, Ping2, ChangePasswordBase
 
 ##############################################################################
 
@@ -119,3 +125,25 @@ class ChangePasswordBaseTestCase(ServiceTestCase):
         response_data2 = {}
 
         self.check_impl(MyChangePasswordRequired, request2, response_data2, 'ignored')
+
+# ##############################################################################
+
+class AdminServiceConfigVersionTestCase(TestCase):
+
+    def _after_handle(self, class_name):
+        service = type(str(class_name), (AdminService,), {})()
+        service.kvdb = MagicMock()
+        service.response.payload = ''
+        service.after_handle()
+
+        return service.kvdb.conn.incr
+
+    def test_config_changed(self):
+        for class_name in ('Create', 'Edit', 'Delete', 'ChangePassword'):
+            incr = self._after_handle(class_name)
+            incr.assert_called_once_with(KVDB.CONFIG_VERSION)
+
+    def test_config_not_changed(self):
+        for class_name in ('GetList', 'GetByName', 'Ping', 'Invoke'):
+            incr = self._after_handle(class_name)
+            self.assertFalse(incr.called)
@@ -0,0 +1,200 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (C) 2016 Dariusz Suchojad <dsuch at zato.io>
+
+Licensed under LGPLv3, see LICENSE.txt for terms and conditions.
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+# stdlib
+from json import dumps, loads
+from unittest import TestCase
+
+# Bunch
+from bunch import Bunch
+
+# nose
+from nose.tools import eq_
+
+# SQLAlchemy
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+# Zato
+from zato.common.broker_message import BATCH, MESSAGE_TYPE, SCHEDULER, SECURITY
+from zato.common.odb.model import Base, Cluster, HTTPBasicAuth
+from zato.server.base import BrokerMessageReceiver
+from zato.server.service.internal.enmasse import BatchBrokerClient, Import
+
+# ################################################################################################################################
+
+class FakeBrokerClient(object):
+    def __init__(self):
+        self.published = []
+        self.invoked_async = []
+
+    def publish(self, msg, msg_type=MESSAGE_TYPE.TO_PARALLEL_ALL):
+        self.published.append((loads(dumps(msg)), msg_type))
+
+    def invoke_async(self, msg):
+        self.invoked_async.append(msg)
+
+class Receiver(BrokerMessageReceiver):
+    def __init__(self):
+        super(Receiver, self).__init__()
+        self.received = []
+
+    def filter(self, msg):
+        return msg.name != 'rejected'
+
+    def on_broker_msg_SECURITY_BASIC_AUTH_CREATE(self, msg):
+        self.received.append(msg.name)
+
+# ################################################################################################################################
+
+class BatchBrokerClientTestCase(TestCase):
+
+    def test_flush(self):
+        broker_client = FakeBrokerClient()
+        batch_client = BatchBrokerClient(broker_client)
+
+        for name in ('abc', 'rejected', 'def'):
+            batch_client.publish(Bunch(action=SECURITY.BASIC_AUTH_CREATE.value, name=name))
+        batch_client.publish({'action': SCHEDULER.CREATE.value, 'name': 'ghi'}, MESSAGE_TYPE.TO_SINGLETON)
+        batch_client.publish({'action': SCHEDULER.CREATE.value, 'name': 'jkl'}, MESSAGE_TYPE.TO_SINGLETON)
+        batch_client.publish({'action': SECURITY.BASIC_AUTH_CREATE.value, 'name': 'mno'}, MESSAGE_TYPE.TO_AMQP_CONNECTOR_ALL)
+
+        # Messages published asynchronously are not batched
+        batch_client.invoke_async({'action': SECURITY.BASIC_AUTH_CREATE.value})
+        eq_(len(broker_client.invoked_async), 1)
+
+        eq_(broker_client.published, [])
+        batch_client.flush()
+
+        published = dict((msg_type, msg) for msg, msg_type in broker_client.published)
+        eq_(sorted(published), sorted([
+            MESSAGE_TYPE.TO_PARALLEL_ALL, MESSAGE_TYPE.TO_SINGLETON, MESSAGE_TYPE.TO_AMQP_CONNECTOR_ALL]))
+
+        # A single message is published as is
+        eq_(published[MESSAGE_TYPE.TO_AMQP_CONNECTOR_ALL]['name'], 'mno')
+
+        msg = published[MESSAGE_TYPE.TO_PARALLEL_ALL]
+        eq_(msg['action'], BATCH.MESSAGES.value)
+        eq_([item['name'] for item in msg['msg_list']], ['abc', 'rejected', 'def'])
+
+        singleton_msg = published[MESSAGE_TYPE.TO_SINGLETON]
+        eq_(singleton_msg['action'], BATCH.MESSAGES.value)
+        eq_([item['name'] for item in singleton_msg['msg_list']], ['ghi', 'jkl'])
+
+        # Each of the messages is handled separately, in order
+        receiver = Receiver()
+        receiver.on_broker_msg(Bunch(msg))
+        eq_(receiver.received, ['abc', 'def'])
+
+        # Nothing is kept after flushing
+        batch_client.flush()
+        eq_(len(broker_client.published), 3)
+
+# ################################################################################################################################
+
+class ImportTestCase(TestCase):
+
+    def setUp(self):
+        engine = create_engine('sqlite://')
+        Base.metadata.create_all(engine)
+
+        self.odb = Bunch(session=sessionmaker(bind=engine))
+        session = self.odb.session()
+
+        cluster = Cluster(None, 'my.cluster', '', 'sqlite', broker_host='localhost', broker_port=6379, lb_host='localhost',
+            lb_port=11223, lb_agent_port=20151)
+        session.add(HTTPBasicAuth(None, 'my.sec', True, 'user', 'realm', 'password', cluster))
+        session.commit()
+
+        self.cluster_id = cluster.id
+        self.sec_id = session.query(HTTPBasicAuth.id).scalar()
+        session.close()
+
+    def get_service(self, items):
+        invoked = []
+
+        class _Import(Import):
+            def invoke(self, name, request):
+                invoked.append((name, dict(request)))
+
+                if request.get('name') == 'error':
+                    raise Exception('Invalid object')
+
+                self.broker_client.publish({'action': SECURITY.BASIC_AUTH_CREATE.value, 'name': request.get('name')})
+                return {'zato_my_create_response': {'id': 123, 'name': request.get('name')}}
+
+        service = _Import()
+        service.odb = self.odb
+        service.broker_client = FakeBrokerClient()
+        service.request.input = Bunch(cluster_id=self.cluster_id, data=dumps(items).encode('bz2').encode('base64'))
+        service.response.payload = Bunch()
+
+        return service, invoked
+
+    def test_import(self):
+        items = [{
+            'item_type': 'def_sec',
+            'service_name': 'zato.security.basic-auth.create',
+            'password_service_name': 'zato.security.basic-auth.change-password',
+            'request': {'name': 'sec1', 'password': 'secret'},
+        }, {
+            'item_type': 'http_soap',
+            'service_name': 'zato.http-soap.edit',
+            'request': {'id': 456, 'name': 'channel1', 'sec_def': 'my.sec'},
+        }, {
+            'item_type': 'http_soap',
+            'service_name': 'zato.http-soap.create',
+            'request': {'name': 'channel2', 'security_id': None},
+        }]
+
+        service, invoked = self.get_service(items)
+        broker_client = service.broker_client
+        service.handle()
+
+        eq_(service.response.payload.imported, 3)
+        eq_(service.response.payload.get('error_name'), None)
+        eq_([name for name, _ in invoked], ['zato.security.basic-auth.create', 'zato.security.basic-auth.change-password',
+            'zato.http-soap.edit', 'zato.http-soap.create'])
+
+        # ID of the newly created object is used to set its password
+        eq_(invoked[1][1], {'id': 123, 'password1': 'secret', 'password2': 'secret'})
+
+        # Security definitions are looked up by name
+        eq_(invoked[2][1]['security_id'], self.sec_id)
+        eq_(invoked[2][1]['cluster_id'], self.cluster_id)
+        eq_(invoked[3][1]['security_id'], None)
+
+        # All of the broker messages were published at once and the original broker client was restored
+        eq_(service.broker_client, broker_client)
+        eq_(len(broker_client.published), 1)
+
+        msg, msg_type = broker_client.published[0]
+        eq_(msg_type, MESSAGE_TYPE.TO_PARALLEL_ALL)
+        eq_([item['name'] for item in msg['msg_list']], ['sec1', None, 'channel1', 'channel2'])
+
+    def test_import_error(self):
+        items = [{
+            'item_type': 'http_soap',
+            'service_name': 'zato.http-soap.create',
+            'request': {'name': name},
+        } for name in ('channel1', 'error', 'channel2')]
+
+        service, invoked = self.get_service(items)
+        broker_client = service.broker_client
+        service.handle()
+
+        eq_(service.response.payload.imported, 1)
+        eq_(service.response.payload.error_name, 'error')
+        eq_(service.response.payload.error_service_name, 'zato.http-soap.create')
+        eq_(service.response.payload.error_details, 'Invalid object')
+        eq_(len(invoked), 2)
+
+        # Objects imported before the error are still published
+        eq_(broker_client.published[0][0]['name'], 'channel1')
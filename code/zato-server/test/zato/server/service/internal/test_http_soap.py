@@ -14,8 +14,10 @@ from bunch import Bunch
 # Zato
 from zato.common import zato_namespace
 from zato.common.test import ForceTypeWrapper, rand_bool, rand_int, rand_string, ServiceTestCase
-from zato.server.service import Bool
-from zato.server.service.internal.http_soap import GetList, Create, Edit, Delete, Ping
+from zato.server.service import Bool, Float, Integer
+from zato.server.service.internal import search_input_optional
+from zato.server.service.internal.http_soap import GetList, Create, Edit, Delete, Ping, GetAuditQueueStats, \
+     GetURLPathCacheStats
 
 ################################################################################
 
@@ -44,9 +46,9 @@ class GetListTestCase(ServiceTestCase):
         self.assertEquals(self.sio.output_optional, ('service_id', 'service_name', 'security_id', 'security_name', 'sec_type',
             'method', 'soap_action', 'soap_version', 'data_format', 'host',
             'ping_method', 'pool_size', 'merge_url_params_req', 'url_params_pri', 'params_pri', 'serialization_type', 'timeout',
-            'sec_tls_ca_cert_id', Bool('has_rbac'), 'content_type'))
+            'sec_tls_ca_cert_id', Bool('has_rbac'), 'content_type', Bool('is_streaming')))
         self.assertEquals(self.sio.namespace, zato_namespace)
-        self.assertRaises(AttributeError, getattr, self.sio, 'input_optional')
+        self.assertEquals(self.sio.input_optional, search_input_optional)
 
     def test_impl(self):
         self.assertEquals(self.service_class.get_name(), 'zato.http-soap.get-list')
@@ -76,7 +78,8 @@ class CreateTestCase(ServiceTestCase):
         self.assertEquals(self.sio.input_required, ('cluster_id', 'name', 'is_active', 'connection', 'transport', 'is_internal', 'url_path'))
         self.assertEquals(self.sio.input_optional, ('service', 'security_id', 'method', 'soap_action', 'soap_version', 'data_format', 'host',
             'ping_method', 'pool_size', ForceTypeWrapper(Bool('merge_url_params_req')), 'url_params_pri', 'params_pri',
-            'serialization_type', 'timeout', 'sec_tls_ca_cert_id', ForceTypeWrapper(Bool('has_rbac')), 'content_type'))
+            'serialization_type', 'timeout', 'sec_tls_ca_cert_id', ForceTypeWrapper(Bool('has_rbac')), 'content_type',
+            ForceTypeWrapper(Bool('is_streaming'))))
         self.assertEquals(self.sio.output_required, ('id', 'name'))
         self.assertEquals(self.sio.namespace, zato_namespace)
         self.assertRaises(AttributeError, getattr, self.sio, 'output_optional')
@@ -110,7 +113,7 @@ class EditTestCase(ServiceTestCase):
         self.assertEquals(self.sio.input_optional, ('service', 'security_id', 'method', 'soap_action', 'soap_version',
             'data_format', 'host', 'ping_method', 'pool_size', ForceTypeWrapper(Bool('merge_url_params_req')), 'url_params_pri',
             'params_pri', 'serialization_type', 'timeout', 'sec_tls_ca_cert_id', ForceTypeWrapper(Bool('has_rbac')),
-            'content_type'))
+            'content_type', ForceTypeWrapper(Bool('is_streaming'))))
         self.assertEquals(self.sio.output_required, ('id', 'name'))
         self.assertEquals(self.sio.namespace, zato_namespace)
         self.assertRaises(AttributeError, getattr, self.sio, 'output_optional')
@@ -171,3 +174,63 @@ class PingTestCase(ServiceTestCase):
 
     def test_impl(self):
         self.assertEquals(self.service_class.get_name(), 'zato.http-soap.ping')
+
+##############################################################################
+
+class GetURLPathCacheStatsTestCase(ServiceTestCase):
+
+    def setUp(self):
+        self.service_class = GetURLPathCacheStats
+        self.sio = self.service_class.SimpleIO
+
+    def get_request_data(self):
+        return {}
+
+    def get_response_data(self):
+        return Bunch({'size':rand_int(), 'max_size':rand_int(), 'lookups':rand_int(), 'hits':rand_int(),
+            'misses':rand_int(), 'evictions':rand_int()})
+
+    def test_sio(self):
+        self.assertEquals(self.sio.request_elem, 'zato_http_soap_get_url_path_cache_stats_request')
+        self.assertEquals(self.sio.response_elem, 'zato_http_soap_get_url_path_cache_stats_response')
+        self.assertEquals(self.sio.output_required, (Integer('size'), Integer('max_size'), Integer('lookups'),
+            Integer('hits'), Integer('misses'), Integer('evictions')))
+        self.assertEquals(self.sio.namespace, zato_namespace)
+        self.assertRaises(AttributeError, getattr, self.sio, 'input_required')
+        self.assertRaises(AttributeError, getattr, self.sio, 'input_optional')
+        self.assertRaises(AttributeError, getattr, self.sio, 'output_optional')
+        self.assertRaises(AttributeError, getattr, self.sio, 'output_repeated')
+
+    def test_impl(self):
+        self.assertEquals(self.service_class.get_name(), 'zato.http-soap.get-url-path-cache-stats')
+
+##############################################################################
+
+class GetAuditQueueStatsTestCase(ServiceTestCase):
+
+    def setUp(self):
+        self.service_class = GetAuditQueueStats
+        self.sio = self.service_class.SimpleIO
+
+    def get_request_data(self):
+        return {}
+
+    def get_response_data(self):
+        return Bunch({'depth':rand_int(), 'max_size':rand_int(), 'flushes':rand_int(), 'flushed':rand_int(),
+            'dropped':rand_int(), 'spilled':rand_int(), 'errors':rand_int(), 'last_flush_time':rand_int(),
+            'max_flush_time':rand_int(), 'mean_flush_time':rand_int()})
+
+    def test_sio(self):
+        self.assertEquals(self.sio.request_elem, 'zato_http_soap_get_audit_queue_stats_request')
+        self.assertEquals(self.sio.response_elem, 'zato_http_soap_get_audit_queue_stats_response')
+        self.assertEquals(self.sio.output_required, (Integer('depth'), Integer('max_size'), Integer('flushes'),
+            Integer('flushed'), Integer('dropped'), Integer('spilled'), Integer('errors'), Float('last_flush_time'),
+            Float('max_flush_time'), Float('mean_flush_time')))
+        self.assertEquals(self.sio.namespace, zato_namespace)
+        self.assertRaises(AttributeError, getattr, self.sio, 'input_required')
+        self.assertRaises(AttributeError, getattr, self.sio, 'input_optional')
+        self.assertRaises(AttributeError, getattr, self.sio, 'output_optional')
+        self.assertRaises(AttributeError, getattr, self.sio, 'output_repeated')
+
+    def test_impl(self):
+        self.assertEquals(self.service_class.get_name(), 'zato.http-soap.get-audit-queue-stats')
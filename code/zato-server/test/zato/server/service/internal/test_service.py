@@ -17,8 +17,12 @@ from nose.tools import eq_
 # Bunch
 from bunch import Bunch
 
+# mock
+from mock import MagicMock, patch
+
 # Zato
 from zato.common.odb.model import Service
+from zato.common.odb.query import SearchResults
 from zato.common.test import Expected, rand_bool, rand_int, rand_string, ServiceTestCase
 from zato.server.service.internal.service import GetList, GetByName
 
@@ -53,6 +57,28 @@ class GetListTestCase(ServiceTestCase):
                 expected_value = getattr(expected, key)
                 eq_(given_value, expected_value)
 
+    def test_name_filter_search(self):
+
+        def get_query(name_filter, query):
+            instance = GetList()
+            instance.server = Bunch(fs_server_config=Bunch(misc=Bunch(
+                return_internal_objects=True, internal_services_may_be_deleted=False)))
+            instance.request.input = Bunch(cluster_id=rand_int(), name_filter=name_filter, current_batch=2,
+                batch_size=None, query=query, sort_by=None, sort_order=None)
+
+            with patch('zato.server.service.internal.service.service_list', MagicMock(return_value=SearchResults([], 0, 2, 25))) as service_list:
+                instance.get_data(None)
+
+            return service_list.call_args[1]['search']['query']
+
+        # Names are filtered in the same query a page of results is selected with
+        eq_(get_query('My Service', None), 'my service')
+        eq_(get_query('My Service', 'abc'), 'abc my service')
+        eq_(get_query('*', 'abc'), 'abc')
+
+        # No name filter still matches nothing
+        self.assertNotEquals(get_query('', 'abc'), 'abc')
+
 class GetByNameTestCase(ServiceTestCase):
     def test_response(self):
         request = {'cluster_id':rand_int(), 'name':rand_string()}
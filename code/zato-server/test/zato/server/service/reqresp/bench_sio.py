@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (C) 2016 Dariusz Suchojad <dsuch at zato.io>
+
+Licensed under LGPLv3, see LICENSE.txt for terms and conditions.
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+# stdlib
+import logging, sys
+from itertools import chain
+from timeit import default_timer
+
+# anyjson
+from anyjson import dumps
+
+# Zato
+from zato.common import DATA_FORMAT, NO_DEFAULT_VALUE, PARAMS_PRIORITY, SIMPLE_IO
+from zato.server.service.reqresp import Request, Response
+from zato.server.service.reqresp.sio import AsIs, Boolean, convert_param, convert_sio, Float, ForceType, Integer, SIOPlan
+
+# ################################################################################################################################
+
+# Compares the per-request SimpleIO cost of a service with 30 input and 30 output elements, i.e. parsing and converting
+# its request and serializing its response. Before is how SimpleIO definitions used to be read and matched against
+# simple_io_config on each request, after is a plan compiled once per service class.
+#
+# Run as: python bench_sio.py [requests]
+
+# ################################################################################################################################
+
+logger = logging.getLogger(__name__)
+
+sio_config = {
+    'bool_parameter_prefixes': SIMPLE_IO.BOOL_PARAMETERS.SUFFIXES,
+    'int_parameters': SIMPLE_IO.INT_PARAMETERS.VALUES,
+    'int_parameter_suffixes': SIMPLE_IO.INT_PARAMETERS.SUFFIXES,
+}
+
+elems = []
+for idx in range(5):
+    elems.extend(['name{}'.format(idx), 'user_id{}'.format(idx), 'is_active{}'.format(idx),
+        Integer('count{}'.format(idx)), Float('amount{}'.format(idx)), Boolean('flag{}'.format(idx))])
+
+class SimpleIO:
+    input_required = elems[:20]
+    input_optional = elems[20:]
+    output_required = elems[:20]
+    output_optional = elems[20:]
+
+payload = {}
+for idx in range(5):
+    payload.update({'name{}'.format(idx): 'abc', 'user_id{}'.format(idx): '123', 'is_active{}'.format(idx): 'true',
+        'count{}'.format(idx): '456', 'amount{}'.format(idx): '7.89', 'flag{}'.format(idx): 'false'})
+
+# ################################################################################################################################
+
+def before(sio):
+    """ How Request.init, Response.init and SimpleIOPayload.getvalue used to work.
+    """
+    # Request.init
+    path_prefix = getattr(sio, 'request_elem', 'request')
+    default_value = getattr(sio, 'default_value', NO_DEFAULT_VALUE)
+    use_text = getattr(sio, 'use_text', True)
+    use_channel_params_only = getattr(sio, 'use_channel_params_only', False)
+
+    bool_parameter_prefixes = sio_config.get('bool_parameter_prefixes', [])
+    int_parameters = sio_config.get('int_parameters', [])
+    int_parameter_suffixes = sio_config.get('int_parameter_suffixes', [])
+
+    input = {}
+    for is_required, params in ((True, getattr(sio, 'input_required', [])), (False, getattr(sio, 'input_optional', []))):
+        for param in params:
+            param_name, value = convert_param(None, '' if use_channel_params_only else payload, param, DATA_FORMAT.JSON,
+                is_required, default_value, path_prefix, use_text, {}, True, bool_parameter_prefixes, int_parameters,
+                int_parameter_suffixes, PARAMS_PRIORITY.DEFAULT)
+            input[param_name] = value
+
+    # Response.init
+    required_list = getattr(sio, 'output_required', [])
+    optional_list = getattr(sio, 'output_optional', [])
+    response_elem = getattr(sio, 'response_elem', 'response')
+    getattr(sio, 'namespace', '')
+    getattr(sio, 'output_repeated', False)
+
+    class Payload(object):
+        pass
+
+    out = Payload()
+    all_attrs = set()
+    for name in chain(required_list, optional_list):
+        if isinstance(name, ForceType):
+            name = name.name
+        all_attrs.add(name)
+        setattr(out, name, '')
+
+    # What a service's handle method does
+    for name, value in input.items():
+        setattr(out, name, value)
+
+    # SimpleIOPayload.getvalue
+    output = set(dir(out)) & all_attrs
+    item = dict((name, getattr(out, name)) for name in output)
+
+    out_item = {}
+    for is_required, name in chain([(True, name) for name in required_list], [(False, name) for name in optional_list]):
+        lookup_name = name.name if isinstance(name, ForceType) else name
+        elem_value = item.get(lookup_name, '')
+        if not isinstance(name, AsIs):
+            elem_value = convert_sio(name, lookup_name, elem_value, True, False, bool_parameter_prefixes,
+                int_parameters, int_parameter_suffixes, None, DATA_FORMAT.JSON, True)
+        out_item[lookup_name] = elem_value
+
+    return dumps({response_elem: out_item})
+
+def after(sio_plan):
+    request = Request(logger, sio_config)
+    request.payload = payload
+    request.init(True, None, sio_plan, DATA_FORMAT.JSON, None, {})
+
+    response = Response(logger, simple_io_config=sio_config)
+    response.init(None, sio_plan, DATA_FORMAT.JSON)
+
+    # What a service's handle method does
+    response.payload = request.input
+
+    return response.payload.getvalue()
+
+def main():
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+
+    print('{:>10} {:>12} {:>20} {:>20}'.format('', 'Requests', 'Total time (s)', 'Per request (us)'))
+
+    for name, func, arg in (('Before', before, SimpleIO), ('After', after, SIOPlan(SimpleIO))):
+        start = default_timer()
+        for idx in range(requests):
+            func(arg)
+        total = default_timer() - start
+
+        print('{:>10} {:>12} {:>20.2f} {:>20.1f}'.format(name, requests, total, total / requests * 1000000))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (C) 2016 Dariusz Suchojad <dsuch at zato.io>
+
+Licensed under LGPLv3, see LICENSE.txt for terms and conditions.
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+# stdlib
+import sys
+from timeit import default_timer
+
+# lxml
+from lxml import objectify
+from lxml.objectify import ObjectPath
+
+# Zato
+import zato.common
+from zato.common import DATA_FORMAT, SIMPLE_IO
+from zato.server.service.reqresp import Request
+from zato.server.service.reqresp.sio import SIOPlan
+
+# ################################################################################################################################
+
+# Compares how long it takes to read SimpleIO input out of SOAP requests with 50 elements each. Before is how it used
+# to be done - each element looked up with an ObjectPath expression compiled anew for each request. Cached is the same
+# but with expressions compiled once only. After is all the elements of a request found in a single pass.
+#
+# Run as: python bench_sio_xml.py [requests]
+
+# ################################################################################################################################
+
+FIELDS = 50
+
+simple_io_config = {
+    'bool_parameter_prefixes': SIMPLE_IO.BOOL_PARAMETERS.SUFFIXES,
+    'int_parameters': SIMPLE_IO.INT_PARAMETERS.VALUES,
+    'int_parameter_suffixes': SIMPLE_IO.INT_PARAMETERS.SUFFIXES,
+}
+
+class SimpleIO:
+    request_elem = 'my_request'
+    input_required = tuple('field{}'.format(idx) for idx in range(FIELDS - 10))
+    input_optional = tuple('field{}'.format(idx) for idx in range(FIELDS - 10, FIELDS))
+
+def get_payload():
+    """ Returns the request element of a SOAP message, the same way SOAP channels pass it on to services.
+    """
+    fields = ''.join('<field{0}>value{0}</field{0}>'.format(idx) for idx in range(FIELDS))
+    soap = '<soapenv:Envelope xmlns:soapenv="http://schemas.xmlsoap.org/soap/envelope/"><soapenv:Body>' \
+        '<my_request>{}</my_request></soapenv:Body></soapenv:Envelope>'.format(fields)
+
+    return objectify.fromstring(soap).Body.getchildren()[0]
+
+def run(sio_plan, payload, count):
+    for idx in range(count):
+        request = Request(None, simple_io_config)
+        request.payload = payload
+        request.init(True, 'cid', sio_plan, DATA_FORMAT.XML, None, {})
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+
+    payload = get_payload()
+    get_object_path = zato.common.get_object_path
+
+    print('{:>10} {:>12} {:>12} {:>20}'.format('', 'Requests', 'Fields', 'Total time (s)'))
+
+    for name in ('Before', 'Cached', 'After'):
+        sio_plan = SIOPlan(SimpleIO)
+        sio_plan.is_xml_flat = name == 'After'
+        zato.common.get_object_path = ObjectPath if name == 'Before' else get_object_path
+
+        start = default_timer()
+        run(sio_plan, payload, count)
+        total = default_timer() - start
+
+        print('{:>10} {:>12} {:>12} {:>20.2f}'.format(name, count, FIELDS, total))
+
+    zato.common.get_object_path = get_object_path
+
+if __name__ == '__main__':
+    main()
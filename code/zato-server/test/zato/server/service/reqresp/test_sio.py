@@ -11,16 +11,21 @@ from __future__ import absolute_import, division, print_function, unicode_litera
 # stdlib
 from unittest import TestCase
 
+# lxml
+from lxml import objectify
+
 # nose
 from nose.tools import eq_
 
 # Zato
-from zato.common import DATA_FORMAT, NO_DEFAULT_VALUE, PARAMS_PRIORITY, SIMPLE_IO
+from zato.common import DATA_FORMAT, get_object_path, NO_DEFAULT_VALUE, PARAMS_PRIORITY, ParsingException, SIMPLE_IO
 from zato.common.test import rand_bool, rand_csv, rand_date_utc, rand_dict, rand_float, rand_int, rand_list, rand_list_of_dicts, \
      rand_nested, rand_opaque, rand_string, rand_unicode
 from zato.common.util import new_cid
-from zato.server.service.reqresp.sio import Boolean, convert_param, CSV, Dict, Float, Integer, List, ListOfDicts, Nested, \
-     Opaque, Unicode, UTC, ValidationException
+from zato.server.service import Service
+from zato.server.service.reqresp import Request
+from zato.server.service.reqresp.sio import AsIs, Boolean, convert_elem, convert_param, CSV, Dict, Float, get_xml_children, \
+     Integer, List, ListOfDicts, Nested, Opaque, SIOPlan, Unicode, UTC, ValidationException
 
 class SIOTestCase(TestCase):
     def test_dict_no_keys_specified(self):
@@ -293,3 +298,229 @@ class ConvertParamTestCase(TestCase):
                 self.assertEquals(expected_value, given_value)
 
 # ################################################################################################################################
+
+class SIOPlanTestCase(TestCase):
+
+    def get_sio_config(self):
+        return {
+            'bool_parameter_prefixes': SIMPLE_IO.BOOL_PARAMETERS.SUFFIXES,
+            'int_parameters': SIMPLE_IO.INT_PARAMETERS.VALUES,
+            'int_parameter_suffixes': SIMPLE_IO.INT_PARAMETERS.SUFFIXES,
+        }
+
+    def test_plan_attrs(self):
+
+        class SimpleIO:
+            request_elem = rand_string()
+            response_elem = rand_string()
+            namespace = rand_string()
+            input_required = ('a', Integer('b'))
+            input_optional = ('c',)
+            output_required = ('d',)
+            output_optional = (List('e'),)
+            output_repeated = True
+
+        plan = SIOPlan(SimpleIO)
+
+        self.assertIs(plan.sio, SimpleIO)
+        eq_(plan.request_elem, SimpleIO.request_elem)
+        eq_(plan.response_elem, SimpleIO.response_elem)
+        eq_(plan.namespace, SimpleIO.namespace)
+        eq_(plan.default_value, NO_DEFAULT_VALUE)
+        eq_(plan.use_text, True)
+        eq_(plan.use_channel_params_only, False)
+        eq_(plan.output_repeated, True)
+        eq_(plan.has_output, True)
+        eq_(plan.output_names, frozenset(['d', 'e']))
+        eq_(plan.output_attrs, {'d':'', 'e':''})
+
+        input_required, input_optional, output = plan.get_elems(self.get_sio_config())
+
+        eq_([(elem.name, elem.is_required) for elem in input_required], [('a', True), ('b', True)])
+        eq_([(elem.name, elem.is_required) for elem in input_optional], [('c', False)])
+        eq_([(elem.name, elem.is_required) for elem in output], [('d', True), ('e', False)])
+
+        eq_(input_required[0].xml_path.path, '{}.a'.format(SimpleIO.request_elem))
+        eq_(output[0].xml_path, None)
+        eq_(output[1].is_complex, True)
+
+    def test_plan_no_output(self):
+
+        class SimpleIO:
+            input_required = ('a',)
+
+        eq_(SIOPlan(SimpleIO).has_output, False)
+
+    def test_converters(self):
+
+        class SimpleIO:
+            input_required = ('name', 'is_active', 'id', 'user_id', Float('amount'), Boolean('flag'), AsIs('cust_id'))
+
+        elems = dict((elem.name, elem) for elem in SIOPlan(SimpleIO).get_elems(self.get_sio_config())[0])
+
+        self.assertIsNone(elems['name'].converter)
+        self.assertIs(elems['is_active'].converter('false', DATA_FORMAT.JSON, False), False)
+        eq_(elems['id'].converter('1', DATA_FORMAT.JSON, False), 1)
+        eq_(elems['user_id'].converter('2', DATA_FORMAT.JSON, False), 2)
+        eq_(elems['amount'].converter('3.5', DATA_FORMAT.JSON, False), 3.5)
+        self.assertIs(elems['flag'].converter('true', DATA_FORMAT.JSON, False), True)
+        eq_(elems['cust_id'].is_as_is, True)
+
+    def test_converters_no_sio_config(self):
+
+        class SimpleIO:
+            input_required = ('id', 'user_id')
+
+        for elem in SIOPlan(SimpleIO).get_elems({})[0]:
+            self.assertIsNone(elem.converter)
+
+    def test_get_elems_cached_per_config(self):
+
+        class SimpleIO:
+            input_required = ('id',)
+
+        plan = SIOPlan(SimpleIO)
+        config1 = self.get_sio_config()
+        config2 = self.get_sio_config()
+
+        elems1 = plan.get_elems(config1)
+        self.assertIs(plan.get_elems(config1), elems1)
+
+        elems2 = plan.get_elems(config2)
+        self.assertIsNot(elems2, elems1)
+        self.assertIs(plan.get_elems(config2), elems2)
+
+    def test_convert_elem_same_as_convert_param(self):
+
+        class SimpleIO:
+            input_required = ('id', 'user_id', 'is_active', Integer('a'), Boolean('b'), Float('c'), 'd')
+
+        config = self.get_sio_config()
+        elems = SIOPlan(SimpleIO).get_elems(config)[0]
+        payload = {'id':'1', 'user_id':'2', 'is_active':'true', 'a':'3', 'b':'false', 'c':'4.5', 'd':'5'}
+
+        for params_priority in PARAMS_PRIORITY:
+            for channel_params in ({}, {'id':'11', 'a':'33', 'd':'55'}):
+                for param, elem in zip(SimpleIO.input_required, elems):
+
+                    expected_name, expected_value = convert_param(
+                        'cid', payload, param, DATA_FORMAT.JSON, True, NO_DEFAULT_VALUE, 'request', True, channel_params,
+                        True, config['bool_parameter_prefixes'], config['int_parameters'],
+                        config['int_parameter_suffixes'], params_priority)
+
+                    given_value = convert_elem('cid', payload, elem, DATA_FORMAT.JSON, True, channel_params, params_priority)
+
+                    eq_(elem.name, expected_name)
+                    eq_(given_value, expected_value)
+                    eq_(type(given_value), type(expected_value))
+
+    def test_service_get_sio_plan(self):
+
+        class MyService(Service):
+            class SimpleIO:
+                input_required = ('a',)
+
+        class MyServiceSubclass(MyService):
+            pass
+
+        class MyServiceOwnSIO(MyService):
+            class SimpleIO:
+                input_required = ('b',)
+
+        plan = MyService.compile_sio()
+
+        self.assertIs(MyService.get_sio_plan(), plan)
+        self.assertIs(MyServiceSubclass.get_sio_plan(), plan)
+
+        own_plan = MyServiceOwnSIO.get_sio_plan()
+        self.assertIs(own_plan.sio, MyServiceOwnSIO.SimpleIO)
+        self.assertIs(MyServiceOwnSIO.get_sio_plan(), own_plan)
+        self.assertIs(MyService.get_sio_plan(), plan)
+
+# ################################################################################################################################
+
+class XMLInputTestCase(TestCase):
+
+    def get_plan(self):
+
+        class SimpleIO:
+            request_elem = 'my_request'
+            input_required = ('id', 'name', Integer('count'))
+            input_optional = ('comment', 'note')
+
+        return SIOPlan(SimpleIO)
+
+    def get_config(self):
+        return {
+            'bool_parameter_prefixes': SIMPLE_IO.BOOL_PARAMETERS.SUFFIXES,
+            'int_parameters': SIMPLE_IO.INT_PARAMETERS.VALUES,
+            'int_parameter_suffixes': SIMPLE_IO.INT_PARAMETERS.SUFFIXES,
+        }
+
+    def get_params(self, plan, xml, use_children):
+        payload = objectify.fromstring(xml)
+        xml_children = get_xml_children(payload, plan.request_elem) if use_children else None
+
+        input_required, input_optional, _ = plan.get_elems(self.get_config())
+        params = {}
+
+        for elem in input_required + input_optional:
+            params[elem.name] = convert_elem(
+                'cid', payload, elem, DATA_FORMAT.XML, True, {}, PARAMS_PRIORITY.DEFAULT, xml_children)
+
+        return params
+
+    def test_get_object_path_cached(self):
+        object_path = get_object_path('my_request.abc')
+        self.assertIs(get_object_path('my_request.abc'), object_path)
+
+    def test_plan_is_xml_flat(self):
+        eq_(self.get_plan().is_xml_flat, True)
+
+        class SimpleIO:
+            input_required = ('a.b',)
+
+        eq_(SIOPlan(SimpleIO).is_xml_flat, False)
+
+        class SimpleIO:
+            request_elem = 'a.b'
+            input_required = ('c',)
+
+        eq_(SIOPlan(SimpleIO).is_xml_flat, False)
+
+    def test_children_same_as_object_path(self):
+        plan = self.get_plan()
+
+        for xml in (
+            '<my_request><id>1</id><name>abc</name><count>2</count><note>abc</note></my_request>',
+            '<my_request><id>1</id><name>abc</name><id>3</id><count>2</count></my_request>',
+            '<my_request><!-- comment --><?pi abc?><id>1</id><name/><count>2</count><comment>xyz</comment></my_request>',
+            '<my_request><id>1</id><name>abc</name><x:count xmlns:x="urn:x">2</x:count><comment>xyz</comment></my_request>',
+            '<my_request xmlns="urn:x"><id>1</id><name>abc</name><count>2</count></my_request>',
+            '<x:my_request xmlns:x="urn:x"><x:id>1</x:id><x:name>abc</x:name><x:count>2</x:count><comment>xyz</comment>'
+                '</x:my_request>',
+            ):
+            eq_(self.get_params(plan, xml, True), self.get_params(plan, xml, False))
+
+    def test_children_missing_required(self):
+        plan = self.get_plan()
+
+        for xml in (
+            '<my_request><id>1</id><count>2</count></my_request>',
+            '<x:my_request xmlns:x="urn:x"><x:id>1</x:id><name>abc</name><x:count>2</x:count></x:my_request>',
+            '<other><id>1</id><name>abc</name><count>2</count></other>',
+            ):
+            for use_children in (True, False):
+                self.assertRaises(ParsingException, self.get_params, plan, xml, use_children)
+
+    def test_request_init(self):
+
+        class SimpleIO:
+            request_elem = 'my_request'
+            input_required = ('id', 'name')
+
+        request = Request(None, self.get_config())
+        request.payload = objectify.fromstring('<my_request><id>1</id><name>abc</name></my_request>')
+        request.init(True, 'cid', SIOPlan(SimpleIO), DATA_FORMAT.XML, None, {})
+
+        eq_(request.input, {'id': 1, 'name': 'abc'})
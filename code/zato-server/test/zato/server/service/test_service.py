@@ -10,6 +10,7 @@ from __future__ import absolute_import, division, print_function, unicode_litera
 
 # stdlib
 import ast
+from cStringIO import StringIO
 from json import loads
 from logging import getLogger, INFO
 from time import time
@@ -36,7 +37,7 @@ from zato.common import CHANNEL, DATA_FORMAT, KVDB, PARAMS_PRIORITY, \
      SCHEDULER, URL_TYPE
 from zato.common.test import FakeKVDB, rand_string, rand_int, ServiceTestCase
 from zato.server.service import List, Service
-from zato.server.service.reqresp import HTTPRequestData, Request
+from zato.server.service.reqresp import HTTPRequestData, Request, Response
 
 logger = getLogger(__name__)
 faker = Faker()
@@ -267,19 +268,19 @@ class TestRequest(TestCase):
                 request.channel_params['f'] = 'channel_param_f'
                 request.channel_params['h'] = 'channel_param_h' # Never overridden
 
-                def _get_params(request_params, *ignored):
+                def _get_params(elems, use_channel_params_only, use_text=True, is_required=True, xml_children=None):
 
                     # Note that 'g' is never overridden
 
                     if params_priority == PARAMS_PRIORITY.CHANNEL_PARAMS_OVER_MSG:
-                        if request_params is io_custom['input_required']:
+                        if is_required:
                             return {'a':request.channel_params['a'], 'b':request.channel_params['b'],
                                     'c':request.channel_params['c'], 'g':'g-msg'}
                         else:
                             return {'d':request.channel_params['d'], 'e':request.channel_params['e'],
                                     'f':request.channel_params['f'], 'g':'g-msg'}
                     else:
-                        if request_params is io_custom['input_required']:
+                        if is_required:
                             return {'a':'a-req', 'b':'b-req', 'c':'c-req', 'g':'g-msg'}
                         else:
                             return {'d':'d-opt', 'e':'e-opt', 'f':'f-opt', 'g':'g-msg'}
@@ -498,3 +499,34 @@ class RESTTargetType(ServiceTestCase):
 
         MyService2.add_http_method_handlers()
         self.assertDictEqual(MyService2.http_method_handlers, {})
+
+# ################################################################################################################################
+
+class ResponseTestCase(TestCase):
+
+    def test_set_payload_stream(self):
+        stream = StringIO(b'abc')
+
+        # Streams are not accepted as they are unless the response is to a streaming channel ..
+        response = Response(logger)
+        self.assertRaises(Exception, setattr, response, 'payload', stream)
+
+        # .. in which case they are sent to the client in chunks.
+        response.is_streaming = True
+        response.payload = stream
+        self.assertIs(response.payload, stream)
+
+    def test_update_is_streaming(self):
+        server = Bunch(kvdb=FakeKVDB(), user_config=Bunch(), time_util=None)
+
+        for wsgi_environ, is_streaming in (
+            ({}, False),
+            ({'zato.http.channel_item': None}, False),
+            ({'zato.http.channel_item': Bunch(is_streaming=False)}, False),
+            ({'zato.http.channel_item': Bunch(is_streaming=True)}, True),
+            ):
+            service = Service()
+            Service.update(service, CHANNEL.HTTP_SOAP, server, None, None, rand_string(), None, None,
+                wsgi_environ=wsgi_environ, init=False)
+
+            eq_(service.response.is_streaming, is_streaming)
@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (C) 2016 Dariusz Suchojad <dsuch at zato.io>
+
+Licensed under LGPLv3, see LICENSE.txt for terms and conditions.
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+# stdlib
+import os
+from shutil import rmtree
+from tempfile import mkdtemp
+from unittest import TestCase
+
+# Bunch
+from bunch import Bunch
+
+# nose
+from nose.tools import eq_
+
+# SQLAlchemy
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+# Zato
+from zato.common.odb.model import Base, Cluster, DeployedService, Server, Service
+from zato.common.test import rand_string
+from zato.server.odb import ODBManager
+from zato.server.service.store import ServiceStore
+
+# ################################################################################################################################
+
+services_source = """
+from zato.server.service import Service
+
+class MyService1(Service):
+    name = 'my.service.1'
+
+class MyService2(Service):
+    name = 'my.service.2'
+"""
+
+def get_odb(engine, server_name):
+    session = sessionmaker(bind=engine)()
+
+    cluster = session.query(Cluster).first()
+    if not cluster:
+        cluster = Cluster(None, 'my.cluster', '', 'sqlite', broker_host='localhost', broker_port=6379, lb_host='localhost',
+            lb_port=11223, lb_agent_port=20151)
+        session.add(cluster)
+
+    server = Server(None, server_name, cluster, rand_string())
+    session.add(server)
+    session.commit()
+
+    odb = ODBManager()
+    odb.session = sessionmaker(bind=engine)
+    odb._session = session
+    odb.cluster = cluster
+    odb.server = Bunch(id=server.id)
+
+    return odb
+
+# ################################################################################################################################
+
+class ServiceStoreTestCase(TestCase):
+
+    def setUp(self):
+        self.dir_name = mkdtemp(prefix='zato-test-service-store')
+        self.engine = create_engine('sqlite://')
+        Base.metadata.create_all(self.engine)
+
+    def tearDown(self):
+        rmtree(self.dir_name)
+
+    def get_store(self, odb):
+        store = ServiceStore({}, odb=odb)
+        store.patterns_matcher.read_config({'order': 'true_false', '*': 'True'})
+
+        return store
+
+    def write_services(self):
+        file_name = os.path.join(self.dir_name, 'my_services.py')
+        with open(file_name, 'w') as f:
+            f.write(services_source)
+
+        return file_name
+
+    def get_deployed(self):
+        ds_table = DeployedService.__table__
+        return sorted((row.server_id, row.service_id) for row in self.engine.execute(ds_table.select()))
+
+    def test_import_services(self):
+        file_name = self.write_services()
+
+        odb1 = get_odb(self.engine, 'server1')
+        store1 = self.get_store(odb1)
+        deployed = store1.import_services_from_anywhere([file_name], self.dir_name)
+
+        eq_(sorted(deployed), ['my.service.1', 'my.service.2'])
+
+        services = dict((item.name, item) for item in odb1._session.query(Service))
+        eq_(sorted(services), ['my.service.1', 'my.service.2'])
+
+        for name, service in services.items():
+            impl_name = store1.name_to_impl_name[name]
+            eq_(store1.impl_name_to_id[impl_name], service.id)
+            eq_(store1.id_to_impl_name[service.id], impl_name)
+            eq_(store1.services[impl_name]['is_active'], True)
+            eq_(store1.services[impl_name]['slow_threshold'], 99999)
+            eq_(store1.services[impl_name]['service_class'].get_name(), name)
+
+        ids = sorted(service.id for service in services.values())
+        eq_(self.get_deployed(), [(odb1.server.id, ids[0]), (odb1.server.id, ids[1])])
+
+        # Another server of the same cluster reuses existing services ..
+        odb2 = get_odb(self.engine, 'server2')
+        store2 = self.get_store(odb2)
+        store2.import_services_from_file(file_name, False, self.dir_name)
+
+        eq_(odb2._session.query(Service).count(), 2)
+        eq_(sorted(store2.id_to_impl_name), ids)
+
+        # .. and redeploying them on the same server updates their deployment information.
+        deployed_before = odb1._session.query(DeployedService).filter(DeployedService.server_id==odb1.server.id).all()
+        deployed_before = dict((item.service_id, item.deployment_time) for item in deployed_before)
+
+        store1.import_services_from_file(file_name, False, self.dir_name)
+        odb1._session.expire_all()
+
+        for item in odb1._session.query(DeployedService).filter(DeployedService.server_id==odb1.server.id):
+            self.assertTrue(item.deployment_time > deployed_before[item.service_id])
+
+        eq_(len(self.get_deployed()), 4)
+
+    def test_add_services_is_active(self):
+        odb = get_odb(self.engine, 'server1')
+        store = self.get_store(odb)
+        file_name = self.write_services()
+
+        store.import_services_from_file(file_name, False, self.dir_name)
+
+        service = odb._session.query(Service).filter(Service.name=='my.service.1').one()
+        service.is_active = False
+        service.slow_threshold = 123
+        odb._session.commit()
+
+        store.import_services_from_file(file_name, False, self.dir_name)
+        impl_name = store.name_to_impl_name['my.service.1']
+
+        eq_(store.services[impl_name]['is_active'], False)
+        eq_(store.services[impl_name]['slow_threshold'], 123)
+
+    def test_add_services_one_by_one(self):
+        odb = get_odb(self.engine, 'server1')
+        add_services = odb.add_services
+
+        # The batch fails because of one invalid service, after which each service is added on its own
+        def _add_services(services):
+            if 'my.service.2' in [item.name for item in services]:
+                raise Exception('Invalid service')
+            return add_services(services)
+
+        odb.add_services = _add_services
+
+        store = self.get_store(odb)
+        deployed = store.import_services_from_file(self.write_services(), False, self.dir_name)
+
+        eq_(deployed, ['my.service.1'])
+        eq_(sorted(store.name_to_impl_name), ['my.service.1'])
+        eq_(odb._session.query(Service.name).all(), [('my.service.1',)])
@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (C) 2016 Dariusz Suchojad <dsuch at zato.io>
+
+Licensed under LGPLv3, see LICENSE.txt for terms and conditions.
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+# stdlib
+from json import dumps, loads
+from time import time
+from unittest import TestCase
+
+# mock
+from mock import MagicMock, patch
+
+# nose
+from nose.tools import eq_
+
+# Redis
+import redis
+
+# Zato
+from zato.broker.client import BrokerClient, get_queue_key, QUEUE_MSG_SEPARATOR
+from zato.common import BROKER
+from zato.common.broker_message import MESSAGE_TYPE, TOPICS
+from zato.common.test import rand_string
+
+# ################################################################################################################################
+
+def start_new_thread(func, args):
+    """ Stands in for thread.start_new_thread - instead of running a client's thread, marks it as already running.
+    """
+    func.__self__.keep_running = True
+
+# ################################################################################################################################
+
+class BrokerClientTestCase(TestCase):
+
+    def setUp(self):
+        self.callback = MagicMock()
+        self.topic_callbacks = {TOPICS[MESSAGE_TYPE.TO_PARALLEL_ANY]: self.callback}
+
+    def get_client(self, **kwargs):
+        with patch('thread.start_new_thread', start_new_thread):
+            client = BrokerClient(MagicMock(), 'parallel', self.topic_callbacks, {}, **kwargs)
+            client.run()
+
+        client.lua_container = MagicMock()
+        client.pub_client = MagicMock()
+
+        return client
+
+    def get_queue_msg(self, expires_at, msg):
+        return QUEUE_MSG_SEPARATOR.join((b'{:.3f}'.format(expires_at), dumps(msg)))
+
+    def test_pub_sub_default(self):
+        client = self.get_client()
+
+        eq_(client.async_delivery, BROKER.ASYNC_DELIVERY.PUB_SUB)
+        self.assertIsNone(client.queue_client)
+
+        client.invoke_async({'data': rand_string()})
+
+        # The message is stored under a key that is published
+        key, msg = client.kvdb.conn.set.call_args[0]
+        self.assertTrue(key.startswith('zato:broker'))
+        client.kvdb.conn.expire.assert_called_once_with(key, BROKER.DEFAULT_EXPIRATION)
+        client.pub_client.publish.assert_called_once_with(TOPICS[MESSAGE_TYPE.TO_PARALLEL_ANY], key)
+
+        self.assertFalse(client.lua_container.run_lua.called)
+
+    def test_queue_enqueue(self):
+        client = self.get_client(async_delivery=BROKER.ASYNC_DELIVERY.QUEUE)
+        data = rand_string()
+        expiration = 30
+
+        now = time()
+        client.invoke_async({'data': data}, expiration=expiration)
+
+        name, keys, args = client.lua_container.run_lua.call_args[0]
+        eq_(name, 'zato.broker.enqueue')
+        eq_(keys, [get_queue_key(MESSAGE_TYPE.TO_PARALLEL_ANY)])
+        eq_(args[1], expiration)
+
+        expires_at, msg = args[0].split(QUEUE_MSG_SEPARATOR, 1)
+        self.assertTrue(now + expiration - 0.001 <= float(expires_at) <= time() + expiration + 0.001)
+        eq_(loads(msg), {'data': data, 'msg_type': MESSAGE_TYPE.TO_PARALLEL_ANY})
+
+        # Nothing goes through pub/sub
+        self.assertFalse(client.kvdb.conn.set.called)
+        self.assertFalse(client.pub_client.publish.called)
+
+    def test_queue_other_msg_types_use_pub_sub(self):
+        client = self.get_client(async_delivery=BROKER.ASYNC_DELIVERY.QUEUE)
+        client.invoke_async({'data': rand_string()}, MESSAGE_TYPE.TO_SINGLETON)
+
+        self.assertFalse(client.lua_container.run_lua.called)
+        eq_(client.pub_client.publish.call_args[0][0], TOPICS[MESSAGE_TYPE.TO_SINGLETON])
+
+    def test_queue_keys(self):
+        client = self.get_client(async_delivery=BROKER.ASYNC_DELIVERY.QUEUE)
+        eq_(client.queue_client.queue_keys, [get_queue_key(MESSAGE_TYPE.TO_PARALLEL_ANY)])
+
+        # No callbacks for messages that can be queued, nothing to pop off
+        self.topic_callbacks = {TOPICS[MESSAGE_TYPE.TO_SINGLETON]: self.callback}
+        client = self.get_client(async_delivery=BROKER.ASYNC_DELIVERY.QUEUE)
+        self.assertIsNone(client.queue_client)
+
+    def test_queue_dispatch(self):
+        client = self.get_client(async_delivery=BROKER.ASYNC_DELIVERY.QUEUE)
+        queue_client = client.queue_client
+        queue_key = get_queue_key(MESSAGE_TYPE.TO_PARALLEL_ANY)
+        data = rand_string()
+
+        msgs = [
+            redis.ConnectionError('Connection refused'),
+            None, # BLPOP timed out
+            (queue_key, self.get_queue_msg(time() + 30, {'data': data, 'msg_type': MESSAGE_TYPE.TO_PARALLEL_ANY})),
+        ]
+
+        def blpop(keys, timeout):
+            if not msgs:
+                queue_client.keep_running = False
+                return None
+
+            msg = msgs.pop(0)
+            if isinstance(msg, Exception):
+                raise msg
+            return msg
+
+        queue_client.kvdb.conn.blpop.side_effect = blpop
+
+        with patch('zato.broker.client.spawn', lambda func, *args: func(*args)):
+            with patch('zato.broker.client.time.sleep') as sleep:
+                queue_client.run()
+
+        sleep.assert_called_once_with(BROKER.QUEUE_POP_TIMEOUT)
+
+        for call in queue_client.kvdb.conn.blpop.call_args_list:
+            eq_(call[0], ([queue_key], BROKER.QUEUE_POP_TIMEOUT))
+
+        self.callback.assert_called_once_with({'data': data, 'msg_type': MESSAGE_TYPE.TO_PARALLEL_ANY})
+        eq_(self.callback.call_args[0][0].data, data)
+
+    def test_queue_expired(self):
+        client = self.get_client(async_delivery=BROKER.ASYNC_DELIVERY.QUEUE)
+        queue_key = get_queue_key(MESSAGE_TYPE.TO_PARALLEL_ANY)
+        msg = {'data': rand_string(), 'msg_type': MESSAGE_TYPE.TO_PARALLEL_ANY}
+
+        with patch('zato.broker.client.spawn', lambda func, *args: func(*args)):
+            client.on_queue_message(queue_key, self.get_queue_msg(time() - 1, msg))
+            self.assertFalse(self.callback.called)
+
+            client.on_queue_message(queue_key, self.get_queue_msg(time() + 30, msg))
+            self.callback.assert_called_once_with(msg)
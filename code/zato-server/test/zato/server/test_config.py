@@ -0,0 +1,202 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (C) 2016 Dariusz Suchojad <dsuch at zato.io>
+
+Licensed under LGPLv3, see LICENSE.txt for terms and conditions.
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+# stdlib
+import os
+from datetime import datetime
+from json import loads
+from shutil import rmtree
+from tempfile import mkdtemp
+from time import time
+from unittest import TestCase
+
+# Bunch
+from bunch import Bunch
+
+# nose
+from nose.tools import eq_
+
+# SQLAlchemy
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+# Zato
+from zato.common import KVDB, MISC, SEC_DEF_TYPE, ZATO_NONE
+from zato.common.odb.model import Base, Cluster, HTTPBasicAuth, HTTPSOAP, Service
+from zato.common.test import rand_string
+from zato.server.config import ConfigDict, ConfigSnapshot
+from zato.server.odb import ODBManager
+
+# ################################################################################################################################
+
+class FakeKVDBConn(object):
+    def __init__(self):
+        self.data = {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+def get_odb(channels, sec_every=2):
+    """ Returns an ODBManager connected to a new in-memory database with a given number of HTTP channels,
+    every sec_every-th of them secured with its own HTTP Basic Auth definition.
+    """
+    engine = create_engine('sqlite://')
+    Base.metadata.create_all(engine)
+
+    odb = ODBManager()
+    odb.session = sessionmaker(bind=engine)
+
+    session = odb.session()
+
+    cluster = Cluster(None, 'my.cluster', '', 'sqlite', broker_host='localhost', broker_port=6379, lb_host='localhost',
+        lb_port=11223, lb_agent_port=20151)
+    service = Service(None, 'my.service', True, 'my.module.MyService', False, cluster)
+    session.add_all([cluster, service])
+
+    for idx in range(channels):
+        security = None
+
+        if idx % sec_every == 0:
+            security = HTTPBasicAuth(None, 'sec.{}'.format(idx), True, 'user.{}'.format(idx), 'realm.{}'.format(idx),
+                'password.{}'.format(idx), cluster)
+            session.add(security)
+
+        session.add(HTTPSOAP(None, 'channel.{}'.format(idx), True, False, 'channel', 'plain_http', None,
+            '/channel/{}'.format(idx), None, '', None, 'json', service=service, security=security, cluster=cluster))
+
+    session.commit()
+    odb.cluster = Bunch(id=cluster.id)
+    session.close()
+
+    return odb
+
+# ################################################################################################################################
+
+class ConfigSnapshotTestCase(TestCase):
+
+    def setUp(self):
+        self.dir_name = mkdtemp(prefix='zato-test-config-snapshot')
+        self.path = os.path.join(self.dir_name, 'config-snapshot.json')
+        self.kvdb_conn = FakeKVDBConn()
+
+    def tearDown(self):
+        rmtree(self.dir_name)
+
+    def get_config(self):
+        config = Bunch()
+        config.http_soap = [Bunch(name='my.channel', match_target='{}/my/channel'.format(MISC.SEPARATOR))]
+        config.basic_auth = ConfigDict('basic_auth', Bunch(abc=Bunch(config=Bunch(id=1, username='abc'))))
+        config.pubsub = Bunch(consumers=ConfigDict('pubsub_consumers', Bunch(abc=[Bunch(id=2, last_seen=datetime(2016, 1, 2))])))
+
+        return config
+
+    def test_save_load(self):
+        deployment_key = rand_string()
+        snapshot = ConfigSnapshot(self.path, self.kvdb_conn)
+        snapshot.save(deployment_key, snapshot.get_version(), self.get_config())
+
+        eq_(os.stat(self.path).st_mode & 0o777, 0o600)
+        eq_(os.listdir(self.dir_name), ['config-snapshot.json'])
+
+        config = ConfigSnapshot(self.path, self.kvdb_conn).load(deployment_key)
+
+        eq_(config.http_soap[0].name, 'my.channel')
+        eq_(config.basic_auth.name, 'basic_auth')
+        eq_(config.basic_auth['abc'].config.username, 'abc')
+        eq_(config.pubsub.consumers['abc'][0].last_seen, datetime(2016, 1, 2))
+
+        # The lock is usable after loading
+        config.basic_auth['def'] = Bunch(config=Bunch(id=3, username='def'))
+        eq_(sorted(config.basic_auth.keys()), ['abc', 'def'])
+
+    def test_save_json(self):
+        deployment_key = rand_string()
+        snapshot = ConfigSnapshot(self.path, self.kvdb_conn)
+        snapshot.save(deployment_key, snapshot.get_version(), self.get_config())
+
+        with open(self.path) as f:
+            data = loads(f.read())
+
+        eq_(data['deployment_key'], deployment_key)
+        eq_(data['config']['basic_auth'],
+            {'__config_dict__': 'basic_auth', '_impl': {'abc': {'config': {'id': 1, 'username': 'abc'}}}})
+
+    def test_save_unsupported(self):
+        config = self.get_config()
+        config.http_soap[0].match_target_compiled = object()
+
+        snapshot = ConfigSnapshot(self.path, self.kvdb_conn)
+        self.assertRaises(TypeError, snapshot.save, rand_string(), snapshot.get_version(), config)
+        eq_(os.listdir(self.dir_name), [])
+
+    def test_load_missing(self):
+        self.assertIsNone(ConfigSnapshot(self.path, self.kvdb_conn).load(rand_string()))
+
+    def test_load_wait_timeout(self):
+        start = time()
+        self.assertIsNone(ConfigSnapshot(self.path, self.kvdb_conn).load(rand_string(), 0.2))
+        self.assertTrue(time() - start >= 0.2)
+
+    def test_load_failed(self):
+        deployment_key = rand_string()
+        ConfigSnapshot(self.path, self.kvdb_conn).save_failed(deployment_key)
+
+        # Does not wait for a snapshot that will never be saved
+        start = time()
+        self.assertIsNone(ConfigSnapshot(self.path, self.kvdb_conn).load(deployment_key, 10))
+        self.assertTrue(time() - start < 1)
+
+    def test_load_other_deployment(self):
+        snapshot = ConfigSnapshot(self.path, self.kvdb_conn)
+        snapshot.save(rand_string(), snapshot.get_version(), self.get_config())
+
+        self.assertIsNone(snapshot.load(rand_string()))
+
+    def test_load_stale(self):
+        deployment_key = rand_string()
+        snapshot = ConfigSnapshot(self.path, self.kvdb_conn)
+
+        eq_(snapshot.get_version(), 0)
+        snapshot.save(deployment_key, snapshot.get_version(), self.get_config())
+
+        # Configuration changed after the snapshot was taken
+        self.kvdb_conn.data[KVDB.CONFIG_VERSION] = b'1'
+
+        eq_(snapshot.get_version(), 1)
+        self.assertIsNone(snapshot.load(deployment_key))
+
+        snapshot.save(deployment_key, snapshot.get_version(), self.get_config())
+        self.assertIsNotNone(snapshot.load(deployment_key))
+
+# ################################################################################################################################
+
+class ODBURLSecurityTestCase(TestCase):
+
+    def test_get_url_security(self):
+        odb = get_odb(4)
+        url_sec, columns = odb.get_url_security(odb.cluster.id, 'channel')
+
+        eq_(len(url_sec), 4)
+        self.assertIn('security_id', columns)
+
+        for idx in range(4):
+            item = url_sec['{}/channel/{}'.format(MISC.SEPARATOR, idx)]
+            eq_(item.is_active, True)
+            eq_(item.transport, 'plain_http')
+            eq_(item.data_format, 'json')
+
+            if idx % 2 == 0:
+                eq_(item.sec_def.name, 'sec.{}'.format(idx))
+                eq_(item.sec_def.sec_type, SEC_DEF_TYPE.BASIC_AUTH)
+                eq_(item.sec_def.username, 'user.{}'.format(idx))
+                eq_(item.sec_def.password, 'password.{}'.format(idx))
+                eq_(item.sec_def.realm, 'realm.{}'.format(idx))
+            else:
+                eq_(item.sec_def, ZATO_NONE)
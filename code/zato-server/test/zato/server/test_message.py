@@ -350,3 +350,77 @@ class TestMapper(TestCase):
         self.assertListEqual(target.aa, [1, 2, '3', 4])
         self.assertEquals(target.bb, '123')
         self.assertEquals(target.cc.dd, 123)
+
+    def test_compile(self):
+        source = {
+            'a': {
+                'b': [1, 2, '3', 4],
+                'c': {'d':'123', 'e':''}
+            }}
+
+        items = [
+            ('/a/b', '/aa'),
+            ('/a/c/d', '/bb'),
+            ('int:/a/c/d', '/cc/dd'),
+            ('int:/a/c/d', '/cc/ee/ff/19'),
+            ('/a/c/e', '/dd'),
+            ('/a/zz', '/ee'),
+            ('/a/b/1', '/ff'),
+        ]
+
+        for skip_missing in True, False:
+            expected = Mapper(source, skip_missing=skip_missing, default='my-default')
+            expected.map_many(items)
+
+            m = Mapper(source, skip_missing=skip_missing, default='my-default')
+            plan = m.compile(items)
+            self.assertEquals(len(plan), len(items))
+            self.assertDictEqual(m.apply(plan), expected.target)
+
+            # The same plan can be applied to other documents
+            other = {'a': {'c': {'d':'456'}}}
+            expected = Mapper(other, skip_missing=skip_missing, default='my-default')
+            expected.map_many(items)
+
+            self.assertDictEqual(plan.apply(other, {}), expected.target)
+
+    def test_compile_cache(self):
+        plans = {}
+        items = [('/a', '/b'), ('int:/c', '/d')]
+
+        plan1 = Mapper({}, plans=plans).compile(items)
+        plan2 = Mapper({'a':1}, plans=plans).compile(list(items))
+        self.assertIs(plan1, plan2)
+        self.assertEquals(len(plans), 1)
+
+        # Different configuration means a different plan
+        plan3 = Mapper({}, plans=plans).compile(items, skip_missing=False)
+
+        m = Mapper({}, plans=plans)
+        m.set_func('int', long)
+        plan4 = m.compile(items)
+
+        self.assertIsNot(plan1, plan3)
+        self.assertIsNot(plan1, plan4)
+        self.assertIsNot(plan3, plan4)
+        self.assertEquals(len(plans), 3)
+
+        # Defaults that cannot be hashed are not cached
+        plan5 = Mapper({}, plans=plans).compile(items, default={})
+        self.assertEquals(len(plan5), 2)
+        self.assertEquals(len(plans), 3)
+
+    def test_compile_force_func_error(self):
+        m = Mapper({'a':'zzz'})
+        plan = m.compile([('int:/a', '/b')])
+        self.assertRaises(ValueError, m.apply, plan)
+
+    def test_get(self):
+        m = Mapper({'a': {'b': [1, {'c':2}], 'd':None}})
+
+        self.assertEquals(m.get('/a/b'), [1, {'c':2}])
+        self.assertEquals(m.get('/a/b/1/c'), 2)
+        self.assertEquals(m.get('/a/d', 'my-default'), None)
+        self.assertEquals(m.get('/a/b/2', 'my-default'), 'my-default')
+        self.assertEquals(m.get('/a/b/1/zzz', 'my-default'), 'my-default')
+        self.assertEquals(m.get('a/b', 'my-default'), 'my-default')
@@ -792,3 +792,96 @@ class IsAllowedTestCase(TestCase):
         self.assertFalse(rbac.is_role_allowed(role_id1, perm_id1, res_name2))
 
 # ################################################################################################################################
+
+class ClientDecisionsTestCase(TestCase):
+
+    def get_rbac(self):
+        rbac = RBAC()
+
+        rbac.create_role(1, 'role_name1', None)
+        rbac.create_role(2, 'role_name2', 1)
+        rbac.create_role(3, 'role_name3', 2)
+
+        rbac.create_resource('res_name1')
+        rbac.create_resource('res_name2')
+
+        rbac.create_permission(11, 'perm_name1')
+        rbac.create_permission(22, 'perm_name2')
+
+        rbac.create_client_role('client_def1', 3)
+        rbac.create_client_role('client_def2', 1)
+
+        return rbac
+
+    def test_is_client_allowed_cached(self):
+        rbac = self.get_rbac()
+        rbac.create_role_permission_allow(1, 11, 'res_name1')
+
+        self.assertTrue(rbac.is_client_allowed('client_def1', 11, 'res_name1'))
+        self.assertFalse(rbac.is_client_allowed('client_def1', 22, 'res_name1'))
+        self.assertFalse(rbac.is_client_allowed('client_def3', 11, 'res_name1'))
+
+        self.assertEquals(rbac.client_decisions, {'client_def1': {(11, 'res_name1'): True, (22, 'res_name1'): None}})
+
+        # Subsequent checks do not consult the registry
+        rbac.registry = None
+        self.assertTrue(rbac.is_client_allowed('client_def1', 11, 'res_name1'))
+
+    def test_role_permission_invalidates_descendants_only(self):
+        rbac = self.get_rbac()
+        rbac.create_role(4, 'role_name4', None)
+        rbac.create_client_role('client_def4', 4)
+
+        for client_def in ('client_def1', 'client_def2', 'client_def4'):
+            self.assertFalse(rbac.is_client_allowed(client_def, 11, 'res_name1'))
+
+        rbac.create_role_permission_allow(2, 11, 'res_name1')
+
+        self.assertEquals(sorted(rbac.client_decisions), ['client_def2', 'client_def4'])
+        self.assertTrue(rbac.is_client_allowed('client_def1', 11, 'res_name1'))
+        self.assertFalse(rbac.is_client_allowed('client_def2', 11, 'res_name1'))
+
+        rbac.create_role_permission_deny(3, 11, 'res_name1')
+        self.assertFalse(rbac.is_client_allowed('client_def1', 11, 'res_name1'))
+
+        rbac.delete_role_permission_deny(3, 11, 'res_name1')
+        self.assertTrue(rbac.is_client_allowed('client_def1', 11, 'res_name1'))
+
+        rbac.delete_role_permission_allow(2, 11, 'res_name1')
+        self.assertFalse(rbac.is_client_allowed('client_def1', 11, 'res_name1'))
+
+    def test_edit_role_and_client_role(self):
+        rbac = self.get_rbac()
+        rbac.create_role(4, 'role_name4', None)
+        rbac.create_role_permission_allow(4, 11, 'res_name1')
+
+        self.assertFalse(rbac.is_client_allowed('client_def1', 11, 'res_name1'))
+
+        # Role 3 is now a child of role 4 rather than of role 2
+        rbac.edit_role(3, 'role_name3', 'role_name3', 4)
+        self.assertTrue(rbac.is_client_allowed('client_def1', 11, 'res_name1'))
+
+        self.assertFalse(rbac.is_client_allowed('client_def2', 11, 'res_name1'))
+
+        rbac.create_client_role('client_def2', 4)
+        self.assertTrue(rbac.is_client_allowed('client_def2', 11, 'res_name1'))
+
+        rbac.delete_client_role('client_def2', 4)
+        self.assertFalse(rbac.is_client_allowed('client_def2', 11, 'res_name1'))
+
+    def test_delete_permission_resource(self):
+        rbac = self.get_rbac()
+        rbac.create_role_permission_allow(1, 11, 'res_name1')
+        rbac.create_role_permission_allow(1, 22, 'res_name2')
+
+        self.assertTrue(rbac.is_client_allowed('client_def1', 11, 'res_name1'))
+        self.assertTrue(rbac.is_client_allowed('client_def1', 22, 'res_name2'))
+
+        rbac.delete_permission(11)
+        self.assertFalse(rbac.is_client_allowed('client_def1', 11, 'res_name1'))
+
+        rbac.delete_resource('res_name2')
+        rbac.create_resource('res_name2')
+        self.assertFalse(rbac.is_client_allowed('client_def1', 22, 'res_name2'))
+
+# ################################################################################################################################
@@ -110,3 +110,78 @@ class SchedulerTestCase(TestCase):
                             check_publish_msg(publish_msgs[0])
                         else:
                             self.assertEquals(len(publish_msgs), 0)
+
+# ################################################################################################################################
+
+    def test_on_jobs_executed(self):
+
+        async_msgs = []
+        publish_msgs = []
+
+        class _BrokerClient:
+
+            def invoke_async(self, msg):
+                async_msgs.append(msg)
+
+            def publish(self, msg):
+                publish_msgs.append(msg)
+
+        class _Singleton:
+            broker_client = _BrokerClient()
+
+        def get_ctx(name, job_type):
+            return {
+                'name': name,
+                'cb_kwargs': {'service': 'service-{}'.format(name), 'extra': 'extra-{}'.format(name)},
+                'cid': new_cid(),
+                'type': job_type,
+                'id': 'id-{}'.format(name),
+            }
+
+        sched = Scheduler(_Singleton(), init=False)
+
+        # A single job is sent in a regular message
+        sched.on_jobs_executed([get_ctx('a', SCHEDULER.JOB_TYPE.INTERVAL_BASED)])
+
+        self.assertEquals(len(async_msgs), 1)
+        self.assertEquals(async_msgs[0]['action'], SCHEDULER_MSG.JOB_EXECUTED.value)
+        self.assertEquals(async_msgs[0]['service'], 'service-a')
+        self.assertEquals(publish_msgs, [])
+
+        del async_msgs[:]
+
+        ctx_list = [
+            get_ctx('a', SCHEDULER.JOB_TYPE.INTERVAL_BASED),
+            get_ctx('b', SCHEDULER.JOB_TYPE.CRON_STYLE),
+            get_ctx('c', SCHEDULER.JOB_TYPE.ONE_TIME),
+            get_ctx('d', SCHEDULER.JOB_TYPE.ONE_TIME),
+            get_ctx(ENSURE_SINGLETON_JOB, SCHEDULER.JOB_TYPE.INTERVAL_BASED),
+        ]
+
+        sched.on_jobs_executed(ctx_list)
+
+        # All the jobs, save for the singleton one, are in a single batch message ..
+        self.assertEquals(len(async_msgs), 1)
+
+        msg = async_msgs[0]
+        self.assertEquals(msg['action'], SCHEDULER_MSG.JOB_EXECUTED_BATCH.value)
+        self.assertEquals(len(msg['cid']), CID_LENGTH)
+        self.assertEquals([elem['name'] for elem in msg['jobs']], ['a', 'b', 'c', 'd'])
+
+        for elem, ctx in zip(msg['jobs'], ctx_list):
+            self.assertEquals(elem['action'], SCHEDULER_MSG.JOB_EXECUTED.value)
+            self.assertEquals(elem['service'], ctx['cb_kwargs']['service'])
+            self.assertEquals(elem['payload'], ctx['cb_kwargs']['extra'])
+            self.assertEquals(elem['cid'], ctx['cid'])
+            self.assertEquals(elem['job_type'], ctx['type'])
+
+        # .. the singleton one is published on its own and both one-time jobs are deactivated in one go.
+        self.assertEquals(len(publish_msgs), 2)
+        self.assertEquals(publish_msgs[0]['name'], ENSURE_SINGLETON_JOB)
+
+        msg = publish_msgs[1]
+        self.assertEquals(msg['action'], SERVICE.PUBLISH.value)
+        self.assertEquals(msg['service'], 'zato.scheduler.job.set-active-status-many')
+        self.assertEquals(msg['payload'], {'id_list': ['id-c', 'id-d'], 'is_active': False})
+        self.assertEquals(msg['channel'], CHANNEL.SCHEDULER_AFTER_ONE_TIME)
+        self.assertEquals(msg['data_format'], DATA_FORMAT.JSON)
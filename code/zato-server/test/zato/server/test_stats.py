@@ -0,0 +1,343 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (C) 2016 Dariusz Suchojad <dsuch at zato.io>
+
+Licensed under LGPLv3, see LICENSE.txt for terms and conditions.
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+# stdlib
+from datetime import datetime
+from fnmatch import fnmatchcase
+from unittest import TestCase
+
+# nose
+from nose.tools import eq_
+
+# Zato
+from zato.common import KVDB
+from zato.server.stats import get_index, get_index_key, hgetall_many, Histogram, MaintenanceTool, ServiceStatsAccumulator
+
+# ################################################################################################################################
+
+class FakePipeline(object):
+    def __init__(self, conn):
+        self.conn = conn
+        self.commands = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *ignored):
+        pass
+
+    def __getattr__(self, name):
+        def _command(*args):
+            self.commands.append((name,) + args)
+        return _command
+
+    def execute(self):
+        if self.conn.execute_exc:
+            raise self.conn.execute_exc
+        self.conn.executed.append(self.commands)
+
+        # Read-only commands return what the connection was populated with
+        return [self.conn.ttls.get(elem[1], -1) if elem[0] == 'ttl' else self.conn.data.get(elem[1], {})
+            for elem in self.commands]
+
+class FakeConn(object):
+    def __init__(self):
+        self.executed = []
+        self.execute_exc = None
+        self.data = {}
+        self.ttls = {}
+
+    def pipeline(self, *ignored_args, **ignored_kwargs):
+        return FakePipeline(self)
+
+    def keys(self, pattern):
+        return sorted(key for key in self.data if fnmatchcase(key, pattern))
+
+    def setnx(self, key, value):
+        if key in self.data:
+            return False
+        self.data[key] = value
+        return True
+
+    def sadd(self, key, *values):
+        self.data.setdefault(key, set()).update(values)
+
+    def delete(self, key):
+        self.data.pop(key, None)
+
+# ################################################################################################################################
+
+class IndexTestCase(TestCase):
+
+    def test_get_index_key(self):
+        eq_(get_index_key(KVDB.SERVICE_TIME_AGGREGATED_BY_MINUTE, '2016:01:02:03:04'),
+            'zato:stats:service:time:index:aggr-by-minute:2016:01:02:03:04')
+        eq_(get_index_key(KVDB.SERVICE_TIME_AGGREGATED_BY_HOUR, '2016:01:02:03'),
+            'zato:stats:service:time:index:aggr-by-hour:2016:01:02:03')
+        eq_(get_index_key(KVDB.SERVICE_SUMMARY_BY_DAY, '2016:01:02'), 'zato:stats:service:time:index:by-day:2016:01:02')
+
+    def test_get_index(self):
+        conn = FakeConn()
+        conn.data[get_index_key(KVDB.SERVICE_TIME_AGGREGATED_BY_MINUTE, '2016:01:02:03:04')] = set(['b', 'a'])
+        conn.data[get_index_key(KVDB.SERVICE_TIME_AGGREGATED_BY_MINUTE, '2016:01:02:03:06')] = set(['c'])
+
+        index = get_index(conn, KVDB.SERVICE_TIME_AGGREGATED_BY_MINUTE, ['2016:01:02:03:04', '2016:01:02:03:05', '2016:01:02:03:06'])
+        eq_(index, [('a', '2016:01:02:03:04'), ('b', '2016:01:02:03:04'), ('c', '2016:01:02:03:06')])
+
+        # No KEYS command is ever used
+        for commands in conn.executed:
+            for elem in commands:
+                eq_(elem[0], 'smembers')
+
+    def test_hgetall_many(self):
+        conn = FakeConn()
+        conn.data['a'] = {'usage': '1'}
+        conn.data['c'] = {'usage': '3'}
+
+        eq_(hgetall_many(conn, ['a', 'b', 'c']), [{'usage': '1'}, {}, {'usage': '3'}])
+        eq_(hgetall_many(conn, []), [])
+
+# ################################################################################################################################
+
+class BackfillIndexTestCase(TestCase):
+
+    def test_backfill_index(self):
+        conn = FakeConn()
+
+        minute_a = '{}a.b:2016:01:02:03:04'.format(KVDB.SERVICE_TIME_AGGREGATED_BY_MINUTE)
+        minute_b = '{}c:2016:01:02:03:04'.format(KVDB.SERVICE_TIME_AGGREGATED_BY_MINUTE)
+        hour = '{}a.b:2016:01:02:03'.format(KVDB.SERVICE_TIME_AGGREGATED_BY_HOUR)
+        year = '{}a.b:2016'.format(KVDB.SERVICE_SUMMARY_BY_YEAR)
+
+        for key in (minute_a, minute_b, hour, year):
+            conn.data[key] = {'usage': '1'}
+
+        conn.data['{}d'.format(KVDB.SERVICE_TIME_HISTOGRAM_RAW)] = {'10': '1'}
+        conn.ttls.update({minute_a: 100, minute_b: 200, hour: 300})
+
+        MaintenanceTool(conn).backfill_index()
+
+        minute_index = get_index_key(KVDB.SERVICE_TIME_AGGREGATED_BY_MINUTE, '2016:01:02:03:04')
+        hour_index = get_index_key(KVDB.SERVICE_TIME_AGGREGATED_BY_HOUR, '2016:01:02:03')
+        year_index = get_index_key(KVDB.SERVICE_SUMMARY_BY_YEAR, '2016')
+
+        commands = sorted(conn.executed[-1])
+        eq_(commands, sorted([
+            ('sadd', minute_index, 'a.b', 'c'),
+            ('expire', minute_index, 200),
+            ('sadd', hour_index, 'a.b'),
+            ('expire', hour_index, 300),
+
+            # Summaries that never expire have an index that doesn't either
+            ('sadd', year_index, 'a.b'),
+        ]))
+
+        eq_(conn.data[KVDB.SERVICE_TIME_INDEX_RAW], set(['d']))
+
+        # It's done only once
+        conn.executed[:] = []
+        MaintenanceTool(conn).backfill_index()
+        eq_(conn.executed, [])
+
+    def test_backfill_index_error(self):
+        conn = FakeConn()
+        conn.data['{}a:2016:01:02:03'.format(KVDB.SERVICE_TIME_AGGREGATED_BY_HOUR)] = {'usage': '1'}
+        conn.execute_exc = Exception('Connection refused')
+
+        # Errors are logged, not raised, and another attempt will be made next time
+        MaintenanceTool(conn).backfill_index()
+        self.assertNotIn(KVDB.SERVICE_TIME_INDEX_BACKFILLED, conn.data)
+
+# ################################################################################################################################
+
+class HistogramTestCase(TestCase):
+
+    def test_get_bucket(self):
+
+        # Small values are kept as they are
+        for value in (0, 1, 63, 127):
+            eq_(Histogram.get_bucket(value), value)
+            eq_(Histogram.get_bucket_width(value), 1)
+
+        eq_(Histogram.get_bucket(128), 128)
+        eq_(Histogram.get_bucket(129), 128)
+        eq_(Histogram.get_bucket(130), 130)
+        eq_(Histogram.get_bucket_width(130), 2)
+
+        eq_(Histogram.get_bucket(1000), 1000)
+        eq_(Histogram.get_bucket(1007), 1000)
+        eq_(Histogram.get_bucket_width(1000), 8)
+
+        # Relative error is always below 1/64
+        for value in range(1, 100000, 7):
+            bucket = Histogram.get_bucket(value)
+            self.assertTrue(bucket <= value < bucket + Histogram.get_bucket_width(bucket))
+            self.assertTrue((value - bucket) / value < 1 / 64.0)
+
+    def test_stats(self):
+        h = Histogram()
+        for value in range(1, 101):
+            h.add(value)
+
+        eq_(h.total, 100)
+        eq_(h.min, 1)
+        eq_(h.max, 100)
+        eq_(h.mean(), 50.5)
+        eq_(h.mean(10), 5.5)
+        eq_(h.percentile(0), 1)
+        eq_(h.percentile(50), 50)
+        eq_(h.percentile(95), 95)
+        eq_(h.percentile(99), 99)
+        eq_(h.percentile(100), 100)
+
+    def test_stats_empty(self):
+        h = Histogram()
+        eq_(h.total, 0)
+        eq_(h.min, 0)
+        eq_(h.max, 0)
+        eq_(h.mean(), 0)
+        eq_(h.percentile(99), 0)
+
+    def test_merge(self):
+        h1 = Histogram()
+        h2 = Histogram()
+
+        for value in range(1000):
+            h1.add(value)
+            h2.add(value * 2)
+
+        h1.merge(h2)
+        eq_(h1.total, 2000)
+        eq_(h1.min, 0)
+        eq_(h1.max, 1999)
+
+    def test_from_kvdb(self):
+        h = Histogram.from_kvdb({'10': '2', '992': '3'})
+        eq_(h.counts, {10:2, 992:3})
+        eq_(h.total, 5)
+        eq_(h.max, 999)
+        eq_(h.percentile(50), 995.5)
+
+# ################################################################################################################################
+
+class ServiceStatsAccumulatorTestCase(TestCase):
+
+    def test_on_invoked(self):
+        acc = ServiceStatsAccumulator(FakeConn())
+
+        eq_(acc.on_invoked('a'), 1)
+        eq_(acc.on_invoked('a'), 2)
+        eq_(acc.on_invoked('b'), 1)
+
+        # Total usage, used for sampling, is not reset by flushing
+        acc.flush()
+        eq_(acc.on_invoked('a'), 3)
+        eq_(acc.usage, {'a': 1})
+
+    def test_flush(self):
+        conn = FakeConn()
+        acc = ServiceStatsAccumulator(conn)
+
+        now1 = datetime(2016, 1, 2, 3, 4, 5)
+        now2 = datetime(2016, 1, 2, 3, 5, 6)
+
+        for name, proc_time, now in (('a', 10, now1), ('a', 10, now1), ('a', 20, now1), ('a', 30, now2), ('b', 0, now1)):
+            acc.on_invoked(name)
+            acc.on_processed(name, proc_time, now)
+
+        acc.flush()
+
+        eq_(len(conn.executed), 1)
+        commands = conn.executed[0]
+
+        incrby = sorted(elem for elem in commands if elem[0] == 'incrby')
+        eq_(incrby, [('incrby', KVDB.SERVICE_USAGE + 'a', 4), ('incrby', KVDB.SERVICE_USAGE + 'b', 1)])
+
+        hset = sorted(elem for elem in commands if elem[0] == 'hset')
+        eq_(hset, [('hset', KVDB.SERVICE_TIME_BASIC + 'a', 'last', 30), ('hset', KVDB.SERVICE_TIME_BASIC + 'b', 'last', 0)])
+
+        hincrby = {}
+        for elem in commands:
+            if elem[0] == 'hincrby':
+                hincrby.setdefault(elem[1], {})
+                hincrby[elem[1]][elem[2]] = hincrby[elem[1]].get(elem[2], 0) + elem[3]
+
+        eq_(hincrby[KVDB.SERVICE_TIME_HISTOGRAM_RAW + 'a'], {10:2, 20:1, 30:1})
+        eq_(hincrby[KVDB.SERVICE_TIME_HISTOGRAM_RAW + 'b'], {0:1})
+        eq_(hincrby[KVDB.SERVICE_TIME_HISTOGRAM_RAW_BY_MINUTE + 'a:2016:01:02:03:04'], {10:2, 20:1})
+        eq_(hincrby[KVDB.SERVICE_TIME_HISTOGRAM_RAW_BY_MINUTE + 'a:2016:01:02:03:05'], {30:1})
+        eq_(hincrby[KVDB.SERVICE_TIME_HISTOGRAM_RAW_BY_MINUTE + 'b:2016:01:02:03:04'], {0:1})
+
+        expire = sorted(elem for elem in commands if elem[0] == 'expire')
+        eq_(expire, [
+            ('expire', KVDB.SERVICE_TIME_HISTOGRAM_RAW_BY_MINUTE + 'a:2016:01:02:03:04', 300),
+            ('expire', KVDB.SERVICE_TIME_HISTOGRAM_RAW_BY_MINUTE + 'a:2016:01:02:03:05', 300),
+            ('expire', KVDB.SERVICE_TIME_HISTOGRAM_RAW_BY_MINUTE + 'b:2016:01:02:03:04', 300),
+            ('expire', KVDB.SERVICE_TIME_INDEX + 'raw-by-minute:2016:01:02:03:04', 300),
+            ('expire', KVDB.SERVICE_TIME_INDEX + 'raw-by-minute:2016:01:02:03:04', 300),
+            ('expire', KVDB.SERVICE_TIME_INDEX + 'raw-by-minute:2016:01:02:03:05', 300),
+        ])
+
+        sadd = sorted(set(elem for elem in commands if elem[0] == 'sadd'))
+        eq_(sadd, [
+            ('sadd', KVDB.SERVICE_TIME_INDEX + 'raw', 'a'),
+            ('sadd', KVDB.SERVICE_TIME_INDEX + 'raw', 'b'),
+            ('sadd', KVDB.SERVICE_TIME_INDEX + 'raw-by-minute:2016:01:02:03:04', 'a'),
+            ('sadd', KVDB.SERVICE_TIME_INDEX + 'raw-by-minute:2016:01:02:03:04', 'b'),
+            ('sadd', KVDB.SERVICE_TIME_INDEX + 'raw-by-minute:2016:01:02:03:05', 'a'),
+        ])
+
+        # Nothing new was collected so there is nothing to flush
+        acc.flush()
+        eq_(len(conn.executed), 1)
+
+    def test_stop(self):
+        conn = FakeConn()
+
+        acc = ServiceStatsAccumulator(conn)
+        acc.on_invoked('a')
+        acc.on_processed('a', 10)
+
+        # Whatever has not been flushed yet is written out when stopping
+        acc.stop()
+        eq_(acc.keep_running, False)
+        eq_(len(conn.executed), 1)
+        eq_(acc.usage, {})
+
+    def test_flush_error(self):
+        conn = FakeConn()
+        conn.execute_exc = Exception('Connection refused')
+
+        acc = ServiceStatsAccumulator(conn)
+        acc.on_invoked('a')
+        acc.on_processed('a', 10)
+
+        # Errors are logged, not raised, and the batch is kept for the next flush
+        acc.flush()
+        eq_(conn.executed, [])
+        eq_(acc.usage, {'a': 1})
+        eq_(acc.last, {'a': 10})
+        eq_(acc.by_minute.values()[0].counts, {10: 1})
+
+        # Data collected in the meantime is merged with the batch that could not be flushed
+        acc.on_invoked('a')
+        acc.on_processed('a', 20)
+
+        conn.execute_exc = None
+        acc.flush()
+
+        commands = conn.executed[0]
+        self.assertIn(('incrby', '{}a'.format(KVDB.SERVICE_USAGE), 2), commands)
+        self.assertIn(('hset', '{}a'.format(KVDB.SERVICE_TIME_BASIC), 'last', 20), commands)
+        self.assertIn(('hincrby', '{}a'.format(KVDB.SERVICE_TIME_HISTOGRAM_RAW), 10, 1), commands)
+        self.assertIn(('hincrby', '{}a'.format(KVDB.SERVICE_TIME_HISTOGRAM_RAW), 20, 1), commands)
+
+        eq_(acc.usage, {})
+        eq_(acc.by_minute, {})
@@ -29,7 +29,7 @@ from pytz import UTC
 
 # Zato
 from zato.admin.web import from_utc_to_user
-from zato.common import SEC_DEF_TYPE_NAME, ZatoException, ZATO_NONE
+from zato.common import BATCH_DEFAULTS, SEC_DEF_TYPE_NAME, ZatoException, ZATO_NONE
 
 logger = logging.getLogger(__name__)
 
@@ -60,6 +60,21 @@ def get_tls_ca_cert_list(client, cluster):
     """
     return _get_list(client, cluster, 'zato.security.tls.ca-cert.get-list')
 
+def get_search_input(req):
+    """ Returns parameters telling a list service which page of results to return, how to filter and sort them.
+    """
+    out = {
+        'current_batch': req.GET.get('current_batch') or BATCH_DEFAULTS.PAGE_NO,
+        'batch_size': req.GET.get('batch_size') or BATCH_DEFAULTS.SIZE,
+    }
+
+    for name in ('query', 'sort_by', 'sort_order'):
+        value = req.GET.get(name)
+        if value:
+            out[name] = value
+
+    return out
+
 def get_sample_dt(user_profile):
     """ A sample date and time an hour in the future serving as a hint as to what
     format to use when entering date and time manually in the user-provided format.
@@ -224,6 +239,9 @@ class Index(_BaseView):
 
     output_class = None
 
+    # Whether a list service is to return a single page of results at a time
+    paginate = False
+
     def __init__(self):
         super(Index, self).__init__()
         self.input = Bunch()
@@ -291,6 +309,9 @@ class Index(_BaseView):
             self.item = None
             self.set_input()
 
+            if self.paginate:
+                self.input.update(get_search_input(self.req))
+
             return_data = {'cluster_id':self.cluster_id}
             output_repeated = getattr(self.SimpleIO, 'output_repeated', False)
 
@@ -302,6 +323,9 @@ class Index(_BaseView):
                         self._handle_item_list(response.data)
                     else:
                         self._handle_item(response.data)
+
+                    if self.paginate and response.meta:
+                        return_data.update(response.meta)
                 else:
                     self.user_message = response.details
             else:
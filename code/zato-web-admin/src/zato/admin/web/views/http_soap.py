@@ -27,8 +27,8 @@ from paste.util.converters import asbool
 # Zato
 from zato.admin.web import from_utc_to_user
 from zato.admin.web.forms.http_soap import AuditLogEntryList, ChooseClusterForm, CreateForm, EditForm, ReplacePatternsForm
-from zato.admin.web.views import get_js_dt_format, get_security_id_from_select, get_tls_ca_cert_list, method_allowed, \
-     id_only_service, SecurityList
+from zato.admin.web.views import get_js_dt_format, get_search_input, get_security_id_from_select, get_tls_ca_cert_list, \
+     method_allowed, id_only_service, SecurityList
 from zato.common import BATCH_DEFAULTS, DEFAULT_HTTP_PING_METHOD, DEFAULT_HTTP_POOL_SIZE, HTTP_SOAP_SERIALIZATION_TYPE, \
      MSG_PATTERN_TYPE, PARAMS_PRIORITY, SEC_DEF_TYPE_NAME, SOAP_CHANNEL_VERSIONS, SOAP_VERSIONS, URL_PARAMS_PRIORITY, URL_TYPE, \
      ZatoException, ZATO_NONE
@@ -83,6 +83,7 @@ def _get_edit_create_message(params, prefix=''):
         'sec_tls_ca_cert_id': params.get(prefix + 'sec_tls_ca_cert_id'),
         'security_id': security_id,
         'has_rbac': bool(params.get(prefix + 'has_rbac')),
+        'is_streaming': bool(params.get(prefix + 'is_streaming')),
         'content_type': params.get(prefix + 'content_type'),
     }
 
@@ -113,6 +114,7 @@ def index(req):
 
     create_form = None
     edit_form = None
+    meta = None
 
     colspan = 17
 
@@ -142,8 +144,12 @@ def index(req):
             'connection': connection,
             'transport': transport,
         }
+        input_dict.update(get_search_input(req))
 
-        for item in req.zato.client.invoke('zato.http-soap.get-list', input_dict):
+        response = req.zato.client.invoke('zato.http-soap.get-list', input_dict)
+        meta = response.meta
+
+        for item in response:
 
             _security_name = item.security_name
             if _security_name:
@@ -163,12 +169,13 @@ def index(req):
                     item.pool_size, item.merge_url_params_req, item.url_params_pri, item.params_pri,
                     item.serialization_type, item.timeout, item.sec_tls_ca_cert_id, service_id=item.service_id,
                     service_name=item.service_name, security_id=security_id, has_rbac=item.has_rbac,
-                    security_name=security_name, content_type=item.content_type)
+                    security_name=security_name, content_type=item.content_type, is_streaming=item.is_streaming)
             items.append(item)
 
     return_data = {'zato_clusters':req.zato.clusters,
         'cluster_id':req.zato.cluster_id,
         'choose_cluster_form':ChooseClusterForm(req.zato.clusters, req.GET),
+        'req':req,
         'items':items,
         'create_form':create_form,
         'edit_form':edit_form,
@@ -183,6 +190,9 @@ def index(req):
         'default_http_timeout':MISC.DEFAULT_HTTP_TIMEOUT,
         }
 
+    if meta:
+        return_data.update(meta)
+
     return TemplateResponse(req, 'zato/http_soap/index.html', return_data)
 
 @method_allowed('POST')
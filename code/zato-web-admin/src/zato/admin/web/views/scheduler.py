@@ -32,7 +32,7 @@ from pytz import UTC
 
 # Zato
 from zato.admin.web import from_user_to_utc, from_utc_to_user
-from zato.admin.web.views import get_js_dt_format, get_sample_dt, method_allowed, Delete as _Delete
+from zato.admin.web.views import get_js_dt_format, get_sample_dt, get_search_input, method_allowed, Delete as _Delete
 from zato.admin.settings import job_type_friendly_names
 from zato.admin.web.forms.scheduler import CronStyleSchedulerJobForm, \
      IntervalBasedSchedulerJobForm, OneTimeSchedulerJobForm
@@ -288,12 +288,17 @@ def _edit_cron_style(client, user_profile, cluster, params):
 def index(req):
     try:
         jobs = []
+        meta = None
 
         # Build a list of schedulers for a given Zato cluster.
         if req.zato.cluster_id and req.method == 'GET':
 
+            input_dict = {'cluster_id': req.zato.cluster_id}
+            input_dict.update(get_search_input(req))
+
             # We have a server to pick the schedulers from, try to invoke it now.
-            response = req.zato.client.invoke('zato.scheduler.job.get-list', {'cluster_id': req.zato.cluster_id})
+            response = req.zato.client.invoke('zato.scheduler.job.get-list', input_dict)
+            meta = response.meta
 
             if response.has_data:
                 for job_elem in response.data:
@@ -397,6 +402,7 @@ def index(req):
 
         return_data = {'zato_clusters':req.zato.clusters,
             'cluster_id':req.zato.cluster_id,
+            'req':req,
             'choose_cluster_form':req.zato.choose_cluster_form,
             'jobs':jobs,
             'friendly_names':job_type_friendly_names.items(),
@@ -411,6 +417,9 @@ def index(req):
 
         return_data.update(get_js_dt_format(req.zato.user_profile))
 
+        if meta:
+            return_data.update(meta)
+
         return TemplateResponse(req, 'zato/scheduler.html', return_data)
     except Exception, e:
         msg = '<pre>Could not invoke the method, e:[{0}]</pre>'.format(format_exc(e))